@@ -0,0 +1,223 @@
+#!/usr/bin/env python
+
+########################################################################
+# PETRUS/SRC/Aatr.py:
+# This is the AATR (Along Arc TEC Rate) Module of PETRUS tool
+#
+#  Project:        PETRUS
+#  File:           Aatr.py
+#  Date(YY/MM/DD): 01/02/21
+#
+#   Author: GNSS Academy
+#   Copyright 2021 GNSS Academy
+#
+# -----------------------------------------------------------------
+# Date       | Author             | Action
+# -----------------------------------------------------------------
+#
+# The AATR indicator is aggregated while the Preprocessing runs, so
+# that it does not need to re-read the PREPRO OBS file. The state only
+# keeps running sums: those of the AATR_SUBBIN sub-bins of the sliding
+# windows, in ring buffers, and the daily statistics of the receiver,
+# so that its memory does not grow with the length of the day nor with
+# the sampling rate.
+########################################################################
+
+
+# Import External and Internal functions and Libraries
+#----------------------------------------------------------------------
+import sys, os
+from collections import OrderedDict
+from math import sqrt
+from COMMON.Dates import convertSod2Ns, NS_IN_S
+
+# Sliding windows of the AATR [s]
+AATR_WINDOWS = OrderedDict({})
+AATR_WINDOWS["5MIN"] = 300
+AATR_WINDOWS["1H"] = 3600
+
+# Sub-bins of the sliding windows [s]: the windows move by whole
+# sub-bins, and cover the last (length / AATR_SUBBIN) sub-bins, the
+# current one included
+AATR_SUBBIN = 60
+
+def initAatrInfo():
+
+    # Purpose: initialize the AATR aggregator of one receiver and day
+
+    # Parameters
+    # ==========
+    # None
+
+    # Returns
+    # =======
+    # AatrInfo: dict
+    #         Dictionary containing the AATR aggregator state
+
+    AatrInfo = {
+        "Sod": 0.0,               # SoD of the last epoch
+        "NSats": 0,               # Number of sats in the epoch AATR
+        "Aatr": 0.0,              # Epoch AATR [mm/s]
+        "VtecRateRms": 0.0,       # Epoch RMS of the VTEC Rate [mm/s]
+        "Windows": OrderedDict({}),
+        "Daily": {
+            "NEpochs": 0,         # Number of epochs with AATR
+            "NSamples": 0,        # Number of sat samples
+            "SumAatr2": 0.0,      # Sum of the squared epoch AATR
+            "SumVtecRate2": 0.0,  # Sum of the squared VTEC Rates
+            "MaxAatr": 0.0,       # Maximum epoch AATR
+            "MaxAatrSod": 0.0,    # SoD of the maximum epoch AATR
+            "MaxAbsVtecRate": 0.0,# Maximum absolute VTEC Rate
+        },
+    }
+
+    # Initialize the sliding windows
+    for Window, Length in AATR_WINDOWS.items():
+        NBins = Length // AATR_SUBBIN
+        AatrInfo["Windows"][Window] = {
+            "Length": Length,     # Window length [s]
+            "Bin": -1,            # Current sub-bin (SoD // AATR_SUBBIN)
+            "BinSumAatr2": [0.0] * NBins, # Ring of the sub-bin sums
+            "BinNEpochs": [0] * NBins,    # Ring of the sub-bin epochs
+            "SumAatr2": 0.0,      # Sum of the squared AATR in the window
+            "NEpochs": 0,         # Number of epochs in the window
+            "Aatr": 0.0,          # Window AATR [mm/s]
+            "MaxAatr": 0.0,       # Maximum window AATR
+        }
+
+    return AatrInfo
+
+# End of initAatrInfo()
+
+def updateAatrInfo(AatrInfo, PreproObsInfo):
+
+    # Purpose: add the current epoch to the AATR aggregator
+    #          The epoch AATR is the RMS of the instantaneous AATR
+    #          of the valid satellites. The window AATR is the RMS of
+    #          the epoch AATR over the last window length seconds.
+
+    # Parameters
+    # ==========
+    # AatrInfo: dict
+    #         Dictionary containing the AATR aggregator state
+    # PreproObsInfo: dict
+    #         Dictionary containing Preprocessing info for the
+    #         current epoch
+
+    # Returns
+    # =======
+    # Nothing, AatrInfo is updated
+
+    Daily = AatrInfo["Daily"]
+
+    # Accumulate the valid satellites of the epoch
+    # The iAATR is only computed when the Geometry-Free rate is
+    # available, otherwise it keeps its initial value
+    NSats = 0
+    SumAatr2 = 0.0
+    SumVtecRate2 = 0.0
+    for SatPreproObs in PreproObsInfo.values():
+        Sod = SatPreproObs["Sod"]
+        if SatPreproObs["ValidL1"] == 1 and SatPreproObs["iAATR"] != 0.0:
+            NSats = NSats + 1
+            SumAatr2 = SumAatr2 + SatPreproObs["iAATR"]**2
+            SumVtecRate2 = SumVtecRate2 + SatPreproObs["VtecRate"]**2
+            if abs(SatPreproObs["VtecRate"]) > Daily["MaxAbsVtecRate"]:
+                Daily["MaxAbsVtecRate"] = abs(SatPreproObs["VtecRate"])
+
+    if len(PreproObsInfo) > 0:
+        AatrInfo["Sod"] = Sod
+    AatrInfo["NSats"] = NSats
+
+    # If no satellite contributes, the epoch is not used
+    if NSats == 0:
+        AatrInfo["Aatr"] = 0.0
+        AatrInfo["VtecRateRms"] = 0.0
+        return
+
+    # Epoch AATR
+    Aatr2 = SumAatr2 / NSats
+    AatrInfo["Aatr"] = sqrt(Aatr2)
+    AatrInfo["VtecRateRms"] = sqrt(SumVtecRate2 / NSats)
+
+    # Daily statistics
+    Daily["NEpochs"] = Daily["NEpochs"] + 1
+    Daily["NSamples"] = Daily["NSamples"] + NSats
+    Daily["SumAatr2"] = Daily["SumAatr2"] + Aatr2
+    Daily["SumVtecRate2"] = Daily["SumVtecRate2"] + SumVtecRate2
+    if AatrInfo["Aatr"] > Daily["MaxAatr"]:
+        Daily["MaxAatr"] = AatrInfo["Aatr"]
+        Daily["MaxAatrSod"] = AatrInfo["Sod"]
+
+    # Sliding windows: drop the expired sub-bins and add the epoch to
+    # the current one, with the epochs in integer ns to be exact at
+    # any rate
+    Bin = convertSod2Ns(AatrInfo["Sod"]) // (AATR_SUBBIN * NS_IN_S)
+    for WindowInfo in AatrInfo["Windows"].values():
+        BinSumAatr2 = WindowInfo["BinSumAatr2"]
+        BinNEpochs = WindowInfo["BinNEpochs"]
+        NBins = len(BinNEpochs)
+
+        # The slots of the new sub-bins held the expired ones
+        for NewBin in range(max(WindowInfo["Bin"] + 1, Bin - NBins + 1),
+            Bin + 1):
+            Slot = NewBin % NBins
+            WindowInfo["SumAatr2"] = WindowInfo["SumAatr2"] - BinSumAatr2[Slot]
+            WindowInfo["NEpochs"] = WindowInfo["NEpochs"] - BinNEpochs[Slot]
+            BinSumAatr2[Slot] = 0.0
+            BinNEpochs[Slot] = 0
+        WindowInfo["Bin"] = max(WindowInfo["Bin"], Bin)
+
+        Slot = Bin % NBins
+        BinSumAatr2[Slot] = BinSumAatr2[Slot] + Aatr2
+        BinNEpochs[Slot] = BinNEpochs[Slot] + 1
+        WindowInfo["SumAatr2"] = WindowInfo["SumAatr2"] + Aatr2
+        WindowInfo["NEpochs"] = WindowInfo["NEpochs"] + 1
+
+        # Avoid negative sums due to the rounding of the subtractions
+        WindowInfo["SumAatr2"] = max(WindowInfo["SumAatr2"], 0.0)
+        WindowInfo["Aatr"] = sqrt(WindowInfo["SumAatr2"] / WindowInfo["NEpochs"])
+        if WindowInfo["Aatr"] > WindowInfo["MaxAatr"]:
+            WindowInfo["MaxAatr"] = WindowInfo["Aatr"]
+
+# End of updateAatrInfo()
+
+def computeAatrDailyStats(AatrInfo):
+
+    # Purpose: compute the daily AATR statistics of the receiver
+
+    # Parameters
+    # ==========
+    # AatrInfo: dict
+    #         Dictionary containing the AATR aggregator state
+
+    # Returns
+    # =======
+    # AatrStats: dict
+    #         Dictionary containing the daily statistics
+
+    Daily = AatrInfo["Daily"]
+
+    AatrStats = OrderedDict({})
+    AatrStats["NEpochs"] = Daily["NEpochs"]
+    AatrStats["NSamples"] = Daily["NSamples"]
+    AatrStats["RmsAatr"] = 0.0
+    AatrStats["MaxAatr"] = Daily["MaxAatr"]
+    AatrStats["MaxAatrSod"] = Daily["MaxAatrSod"]
+    for Window, WindowInfo in AatrInfo["Windows"].items():
+        AatrStats["MaxAatr" + Window] = WindowInfo["MaxAatr"]
+    AatrStats["RmsVtecRate"] = 0.0
+    AatrStats["MaxAbsVtecRate"] = Daily["MaxAbsVtecRate"]
+
+    if Daily["NEpochs"] > 0:
+        AatrStats["RmsAatr"] = sqrt(Daily["SumAatr2"] / Daily["NEpochs"])
+        AatrStats["RmsVtecRate"] = \
+            sqrt(Daily["SumVtecRate2"] / Daily["NSamples"])
+
+    return AatrStats
+
+# End of computeAatrDailyStats()
+
+########################################################################
+# END OF AATR FUNCTIONS MODULE
+########################################################################
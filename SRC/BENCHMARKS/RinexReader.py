@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+
+########################################################################
+# PETRUS/SRC/BENCHMARKS/RinexReader.py:
+# This is the RINEX Reader Benchmark of PETRUS tool
+#
+#  Project:        PETRUS
+#  File:           RinexReader.py
+#
+#   Author: GNSS Academy
+#   Copyright 2021 GNSS Academy
+#
+# -----------------------------------------------------------------
+# Date       | Author             | Action
+# -----------------------------------------------------------------
+#
+# Usage:
+#   RinexReader.py OBS_FILE
+#
+# Converts the OBS file into RINEX 2.11 and 3.04 observation files
+# (plain and gzip), reads all of them with readRinexObsEpochs() and
+# compares their epochs and reading time with those of the OBS file
+# read by readObsEpoch(), with and without the conversion of its
+# fields to the types given by the RINEX reader.
+# Exits with an error if any observation differs.
+########################################################################
+
+import sys, os
+import gzip
+import tempfile
+import time
+
+# Add path to SRC folder
+Src = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, Src)
+
+from InputOutput import ObsIdx, readObsEpoch
+from COMMON.Dates import NS_IN_S, convertSod2Ns
+from Rinex import readRinexObsEpochs
+
+# RINEX observation types written, in PETRUS column order
+RINEX2_TYPES = ["C1", "L1", "P2", "L2", "S1", "S2"]
+RINEX3_TYPES = ["C1C", "L1C", "C2W", "L2W", "S1C", "S2W"]
+OBS_COLUMNS = ["C1", "L1", "P2", "L2", "S1", "S2"]
+
+def readObsFile(ObsFile):
+
+    # Purpose: read all the epochs of an OBS file with readObsEpoch()
+
+    Epochs = []
+    with open(ObsFile, 'r') as f:
+        f.readline()
+        while True:
+            EpochInfo = readObsEpoch(f)
+            if EpochInfo == []:
+                break
+            Epochs.append(EpochInfo)
+
+    return Epochs
+
+# End of readObsFile()
+
+def convertObsEpochs(Epochs):
+
+    # Purpose: convert the fields of the OBS epochs to typed values
+
+    Types = [float, int, int, str, int] + [float] * (len(ObsIdx) - 5)
+
+    return [[[Type(Field) for Type, Field in zip(Types, Row)]
+        for Row in EpochInfo] for EpochInfo in Epochs]
+
+# End of convertObsEpochs()
+
+def writeRinexFile(Path, Version, Epochs):
+
+    # Purpose: write the epochs of an OBS file in a RINEX file
+
+    Open = gzip.open if Path.endswith(".gz") else open
+    Year = int(Epochs[0][0][ObsIdx["YEAR"]])
+    Doy = int(Epochs[0][0][ObsIdx["DOY"]])
+
+    # Month and day of the DoY
+    Date = time.strptime("%d %d" % (Year, Doy), "%Y %j")
+
+    with Open(Path, 'wt') as f:
+        if Version < 3:
+            f.write("%9.2f%11s%-20s%-20s%-20s\n" % (Version, "", "OBSERVATION DATA",
+                "G (GPS)", "RINEX VERSION / TYPE"))
+            f.write("%6d" % len(RINEX2_TYPES) + "".join("    %2s" % Type
+                for Type in RINEX2_TYPES).ljust(54) + "# / TYPES OF OBSERV\n")
+        else:
+            f.write("%9.2f%11s%-20s%-20s%-20s\n" % (Version, "", "OBSERVATION DATA",
+                "G", "RINEX VERSION / TYPE"))
+            f.write(("G  %3d" % len(RINEX3_TYPES) + "".join(" %3s" % Type
+                for Type in RINEX3_TYPES)).ljust(60) + "SYS / # / OBS TYPES\n")
+        f.write("%60s%-20s\n" % ("", "END OF HEADER"))
+
+        for EpochInfo in Epochs:
+            # Sub-second SODs of the high-rate files are kept exactly
+            SodNs = convertSod2Ns(EpochInfo[0][ObsIdx["SOD"]])
+            Hour = SodNs // (3600 * NS_IN_S)
+            Minute = SodNs // (60 * NS_IN_S) % 60
+            Second = SodNs % (60 * NS_IN_S) / NS_IN_S
+            Sats = ["G%02d" % int(Row[ObsIdx["PRN"]]) for Row in EpochInfo]
+            Fields = ["".join("%14.3f  " % float(Row[ObsIdx[Column]])
+                for Column in OBS_COLUMNS) for Row in EpochInfo]
+
+            if Version < 3:
+                Line = " %02d %2d %2d %2d %2d%11.7f  0%3d" % (Year % 100,
+                    Date.tm_mon, Date.tm_mday, Hour, Minute, Second, len(Sats))
+                for i in range(0, len(Sats), 12):
+                    f.write((Line if i == 0 else " " * 32) + \
+                        "".join(Sats[i:i + 12]) + "\n")
+                for Record in Fields:
+                    # 5 fields per line
+                    f.write(Record[:80].rstrip() + "\n" + Record[80:].rstrip() + "\n")
+            else:
+                f.write("> %4d %02d %02d %02d %02d%11.7f  0%3d\n" % (Year,
+                    Date.tm_mon, Date.tm_mday, Hour, Minute, Second, len(Sats)))
+                for Sat, Record in zip(Sats, Fields):
+                    f.write(Sat + Record.rstrip() + "\n")
+
+# End of writeRinexFile()
+
+def compareEpochs(ObsEpochs, RinexEpochs):
+
+    # Purpose: count the observations that differ between the OBS and
+    #          RINEX epochs
+
+    NDiff = abs(len(ObsEpochs) - len(RinexEpochs))
+    for ObsEpoch, RinexEpoch in zip(ObsEpochs, RinexEpochs):
+        if len(ObsEpoch) != len(RinexEpoch):
+            NDiff = NDiff + 1
+            continue
+        for ObsRow, RinexRow in zip(ObsEpoch, RinexEpoch):
+            for Column in ["SOD", "DOY", "PRN"] + OBS_COLUMNS:
+                if abs(float(ObsRow[ObsIdx[Column]]) - RinexRow[ObsIdx[Column]]) > 1e-3:
+                    NDiff = NDiff + 1
+
+    return NDiff
+
+# End of compareEpochs()
+
+#######################################################
+# MAIN BODY
+#######################################################
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        sys.stderr.write("Usage: RinexReader.py OBS_FILE\n")
+        sys.exit(-1)
+    ObsFile = sys.argv[1]
+
+    Start = time.perf_counter()
+    ObsEpochs = readObsFile(ObsFile)
+    ObsTime = time.perf_counter() - Start
+    print("INFO: OBS file:        %7.3f s (%d epochs)" % (ObsTime, len(ObsEpochs)))
+
+    Start = time.perf_counter()
+    convertObsEpochs(ObsEpochs)
+    ObsTime = ObsTime + time.perf_counter() - Start
+    print("INFO: OBS file, typed: %7.3f s" % ObsTime)
+
+    Status = 0
+    with tempfile.TemporaryDirectory() as TmpDir:
+        for Name, Version in [("OBS.21o", 2.11), ("OBS.21o.gz", 2.11),
+            ("OBS.rnx", 3.04), ("OBS.rnx.gz", 3.04)]:
+            RinexFile = os.path.join(TmpDir, Name)
+            writeRinexFile(RinexFile, Version, ObsEpochs)
+
+            Start = time.perf_counter()
+            RinexEpochs = list(readRinexObsEpochs(RinexFile))
+            RinexTime = time.perf_counter() - Start
+
+            NDiff = compareEpochs(ObsEpochs, RinexEpochs)
+            print("INFO: RINEX %.2f %-4s %7.3f s (x%.1f), %d differences" %
+                (Version, "gz" if Name.endswith(".gz") else "", RinexTime,
+                ObsTime / RinexTime, NDiff))
+            if NDiff > 0:
+                Status = 1
+
+    if Status != 0:
+        sys.stderr.write("ERROR: RINEX observations differ from the OBS file\n")
+
+    sys.exit(Status)
+
+#######################################################
+# End of RinexReader.py
+#######################################################
@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+
+########################################################################
+# PETRUS/SRC/BENCHMARKS/StartupTime.py:
+# This is the Startup Time Benchmark of PETRUS tool
+#
+#  Project:        PETRUS
+#  File:           StartupTime.py
+#
+#   Author: GNSS Academy
+#   Copyright 2021 GNSS Academy
+#
+# -----------------------------------------------------------------
+# Date       | Author             | Action
+# -----------------------------------------------------------------
+#
+# Usage:
+#   StartupTime.py [MAX_SECONDS] [NRUNS]
+#
+# Measures the time needed to import the modules loaded by Petrus.py
+# at startup (its top-level imports), in a fresh interpreter, and checks that the heavy
+# dependencies (pandas, matplotlib, yaml) are not loaded by them.
+# Exits with an error if the startup time exceeds MAX_SECONDS
+# (default: 0.5 s) or if any heavy dependency is loaded at startup.
+########################################################################
+
+import sys, os
+import ast
+import subprocess
+import time
+
+# Path to SRC folder
+Src = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def getStartupModules(MainFile):
+
+    # Purpose: get the modules imported at startup by the main
+    #          script: those of its top-level import statements (the
+    #          imports inside the stages are only done when needed)
+
+    # Parameters
+    # ==========
+    # MainFile: str
+    #         Path to the main script
+
+    # Returns
+    # =======
+    # Modules: list
+    #         Names of the imported modules, in import order
+
+    with open(MainFile, 'r') as f:
+        Tree = ast.parse(f.read(), MainFile)
+
+    Modules = []
+    for Node in Tree.body:
+        if isinstance(Node, ast.Import):
+            Names = [Alias.name for Alias in Node.names]
+        elif isinstance(Node, ast.ImportFrom) and Node.level == 0:
+            # Submodules of the packages of SRC (from COMMON import ...)
+            Package = os.path.join(Src, *Node.module.split("."))
+            Names = [Node.module + "." + Alias.name for Alias in Node.names
+                if os.path.isfile(os.path.join(Package, Alias.name + ".py"))]
+            Names = Names or [Node.module]
+        else:
+            continue
+        for Name in Names:
+            if Name not in Modules:
+                Modules.append(Name)
+
+    return Modules
+
+# End of getStartupModules()
+
+# Modules imported by Petrus.py at startup
+STARTUP_MODULES = getStartupModules(os.path.join(Src, "Petrus.py"))
+
+# Modules that shall only be loaded by the stages needing them
+HEAVY_MODULES = [
+    "pandas",
+    "matplotlib",
+    "mpl_toolkits.axes_grid1",
+    "yaml",
+]
+
+# Default maximum startup time [s]
+DEFAULT_MAX_STARTUP_TIME = 0.5
+
+# Default number of runs
+DEFAULT_NRUNS = 5
+
+def measureStartupTime(NRuns):
+
+    # Purpose: measure the startup imports time in a fresh interpreter
+
+    # Parameters
+    # ==========
+    # NRuns: int
+    #         Number of runs
+
+    # Returns
+    # =======
+    # Times: list
+    #         Wall time of each run [s]
+    # Loaded: list
+    #         Heavy modules loaded at startup
+
+    Code = "import sys\n" + \
+        "".join(["import %s\n" % Module for Module in STARTUP_MODULES]) + \
+        "print(' '.join(m for m in %s if m in sys.modules))\n" % \
+            repr(HEAVY_MODULES)
+
+    Times = []
+    Loaded = []
+    for Run in range(NRuns):
+        Start = time.perf_counter()
+        Output = subprocess.check_output([sys.executable, "-c", Code],
+            cwd=Src, stderr=subprocess.DEVNULL)
+        Times.append(time.perf_counter() - Start)
+        Loaded = Output.decode().split()
+
+    return Times, Loaded
+
+# End of measureStartupTime()
+
+#######################################################
+# MAIN BODY
+#######################################################
+
+if __name__ == "__main__":
+    MaxTime = DEFAULT_MAX_STARTUP_TIME
+    NRuns = DEFAULT_NRUNS
+    if len(sys.argv) > 1:
+        MaxTime = float(sys.argv[1])
+    if len(sys.argv) > 2:
+        NRuns = int(sys.argv[2])
+
+    Times, Loaded = measureStartupTime(NRuns)
+    Times.sort()
+    Median = Times[len(Times) // 2]
+
+    print("INFO: Startup time over %d runs: min %.3f s, median %.3f s, max %.3f s" %
+        (NRuns, Times[0], Median, Times[-1]))
+
+    Status = 0
+    if Loaded:
+        sys.stderr.write("ERROR: Heavy modules loaded at startup: %s\n" %
+            ", ".join(Loaded))
+        Status = 1
+
+    if Median > MaxTime:
+        sys.stderr.write("ERROR: Startup time %.3f s exceeds %.3f s\n" %
+            (Median, MaxTime))
+        Status = 1
+
+    sys.exit(Status)
+
+#######################################################
+# End of StartupTime.py
+#######################################################
@@ -0,0 +1,164 @@
+import numpy as np
+
+# Continuous arcs of the measurements of each satellite
+# The rows of a batch (any order) are sorted by satellite and time, and
+# split in arcs at the satellite changes, the data gaps and the resets
+# (cycle slips, rejections, missing measurements...). The recursive
+# filters run for all the arcs at once, one position of the arcs at a
+# time, so that their cost grows with the length of the arcs and not
+# with their number.
+
+# State of the arcs of a filter at the end of a batch, to continue
+# them in the next batch of the same receiver
+# NSats: number of satellite indexes
+def initArcState(NSats):
+    ArcState = {
+        "LastNs": np.full(NSats, -1, dtype=np.int64),  # Last epoch [ns]
+        "Elapsed": np.zeros(NSats, dtype=np.int64),    # Arc time [ns]
+        "Value": np.zeros(NSats),                      # Last filter value
+    }
+
+    return ArcState
+
+# Split the rows of a batch in arcs
+# Sat: satellite index of each row, TimeNs: epoch of each row [ns]
+# GapNs: maximum time between consecutive rows of an arc [ns]
+# Reset: rows starting a new arc, or None
+# ArcState: arcs of the previous batch, as given by initArcState(), or
+# None to start new arcs
+def findArcs(Sat, TimeNs, GapNs, Reset=None, ArcState=None):
+    Sat = np.asarray(Sat, dtype=np.int64)
+    TimeNs = np.asarray(TimeNs, dtype=np.int64)
+    Order = np.lexsort((TimeNs, Sat))
+    Sat = Sat[Order]
+    TimeNs = TimeNs[Order]
+    NRows = len(Sat)
+
+    # Time step of each row, 0 at the first row of each satellite
+    NewSat = np.ones(NRows, dtype=bool)
+    NewSat[1:] = Sat[1:] != Sat[:-1]
+    Dt = np.zeros(NRows, dtype=np.int64)
+    Dt[1:] = np.diff(TimeNs)
+    Dt[NewSat] = 0
+
+    Start = NewSat | (Dt > GapNs)
+    if Reset is not None:
+        Start = Start | np.asarray(Reset, dtype=bool)[Order]
+
+    # The first row of a satellite continues its arc of the previous
+    # batch if there is no gap nor reset
+    Continued = np.zeros(NRows, dtype=bool)
+    if ArcState is not None:
+        LastNs = ArcState["LastNs"][Sat]
+        Continued = NewSat & (LastNs >= 0) & (TimeNs - LastNs <= GapNs)
+        if Reset is not None:
+            Continued = Continued & ~np.asarray(Reset, dtype=bool)[Order]
+        Dt[Continued] = (TimeNs - LastNs)[Continued]
+        Start = Start & ~Continued
+
+    # Time since the start of the arc of each row, and position of the
+    # row in the batch part of its arc
+    First = Start | Continued
+    ArcStart = np.flatnonzero(First)
+    ArcIdx = np.cumsum(First) - 1
+    Elapsed = np.cumsum(np.where(Start, 0, Dt))
+    Elapsed = Elapsed - Elapsed[ArcStart][ArcIdx]
+    if ArcState is not None:
+        Elapsed = Elapsed + np.where(Continued, ArcState["Elapsed"][Sat] + Dt,
+            0)[ArcStart][ArcIdx]
+    Pos = np.arange(NRows) - ArcStart[ArcIdx]
+
+    # Rows of each position, to run the filters of all the arcs at once
+    ByPos = np.argsort(Pos, kind="stable")
+    Bounds = np.concatenate(([0], np.cumsum(np.bincount(Pos))))
+
+    Arcs = {
+        "Order": Order,         # Rows of the batch sorted by sat and time
+        "Sat": Sat,             # Satellite of the sorted rows
+        "TimeNs": TimeNs,       # Epoch of the sorted rows [ns]
+        "Start": Start,         # Rows starting a new arc
+        "Continued": Continued, # Rows continuing the previous batch
+        "ArcIdx": ArcIdx,       # Arc of the sorted rows
+        "Dt": Dt,               # Time since the previous row [ns]
+        "Elapsed": Elapsed,     # Time since the start of the arc [ns]
+        "ByPos": ByPos,         # Sorted rows by position in their arc
+        "Bounds": Bounds,       # Limits of each position in ByPos
+        "Broken": np.zeros(0, dtype=np.int64), # Satellites not continued
+    }
+
+    return Arcs
+
+# Arcs of the valid rows of a batch: the other rows (rejected, missing
+# measurements...) are skipped and restart the arc of the next valid
+# row of their satellite, or of its next batch
+# Valid: rows to keep
+# Returns the arcs of the valid rows, as findArcs()
+def findValidArcs(Sat, TimeNs, GapNs, Valid, Reset=None, ArcState=None):
+    Sat = np.asarray(Sat, dtype=np.int64)
+    TimeNs = np.asarray(TimeNs, dtype=np.int64)
+    Valid = np.asarray(Valid, dtype=bool)
+    Order = np.lexsort((TimeNs, Sat))
+    SortedSat = Sat[Order]
+    Skipped = ~Valid[Order]
+
+    # Rows following an invalid row of their satellite
+    After = np.zeros(len(Sat), dtype=bool)
+    After[1:] = Skipped[:-1] & (SortedSat[1:] == SortedSat[:-1])
+    Missing = np.zeros(len(Sat), dtype=bool)
+    Missing[Order] = After
+    if Reset is not None:
+        Missing = Missing | np.asarray(Reset, dtype=bool)
+
+    Arcs = findArcs(Sat[Valid], TimeNs[Valid], GapNs, Missing[Valid], ArcState)
+
+    # Satellites whose last row is invalid
+    Last = np.ones(len(Sat), dtype=bool)
+    Last[:-1] = SortedSat[:-1] != SortedSat[1:]
+    Arcs["Broken"] = SortedSat[Last & Skipped]
+
+    return Arcs
+
+# Last sorted row of each satellite of the batch
+def getArcLastRows(Arcs):
+    Sat = Arcs["Sat"]
+    Last = np.ones(len(Sat), dtype=bool)
+    Last[:-1] = Sat[:-1] != Sat[1:]
+
+    return np.flatnonzero(Last)
+
+# First-order recursive filter along the arcs, in sorted row order:
+# Y[k] = Y[k-1] + Alpha[k] * (X[k] - Y[k-1]), Y = X at the arc start
+# ArcState: updated with the end of the arcs, if given
+def runArcRecursion(Arcs, X, Alpha, ArcState=None):
+    Y = np.empty(len(X))
+    Alpha = np.where(Arcs["Start"], 1.0, Alpha)
+
+    # Value before the first position: the last one of the previous
+    # batch for the continued arcs
+    Prev = np.zeros(len(X))
+    if ArcState is not None:
+        Prev = np.where(Arcs["Continued"], ArcState["Value"][Arcs["Sat"]], 0.0)
+
+    ByPos = Arcs["ByPos"]
+    Bounds = Arcs["Bounds"]
+    for P in range(len(Bounds) - 1):
+        Rows = ByPos[Bounds[P]:Bounds[P + 1]]
+        Before = Prev[Rows] if P == 0 else Y[Rows - 1]
+        Y[Rows] = Before + Alpha[Rows] * (X[Rows] - Before)
+
+    if ArcState is not None:
+        Last = getArcLastRows(Arcs)
+        Sat = Arcs["Sat"][Last]
+        ArcState["LastNs"][Sat] = Arcs["TimeNs"][Last]
+        ArcState["Elapsed"][Sat] = Arcs["Elapsed"][Last]
+        ArcState["Value"][Sat] = Y[Last]
+        ArcState["LastNs"][Arcs["Broken"]] = -1
+
+    return Y
+
+# Sorted rows back to the batch order
+def unsortArcRows(Arcs, Y):
+    Out = np.empty_like(Y)
+    Out[Arcs["Order"]] = Y
+
+    return Out
@@ -0,0 +1,195 @@
+from collections import OrderedDict
+from functools import lru_cache
+import numpy as np
+from COMMON import GnssConstants as Const
+from COMMON.Arcs import initArcState, findValidArcs
+from COMMON.Arcs import runArcRecursion, unsortArcRows
+from COMMON.Dates import NS_IN_S
+
+# Dual-frequency linear combinations of the code and phase measurements
+# of two bands, computed for all the rows at once.
+# Every combination is a linear form of (Code1, Code2, Phase1, Phase2)
+# in meters, so that the requested ones are obtained with one product
+# of their coefficients by the stacked measurements.
+
+# Frequencies of the GPS bands [Hz]
+COMB_FREQS = OrderedDict({})
+COMB_FREQS["L1"] = Const.GPS_L1_MHZ * 1e6
+COMB_FREQS["L2"] = Const.GPS_L2_MHZ * 1e6
+COMB_FREQS["L5"] = Const.GPS_L5_MHZ * 1e6
+
+# Combinations: coefficients of (Code1, Code2, Phase1, Phase2) as a
+# function of the frequencies of the two bands
+# Ref.: ESA_GNSS-Book_TM-23_Vol_I.pdf Section 7.1
+COMB_COEFS = OrderedDict({})
+# Measurements of the first band [m]
+COMB_COEFS["CODE1"] = lambda f1, f2: (1.0, 0.0, 0.0, 0.0)
+COMB_COEFS["PHASE1"] = lambda f1, f2: (0.0, 0.0, 1.0, 0.0)
+# Ionosphere-free
+COMB_COEFS["IF_CODE"] = lambda f1, f2: \
+    (f1**2 / (f1**2 - f2**2), -f2**2 / (f1**2 - f2**2), 0.0, 0.0)
+COMB_COEFS["IF_PHASE"] = lambda f1, f2: \
+    (0.0, 0.0, f1**2 / (f1**2 - f2**2), -f2**2 / (f1**2 - f2**2))
+# Geometry-free, with the sign of the ionospheric delay
+COMB_COEFS["GF_CODE"] = lambda f1, f2: (-1.0, 1.0, 0.0, 0.0)
+COMB_COEFS["GF_PHASE"] = lambda f1, f2: (0.0, 0.0, 1.0, -1.0)
+# Wide-lane and narrow-lane
+COMB_COEFS["WL_CODE"] = lambda f1, f2: (f1 / (f1 - f2), -f2 / (f1 - f2), 0.0, 0.0)
+COMB_COEFS["WL_PHASE"] = lambda f1, f2: (0.0, 0.0, f1 / (f1 - f2), -f2 / (f1 - f2))
+COMB_COEFS["NL_CODE"] = lambda f1, f2: (f1 / (f1 + f2), f2 / (f1 + f2), 0.0, 0.0)
+COMB_COEFS["NL_PHASE"] = lambda f1, f2: (0.0, 0.0, f1 / (f1 + f2), f2 / (f1 + f2))
+# Melbourne-Wubbena: wide-lane phase minus narrow-lane code
+COMB_COEFS["MW"] = lambda f1, f2: \
+    (-f1 / (f1 + f2), -f2 / (f1 + f2), f1 / (f1 - f2), -f2 / (f1 - f2))
+# Divergence-free phase of the first band: its ionospheric delay
+# with the sign of the code one
+COMB_COEFS["DF_PHASE"] = lambda f1, f2: \
+    (0.0, 0.0, 1.0 + 2.0 * f2**2 / (f1**2 - f2**2), -2.0 * f2**2 / (f1**2 - f2**2))
+
+# Hatch smoothing variants: code and phase combinations smoothed
+# Ref.: RTCA MOPS DO-229 Section J.2 (SF), DFMC MOPS ED-259 (IF)
+COMB_SMOOTHING = OrderedDict({})
+COMB_SMOOTHING["SMOOTH_CODE1"] = ("CODE1", "PHASE1")    # Single-frequency
+COMB_SMOOTHING["SMOOTH_DFREE"] = ("CODE1", "DF_PHASE")  # Divergence-free
+COMB_SMOOTHING["SMOOTH_IFREE"] = ("IF_CODE", "IF_PHASE")# Ionosphere-free
+
+# All the available outputs
+COMB_NAMES = list(COMB_COEFS.keys()) + list(COMB_SMOOTHING.keys())
+
+# Jump of the geometry-free phase between consecutive rows of an arc
+# taken as a cycle slip [m]: one L2 cycle gives 0.24 m, and the same
+# slip in both bands 0.05 m
+GF_JUMP_TH = 0.05
+
+# (NCombs, 4) coefficients of some combinations of two bands
+@lru_cache(maxsize=None)
+def computeCombinationCoefs(Names, Bands=("L1", "L2")):
+    f1, f2 = COMB_FREQS[Bands[0]], COMB_FREQS[Bands[1]]
+
+    return np.array([COMB_COEFS[Name](f1, f2) for Name in Names])
+
+# Linear combinations of the measurements of all the rows at once
+# Code1, Code2: codes of the two bands [m]
+# Phase1, Phase2: phases of the two bands [cycles]
+# Missing measurements (0 or NaN) give NaN combinations
+# Names: combinations to compute, among COMB_COEFS
+def computeCombinations(Code1, Code2, Phase1, Phase2, Names,
+    Bands=("L1", "L2")):
+    Waves = [Const.SPEED_OF_LIGHT / COMB_FREQS[Band] for Band in Bands]
+    Obs = np.stack((
+        np.asarray(Code1, dtype=float),
+        np.asarray(Code2, dtype=float),
+        np.asarray(Phase1, dtype=float) * Waves[0],
+        np.asarray(Phase2, dtype=float) * Waves[1]))
+    Obs[Obs == 0.0] = np.nan
+
+    # Only the measurements used by the combinations are checked
+    Coefs = computeCombinationCoefs(tuple(Names), tuple(Bands))
+    Used = np.any(Coefs != 0.0, axis=0)
+    Values = Coefs[:, Used] @ Obs[Used]
+
+    return OrderedDict(zip(Names, Values))
+
+# Hatch filter of a code with a phase along their arcs: the code minus
+# phase is averaged over min(arc time, HatchTime) and the phase added
+# back, as the smoothing of the code with the phase increments
+# Sat, TimeNs: satellite index and epoch [ns] of the rows
+# Code, Phase: code and phase combinations of the rows [m], the rows
+# with any of them missing (NaN) are not smoothed and restart the arc
+# Reset: rows restarting the arc (cycle slips...), or None
+# GapNs: maximum gap of an arc [ns], RateNs: sampling rate [ns]
+# HatchTime: smoothing time [s]
+# ArcState: arcs of the previous batch, as given by initArcState(), or
+# None
+# Valid: rows to smooth (not rejected...), the others are missing, or
+# None
+def computeHatchSmoothing(Sat, TimeNs, Code, Phase, Reset, GapNs, RateNs,
+    HatchTime, ArcState=None, Valid=None):
+    Finite = np.isfinite(Code) & np.isfinite(Phase)
+    Valid = Finite if Valid is None else Finite & np.asarray(Valid, dtype=bool)
+
+    Arcs = findValidArcs(Sat, TimeNs, GapNs, Valid, Reset, ArcState)
+    Sorted = Arcs["Order"]
+    Code = np.asarray(Code, dtype=float)[Valid][Sorted]
+    Phase = np.asarray(Phase, dtype=float)[Valid][Sorted]
+
+    SmoothTime = np.minimum(Arcs["Elapsed"] + RateNs, HatchTime * NS_IN_S)
+    Alpha = Arcs["Dt"] / SmoothTime
+    Smoothed = np.full(len(Valid), np.nan)
+    Smoothed[Valid] = unsortArcRows(Arcs,
+        Phase + runArcRecursion(Arcs, Code - Phase, Alpha, ArcState))
+
+    return Smoothed
+
+# Cycle slips of any of the bands, seen as jumps of the geometry-free
+# phase between consecutive valid rows of a satellite
+# Sat, TimeNs: satellite index and epoch [ns] of the rows
+# GfPhase: geometry-free phase of the rows [m], NaN when missing
+# Valid: rows to check, the others are skipped
+# GapNs: maximum gap between the compared rows [ns]
+# JumpState: last valid row of each satellite of the previous batch, as
+# given by initArcState() and updated here, or None
+# Returns the rows with a jump, to restart their arcs
+def detectGeometryFreeJumps(Sat, TimeNs, GfPhase, Valid, GapNs,
+    JumpState=None, Threshold=GF_JUMP_TH):
+    Sat = np.asarray(Sat, dtype=np.int64)
+    TimeNs = np.asarray(TimeNs, dtype=np.int64)
+    GfPhase = np.asarray(GfPhase, dtype=float)
+    Rows = np.flatnonzero(np.asarray(Valid, dtype=bool) & np.isfinite(GfPhase))
+    Rows = Rows[np.lexsort((TimeNs[Rows], Sat[Rows]))]
+    Sat = Sat[Rows]
+    TimeNs = TimeNs[Rows]
+    GfPhase = GfPhase[Rows]
+
+    # Previous valid row of the satellite, in this batch or the previous
+    NewSat = np.ones(len(Rows), dtype=bool)
+    NewSat[1:] = Sat[1:] != Sat[:-1]
+    PrevNs = np.concatenate(([-1], TimeNs[:-1]))
+    PrevGf = np.concatenate(([0.0], GfPhase[:-1]))
+    PrevNs[NewSat] = -1
+    if JumpState is not None:
+        PrevNs[NewSat] = JumpState["LastNs"][Sat[NewSat]]
+        PrevGf[NewSat] = JumpState["Value"][Sat[NewSat]]
+
+    Jump = (PrevNs >= 0) & (TimeNs - PrevNs <= GapNs) & \
+        (np.abs(GfPhase - PrevGf) > Threshold)
+
+    if JumpState is not None:
+        Last = np.ones(len(Rows), dtype=bool)
+        Last[:-1] = NewSat[1:]
+        JumpState["LastNs"][Sat[Last]] = TimeNs[Last]
+        JumpState["Value"][Sat[Last]] = GfPhase[Last]
+
+    Reset = np.zeros(len(Valid), dtype=bool)
+    Reset[Rows] = Jump
+
+    return Reset
+
+# Requested combinations and smoothed codes of a batch of rows
+# Names: outputs, among COMB_NAMES
+# Sat, TimeNs, Reset, GapNs, RateNs, HatchTime, Valid: as in
+# computeHatchSmoothing(), only needed for the smoothed codes
+# ArcStates: arcs of the previous batch of each smoothed code, filled
+# with initArcState(NSats) when missing
+def computeCombinationOutputs(Code1, Code2, Phase1, Phase2, Names,
+    Bands=("L1", "L2"), Sat=None, TimeNs=None, Reset=None, GapNs=None,
+    RateNs=None, HatchTime=None, ArcStates=None, NSats=None, Valid=None):
+    # Combinations needed by the outputs
+    Needed = [Name for Name in COMB_COEFS if Name in Names or \
+        any(Name in COMB_SMOOTHING[Smooth] for Smooth in Names
+            if Smooth in COMB_SMOOTHING)]
+    Combs = computeCombinations(Code1, Code2, Phase1, Phase2, Needed, Bands)
+
+    Outputs = OrderedDict({})
+    for Name in Names:
+        if Name in COMB_SMOOTHING:
+            ArcState = None
+            if ArcStates is not None:
+                ArcState = ArcStates.setdefault(Name, initArcState(NSats))
+            Code, Phase = COMB_SMOOTHING[Name]
+            Outputs[Name] = computeHatchSmoothing(Sat, TimeNs, Combs[Code],
+                Combs[Phase], Reset, GapNs, RateNs, HatchTime, ArcState, Valid)
+        else:
+            Outputs[Name] = Combs[Name]
+
+    return Outputs
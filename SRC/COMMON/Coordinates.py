@@ -1,4 +1,6 @@
 import math
+import numpy as np
+from COMMON import GnssConstants as Const
 
 # Ref.: ESA_GNSS-Book_TM-23_Vol_I.pdf Section B.1.2 (Appendix B)
 def xyz2llh(x,y,z):
@@ -36,3 +38,86 @@ def llh2xyz(lon,lat,h):
     Z = ((1-0.0066943799901)*N + h)*(math.sin(math.radians(lat))) 
 
     return X,Y,Z
+
+# Number of iterations of Bowring's method in xyz2llhArray()
+XYZ2LLH_NITER = 2
+
+# Ref.: ESA_GNSS-Book_TM-23_Vol_I.pdf Section B.1.2 (Appendix B)
+#       Bowring's method, with a fixed number of iterations
+# Accuracy (XYZ2LLH_NITER = 2): below 1e-6 m in height and 1e-11 deg
+# in latitude for heights between -10 km and 40000 km, i.e. from the
+# Earth surface up to GEO satellites.
+def xyz2llhArray(X, Y, Z):
+    # --- WGS84 constants
+    a = Const.EARTH_SEMIAXIS
+    b = a * (1.0 - Const.FLATTENING)
+    e2 = Const.E2
+    ep2 = Const.E12
+
+    X = np.asarray(X, dtype=float)
+    Y = np.asarray(Y, dtype=float)
+    Z = np.asarray(Z, dtype=float)
+
+    Lon = np.arctan2(Y, X)
+    p = np.hypot(X, Y)
+
+    # first guess of the parametric latitude
+    Beta = np.arctan2(a * Z, b * p)
+    for i in range(XYZ2LLH_NITER):
+        Lat = np.arctan2(Z + ep2 * b * np.sin(Beta)**3,
+                         p - e2 * a * np.cos(Beta)**3)
+        Beta = np.arctan2((1.0 - Const.FLATTENING) * np.sin(Lat), np.cos(Lat))
+
+    SinLat = np.sin(Lat)
+    H = p * np.cos(Lat) + Z * SinLat - a * np.sqrt(1.0 - e2 * SinLat**2)
+
+    return np.degrees(Lon), np.degrees(Lat), H
+
+# Ref.: ESA_GNSS-Book_TM-23_Vol_I.pdf Section B.1.1 (Appendix B)
+def llh2xyzArray(Lon, Lat, H):
+    Lon = np.radians(np.asarray(Lon, dtype=float))
+    Lat = np.radians(np.asarray(Lat, dtype=float))
+    H = np.asarray(H, dtype=float)
+
+    N = Const.EARTH_SEMIAXIS / np.sqrt(1 - Const.E2 * np.sin(Lat)**2)
+
+    X = (N + H) * np.cos(Lat) * np.cos(Lon)
+    Y = (N + H) * np.cos(Lat) * np.sin(Lon)
+    Z = ((1 - Const.E2) * N + H) * np.sin(Lat)
+
+    return X, Y, Z
+
+# Rotation matrices from ECEF to local ENU, shape (..., 3, 3)
+# Rows are the East, North and Up unit vectors in ECEF
+# Ref.: ESA_GNSS-Book_TM-23_Vol_I.pdf Section B.1.3 (Appendix B)
+def computeEnuRotation(Lon, Lat):
+    Lon = np.radians(np.asarray(Lon, dtype=float))
+    Lat = np.radians(np.asarray(Lat, dtype=float))
+    SinLon, CosLon = np.sin(Lon), np.cos(Lon)
+    SinLat, CosLat = np.sin(Lat), np.cos(Lat)
+
+    Rot = np.empty(np.broadcast(Lon, Lat).shape + (3, 3))
+    Rot[..., 0, 0] = -SinLon
+    Rot[..., 0, 1] = CosLon
+    Rot[..., 0, 2] = 0.0
+    Rot[..., 1, 0] = -SinLat * CosLon
+    Rot[..., 1, 1] = -SinLat * SinLon
+    Rot[..., 1, 2] = CosLat
+    Rot[..., 2, 0] = CosLat * CosLon
+    Rot[..., 2, 1] = CosLat * SinLon
+    Rot[..., 2, 2] = SinLat
+
+    return Rot
+
+# Rotate ECEF vectors (..., 3) to ENU at the given Lon, Lat [deg]
+# (one position for all the vectors or one position per vector)
+def ecef2enuArray(Dxyz, Lon, Lat):
+    Rot = computeEnuRotation(Lon, Lat)
+
+    return np.einsum('...ij,...j->...i', Rot, np.asarray(Dxyz, dtype=float))
+
+# Rotate ENU vectors (..., 3) to ECEF at the given Lon, Lat [deg]
+def enu2ecefArray(Enu, Lon, Lat):
+    Rot = computeEnuRotation(Lon, Lat)
+
+    return np.einsum('...ji,...j->...i', Rot, np.asarray(Enu, dtype=float))
@@ -1,8 +1,18 @@
 
 import sys, os
 from math import fmod
+from functools import lru_cache
+import numpy as np
+from COMMON import GnssConstants as Const
+
+# Size of the caches of the scalar conversions
+DATES_CACHE_SIZE = 4096
+
+# Nanoseconds in one second
+NS_IN_S = 1000000000
 
 # Ref.: ESA GNSS Book TM-23 Vol I Section A.1.4 in Appendix A
+@lru_cache(maxsize=DATES_CACHE_SIZE)
 def convertYearMonthDay2JulianDay(Year, Month, Day):
     # Case where month number is greater than 2
     if Month > 2:
@@ -37,6 +47,7 @@ def convertYearMonthDay2JulianDay(Year, Month, Day):
     return JulianDay
 
 # Ref.: ESA GNSS Book TM-23 Vol I Section A.1.4 in Appendix A
+@lru_cache(maxsize=DATES_CACHE_SIZE)
 def convertJulianDay2YearMonthDay(JulianDay):
     Jd2 = (JulianDay + 0.5)
     Z = int(Jd2)
@@ -65,6 +76,7 @@ def convertJulianDay2YearMonthDay(JulianDay):
     return Year, Month, Day
 
 
+@lru_cache(maxsize=DATES_CACHE_SIZE)
 def convertYearMonthDay2Doy(Year, Month, Day):
     # Do modulo 4 leap year check
     Modulo4Check = int(fmod(fmod((Year),4.)+4.,4.))
@@ -142,3 +154,137 @@ def convertJulianDay2EgnosEpoch(Jd):
     EgnosEpoch = (CorrectedJd - 2444244.5 - (1024.0 * 7.0)) * 86400.0
 
     return EgnosEpoch
+
+
+#>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>
+# VECTORIZED CONVERSIONS
+# Same algorithms as the scalar conversions above, applied to
+# arrays (or scalars) of dates at once
+#>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>>
+
+# Ref.: ESA GNSS Book TM-23 Vol I Section A.1.4 in Appendix A
+def convertYearMonthDay2JulianDayArray(Year, Month, Day):
+    Year = np.asarray(Year)
+    Month = np.asarray(Month)
+    Day = np.asarray(Day)
+
+    # Months January and February are the 13th and 14th of the
+    # previous year for the algorithm
+    NewYear = np.where(Month > 2, Year, Year - 1)
+    NewMonth = np.where(Month > 2, Month, Month + 12)
+
+    # Compute A and B variables
+    A = np.trunc(NewYear / 100)
+    B = 2 - A + np.trunc(A / 4)
+
+    # Compute Julian date
+    JulianDay = np.trunc(365.25 * NewYear) + \
+                np.trunc(30.6001 * (NewMonth + 1)) + \
+                Day + 1720994.5 + B
+
+    return JulianDay
+
+# Ref.: ESA GNSS Book TM-23 Vol I Section A.1.4 in Appendix A
+def convertJulianDay2YearMonthDayArray(JulianDay):
+    Jd2 = np.asarray(JulianDay) + 0.5
+    Z = np.trunc(Jd2)
+    F = np.trunc(Jd2 - Z)
+    Alpha = np.trunc((Z - 1867216.25) / 36524.25)
+    A = (Z + 1 + Alpha) - np.trunc(Alpha / 4.0)
+    B = A + 1524
+    C = np.trunc((B - 122.1) / 365.25)
+    D = np.trunc(365.25 * C)
+    E = np.trunc((B - D) / 30.6001)
+
+    Day = (B - D) - np.trunc(30.6001 * E) + F
+    Month = np.where(E < 13.5, E - 1, E - 13)
+    Year = np.where(Month > 2.5, C - 4716, C - 4715)
+
+    return Year.astype(int), Month.astype(int), Day.astype(int)
+
+def isLeapYearArray(Year):
+    # Divisible by 4 and not by 100, or divisible by 400
+    Year = np.asarray(Year)
+
+    return ((Year % 4) == 0) & (((Year % 100) != 0) | ((Year % 400) == 0))
+
+def convertYearMonthDay2DoyArray(Year, Month, Day):
+    Month = np.asarray(Month)
+
+    # Leap years subtract one day after February instead of two
+    FebCorrection = np.where(isLeapYearArray(Year), 1, 2)
+
+    DayOfYear = ((275 * Month) // 9 - \
+                FebCorrection * ((Month + 9) // 12)) + np.asarray(Day) - 30
+
+    return DayOfYear
+
+def convertYearDoy2JulianDayArray(Year, Doy):
+    # Julian Day of January 1st plus the elapsed days
+    return convertYearMonthDay2JulianDayArray(Year, 1, 1) + \
+        np.asarray(Doy) - 1
+
+def convertJulianDay2GpsWeekSowArray(JulianDay):
+    # Days since GPS start epoch (1980 January 6)
+    Days = np.asarray(JulianDay) - Const.JD_0
+
+    # GPS week and seconds of week
+    Week = np.floor(Days / Const.D_IN_W).astype(int)
+    Sow = (Days - Week * Const.D_IN_W) * Const.S_IN_D
+
+    return Week, Sow
+
+def convertGpsWeekSow2JulianDayArray(Week, Sow):
+    return Const.JD_0 + np.asarray(Week) * Const.D_IN_W + \
+        np.asarray(Sow) / Const.S_IN_D
+
+def convertJulianDay2EgnosEpochArray(Jd):
+    # Julian Day at 0h of the day, as in convertJulianDay2EgnosEpoch()
+    Jd0h = np.floor(np.asarray(Jd) - 0.5) + 0.5
+
+    # Seconds since the EGNOS epoch (GPS week 1024)
+    return (Jd0h - Const.JD_0 - (1024.0 * 7.0)) * Const.S_IN_D
+
+def convertSodDoyYear2GpsTimeNs(Sod, Doy, Year):
+    # Purpose: convert SOD, DOY and YEAR columns into the absolute
+    #          GPS time as integer nanoseconds since GPS start epoch,
+    #          so that multi-day data can be merged, sorted and
+    #          differenced exactly
+
+    Sod, Doy, Year = np.broadcast_arrays(np.asarray(Sod),
+        np.asarray(Doy).astype(np.int64), np.asarray(Year).astype(np.int64))
+
+    # Compute the day offsets only once per different day
+    Days, Inverse = np.unique(np.stack((Year.ravel(), Doy.ravel())),
+        axis=1, return_inverse=True)
+    DayNs = np.rint(convertYearDoy2JulianDayArray(Days[0], Days[1]) - Const.JD_0
+        ).astype(np.int64) * Const.S_IN_D * NS_IN_S
+
+    # Integer SOD are converted exactly, fractional SOD to the closest ns
+    if np.issubdtype(Sod.dtype, np.integer):
+        SodNs = Sod.astype(np.int64) * NS_IN_S
+    else:
+        SodNs = np.rint(Sod * NS_IN_S).astype(np.int64)
+
+    return DayNs[Inverse.reshape(-1)].reshape(Sod.shape) + SodNs
+
+def convertGpsTimeNs2SodDoyYear(TimeNs):
+    # Purpose: convert absolute GPS time in integer nanoseconds into
+    #          SOD (float), DOY and YEAR columns
+
+    TimeNs = np.asarray(TimeNs, dtype=np.int64)
+    DayNs = Const.S_IN_D * NS_IN_S
+
+    Days = TimeNs // DayNs
+    Sod = (TimeNs - Days * DayNs) / NS_IN_S
+
+    Year, Month, Day = convertJulianDay2YearMonthDayArray(Const.JD_0 + Days)
+    Doy = convertYearMonthDay2DoyArray(Year, Month, Day)
+
+    return Sod, Doy, Year
+
+def convertSod2Ns(Sod):
+    # Purpose: convert a SOD [s] into integer nanoseconds of the day,
+    #          the exact time tag of the (high-rate) epochs
+
+    return int(round(float(Sod) * NS_IN_S))
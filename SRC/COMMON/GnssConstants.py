@@ -166,4 +166,4 @@ MAX_NUM_IGPS = 500
 MAX_NUM_USRS = 1000
 
 # Maximum number of Receivers in RCVR (dimensioning constant)
-MAX_NUM_RCVR = 1000
+MAX_NUM_RCVR = 10000
@@ -1,13 +1,95 @@
-
 import numpy as np
+from COMMON import GnssConstants as Const
 
+# Obliquity factor of the thin-shell ionosphere at IONO_HEIGHT
+# ElevDeg can be a scalar or an array of elevations [deg]
 def computeIonoMappingFunction(ElevDeg):
-    EARTH_RADIUS = 6378136.3
-    IONO_HEIGHT = 350000.0
+    EARTH_RADIUS = Const.EARTH_RADIUS
+    IONO_HEIGHT = Const.IONO_HEIGHT
 
     ElevRad = ElevDeg * np.pi / 180.0
 
     Fpp = (1.0-((EARTH_RADIUS * np.cos(ElevRad))/\
                  (EARTH_RADIUS + IONO_HEIGHT))**2)**(-0.5)
 
-    return Fpp
\ No newline at end of file
+    return Fpp
+
+# Elevation step of the mapping function look-up table [deg]
+IONO_MPP_LUT_STEP = 0.01
+
+# Precompute the mapping function on a grid of elevations
+def buildIonoMappingLut(Step=IONO_MPP_LUT_STEP):
+    Elev = np.arange(0.0, 90.0 + Step / 2, Step)
+
+    Lut = {
+        "Step": Step,
+        # Plain lists, for fast scalar look-ups
+        "Mpp": computeIonoMappingFunction(Elev).tolist(),
+    }
+
+    return Lut
+
+# Linear interpolation in the mapping function look-up table
+# Scalar elevations use plain floats, arrays are interpolated at once
+# Max. relative error with the default step is below 1e-7
+def interpolateIonoMappingFunction(Lut, ElevDeg):
+    Mpp = Lut["Mpp"]
+    Step = Lut["Step"]
+
+    if isinstance(ElevDeg, float):
+        Pos = ElevDeg / Step
+        if Pos <= 0.0:
+            return Mpp[0]
+        Idx = int(Pos)
+        if Idx >= len(Mpp) - 1:
+            return Mpp[-1]
+
+        return Mpp[Idx] + (Pos - Idx) * (Mpp[Idx + 1] - Mpp[Idx])
+
+    Elev = np.clip(np.asarray(ElevDeg, dtype=float), 0.0, 90.0)
+
+    return np.interp(Elev, np.arange(len(Mpp)) * Step, Mpp)
+
+# Ref.: RTCA MOPS DO-229 Section A.4.4.10.1
+# Ionospheric Pierce Point of the lines of sight from the receiver
+# RcvrLon, RcvrLat [deg]: one position, or one position per LoS
+# ElevDeg, AzimDeg [deg]: arrays of elevations and azimuths
+# Returns IPP longitude [-180, 180) and latitude [deg]
+def computeIonoPiercePoint(RcvrLon, RcvrLat, ElevDeg, AzimDeg):
+    Lon = np.radians(RcvrLon)
+    Lat = np.radians(RcvrLat)
+    Elev = np.radians(ElevDeg)
+    Azim = np.radians(AzimDeg)
+
+    # Earth's central angle between the receiver and the IPP
+    Psi = np.pi / 2 - Elev - np.arcsin(Const.EARTH_RADIUS / \
+        (Const.EARTH_RADIUS + Const.IONO_HEIGHT) * np.cos(Elev))
+
+    # IPP latitude
+    IppLat = np.arcsin(np.sin(Lat) * np.cos(Psi) + \
+        np.cos(Lat) * np.sin(Psi) * np.cos(Azim))
+
+    # IPP longitude, crossing the pole if needed
+    DeltaLon = np.arcsin(np.clip(np.sin(Psi) * np.sin(Azim) / np.cos(IppLat),
+        -1.0, 1.0))
+    CrossPole = ((Lat > np.radians(70.0)) & \
+        (np.tan(Psi) * np.cos(Azim) > np.tan(np.pi / 2 - Lat))) | \
+        ((Lat < np.radians(-70.0)) & \
+        (np.tan(Psi) * np.cos(Azim + np.pi) > np.tan(np.pi / 2 + Lat)))
+    IppLon = np.where(CrossPole, Lon + np.pi - DeltaLon, Lon + DeltaLon)
+
+    IppLon = (np.degrees(IppLon) + 180.0) % 360.0 - 180.0
+
+    return IppLon, np.degrees(IppLat)
+
+# Geomagnetic latitude of the IPPs [deg] (magnetic dipole model)
+def computeIonoMagneticLatitude(IppLon, IppLat):
+    Lon = np.radians(IppLon)
+    Lat = np.radians(IppLat)
+    DipoleLon = np.radians(Const.MAGNETIC_DIPOLE_LONGITUDE)
+    DipoleLat = np.radians(Const.MAGNETIC_DIPOLE_LATITUDE)
+
+    MagLat = np.arcsin(np.sin(Lat) * np.sin(DipoleLat) + \
+        np.cos(Lat) * np.cos(DipoleLat) * np.cos(Lon - DipoleLon))
+
+    return np.degrees(MagLat)
@@ -1,5 +1,8 @@
 import sys, os
 import matplotlib as mpl
+# Force a non-interactive backend, figures are only written to files
+# (this must be done before importing pyplot)
+mpl.use('Agg')
 from matplotlib.markers import MarkerStyle
 import matplotlib.pyplot as plt
 from mpl_toolkits.axes_grid1 import make_axes_locatable
@@ -12,6 +15,21 @@ warnings.filterwarnings("ignore", category=matplotlib.cbook.mplDeprecation)
 COLORS = ['b','r','c','m','y','g','k']
 MARKERS = ['+','|','o','v','^','.','8','s','*','D']
 
+# Rendering of the colour-mapped scatter plots (PlotConf["Render"])
+#   AUTO:    DENSITY if the plot has more than DENSITY_MIN_POINTS points,
+#            SCATTER otherwise
+#   SCATTER: one marker per point
+#   DENSITY: points aggregated per cell and drawn as an image
+DENSITY_MIN_POINTS = 100000
+
+# Density cells per inch of figure, if PlotConf["DensityBins"] is not set
+DENSITY_BINS_PER_INCH = 100
+
+
+# Figures kept alive to be reused by the plots of the same type
+# FigureTemplates["SAT_NUM"] = {"Fig": fig, "Ax": ax, "Artists": {...}}
+FigureTemplates = {}
+
 
 def createFigure(PlotConf):
     try:
@@ -23,7 +41,7 @@ def createFigure(PlotConf):
     return fig, ax
 
 
-def saveFigure(fig, Path):
+def saveFigure(fig, Path, Close=True):
     Dir = os.path.dirname(Path)
     try:
         os.makedirs(Dir)
@@ -31,6 +49,18 @@ def saveFigure(fig, Path):
         pass
     fig.savefig(Path, dpi=150., bbox_inches='tight')
 
+    # Release the figure unless it is kept as a template
+    if Close:
+        plt.close(fig)
+
+
+def closeFigureTemplates():
+    # Release all the figures kept as templates
+    for Template in FigureTemplates.values():
+        plt.close(Template["Fig"])
+
+    FigureTemplates.clear()
+
 
 def prepareAxis(PlotConf, ax):
     for key in PlotConf:
@@ -151,11 +181,241 @@ def prepareColorBar(PlotConf, ax, Values):
 
 
 
+def selectRenderMode(PlotConf):
+    # Return the effective rendering (SCATTER or DENSITY) of the plot
+    if not "ColorBar" in PlotConf or "RejectFlag" in PlotConf:
+        return "SCATTER"
+
+    try:
+        Render = PlotConf["Render"]
+    except:
+        Render = "AUTO"
+
+    if Render == "AUTO":
+        NPoints = 0
+        for Label in PlotConf["xData"].keys():
+            NPoints = NPoints + len(PlotConf["xData"][Label])
+            if "NotConv" in PlotConf and PlotConf["NotConv"] == True:
+                NPoints = NPoints + len(PlotConf["xDataNotConv"][Label])
+
+        if NPoints > DENSITY_MIN_POINTS:
+            Render = "DENSITY"
+        else:
+            Render = "SCATTER"
+
+    return Render
+
+
+def getDensityExtent(PlotConf):
+    # Return the area covered by the density image: the axes limits,
+    # or the data limits if they are not configured
+    Extent = []
+    for axis in ["x", "y"]:
+        if axis + "Lim" in PlotConf:
+            Extent.extend(PlotConf[axis + "Lim"])
+        else:
+            Values = np.concatenate([np.asarray(v, dtype=float)
+                for v in PlotConf[axis + "Data"].values()])
+            Values = Values[np.isfinite(Values)]
+            if len(Values) == 0:
+                Extent.extend([0., 1.])
+            else:
+                Extent.extend([Values.min(), Values.max()])
+
+    return Extent
+
+
+def computeDensityImage(xData, yData, zData, Extent, Bins, Stat="MEAN"):
+    # Aggregate the points in a grid of Bins[0] x Bins[1] cells covering
+    # Extent [xMin, xMax, yMin, yMax] and return the image (rows along y)
+    # with the MEAN or MAX of zData in each cell, or the number of points
+    # if zData is None. Cells without points are set to NaN.
+    Nx, Ny = int(Bins[0]), int(Bins[1])
+    xMin, xMax, yMin, yMax = Extent
+
+    x = np.asarray(xData, dtype=float)
+    y = np.asarray(yData, dtype=float)
+    Inside = (x >= xMin) & (x <= xMax) & (y >= yMin) & (y <= yMax)
+    if zData is not None:
+        z = np.asarray(zData, dtype=float)
+        Inside = Inside & np.isfinite(z)
+        z = z[Inside]
+
+    # Cell of each point, the upper limits belong to the last cell
+    Col = ((x[Inside] - xMin) * (Nx / max(xMax - xMin, 1e-12))).astype(np.int64)
+    Row = ((y[Inside] - yMin) * (Ny / max(yMax - yMin, 1e-12))).astype(np.int64)
+    Cell = np.minimum(Row, Ny - 1) * Nx + np.minimum(Col, Nx - 1)
+
+    Count = np.bincount(Cell, minlength=Nx * Ny)
+
+    if zData is None:
+        Image = Count.astype(float)
+
+    elif Stat == "MAX":
+        Image = np.full(Nx * Ny, -np.inf)
+        np.maximum.at(Image, Cell, z)
+
+    else:
+        Image = np.bincount(Cell, weights=z, minlength=Nx * Ny) / \
+            np.maximum(Count, 1)
+
+    Image[Count == 0] = np.nan
+
+    return Image.reshape(Ny, Nx)
+
+
+def getDensityImage(PlotConf, Label, NotConv=False):
+    # Compute the density image of the given curve of the plot
+    Extent = getDensityExtent(PlotConf)
+    try:
+        Bins = PlotConf["DensityBins"]
+    except:
+        Bins = (PlotConf["FigSize"][0] * DENSITY_BINS_PER_INCH,
+                PlotConf["FigSize"][1] * DENSITY_BINS_PER_INCH)
+    try:
+        Stat = PlotConf["DensityStat"]
+    except:
+        Stat = "MEAN"
+
+    if NotConv:
+        Image = computeDensityImage(PlotConf["xDataNotConv"][Label],
+            PlotConf["yDataNotConv"][Label], None, Extent, Bins)
+    else:
+        Image = computeDensityImage(PlotConf["xData"][Label],
+            PlotConf["yData"][Label], PlotConf["zData"][Label], Extent, Bins, Stat)
+
+    return Image, Extent
+
+
+def buildLinesPlotArtists(PlotConf, ax):
+    # Create the artists of the plot and return them per Label so that
+    # they can be updated with new data afterwards
+    Artists = {}
+    LineWidth = 1.5
+    Render = selectRenderMode(PlotConf)
+
+    for key in PlotConf:
+        if key == "LineWidth":
+            LineWidth = PlotConf["LineWidth"]
+        if key == "ColorBar" and not "RejectFlag" in PlotConf:
+            normalize, cmap = prepareColorBar(PlotConf, ax, PlotConf["zData"])
+
+    for Label in PlotConf["yData"].keys():
+        Artists[Label] = {}
+        if "ColorBar" in PlotConf:
+            if "RejectFlag" in PlotConf and PlotConf["RejectFlag"] == True:
+                cmap = mpl.cm.get_cmap(PlotConf["ColorBar"])
+                normalize = mpl.colors.Normalize(vmin=PlotConf["ColorBarMin"],
+                                                 vmax=PlotConf["ColorBarMax"])
+
+                Artists[Label]["Scatter"] = ax.scatter(PlotConf["xData"][Label], PlotConf["yData"][Label],
+                                marker='o',
+                                s=2,
+                                linewidth=8,
+                                c=PlotConf["zData"][Label],
+                                cmap=cmap,
+                                norm=normalize)
+            elif Render == "DENSITY":
+                if "NotConv" in PlotConf and PlotConf["NotConv"] == True:
+                    Image, Extent = getDensityImage(PlotConf, Label, NotConv=True)
+                    Artists[Label]["NotConvImage"] = ax.imshow(Image, extent=Extent,
+                               origin='lower', aspect='auto', interpolation='nearest',
+                               cmap=mpl.colors.ListedColormap(['grey']))
+
+                Image, Extent = getDensityImage(PlotConf, Label)
+                Artists[Label]["Image"] = ax.imshow(Image, extent=Extent,
+                           origin='lower', aspect='auto', interpolation='nearest',
+                           cmap=cmap, norm=normalize)
+            else:
+                if "NotConv" in PlotConf and PlotConf["NotConv"] == True:
+                    Artists[Label]["NotConv"] = ax.scatter(PlotConf["xDataNotConv"][Label], PlotConf["yDataNotConv"][Label],
+                               marker=PlotConf["Marker"],
+                               s=PlotConf["MarkerSize"],
+                               linewidth=LineWidth,
+                               c='grey')
+
+                Artists[Label]["Scatter"] = ax.scatter(PlotConf["xData"][Label], PlotConf["yData"][Label],
+                           marker=PlotConf["Marker"],
+                           s=PlotConf["MarkerSize"],
+                           linewidth=LineWidth,
+                           c=np.array(PlotConf["zData"][Label]),
+                           cmap=cmap,
+                           norm=normalize)
+        else:
+            Artists[Label]["Line"], = ax.plot(PlotConf["xData"][Label], PlotConf["yData"][Label],
+                    PlotConf["Marker"],
+                    markersize=PlotConf["MarkerSize"],
+                    color=PlotConf["Color"][Label],
+                    label=PlotConf["Label"][Label],
+                    linewidth=LineWidth)
+
+    if PlotConf["Legend"]:
+        ax.legend(loc='upper right')
+
+    if "RejectFlag" in PlotConf and PlotConf["RejectFlag"] == True:
+        plt.colorbar(Artists[Label]["Scatter"], ax=ax, ticks=range(0, 33), boundaries=range(0, 33),
+                     label=PlotConf["ColorBarLabel"])
+
+    return Artists
+
+
+def updateLinesPlotArtists(PlotConf, ax, Artists):
+    # Swap the data of the artists created by buildLinesPlotArtists()
+    for Label, LabelArtists in Artists.items():
+        if "Line" in LabelArtists:
+            LabelArtists["Line"].set_data(PlotConf["xData"][Label], PlotConf["yData"][Label])
+
+        elif "Image" in LabelArtists:
+            Image, Extent = getDensityImage(PlotConf, Label)
+            LabelArtists["Image"].set_data(Image)
+            LabelArtists["Image"].set_extent(Extent)
+
+            if "NotConvImage" in LabelArtists:
+                Image, Extent = getDensityImage(PlotConf, Label, NotConv=True)
+                LabelArtists["NotConvImage"].set_data(Image)
+                LabelArtists["NotConvImage"].set_extent(Extent)
+
+        else:
+            LabelArtists["Scatter"].set_offsets(
+                np.column_stack((PlotConf["xData"][Label], PlotConf["yData"][Label])))
+            LabelArtists["Scatter"].set_array(np.array(PlotConf["zData"][Label]))
+
+            if "NotConv" in LabelArtists:
+                LabelArtists["NotConv"].set_offsets(
+                    np.column_stack((PlotConf["xDataNotConv"][Label], PlotConf["yDataNotConv"][Label])))
+
+    # Rescale the axes which limits are not configured
+    if not "xLim" in PlotConf or not "yLim" in PlotConf:
+        ax.relim()
+        for Collection in ax.collections:
+            ax.update_datalim(Collection.get_offsets())
+        ax.autoscale_view(scalex=not "xLim" in PlotConf, scaley=not "yLim" in PlotConf)
+
+
+def getFigureTemplate(PlotConf):
+    # Return the template for the plot type, if it can be reused
+    if not "Template" in PlotConf or not PlotConf["Template"] in FigureTemplates:
+        return None
+
+    Template = FigureTemplates[PlotConf["Template"]]
+
+    # The template can only be reused with the same curves and rendering
+    if set(Template["Artists"].keys()) != set(PlotConf["yData"].keys()) or \
+        Template["NotConv"] != ("NotConv" in PlotConf and PlotConf["NotConv"] == True) or \
+        Template["Render"] != selectRenderMode(PlotConf):
+        plt.close(Template["Fig"])
+        del FigureTemplates[PlotConf["Template"]]
+
+        return None
+
+    return Template
+
+
 def generateLinesPlot(PlotConf):
     LineWidth = 1.5
-    fig, ax = createFigure(PlotConf)
 
     if PlotConf["DoubleAxis"] == True:
+        fig, ax = createFigure(PlotConf)
         ax1 = ax
         ax2 = ax1.twinx()
         prepareDoubleAxis(PlotConf, ax1, ax2)
@@ -179,55 +439,35 @@ def generateLinesPlot(PlotConf):
             handles, labels = [sum(lol, []) for lol in zip(*handles_labels)]
             ax1.legend(handles, labels, loc='upper right', prop={'size': 8})
 
-    else:
-        prepareAxis(PlotConf, ax)
+        saveFigure(fig, PlotConf["Path"])
 
-        for key in PlotConf:
-            if key == "LineWidth":
-                LineWidth = PlotConf["LineWidth"]
-            if key == "ColorBar" and not "RejectFlag" in PlotConf:
-                normalize, cmap = prepareColorBar(PlotConf, ax, PlotConf["zData"])
-
-
-        for Label in PlotConf["yData"].keys():
-            if "ColorBar" in PlotConf:
-                if "RejectFlag" in PlotConf and PlotConf["RejectFlag"] == True:
-                    cmap = mpl.cm.get_cmap(PlotConf["ColorBar"])
-
-                    im = ax.scatter(PlotConf["xData"][Label], PlotConf["yData"][Label],
-                                    marker='o',
-                                    s=2,
-                                    linewidth=8,
-                                    c=PlotConf["zData"][Label],
-                                    cmap=cmap)
-                else:
-                    if "NotConv" in PlotConf and PlotConf["NotConv"] == True:
-                        ax.scatter(PlotConf["xDataNotConv"][Label], PlotConf["yDataNotConv"][Label],
-                                   marker=PlotConf["Marker"],
-                                   s=PlotConf["MarkerSize"],
-                                   linewidth=LineWidth,
-                                   c='grey')
-
-                    ax.scatter(PlotConf["xData"][Label], PlotConf["yData"][Label],
-                               marker=PlotConf["Marker"],
-                               s=PlotConf["MarkerSize"],
-                               linewidth=LineWidth,
-                               c=cmap(normalize(np.array(PlotConf["zData"][Label]))))
-            else:
-                ax.plot(PlotConf["xData"][Label], PlotConf["yData"][Label],
-                        PlotConf["Marker"],
-                        markersize=PlotConf["MarkerSize"],
-                        color=PlotConf["Color"][Label],
-                        label=PlotConf["Label"][Label],
-                        linewidth=LineWidth)
+        return
 
-        if PlotConf["Legend"]:
-            ax.legend(loc='upper right')
+    # Reuse the figure of the same plot type, if any
+    Template = getFigureTemplate(PlotConf)
 
-        if "RejectFlag" in PlotConf and PlotConf["RejectFlag"] == True:
-            plt.colorbar(im, ticks=range(0, 33), boundaries=range(0, 33), label=PlotConf["ColorBarLabel"])
+    if Template is None:
+        fig, ax = createFigure(PlotConf)
+        prepareAxis(PlotConf, ax)
+        Artists = buildLinesPlotArtists(PlotConf, ax)
+
+        # If requested, keep the figure to be reused
+        if "Template" in PlotConf:
+            FigureTemplates[PlotConf["Template"]] = {
+                "Fig": fig,
+                "Ax": ax,
+                "Artists": Artists,
+                "NotConv": "NotConv" in PlotConf and PlotConf["NotConv"] == True,
+                "Render": selectRenderMode(PlotConf),
+            }
+
+    else:
+        fig, ax = Template["Fig"], Template["Ax"]
+        # Titles and ticks may change from one plot to another
+        prepareAxis(PlotConf, ax)
+        updateLinesPlotArtists(PlotConf, ax, Template["Artists"])
 
-    saveFigure(fig, PlotConf["Path"])
+    saveFigure(fig, PlotConf["Path"], Close=not "Template" in PlotConf)
 
 
 def generatePlot(PlotConf):
@@ -0,0 +1,89 @@
+import numpy as np
+
+# MOPS tropospheric model
+# Ref.: RTCA MOPS DO-229 Section A.4.2.4
+# All the functions accept scalar or array arguments
+
+# Latitudes of the meteorological parameters table [deg]
+TROPO_MET_LAT = np.array([15.0, 30.0, 45.0, 60.0, 75.0])
+
+# Average meteorological parameters:
+# Pressure [mbar], Temperature [K], Water vapour pressure [mbar],
+# Temperature lapse rate [K/m], Water vapour lapse rate
+TROPO_MET_AVG = np.array([
+    [1013.25, 1017.25, 1015.75, 1011.75, 1013.00],
+    [299.65,  294.15,  283.15,  272.15,  263.65],
+    [26.31,   21.79,   11.66,   6.78,    4.11],
+    [6.30e-3, 6.05e-3, 5.58e-3, 5.39e-3, 4.53e-3],
+    [2.77,    3.15,    2.57,    1.81,    1.55],
+])
+
+# Seasonal variation of the meteorological parameters
+TROPO_MET_SEASON = np.array([
+    [0.00,    -3.75,   -2.25,   -1.75,   -0.50],
+    [0.00,    7.00,    11.00,   15.00,   14.50],
+    [0.00,    8.85,    7.24,    5.36,    3.39],
+    [0.00,    0.25e-3, 0.32e-3, 0.81e-3, 0.62e-3],
+    [0.00,    0.33,    0.46,    0.74,    0.30],
+])
+
+# Model constants
+TROPO_K1 = 77.604          # [K/mbar]
+TROPO_K2 = 382000.0        # [K^2/mbar]
+TROPO_RD = 287.054         # [J/(kg K)]
+TROPO_GM = 9.784           # [m/s^2]
+TROPO_G = 9.80665          # [m/s^2]
+
+# Tropospheric mapping function
+def computeTropoMappingFunction(ElevDeg):
+    ElevDeg = np.asarray(ElevDeg, dtype=float)
+
+    Mpp = 1.001 / np.sqrt(0.002001 + np.sin(np.radians(ElevDeg))**2)
+
+    # Low elevations correction
+    Mpp = np.where(ElevDeg < 4.0,
+        Mpp * (1.0 + 0.015 * np.maximum(4.0 - ElevDeg, 0.0)**2), Mpp)
+
+    return Mpp
+
+# Meteorological parameters at the latitude and day of year
+# Returns an array (5, ...) with P, T, e, Beta and Lambda
+def computeTropoMetParams(LatDeg, Doy):
+    LatDeg = np.asarray(LatDeg, dtype=float)
+    Doy = np.asarray(Doy, dtype=float)
+
+    # Seasonal phase, shifted half a year in the southern hemisphere
+    DMin = np.where(LatDeg >= 0.0, 28.0, 211.0)
+    Season = np.cos(2 * np.pi * (Doy - DMin) / 365.25)
+
+    # Linear interpolation in |latitude|, constant out of the table
+    AbsLat = np.abs(LatDeg)
+    Params = np.array([
+        np.interp(AbsLat, TROPO_MET_LAT, Avg) - \
+            np.interp(AbsLat, TROPO_MET_LAT, Var) * Season
+        for Avg, Var in zip(TROPO_MET_AVG, TROPO_MET_SEASON)])
+
+    return Params
+
+# Zenith hydrostatic and wet delays at the receiver height [m]
+def computeTropoZenithDelays(LatDeg, Height, Doy):
+    P, T, e, Beta, Lambda = computeTropoMetParams(LatDeg, Doy)
+    Height = np.asarray(Height, dtype=float)
+
+    # Zero altitude zenith delays
+    ZHyd = 1e-6 * TROPO_K1 * TROPO_RD * P / TROPO_GM
+    ZWet = 1e-6 * TROPO_K2 * TROPO_RD / \
+        (TROPO_GM * (Lambda + 1) - Beta * TROPO_RD) * e / T
+
+    # Height correction
+    Base = 1 - Beta * Height / T
+    DHyd = Base**(TROPO_G / (TROPO_RD * Beta)) * ZHyd
+    DWet = Base**((Lambda + 1) * TROPO_G / (TROPO_RD * Beta) - 1) * ZWet
+
+    return DHyd, DWet
+
+# Slant tropospheric delay [m]
+def computeTropoDelay(LatDeg, Height, Doy, ElevDeg):
+    DHyd, DWet = computeTropoZenithDelays(LatDeg, Height, Doy)
+
+    return (DHyd + DWet) * computeTropoMappingFunction(ElevDeg)
@@ -0,0 +1,80 @@
+import numpy as np
+from COMMON.Tropo import computeTropoMappingFunction
+
+# Measurement error models of the User Equivalent Range Error
+# All the functions accept scalar or array elevations [deg]
+
+# Zenith sigma of the residual tropospheric error [m]
+# Ref.: RTCA MOPS DO-229 Section A.4.2.4
+SIGMA_TROPO_VERTICAL = 0.12
+
+# Airborne receiver noise sigmas above / below ELEV_NOISE_TH [m]
+# for each Airborne Accuracy Designator
+# Ref.: RTCA MOPS DO-229, Airborne Accuracy Designators A and B
+SIGMA_NOISE_AAD = {
+    "A": (0.15, 0.36),
+    "B": (0.11, 0.15),
+}
+
+# Elevation step of the UERE look-up table [deg]
+UERE_LUT_STEP = 0.1
+
+# Sigma of the residual tropospheric error [m]
+def computeSigmaTropo(ElevDeg):
+    return SIGMA_TROPO_VERTICAL * computeTropoMappingFunction(ElevDeg)
+
+# Sigma of the airborne multipath [m]
+# Ref.: RTCA MOPS DO-229 Section J.2.4
+def computeSigmaMultipath(ElevDeg):
+    return 0.13 + 0.53 * np.exp(-np.asarray(ElevDeg, dtype=float) / 10.0)
+
+# Sigma of the airborne receiver noise [m]
+# AccDesig: Airborne Accuracy Designator (A|B), used for SF users
+# SigmaNoiseDf: noise of the Dual-Frequency combination for DF users,
+# or None for SF users
+def computeSigmaNoise(ElevDeg, AccDesig, ElevNoiseTh, SigmaNoiseDf=None):
+    ElevDeg = np.asarray(ElevDeg, dtype=float)
+
+    if SigmaNoiseDf is not None:
+        return np.full(ElevDeg.shape, float(SigmaNoiseDf))
+
+    SigmaHigh, SigmaLow = SIGMA_NOISE_AAD[AccDesig]
+
+    return np.where(ElevDeg >= ElevNoiseTh, SigmaHigh, SigmaLow)
+
+# Variance of the airborne error (noise and multipath) [m^2]
+def computeVarAir(ElevDeg, AccDesig, ElevNoiseTh, SigmaNoiseDf=None):
+    return computeSigmaNoise(ElevDeg, AccDesig, ElevNoiseTh, SigmaNoiseDf)**2 + \
+        computeSigmaMultipath(ElevDeg)**2
+
+# Sigma of the UERE [m]
+# SigmaFlt, SigmaUire: sigmas of the satellite (fast and long term)
+# and ionospheric corrections [m], 0 when they are not applied
+def computeSigmaUere(ElevDeg, AccDesig, ElevNoiseTh, SigmaNoiseDf=None,
+    SigmaFlt=0.0, SigmaUire=0.0):
+    return np.sqrt(SigmaFlt**2 + SigmaUire**2 + \
+        computeVarAir(ElevDeg, AccDesig, ElevNoiseTh, SigmaNoiseDf) + \
+        computeSigmaTropo(ElevDeg)**2)
+
+# Precompute the elevation dependent UERE variances (airborne and
+# tropospheric terms) on a grid of elevations
+def buildUereLut(AccDesig, ElevNoiseTh, SigmaNoiseDf=None,
+    Step=UERE_LUT_STEP):
+    Elev = np.arange(0.0, 90.0 + Step / 2, Step)
+
+    Lut = {
+        "Step": Step,
+        "Var": computeVarAir(Elev, AccDesig, ElevNoiseTh, SigmaNoiseDf) + \
+            computeSigmaTropo(Elev)**2,
+    }
+
+    return Lut
+
+# UERE variance [m^2] of the given elevations from the look-up table
+# Elevations are rounded down to the table step, so that the variances
+# (decreasing with the elevation) are overbounded
+def lookupUereVariance(Lut, ElevDeg, VarFlt=0.0, VarUire=0.0):
+    Idx = np.clip(np.floor(np.asarray(ElevDeg, dtype=float) / Lut["Step"] + 1e-9),
+        0, len(Lut["Var"]) - 1).astype(int)
+
+    return Lut["Var"][Idx] + VarFlt + VarUire
@@ -0,0 +1,303 @@
+#!/usr/bin/env python
+
+########################################################################
+# PETRUS/SRC/Corrections.py:
+# This is the Corrections Module of PETRUS tool
+#
+#  Project:        PETRUS
+#  File:           Corrections.py
+#  Date(YY/MM/DD): 01/02/21
+#
+#   Author: GNSS Academy
+#   Copyright 2021 GNSS Academy
+#
+# -----------------------------------------------------------------
+# Date       | Author             | Action
+# -----------------------------------------------------------------
+#
+# The preprocessed measurements are buffered while the Preprocessing
+# runs, and the corrections of CORR_BATCH epochs are computed at once
+# on the columns of all their rows:
+#   CorrC1 = SmoothC1 + Prc + Ltc + SatClk + Rel - Tropo - Iono
+# with the SBAS fast (Prc) and long-term (Ltc) corrections and grid
+# ionospheric delays when the SBAS messages of the day are available.
+# The satellites without any of them are flagged as not usable.
+########################################################################
+
+
+# Import External and Internal functions and Libraries
+#----------------------------------------------------------------------
+import sys, os
+from collections import OrderedDict
+import numpy as np
+from COMMON import GnssConstants as Const
+from COMMON.Coordinates import enu2ecefArray
+from COMMON.Tropo import computeTropoDelay
+from COMMON.Iono import computeIonoMappingFunction
+from COMMON.Iono import computeIonoPiercePoint
+from COMMON.Uere import lookupUereVariance
+from InputOutput import RcvrIdx
+from Sbas import getSbasFastCorrection
+from Sbas import getSbasLongTermCorrection
+from Sbas import getSbasFltVariance
+from Sbas import getSbasIonoDelay
+
+# Number of epochs corrected at once
+CORR_BATCH = 3600
+
+def initCorrInfo():
+
+    # Purpose: initialize the buffer of preprocessed measurements
+
+    # Returns
+    # =======
+    # CorrInfo: dict
+    #         Dictionary containing one entry per buffered row
+
+    CorrInfo = {
+        "NEpochs": 0,   # Number of buffered epochs
+        "Rows": [],     # (Sod, Doy, Elev, Azim, Flag, SmoothC1, C1, P2)
+        "Labels": [],   # Satellite labels
+        "SatClk": [],   # Satellite clock bias [m]
+        "Rel": [],      # Relativistic correction [m]
+    }
+
+    return CorrInfo
+
+# End of initCorrInfo()
+
+def updateCorrInfo(CorrInfo, PreproObsInfo, SatClkInfo=None):
+
+    # Purpose: buffer the preprocessed measurements of the current epoch
+
+    # Parameters
+    # ==========
+    # CorrInfo: dict
+    #         Dictionary containing the buffered rows
+    # PreproObsInfo: dict
+    #         Dictionary containing Preprocessing info for the
+    #         current epoch
+    # SatClkInfo: dict
+    #         Per satellite: clock bias ("Clk") and relativistic
+    #         correction ("Rel") [m], or None if there is no
+    #         navigation data (both set to 0)
+
+    # Returns
+    # =======
+    # Nothing, CorrInfo is updated
+
+    CorrInfo["NEpochs"] = CorrInfo["NEpochs"] + 1
+
+    for SatLabel, SatPreproObs in PreproObsInfo.items():
+        CorrInfo["Rows"].append((
+            SatPreproObs["Sod"],
+            SatPreproObs["Doy"],
+            SatPreproObs["Elevation"],
+            SatPreproObs["Azimuth"],
+            SatPreproObs["ValidL1"] == 1 and SatPreproObs["Status"] == 1,
+            SatPreproObs["SmoothC1"],
+            SatPreproObs["C1"],
+            SatPreproObs["P2"],
+            ))
+        CorrInfo["Labels"].append(SatLabel)
+
+        if SatClkInfo is not None and SatLabel in SatClkInfo:
+            CorrInfo["SatClk"].append(SatClkInfo[SatLabel]["Clk"])
+            CorrInfo["Rel"].append(SatClkInfo[SatLabel]["Rel"])
+        else:
+            CorrInfo["SatClk"].append(0.0)
+            CorrInfo["Rel"].append(0.0)
+
+# End of updateCorrInfo()
+
+def computeSatClockBias(Af0, Af1, Af2, Toc, Tow):
+
+    # Purpose: compute the satellite clock bias from the broadcast
+    #          polynomial coefficients
+    #          Ref.: IS-GPS-200 Section 20.3.3.3.3.1
+
+    # Parameters
+    # ==========
+    # Af0 [s], Af1 [s/s], Af2 [s/s^2], Toc [s]: numpy arrays
+    #         Clock polynomial and its reference time of week
+    # Tow: numpy array
+    #         Time of week of transmission [s]
+
+    # Returns
+    # =======
+    # SatClk: numpy array
+    #         Satellite clock bias [m]
+
+    # Time from the reference epoch, accounting for the week crossover
+    Dt = np.asarray(Tow, dtype=float) - Toc
+    Dt = Dt - np.round(Dt / (Const.D_IN_W * Const.S_IN_D)) * \
+        (Const.D_IN_W * Const.S_IN_D)
+
+    return (Af0 + Af1 * Dt + Af2 * Dt**2) * Const.SPEED_OF_LIGHT
+
+# End of computeSatClockBias()
+
+def computeRelativisticCorrection(SatPos, SatVel):
+
+    # Purpose: compute the relativistic correction of the satellite
+    #          clock due to the orbit eccentricity
+    #          Ref.: IS-GPS-200 Section 20.3.3.3.3.1
+
+    # Parameters
+    # ==========
+    # SatPos, SatVel: numpy arrays
+    #         (..., 3) satellite ECEF position [m] and velocity [m/s]
+
+    # Returns
+    # =======
+    # Rel: numpy array
+    #         Relativistic correction [m]
+
+    return -2.0 * np.sum(np.asarray(SatPos) * np.asarray(SatVel), axis=-1) / \
+        Const.SPEED_OF_LIGHT
+
+# End of computeRelativisticCorrection()
+
+def computeLongTermRangeCorrection(Rcvr, Elev, Azim, Sod, Ltc):
+
+    # Purpose: compute the range-domain effect of the SBAS long-term
+    #          corrections: the clock correction minus the orbit
+    #          correction projected on the line of sight
+    #          Ref.: RTCA MOPS DO-229 Section A.4.4.7
+
+    # Parameters
+    # ==========
+    # Rcvr: list
+    #         Receiver info, as given by readRcvr()
+    # Elev, Azim: numpy arrays
+    #         Satellite elevation and azimuth [deg]
+    # Sod: numpy array
+    #         Second of day [s]
+    # Ltc: dict
+    #         Long-term corrections, as given by
+    #         getSbasLongTermCorrection()
+
+    # Returns
+    # =======
+    # LtcRange: numpy array
+    #         Correction to add to the measurement [m], NaN where
+    #         there is no long-term correction
+
+    # Time from the time of applicability, within the day
+    Dt = Sod - Ltc["T0"]
+    Dt = Dt - np.round(Dt / Const.S_IN_D) * Const.S_IN_D
+    Dt = np.where(Ltc["VelCode"] == 1, Dt, 0.0)
+
+    DClk = (Ltc["Daf0"] + Ltc["Daf1"] * Dt) * Const.SPEED_OF_LIGHT
+    DPos = np.stack((Ltc["Dx"] + Ltc["DxRate"] * Dt,
+        Ltc["Dy"] + Ltc["DyRate"] * Dt,
+        Ltc["Dz"] + Ltc["DzRate"] * Dt), axis=-1)
+
+    # Line of sight from the receiver to the satellite
+    ElevRad = np.radians(Elev)
+    AzimRad = np.radians(Azim)
+    Los = enu2ecefArray(np.stack((np.cos(ElevRad) * np.sin(AzimRad),
+        np.cos(ElevRad) * np.cos(AzimRad), np.sin(ElevRad)), axis=-1),
+        float(Rcvr[RcvrIdx["LON"]]), float(Rcvr[RcvrIdx["LAT"]]))
+
+    return DClk - np.sum(Los * DPos, axis=-1)
+
+# End of computeLongTermRangeCorrection()
+
+def computeCorrectionsBatch(CorrInfo, Rcvr, UereLut, SbasInfo=None):
+
+    # Purpose: correct the buffered measurements and empty the buffer
+
+    # Parameters
+    # ==========
+    # CorrInfo: dict
+    #         Dictionary containing the buffered rows
+    # Rcvr: list
+    #         Receiver info, as given by readRcvr()
+    # UereLut: dict
+    #         UERE look-up table, as given by buildUereLut()
+    # SbasInfo: dict
+    #         Decoded SBAS messages, as given by readSbasFile(), or
+    #         None to use the Dual-Frequency ionospheric delay
+
+    # Returns
+    # =======
+    # CorrOut: dict
+    #         Columns of the corrected measurements, in CorrIdx order
+
+    Rows = np.array(CorrInfo["Rows"], dtype=float).reshape(-1, 8)
+    Sod, Doy, Elev, Azim, Flag, SmoothC1, C1, P2 = Rows.T
+    SatClk = np.array(CorrInfo["SatClk"])
+    Rel = np.array(CorrInfo["Rel"])
+
+    # MOPS tropospheric delay
+    Tropo = computeTropoDelay(float(Rcvr[RcvrIdx["LAT"]]),
+        float(Rcvr[RcvrIdx["ALT"]]), Doy, Elev)
+
+    if SbasInfo is None:
+        # Ionospheric delay on L1 from the Dual-Frequency code, 0 without
+        # P2 (the satellite and receiver code biases are not removed)
+        Iono = np.where(P2 > 0, (P2 - C1) / (Const.GPS_GAMMA_L1L2 - 1), 0.0)
+        Prc = np.zeros(len(Sod))
+        Ltc = np.zeros(len(Sod))
+        VarFlt = 0.0
+        VarUire = 0.0
+
+    else:
+        # SBAS fast and long-term corrections of the GPS satellites
+        Prn = np.array([int(SatLabel[1:]) if SatLabel[0] == "G" else 0
+            for SatLabel in CorrInfo["Labels"]], dtype=int)
+        Prc, Sigma2Udre = getSbasFastCorrection(SbasInfo, Prn, Sod)
+        LtcInfo = getSbasLongTermCorrection(SbasInfo, Prn, Sod)
+        Ltc = computeLongTermRangeCorrection(Rcvr, Elev, Azim, Sod, LtcInfo)
+        VarFlt = getSbasFltVariance(SbasInfo, Prn, Sod, Sigma2Udre, LtcInfo)
+
+        # SBAS grid vertical delay at the IPP, mapped to the slant
+        IppLon, IppLat = computeIonoPiercePoint(float(Rcvr[RcvrIdx["LON"]]),
+            float(Rcvr[RcvrIdx["LAT"]]), Elev, Azim)
+        Vtec, VarUive = getSbasIonoDelay(SbasInfo, IppLat, IppLon, Sod)
+        Fpp = computeIonoMappingFunction(Elev)
+        Iono = Fpp * Vtec
+        VarUire = Fpp**2 * VarUive
+
+        # The satellites without fast, long-term or ionospheric
+        # corrections (not received, timed out or not monitored) are
+        # flagged as not usable, with their missing terms set to 0
+        Corrected = np.isfinite(Prc) & np.isfinite(Ltc) & \
+            np.isfinite(VarFlt) & np.isfinite(Iono) & np.isfinite(VarUire)
+        Flag = np.where(Corrected, Flag, 0)
+        Prc = np.where(Corrected, Prc, 0.0)
+        Ltc = np.where(Corrected, Ltc, 0.0)
+        VarFlt = np.where(Corrected, VarFlt, 0.0)
+        Iono = np.where(Corrected, Iono, 0.0)
+        VarUire = np.where(Corrected, VarUire, 0.0)
+
+    CorrOut = OrderedDict({})
+    CorrOut["SOD"] = Sod
+    CorrOut["DOY"] = Doy
+    CorrOut["CONST"] = [SatLabel[0] for SatLabel in CorrInfo["Labels"]]
+    CorrOut["PRN"] = [int(SatLabel[1:]) for SatLabel in CorrInfo["Labels"]]
+    CorrOut["ELEV"] = Elev
+    CorrOut["AZIM"] = Azim
+    CorrOut["FLAG"] = Flag
+    CorrOut["SMOOTHC1"] = SmoothC1
+    CorrOut["TROPO"] = Tropo
+    CorrOut["IONO"] = Iono
+    CorrOut["PRC"] = Prc
+    CorrOut["LTC"] = Ltc
+    CorrOut["SATCLK"] = SatClk
+    CorrOut["REL"] = Rel
+    CorrOut["CORRC1"] = SmoothC1 + Prc + Ltc + SatClk + Rel - Tropo - Iono
+    CorrOut["SIGMAUERE"] = np.sqrt(lookupUereVariance(UereLut, Elev,
+        VarFlt, VarUire))
+
+    # Empty the buffer
+    CorrInfo.update(initCorrInfo())
+
+    return CorrOut
+
+# End of computeCorrectionsBatch()
+
+########################################################################
+# END OF CORRECTIONS FUNCTIONS MODULE
+########################################################################
@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+
+########################################################################
+# PETRUS/SRC/DualFrequency.py:
+# This is the Dual-Frequency Combinations Module of PETRUS tool
+#
+#  Project:        PETRUS
+#  File:           DualFrequency.py
+#  Date(YY/MM/DD): 01/02/21
+#
+#   Author: GNSS Academy
+#   Copyright 2021 GNSS Academy
+#
+# -----------------------------------------------------------------
+# Date       | Author             | Action
+# -----------------------------------------------------------------
+#
+# The L1/L2 measurements are buffered while the Preprocessing runs, and
+# the requested linear combinations (iono-free, geometry-free, wide-lane,
+# narrow-lane, Melbourne-Wubbena...) of COMB_BATCH epochs are computed
+# at once on the columns of all their rows. The Hatch smoothing
+# variants (single-frequency, divergence-free and iono-free) run along
+# the arcs of all the satellites at once, their state being kept from
+# one batch to the next. The arcs are restarted at the rejected L1
+# measurements and at the jumps of the geometry-free phase, so that
+# the cycle slips of L2 do not corrupt the dual-frequency smoothing.
+########################################################################
+
+
+# Import External and Internal functions and Libraries
+#----------------------------------------------------------------------
+import sys, os
+from collections import OrderedDict
+import numpy as np
+from COMMON import GnssConstants as Const
+from COMMON.Arcs import initArcState
+from COMMON.Combinations import computeCombinations
+from COMMON.Combinations import computeCombinationOutputs
+from COMMON.Combinations import detectGeometryFreeJumps
+from COMMON.Dates import convertSod2Ns
+
+# Number of epochs combined at once
+COMB_BATCH = 3600
+
+def initCombInfo():
+
+    # Purpose: initialize the buffer of measurements and the state of
+    #          the smoothing arcs of a receiver
+
+    # Returns
+    # =======
+    # CombInfo: dict
+    #         Dictionary containing one entry per buffered row
+
+    CombInfo = {
+        "NEpochs": 0,   # Number of buffered epochs
+        "Rows": [],     # (SodNs, Sod, Doy, Prn, Valid, C1, P2, L1, L2)
+        "Labels": [],   # Satellite labels
+        "ArcStates": {},# State of the arcs of each smoothed code
+        "JumpState": initArcState(Const.MAX_NUM_SATS_CONSTEL + 1),
+                        # Last geometry-free phase of each satellite
+    }
+
+    return CombInfo
+
+# End of initCombInfo()
+
+def updateCombInfo(CombInfo, PreproObsInfo):
+
+    # Purpose: buffer the measurements of the current epoch
+
+    # Parameters
+    # ==========
+    # CombInfo: dict
+    #         Dictionary containing the buffered rows
+    # PreproObsInfo: dict
+    #         Dictionary containing Preprocessing info for the
+    #         current epoch
+
+    # Returns
+    # =======
+    # Nothing, CombInfo is updated
+
+    CombInfo["NEpochs"] = CombInfo["NEpochs"] + 1
+
+    for SatLabel, SatPreproObs in PreproObsInfo.items():
+        CombInfo["Rows"].append((
+            SatPreproObs["SodNs"],
+            SatPreproObs["Sod"],
+            SatPreproObs["Doy"],
+            SatPreproObs["PRN"],
+            SatPreproObs["ValidL1"] == 1,
+            SatPreproObs["C1"],
+            SatPreproObs["P2"],
+            SatPreproObs["L1"],
+            SatPreproObs["L2"],
+            ))
+        CombInfo["Labels"].append(SatLabel)
+
+# End of updateCombInfo()
+
+def computeCombinationsBatch(Conf, CombInfo):
+
+    # Purpose: compute the requested combinations of the buffered
+    #          measurements and empty the buffer
+
+    # Parameters
+    # ==========
+    # Conf: dict
+    #         Configuration dictionary
+    # CombInfo: dict
+    #         Dictionary containing the buffered rows
+
+    # Returns
+    # =======
+    # CombOut: dict
+    #         Columns of the combinations: SOD, DOY, CONST, PRN, FLAG
+    #         and those of COMB_LIST [m], NaN for the missing
+    #         measurements
+
+    Rows = np.array(CombInfo["Rows"], dtype=float).reshape(-1, 9)
+    Sod, Doy, Prn, Valid, C1, P2, L1, L2 = Rows[:, 1:].T
+    Valid = Valid == 1
+    # The epochs are taken from the exact integer column
+    SodNs = np.array([Row[0] for Row in CombInfo["Rows"]], dtype=np.int64)
+
+    # The rejected measurements (cycle slips, gaps...) are not smoothed
+    # and restart the arcs of their satellites, as the jumps of the
+    # geometry-free phase (cycle slips of L2)
+    GapNs = convertSod2Ns(Conf["HATCH_GAP_TH"])
+    GfPhase = computeCombinations(C1, P2, L1, L2, ["GF_PHASE"])["GF_PHASE"]
+    Reset = detectGeometryFreeJumps(Prn.astype(int), SodNs, GfPhase, Valid,
+        GapNs, CombInfo["JumpState"])
+    Outputs = computeCombinationOutputs(C1, P2, L1, L2, Conf["COMB_LIST"],
+        Sat=Prn.astype(int), TimeNs=SodNs, Reset=Reset, GapNs=GapNs,
+        RateNs=convertSod2Ns(Conf["SAMPLING_RATE"]),
+        HatchTime=Conf["HATCH_TIME"], ArcStates=CombInfo["ArcStates"],
+        NSats=Const.MAX_NUM_SATS_CONSTEL + 1, Valid=Valid)
+
+    CombOut = OrderedDict({})
+    CombOut["SOD"] = Sod
+    CombOut["DOY"] = Doy
+    CombOut["CONST"] = [SatLabel[0] for SatLabel in CombInfo["Labels"]]
+    CombOut["PRN"] = Prn
+    CombOut["FLAG"] = Valid.astype(int)
+    CombOut.update(Outputs)
+
+    # Empty the buffer, keeping the state of the arcs
+    ArcStates = CombInfo["ArcStates"]
+    JumpState = CombInfo["JumpState"]
+    CombInfo.update(initCombInfo())
+    CombInfo["ArcStates"] = ArcStates
+    CombInfo["JumpState"] = JumpState
+
+    return CombOut
+
+# End of computeCombinationsBatch()
+
+########################################################################
+# END OF DUAL-FREQUENCY COMBINATIONS FUNCTIONS MODULE
+########################################################################
@@ -0,0 +1,655 @@
+#!/usr/bin/env python
+
+########################################################################
+# PETRUS/SRC/Ephemeris.py:
+# This is the Broadcast Ephemeris Module of PETRUS tool
+#
+#  Project:        PETRUS
+#  File:           Ephemeris.py
+#  Date(YY/MM/DD): 01/02/21
+#
+#   Author: GNSS Academy
+#   Copyright 2021 GNSS Academy
+#
+# -----------------------------------------------------------------
+# Date       | Author             | Action
+# -----------------------------------------------------------------
+#
+# Reads the GPS broadcast ephemerides of RINEX 2.11 and 3.x navigation
+# files, or YUMA almanacs, into one array per parameter, sorted by
+# (PRN, Toe), and computes the satellite positions, clocks and, for a
+# receiver, the elevations and azimuths of any set of satellites and
+# epochs at once.
+# Times are GPS seconds since the GPS start epoch.
+########################################################################
+
+
+# Import External and Internal functions and Libraries
+#----------------------------------------------------------------------
+import sys, os
+from collections import OrderedDict
+import numpy as np
+from COMMON import GnssConstants as Const
+from COMMON.Dates import convertYearMonthDay2JulianDay
+from COMMON.Dates import convertYearDoy2JulianDayArray
+from COMMON.Coordinates import ecef2enuArray
+from InputOutput import RcvrIdx, ObsIdx
+from Rinex import openRinexFile, readRinexLines
+
+# Broadcast parameters of a navigation record, in RINEX order after
+# the clock polynomial (4 per line, 7 lines)
+EPH_PARAMS = ["Iode", "Crs", "DeltaN", "M0",
+    "Cuc", "Ecc", "Cus", "SqrtA",
+    "Toe", "Cic", "Omega0", "Cis",
+    "I0", "Crc", "Omega", "OmegaDot",
+    "IDot", "L2Codes", "Week", "L2PFlag",
+    "Accuracy", "Health", "Tgd", "Iodc",
+    "TransTime", "FitInterval"]
+
+# Validity of an ephemeris around its Toe when the fit interval is
+# not given [s]
+EPH_DEFAULT_FIT = 4 * Const.S_IN_H
+
+# Span between the keys of two PRNs [s], longer than any GPS time
+EPH_KEY_SPAN = 1e10
+
+# Relativistic clock correction constant F [s/m^0.5]
+# Ref.: IS-GPS-200 Section 20.3.3.3.3.1
+EPH_REL_F = -4.442807633e-10
+
+# Iterations of the Kepler equation and of the signal transit time,
+# from a first guess of the transit time [s]
+EPH_KEPLER_NITER = 4
+EPH_TRANSIT_NITER = 1
+EPH_TRANSIT_GUESS = 0.075
+
+# Parameters used to compute the positions and clocks
+EPH_ORBIT_PARAMS = ["SqrtA", "DeltaN", "M0", "Ecc", "Omega", "Cus", "Cuc",
+    "Crs", "Crc", "I0", "Cis", "Cic", "IDot", "Omega0", "OmegaDot", "Toe",
+    "ToeGps", "TocGps", "Af0", "Af1", "Af2"]
+
+# Number of epochs of the day computed at once
+EPH_DAY_BATCH = 3600
+
+# Elevation and azimuth [deg] filled in the RINEX observations of the
+# satellites without orbit (unhealthy, or out of the fit intervals),
+# below any mask so that the Preprocessing rejects them
+NO_ORBIT_ELEV = -90.0
+NO_ORBIT_AZIM = 0.0
+
+# Validity of an almanac around its time of applicability [h]
+EPH_ALMANAC_FIT = 14 * 24
+
+# YUMA almanac fields, by label
+EPH_YUMA_FIELDS = OrderedDict({})
+EPH_YUMA_FIELDS["ID"] = "Prn"
+EPH_YUMA_FIELDS["Health"] = "Health"
+EPH_YUMA_FIELDS["Eccentricity"] = "Ecc"
+EPH_YUMA_FIELDS["Time of Applicability(s)"] = "Toe"
+EPH_YUMA_FIELDS["Orbital Inclination(rad)"] = "I0"
+EPH_YUMA_FIELDS["Rate of Right Ascen(r/s)"] = "OmegaDot"
+EPH_YUMA_FIELDS["SQRT(A)  (m 1/2)"] = "SqrtA"
+EPH_YUMA_FIELDS["Right Ascen at Week(rad)"] = "Omega0"
+EPH_YUMA_FIELDS["Argument of Perigee(rad)"] = "Omega"
+EPH_YUMA_FIELDS["Mean Anom(rad)"] = "M0"
+EPH_YUMA_FIELDS["Af0(s)"] = "Af0"
+EPH_YUMA_FIELDS["Af1(s/s)"] = "Af1"
+EPH_YUMA_FIELDS["week"] = "Week"
+
+def readNavValue(Field):
+
+    # Purpose: convert a RINEX navigation field (D exponent) to float
+
+    Field = Field.strip()
+
+    return float(Field.replace("D", "E").replace("d", "e")) if Field else 0.0
+
+# End of readNavValue()
+
+def readRinexNav(NavFile):
+
+    # Purpose: read the GPS ephemerides of a RINEX navigation file
+
+    # Parameters
+    # ==========
+    # NavFile: str
+    #         Path to the RINEX navigation file
+
+    # Returns
+    # =======
+    # EphInfo: dict
+    #         One array per parameter (EPH_PARAMS, "Prn", "Af0", "Af1",
+    #         "Af2" and the absolute "TocGps" and "ToeGps" times),
+    #         sorted by PRN and Toe, with its search "Key"
+
+    Records = []
+
+    with openRinexFile(NavFile) as f:
+        Lines = readRinexLines(f)
+
+        # Header
+        Version = 0.0
+        for Line in Lines:
+            Label = Line[60:].strip()
+            if Label == "RINEX VERSION / TYPE":
+                Version = float(Line[:9])
+            elif Label == "END OF HEADER":
+                break
+
+        # RINEX 2: PRN and date in the first 22 characters
+        # RINEX 3: system, PRN and date in the first 23 characters
+        Offset = 3 if Version < 3 else 4
+        for Line in Lines:
+            if not Line.strip():
+                continue
+
+            # Broadcast orbit lines: 3 for GLONASS and SBAS, 7 otherwise
+            Orbit = [next(Lines) for i in range(3 if Line[0] in "RS" and
+                Version >= 3 else 7)]
+
+            if Version < 3:
+                Prn = int(Line[:2])
+                Year = int(Line[3:5])
+                Year = Year + 2000 if Year < 80 else Year + 1900
+                Date = [Year] + [int(Line[6 + 3 * i:8 + 3 * i]) for i in range(4)] + \
+                    [float(Line[17:22])]
+            else:
+                if Line[0] != "G":
+                    continue
+                Prn = int(Line[1:3])
+                Date = [int(Line[4:8])] + [int(Line[9 + 3 * i:11 + 3 * i])
+                    for i in range(5)]
+
+            Clock = [readNavValue(Line[Offset + 19 + 19 * i:Offset + 38 + 19 * i])
+                for i in range(3)]
+            Params = [readNavValue(OrbitLine[Offset + 19 * i:Offset + 19 * (i + 1)])
+                for OrbitLine in Orbit for i in range(4)]
+
+            Records.append([Prn] + Date + Clock + Params[:len(EPH_PARAMS)])
+
+    Data = np.array(Records, dtype=float).reshape(-1, 10 + len(EPH_PARAMS))
+
+    EphInfo = OrderedDict({})
+    EphInfo["Prn"] = Data[:, 0].astype(int)
+    EphInfo["Af0"], EphInfo["Af1"], EphInfo["Af2"] = Data[:, 7:10].T
+    for i, Param in enumerate(EPH_PARAMS):
+        EphInfo[Param] = Data[:, 10 + i]
+
+    # Absolute times: Toc from the epoch of the record, Toe from the
+    # week of the record
+    Jd = np.array([convertYearMonthDay2JulianDay(int(Y), int(M), int(D))
+        for Y, M, D in Data[:, 1:4]], dtype=float)
+    EphInfo["TocGps"] = (Jd - Const.JD_0) * Const.S_IN_D + \
+        Data[:, 4] * Const.S_IN_H + Data[:, 5] * 60 + Data[:, 6]
+    EphInfo["ToeGps"] = EphInfo["Week"] * Const.D_IN_W * Const.S_IN_D + \
+        EphInfo["Toe"]
+
+    # Sort by PRN and Toe, the latest record first for repeated Toe
+    Order = np.lexsort((-EphInfo["TransTime"], EphInfo["ToeGps"], EphInfo["Prn"]))
+    for Param in EphInfo:
+        EphInfo[Param] = EphInfo[Param][Order]
+    Unique = np.ones(len(Order), dtype=bool)
+    Unique[1:] = (np.diff(EphInfo["Prn"]) != 0) | (np.diff(EphInfo["ToeGps"]) != 0)
+    for Param in EphInfo:
+        EphInfo[Param] = EphInfo[Param][Unique]
+
+    EphInfo["Key"] = EphInfo["Prn"] * EPH_KEY_SPAN + EphInfo["ToeGps"]
+
+    return EphInfo
+
+# End of readRinexNav()
+
+def readYumaAlmanac(AlmFile, Time):
+
+    # Purpose: read a YUMA almanac as ephemerides without harmonic
+    #          corrections, valid for EPH_ALMANAC_FIT hours
+    #          Ref.: IS-GPS-200 Table 20-VI
+
+    # Parameters
+    # ==========
+    # AlmFile: str
+    #         Path to the YUMA almanac file
+    # Time: float
+    #         GPS time of use [s], to resolve the 10-bit week
+
+    # Returns
+    # =======
+    # EphInfo: dict
+    #         Ephemerides, as given by readRinexNav()
+
+    Records = []
+    Record = {}
+
+    with openRinexFile(AlmFile) as f:
+        for Line in readRinexLines(f):
+            Label, Sep, Value = Line.partition(":")
+            Label = Label.strip()
+            if Sep and Label in EPH_YUMA_FIELDS:
+                Record[EPH_YUMA_FIELDS[Label]] = float(Value)
+                # The week closes the record
+                if Label == "week":
+                    Records.append(Record)
+                    Record = {}
+
+    NAlm = len(Records)
+    EphInfo = OrderedDict({})
+    EphInfo["Prn"] = np.array([Record["Prn"] for Record in Records], dtype=int)
+    for Param in ["Af0", "Af1", "Af2"] + EPH_PARAMS:
+        EphInfo[Param] = np.array([Record.get(Param, 0.0) for Record in Records],
+            dtype=float).reshape(NAlm)
+
+    # Full week, the nearest one to the time of use
+    Week = np.floor(Time / (Const.D_IN_W * Const.S_IN_D))
+    EphInfo["Week"] = EphInfo["Week"] + \
+        1024 * np.round((Week - EphInfo["Week"]) / 1024)
+    EphInfo["FitInterval"][:] = EPH_ALMANAC_FIT
+    EphInfo["ToeGps"] = EphInfo["Week"] * Const.D_IN_W * Const.S_IN_D + \
+        EphInfo["Toe"]
+    EphInfo["TocGps"] = EphInfo["ToeGps"]
+
+    # Sort by PRN
+    Order = np.argsort(EphInfo["Prn"], kind="stable")
+    for Param in EphInfo:
+        EphInfo[Param] = EphInfo[Param][Order]
+
+    EphInfo["Key"] = EphInfo["Prn"] * EPH_KEY_SPAN + EphInfo["ToeGps"]
+
+    return EphInfo
+
+# End of readYumaAlmanac()
+
+def findEphemeris(EphInfo, Prn, Time):
+
+    # Purpose: select the healthy ephemeris with the nearest Toe for
+    #          each PRN and time, within its fit interval
+
+    # Parameters
+    # ==========
+    # EphInfo: dict
+    #         Ephemerides, as given by readRinexNav()
+    # Prn, Time: numpy arrays
+    #         PRNs and GPS times [s]
+
+    # Returns
+    # =======
+    # Idx: numpy array
+    #         Position of the ephemeris in EphInfo
+    # Found: numpy array
+    #         True where a valid ephemeris is available
+
+    Prn = np.asarray(Prn, dtype=int)
+    Time = np.asarray(Time, dtype=float)
+    NEph = len(EphInfo["Key"])
+    if NEph == 0:
+        return np.zeros(Prn.shape, dtype=int), np.zeros(Prn.shape, dtype=bool)
+
+    # Ephemerides before and after the time
+    After = np.clip(np.searchsorted(EphInfo["Key"], Prn * EPH_KEY_SPAN + Time),
+        0, NEph - 1)
+    Before = np.maximum(After - 1, 0)
+
+    # Nearest one of the same PRN
+    DtAfter = np.where(EphInfo["Prn"][After] == Prn,
+        np.abs(EphInfo["ToeGps"][After] - Time), np.inf)
+    DtBefore = np.where(EphInfo["Prn"][Before] == Prn,
+        np.abs(EphInfo["ToeGps"][Before] - Time), np.inf)
+    Idx = np.where(DtBefore <= DtAfter, Before, After)
+    Dt = np.minimum(DtBefore, DtAfter)
+
+    # Within half the fit interval [h] of a healthy satellite
+    Fit = np.where(EphInfo["FitInterval"][Idx] > 0,
+        EphInfo["FitInterval"][Idx] * Const.S_IN_H, EPH_DEFAULT_FIT)
+    Found = (Dt <= Fit / 2) & (EphInfo["Health"][Idx] == 0)
+
+    return Idx, Found
+
+# End of findEphemeris()
+
+def computeSatPosClk(EphInfo, Idx, Time):
+
+    # Purpose: compute the satellite positions and clocks from the
+    #          selected ephemerides
+    #          Ref.: IS-GPS-200 Table 20-IV and Section 20.3.3.3.3.1
+
+    # Parameters
+    # ==========
+    # EphInfo: dict
+    #         Ephemerides, as given by readRinexNav()
+    # Idx: numpy array
+    #         Ephemeris of each satellite, as given by findEphemeris()
+    # Time: numpy array
+    #         GPS times of transmission [s]
+
+    # Returns
+    # =======
+    # SatPos: numpy array
+    #         (..., 3) ECEF position at the time of transmission [m]
+    # SatClk: numpy array
+    #         Clock bias from the polynomial [m] (without TGD)
+    # SatRel: numpy array
+    #         Relativistic clock correction [m]
+
+    Eph = {Param: EphInfo[Param][Idx] for Param in EPH_ORBIT_PARAMS}
+    Time = np.asarray(Time, dtype=float)
+
+    # Time from the ephemeris reference epoch
+    Tk = Time - Eph["ToeGps"]
+
+    # Mean motion and mean anomaly
+    A = Eph["SqrtA"]**2
+    N = np.sqrt(Const.MU_EARTH / A**3) + Eph["DeltaN"]
+    M = Eph["M0"] + N * Tk
+
+    # Kepler's equation for the eccentric anomaly
+    Ecc = Eph["Ecc"]
+    E = M
+    for i in range(EPH_KEPLER_NITER):
+        E = E - (E - Ecc * np.sin(E) - M) / (1 - Ecc * np.cos(E))
+    SinE, CosE = np.sin(E), np.cos(E)
+
+    # Argument of latitude, radius and inclination, corrected
+    Nu = np.arctan2(np.sqrt(1 - Ecc**2) * SinE, CosE - Ecc)
+    Phi = Nu + Eph["Omega"]
+    Sin2Phi, Cos2Phi = np.sin(2 * Phi), np.cos(2 * Phi)
+    U = Phi + Eph["Cus"] * Sin2Phi + Eph["Cuc"] * Cos2Phi
+    R = A * (1 - Ecc * CosE) + Eph["Crs"] * Sin2Phi + Eph["Crc"] * Cos2Phi
+    I = Eph["I0"] + Eph["Cis"] * Sin2Phi + Eph["Cic"] * Cos2Phi + Eph["IDot"] * Tk
+
+    # Longitude of the ascending node in the ECEF frame
+    Omega = Eph["Omega0"] + (Eph["OmegaDot"] - Const.OMEGA_EARTH) * Tk - \
+        Const.OMEGA_EARTH * Eph["Toe"]
+
+    # Position in the orbital plane and ECEF
+    X, Y = R * np.cos(U), R * np.sin(U)
+    SatPos = np.stack((X * np.cos(Omega) - Y * np.cos(I) * np.sin(Omega),
+        X * np.sin(Omega) + Y * np.cos(I) * np.cos(Omega),
+        Y * np.sin(I)), axis=-1)
+
+    # Clock polynomial and relativistic correction
+    Dt = Time - Eph["TocGps"]
+    SatClk = (Eph["Af0"] + Eph["Af1"] * Dt + Eph["Af2"] * Dt**2) * Const.SPEED_OF_LIGHT
+    SatRel = EPH_REL_F * Ecc * Eph["SqrtA"] * SinE * Const.SPEED_OF_LIGHT
+
+    return SatPos, SatClk, SatRel
+
+# End of computeSatPosClk()
+
+def computeSatGeometry(EphInfo, Prn, Time, RcvrXyz):
+
+    # Purpose: compute the satellite positions seen from a receiver,
+    #          at the time of transmission and in the ECEF frame at the
+    #          time of reception (Sagnac effect)
+
+    # Parameters
+    # ==========
+    # EphInfo: dict
+    #         Ephemerides, as given by readRinexNav()
+    # Prn, Time: numpy arrays
+    #         PRNs and GPS times of reception [s]
+    # RcvrXyz: list
+    #         Receiver ECEF position [m]
+
+    # Returns
+    # =======
+    # SatGeom: dict
+    #         "Pos" (..., 3) [m], "Clk" and "Rel" [m], and "Found",
+    #         False where there is no valid ephemeris (NaN values)
+
+    Time = np.asarray(Time, dtype=float)
+    Idx, Found = findEphemeris(EphInfo, Prn, Time)
+    RcvrXyz = np.asarray(RcvrXyz, dtype=float)
+
+    # Signal transit time, from the geometric range
+    Transit = np.full(Time.shape, EPH_TRANSIT_GUESS)
+    for i in range(EPH_TRANSIT_NITER + 1):
+        SatPos, SatClk, SatRel = computeSatPosClk(EphInfo, Idx, Time - Transit)
+        Transit = np.linalg.norm(SatPos - RcvrXyz, axis=-1) / Const.SPEED_OF_LIGHT
+
+    SatPos = rotateEarthTransit(SatPos, Transit)
+    SatPos[~Found] = np.nan
+    SatGeom = OrderedDict({})
+    SatGeom["Pos"] = SatPos
+    SatGeom["Clk"] = np.where(Found, SatClk, np.nan)
+    SatGeom["Rel"] = np.where(Found, SatRel, np.nan)
+    SatGeom["Found"] = Found
+
+    return SatGeom
+
+# End of computeSatGeometry()
+
+def rotateEarthTransit(SatPos, Transit):
+
+    # Purpose: rotate the satellite positions at the time of
+    #          transmission to the ECEF frame at the time of reception
+
+    # Parameters
+    # ==========
+    # SatPos: numpy array
+    #         (..., 3) ECEF positions at the time of transmission [m]
+    # Transit: numpy array
+    #         Signal transit times [s]
+
+    # Returns
+    # =======
+    # SatPos: numpy array
+    #         (..., 3) rotated positions [m]
+
+    # Earth rotation during the transit
+    Theta = Const.OMEGA_EARTH * Transit
+
+    return np.stack((np.cos(Theta) * SatPos[..., 0] + np.sin(Theta) * SatPos[..., 1],
+        -np.sin(Theta) * SatPos[..., 0] + np.cos(Theta) * SatPos[..., 1],
+        SatPos[..., 2]), axis=-1)
+
+# End of rotateEarthTransit()
+
+def computeElevAzim(Rcvr, SatPos):
+
+    # Purpose: compute the elevation and azimuth of satellites
+
+    # Parameters
+    # ==========
+    # Rcvr: list
+    #         Receiver info, as given by readRcvr()
+    # SatPos: numpy array
+    #         (..., 3) ECEF satellite positions [m]
+
+    # Returns
+    # =======
+    # Elev, Azim: numpy arrays
+    #         Elevation [-90, 90] and azimuth [0, 360) [deg]
+
+    Los = np.asarray(SatPos, dtype=float) - np.asarray(Rcvr[RcvrIdx["XYZ"]])
+    Enu = ecef2enuArray(Los, float(Rcvr[RcvrIdx["LON"]]),
+        float(Rcvr[RcvrIdx["LAT"]]))
+
+    Elev = np.degrees(np.arcsin(Enu[..., 2] / np.linalg.norm(Enu, axis=-1)))
+    Azim = np.degrees(np.arctan2(Enu[..., 0], Enu[..., 1])) % 360.0
+
+    return Elev, Azim
+
+# End of computeElevAzim()
+
+def computeDaySatGeometry(EphInfo, Rcvr, Year, Doy, SamplingRate):
+
+    # Purpose: compute the geometry of all the GPS satellites at all
+    #          the epochs of a day, seen from a receiver
+
+    # Parameters
+    # ==========
+    # EphInfo: dict
+    #         Ephemerides, as given by readRinexNav()
+    # Rcvr: list
+    #         Receiver info, as given by readRcvr()
+    # Year, Doy: int
+    #         Day to compute
+    # SamplingRate: int
+    #         Epochs sampling rate [s]
+
+    # Returns
+    # =======
+    # DayGeom: dict
+    #         (NEpochs, MAX_NUM_SATS_CONSTEL) arrays "Elev", "Azim"
+    #         [deg], "Clk", "Rel" [m] and (..., 3) "Pos" [m], with
+    #         column PRN - 1, NaN without ephemeris
+
+    Sod = np.arange(0, Const.S_IN_D, SamplingRate, dtype=float)
+    Day = (convertYearDoy2JulianDayArray(Year, Doy) - Const.JD_0) * Const.S_IN_D
+    Prn = np.arange(1, Const.MAX_NUM_SATS_CONSTEL + 1)
+    Shape = (len(Sod), len(Prn))
+
+    DayGeom = OrderedDict({})
+    DayGeom["SamplingRate"] = SamplingRate
+    for Key in ["Elev", "Azim", "Clk", "Rel"]:
+        DayGeom[Key] = np.empty(Shape)
+    DayGeom["Pos"] = np.empty(Shape + (3,))
+
+    # By batches of epochs, to bound the memory of the intermediate arrays
+    for Start in range(0, len(Sod), EPH_DAY_BATCH):
+        Batch = slice(Start, Start + EPH_DAY_BATCH)
+        Time, BatchPrn = np.broadcast_arrays((Day + Sod[Batch])[:, None],
+            Prn[None, :])
+        SatGeom = computeSatGeometry(EphInfo, BatchPrn, Time, Rcvr[RcvrIdx["XYZ"]])
+
+        DayGeom["Elev"][Batch], DayGeom["Azim"][Batch] = \
+            computeElevAzim(Rcvr, SatGeom["Pos"])
+        DayGeom["Pos"][Batch] = SatGeom["Pos"]
+        DayGeom["Clk"][Batch] = SatGeom["Clk"]
+        DayGeom["Rel"][Batch] = SatGeom["Rel"]
+
+    return DayGeom
+
+# End of computeDaySatGeometry()
+
+def getEpochSatGeometry(DayGeom, Sod):
+
+    # Purpose: get the geometry of the satellites at one epoch of the day
+
+    # Returns
+    # =======
+    # SatGeomInfo: dict
+    #         Per satellite label: "Elev", "Azim", "Pos", "Clk", "Rel",
+    #         only for satellites with a valid ephemeris
+
+    Row = int(round(Sod / DayGeom["SamplingRate"]))
+
+    SatGeomInfo = OrderedDict({})
+    if Row < 0 or Row >= len(DayGeom["Elev"]):
+        return SatGeomInfo
+
+    for Col in np.flatnonzero(~np.isnan(DayGeom["Clk"][Row])).tolist():
+        SatGeomInfo["G%02d" % (Col + 1)] = {
+            "Elev": float(DayGeom["Elev"][Row, Col]),
+            "Azim": float(DayGeom["Azim"][Row, Col]),
+            "Pos": DayGeom["Pos"][Row, Col],
+            "Clk": float(DayGeom["Clk"][Row, Col]),
+            "Rel": float(DayGeom["Rel"][Row, Col]),
+        }
+
+    return SatGeomInfo
+
+# End of getEpochSatGeometry()
+
+def readEpochsSatGeometry(OrbitInfo, Rcvr, Epochs, FillElevAzim=False,
+    computeGeometry=computeSatGeometry):
+
+    # Purpose: add the satellite geometry to a stream of OBS epochs,
+    #          computed for all the satellites of EPH_DAY_BATCH epochs
+    #          at once
+
+    # Parameters
+    # ==========
+    # OrbitInfo: dict
+    #         Orbits: ephemerides, as given by readRinexNav(), or
+    #         precise orbits, as given by buildSp3Segments()
+    # Rcvr: list
+    #         Receiver info, as given by readRcvr()
+    # Epochs: iterable
+    #         OBS epochs, as given by readObsEpochs() or
+    #         readRinexObsEpochs()
+    # FillElevAzim: bool
+    #         If True, the ELEV and AZIM columns of the epochs are
+    #         replaced by the computed ones (NO_ORBIT_ELEV and
+    #         NO_ORBIT_AZIM without orbit)
+    # computeGeometry: function
+    #         Geometry of the orbits, as computeSatGeometry() for the
+    #         ephemerides or computeSp3SatGeometry() for precise orbits
+
+    # Returns
+    # =======
+    # Generator of (EpochInfo, SatGeomInfo), with SatGeomInfo as given
+    # by getEpochSatGeometry()
+
+    Batch = []
+    for EpochInfo in Epochs:
+        Batch.append(EpochInfo)
+        if len(Batch) < EPH_DAY_BATCH:
+            continue
+
+        for Epoch in computeEpochsSatGeometry(OrbitInfo, Rcvr, Batch,
+            FillElevAzim, computeGeometry):
+            yield Epoch
+        Batch = []
+
+    for Epoch in computeEpochsSatGeometry(OrbitInfo, Rcvr, Batch,
+        FillElevAzim, computeGeometry):
+        yield Epoch
+
+# End of readEpochsSatGeometry()
+
+def computeEpochsSatGeometry(OrbitInfo, Rcvr, Batch, FillElevAzim, computeGeometry):
+
+    # Purpose: compute the satellite geometry of all the rows of a
+    #          batch of OBS epochs
+
+    # Returns
+    # =======
+    # List of (EpochInfo, SatGeomInfo)
+
+    Rows = [Row for EpochInfo in Batch for Row in EpochInfo]
+    if not Rows:
+        return [(EpochInfo, OrderedDict({})) for EpochInfo in Batch]
+
+    Sod = np.array([float(Row[ObsIdx["SOD"]]) for Row in Rows])
+    Doy = np.array([int(Row[ObsIdx["DOY"]]) for Row in Rows])
+    Year = np.array([int(Row[ObsIdx["YEAR"]]) for Row in Rows])
+    Prn = np.array([int(Row[ObsIdx["PRN"]]) if Row[ObsIdx["CONST"]] == "G" else 0
+        for Row in Rows])
+
+    Time = (convertYearDoy2JulianDayArray(Year, Doy) - Const.JD_0) * \
+        Const.S_IN_D + Sod
+    SatGeom = computeGeometry(OrbitInfo, Prn, Time, Rcvr[RcvrIdx["XYZ"]])
+    Elev, Azim = computeElevAzim(Rcvr, SatGeom["Pos"])
+
+    Found = SatGeom["Found"].tolist()
+    Clk = SatGeom["Clk"].tolist()
+    Rel = SatGeom["Rel"].tolist()
+    Elev = Elev.tolist()
+    Azim = Azim.tolist()
+
+    Epochs = []
+    i = 0
+    for EpochInfo in Batch:
+        SatGeomInfo = OrderedDict({})
+        for Row in EpochInfo:
+            if FillElevAzim:
+                Row[ObsIdx["ELEV"]] = Elev[i] if Found[i] else NO_ORBIT_ELEV
+                Row[ObsIdx["AZIM"]] = Azim[i] if Found[i] else NO_ORBIT_AZIM
+            if Found[i]:
+                SatGeomInfo[Row[ObsIdx["CONST"]] + "%02d" % int(Row[ObsIdx["PRN"]])] = {
+                    "Elev": Elev[i],
+                    "Azim": Azim[i],
+                    "Pos": SatGeom["Pos"][i],
+                    "Clk": Clk[i],
+                    "Rel": Rel[i],
+                }
+            i = i + 1
+        Epochs.append((EpochInfo, SatGeomInfo))
+
+    return Epochs
+
+# End of computeEpochsSatGeometry()
+
+########################################################################
+# END OF EPHEMERIS FUNCTIONS MODULE
+########################################################################
@@ -0,0 +1,241 @@
+#!/usr/bin/env python
+
+########################################################################
+# PETRUS/SRC/Geometry.py:
+# This is the Geometry (DOP) Module of PETRUS tool
+#
+#  Project:        PETRUS
+#  File:           Geometry.py
+#  Date(YY/MM/DD): 01/02/21
+#
+#   Author: GNSS Academy
+#   Copyright 2021 GNSS Academy
+#
+# -----------------------------------------------------------------
+# Date       | Author             | Action
+# -----------------------------------------------------------------
+#
+# The Elevation and Azimuth of the satellites used by each epoch are
+# buffered while the Preprocessing runs. The Line-of-Sight matrices,
+# the DOPs and, if requested, the Protection Levels are then computed
+# for GEOMETRY_BATCH epochs at once, as stacks of matrices, instead of
+# epoch by epoch.
+########################################################################
+
+
+# Import External and Internal functions and Libraries
+#----------------------------------------------------------------------
+import sys, os
+from collections import OrderedDict
+import numpy as np
+from COMMON import GnssConstants as Const
+from COMMON.Uere import lookupUereVariance
+from Integrity import computeProtectionLevels
+
+# Number of epochs processed at once
+GEOMETRY_BATCH = 3600
+
+def initGeometryInfo():
+
+    # Purpose: initialize the buffer of epoch geometries
+
+    # Returns
+    # =======
+    # GeomInfo: dict
+    #         Dictionary containing one entry per buffered epoch
+
+    GeomInfo = {
+        "Sod": [],     # SoD of the epochs
+        "Elev": [],    # Elevations of the used sats [deg]
+        "Azim": [],    # Azimuths of the used sats [deg]
+    }
+
+    return GeomInfo
+
+# End of initGeometryInfo()
+
+def updateGeometryInfo(GeomInfo, PreproObsInfo):
+
+    # Purpose: buffer the geometry of the current epoch, with the
+    #          valid satellites whose smoothing has converged
+
+    # Parameters
+    # ==========
+    # GeomInfo: dict
+    #         Dictionary containing the buffered epochs
+    # PreproObsInfo: dict
+    #         Dictionary containing Preprocessing info for the
+    #         current epoch
+
+    # Returns
+    # =======
+    # Nothing, GeomInfo is updated
+
+    Elev = []
+    Azim = []
+    for SatPreproObs in PreproObsInfo.values():
+        Sod = SatPreproObs["Sod"]
+        if SatPreproObs["ValidL1"] == 1 and SatPreproObs["Status"] == 1:
+            Elev.append(SatPreproObs["Elevation"])
+            Azim.append(SatPreproObs["Azimuth"])
+
+    if len(PreproObsInfo) > 0:
+        GeomInfo["Sod"].append(Sod)
+        GeomInfo["Elev"].append(Elev)
+        GeomInfo["Azim"].append(Azim)
+
+# End of updateGeometryInfo()
+
+def packEpochGeometry(ElevList, AzimList):
+
+    # Purpose: pack the per-epoch lists of satellites in padded arrays
+
+    # Parameters
+    # ==========
+    # ElevList, AzimList: list
+    #         Elevations and azimuths of each epoch [deg]
+
+    # Returns
+    # =======
+    # Elev, Azim: numpy arrays
+    #         (NEpochs, NMaxSats) arrays, NaN where there is no sat
+    # NSats: numpy array
+    #         Number of satellites of each epoch
+
+    NSats = np.array([len(EpochElev) for EpochElev in ElevList], dtype=int)
+    NMaxSats = max(NSats.max(initial=0), 1)
+
+    Elev = np.full((len(ElevList), NMaxSats), np.nan)
+    Azim = np.full((len(ElevList), NMaxSats), np.nan)
+
+    # Scatter all the satellites at once
+    Filled = np.arange(NMaxSats) < NSats[:, None]
+    if NSats.sum() > 0:
+        Elev[Filled] = np.concatenate(ElevList)
+        Azim[Filled] = np.concatenate(AzimList)
+
+    return Elev, Azim, NSats
+
+# End of packEpochGeometry()
+
+def buildLosMatrices(Elev, Azim):
+
+    # Purpose: build the Line-of-Sight (geometry) matrices in the
+    #          local ENU frame, with the receiver clock column
+
+    # Parameters
+    # ==========
+    # Elev, Azim: numpy arrays
+    #         (NEpochs, NMaxSats) elevations and azimuths [deg],
+    #         NaN where there is no satellite
+
+    # Returns
+    # =======
+    # G: numpy array
+    #         (NEpochs, NMaxSats, 4) matrices, rows of missing
+    #         satellites are zero and do not contribute
+
+    ElevRad = np.radians(Elev)
+    AzimRad = np.radians(Azim)
+
+    G = np.empty(Elev.shape + (4,))
+    G[..., 0] = -np.cos(ElevRad) * np.sin(AzimRad)
+    G[..., 1] = -np.cos(ElevRad) * np.cos(AzimRad)
+    G[..., 2] = -np.sin(ElevRad)
+    G[..., 3] = 1.0
+
+    G[np.isnan(Elev)] = 0.0
+
+    return G
+
+# End of buildLosMatrices()
+
+def computeDop(G, NSats, W=None):
+
+    # Purpose: compute the DOPs of a stack of geometry matrices
+
+    # Parameters
+    # ==========
+    # G: numpy array
+    #         (NEpochs, NMaxSats, 4) geometry matrices
+    # NSats: numpy array
+    #         Number of satellites of each epoch
+    # W: numpy array
+    #         (NEpochs, NMaxSats) weights, or None for unweighted DOPs
+
+    # Returns
+    # =======
+    # Dop: dict
+    #         GDOP, PDOP, HDOP, VDOP and TDOP of each epoch, NaN where
+    #         the geometry cannot be solved
+
+    # Stacked 4x4 normal matrices
+    Gt = np.swapaxes(G, 1, 2)
+    if W is None:
+        N = np.matmul(Gt, G)
+    else:
+        N = np.matmul(Gt * W[:, None, :], G)
+
+    # Only epochs with enough satellites and a regular matrix
+    Valid = (NSats >= Const.MIN_NUM_SATS_PVT) & (np.abs(np.linalg.det(N)) > 1e-12)
+
+    Q = np.full(N.shape, np.nan)
+    if Valid.any():
+        Q[Valid] = np.linalg.inv(N[Valid])
+
+    Dop = OrderedDict({})
+    Dop["GDOP"] = np.sqrt(np.trace(Q, axis1=1, axis2=2))
+    Dop["PDOP"] = np.sqrt(Q[:, 0, 0] + Q[:, 1, 1] + Q[:, 2, 2])
+    Dop["HDOP"] = np.sqrt(Q[:, 0, 0] + Q[:, 1, 1])
+    Dop["VDOP"] = np.sqrt(Q[:, 2, 2])
+    Dop["TDOP"] = np.sqrt(Q[:, 3, 3])
+
+    return Dop
+
+# End of computeDop()
+
+def computeGeometryBatch(GeomInfo, UereLut=None):
+
+    # Purpose: compute the DOPs of the buffered epochs and empty
+    #          the buffer
+
+    # Parameters
+    # ==========
+    # GeomInfo: dict
+    #         Dictionary containing the buffered epochs
+    # UereLut: dict
+    #         UERE look-up table, as given by buildUereLut(), to
+    #         compute the Protection Levels, or None
+
+    # Returns
+    # =======
+    # DopInfo: dict
+    #         SoD, number of satellites and DOPs of each epoch, and
+    #         HPL and VPL if UereLut is given
+
+    Elev, Azim, NSats = packEpochGeometry(GeomInfo["Elev"], GeomInfo["Azim"])
+    G = buildLosMatrices(Elev, Azim)
+
+    DopInfo = OrderedDict({})
+    DopInfo["SOD"] = np.array(GeomInfo["Sod"])
+    DopInfo["NSATS"] = NSats
+    DopInfo.update(computeDop(G, NSats))
+
+    if UereLut is not None:
+        # Weights from the UERE table (0 where there is no sat)
+        Used = ~np.isnan(Elev)
+        W = np.zeros(Elev.shape)
+        W[Used] = 1.0 / lookupUereVariance(UereLut, Elev[Used])
+        DopInfo["HPL"], DopInfo["VPL"] = computeProtectionLevels(G, W)
+
+    # Empty the buffer
+    for Key in GeomInfo:
+        GeomInfo[Key] = []
+
+    return DopInfo
+
+# End of computeGeometryBatch()
+
+########################################################################
+# END OF GEOMETRY FUNCTIONS MODULE
+########################################################################
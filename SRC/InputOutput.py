@@ -22,9 +22,12 @@
 #----------------------------------------------------------------------
 import sys, os
 from collections import OrderedDict
+from itertools import groupby
 from COMMON.Dates import convertYearMonthDay2JulianDay
+from COMMON.Dates import convertSod2Ns
 from COMMON import GnssConstants as Const
 from COMMON.Coordinates import llh2xyz
+from COMMON.Combinations import COMB_NAMES
 
 
 # Input interfaces
@@ -35,6 +38,43 @@ VALUE = 1
 TH = 1
 CSNEPOCHS = 2
 
+# Service Levels
+SERVICE_LEVELS = ["OS", "APVI", "LPV200", "CATI", "NPA", "MARITIME", "CUSTOM"]
+
+# Service Level parameters
+SrvIdx = OrderedDict({})
+SrvIdx["ON"]=0
+SrvIdx["HAL"]=1
+SrvIdx["VAL"]=2
+SrvIdx["HPE95"]=3
+SrvIdx["VPE95"]=4
+SrvIdx["VPE1E7"]=5
+SrvIdx["AVAI"]=6
+SrvIdx["CONT"]=7
+SrvIdx["CINT"]=8
+
+# Default values of the optional configuration parameters
+ConfDefaults = OrderedDict({})
+ConfDefaults["PLOTS_NPROC"] = 1
+ConfDefaults["MPP_LUT_STEP"] = 0
+ConfDefaults["AATR_OUT"] = 0
+ConfDefaults["IONO_GRID_OUT"] = 0
+ConfDefaults["IONO_GRID"] = [5.0, 5.0, 300.0]
+ConfDefaults["IONO_GRID_NPROC"] = 1
+ConfDefaults["DOP_OUT"] = 0
+ConfDefaults["SERVICE_OUT"] = 0
+ConfDefaults["USR_GRID_OUT"] = 0
+ConfDefaults["USR_GRID"] = [30.0, 70.0, -20.0, 40.0, 2.5, 2.5]
+ConfDefaults["USR_GRID_RATE"] = 300
+ConfDefaults["COMB_OUT"] = 0
+ConfDefaults["COMB_LIST"] = list(COMB_NAMES)
+ConfDefaults["TEC_OUT"] = 0
+ConfDefaults["TEC_MIN_ARC"] = 600
+ConfDefaults["MPATH_OUT"] = 0
+ConfDefaults["MPATH_BINS"] = [5.0, 20.0, 60.0, 2.0]
+ConfDefaults["HATCH_DIV_PERSIST"] = 5
+ConfDefaults["PVT_OUT"] = 0
+
 # RCVR file columns
 RcvrIdx = OrderedDict({})
 RcvrIdx["ACR"]=0
@@ -98,6 +138,137 @@ PreproIdx["GEOM FREE"]=17
 PreproIdx["VTEC RATE"]=18
 PreproIdx["iAATR"]=19
 
+# AATR
+# Header
+AatrHdr = "\
+# SOD DOY NSATS     AATR  AATR5MIN    AATR1H  VTECRATERMS\n"
+
+# Line format
+AatrFmt = "%05d %03d %5d %8.3f %9.3f %9.3f %12.3f".split()
+
+# File columns
+AatrIdx = OrderedDict({})
+AatrIdx["SOD"]=0
+AatrIdx["DOY"]=1
+AatrIdx["NSATS"]=2
+AatrIdx["AATR"]=3
+AatrIdx["AATR5MIN"]=4
+AatrIdx["AATR1H"]=5
+AatrIdx["VTECRATERMS"]=6
+
+# IONO GRID
+# Header
+IonoGridHdr = "\
+# SOD DOY     LAT      LON NSAMPLES VTECRATE VTECRATERMS MAXVTECRATE     AATR\n"
+
+# Line format
+IonoGridFmt = "%05d %03d %7.2f %8.2f %8d %8.3f %11.3f %11.3f %8.3f".split()
+
+# USER GRID
+# Header
+UsrGridHdr = "\
+# USER     LAT      LON NEPOCHS MINNSATS AVGNSATS  AVGPDOP  MAXPDOP  SOLAVAIL\n"
+
+# Line format
+UsrGridFmt = "%6d %7.2f %8.2f %7d %8d %8.3f %8.3f %8.3f %9.3f".split()
+
+# USER GRID SERVICE LEVELS
+# Header
+UsrGridSrvHdr = "\
+# USER     LAT      LON SERVICE      AVAIL  CONTRISK COMPLIANT\n"
+
+# Line format
+UsrGridSrvFmt = "%6d %7.2f %8.2f %-9s %9.3f %9.2e %9d".split()
+
+# DOP
+# Header
+DopHdr = "\
+# SOD DOY NSATS     GDOP     PDOP     HDOP     VDOP     TDOP AVAIL\n"
+
+# Line format
+DopFmt = "%05d %03d %5d %8.3f %8.3f %8.3f %8.3f %8.3f %5d".split()
+
+# SERVICE LEVELS
+# Header (the accuracies are NaN, and NHMI, NVMI and COMPLIANT -1, when
+# they are not evaluated)
+ServiceLevelsHdr = "\
+# SERVICE  NEPOCHS    AVAIL  CONTRISK    HPE95    VPE95   VPE1E7  NHMI  NVMI COMPLIANT\n"
+
+# Line format
+ServiceLevelsFmt = "%-9s %8d %8.3f %9.2e %8.3f %8.3f %8.3f %5d %5d %9d".split()
+
+# AATR daily statistics
+# Header
+AatrStatsHdr = "\
+# RCVR YEAR DOY NEPOCHS NSAMPLES  RMSAATR  MAXAATR MAXSOD MAXAATR5MIN MAXAATR1H RMSVTECRATE MAXVTECRATE\n"
+
+# Line format
+AatrStatsFmt = "%4s %4d %03d %7d %8d %8.3f %8.3f %06.0f %11.3f %9.3f %11.3f %11.3f".split()
+
+# CORR
+# Header
+CorrHdr = "\
+# SOD DOY C PRN    ELEV     AZIM FLAG      SMOOTHC1    TROPO     IONO      PRC      LTC          SATCLK      REL          CORRC1 SIGMAUERE\n"
+
+# Line format
+CorrFmt = "%05d %03d %s %02d %8.3f %8.3f %4d "\
+    "%15.3f %8.3f %8.3f %8.3f %8.3f %15.3f %8.3f %15.3f %9.3f".split()
+
+# File columns
+CorrIdx = OrderedDict({})
+CorrIdx["SOD"]=0
+CorrIdx["DOY"]=1
+CorrIdx["CONST"]=2
+CorrIdx["PRN"]=3
+CorrIdx["ELEV"]=4
+CorrIdx["AZIM"]=5
+CorrIdx["FLAG"]=6
+CorrIdx["SMOOTHC1"]=7
+CorrIdx["TROPO"]=8
+CorrIdx["IONO"]=9
+CorrIdx["PRC"]=10
+CorrIdx["LTC"]=11
+CorrIdx["SATCLK"]=12
+CorrIdx["REL"]=13
+CorrIdx["CORRC1"]=14
+CorrIdx["SIGMAUERE"]=15
+
+# PVT
+# Header
+PvtHdr = "\
+# SOD DOY NSATS SOL NITER          LON          LAT        ALT           CLK      EPE      NPE      UPE      HPE      VPE     PDOP      HPL      VPL\n"
+
+# Line format
+PvtFmt = "%05d %03d %5d %3d %5d %12.7f %12.7f %10.3f %13.3f "\
+    "%8.3f %8.3f %8.3f %8.3f %8.3f %8.3f %8.3f %8.3f".split()
+
+# COMB
+# Header of the fixed columns, followed by those of COMB_LIST
+CombHdr = "# SOD DOY C PRN FLAG"
+
+# Line format of the fixed columns, and of each combination
+CombFmt = "%05d %03d %s %02d %4d".split()
+CombValueFmt = "%15.3f"
+
+# MPATH
+# Header
+MpathHdr = "\
+#  ELEV   CN0 PRN  NSAMPLES    MEAN     STD  MEDIAN   ABS68   ABS95\n"
+
+# Line format
+MpathFmt = "%6.1f %5.1f %3d %9d %7.3f %7.3f %7.3f %7.3f %7.3f".split()
+
+# TEC
+# Header
+TecHdr = "\
+# SOD DOY C PRN    ELEV   IPPLON   IPPLAT ARCLEN     STEC     VTEC LEVSTD\n"
+
+# Line format
+TecFmt = "%05d %03d %s %02d %8.3f %8.3f %8.3f %6d %8.3f %8.3f %6.3f".split()
+
+# Number of lines formatted before writing them at once
+OUTPUT_BUFFER_LINES = 10000
+
 # Rejection causes flags
 REJECTION_CAUSE = OrderedDict({})
 REJECTION_CAUSE["NCHANNELS_GPS"]=1
@@ -110,6 +281,7 @@ REJECTION_CAUSE["MAX_PHASE_RATE"]=7
 REJECTION_CAUSE["MAX_PHASE_RATE_STEP"]=8
 REJECTION_CAUSE["MAX_CODE_RATE"]=9
 REJECTION_CAUSE["MAX_CODE_RATE_STEP"]=10
+REJECTION_CAUSE["HATCH_DIV"]=11
 
 REJECTION_CAUSE_DESC = OrderedDict({})
 REJECTION_CAUSE_DESC["1: Number of Channels for GPS"]=1
@@ -122,6 +294,7 @@ REJECTION_CAUSE_DESC["7: Maximum Phase Rate"]=7
 REJECTION_CAUSE_DESC["8: Maximum Phase Rate Step"]=8
 REJECTION_CAUSE_DESC["9: Maximum Code Rate"]=9
 REJECTION_CAUSE_DESC["10: Maximum Code Rate Step"]=10
+REJECTION_CAUSE_DESC["11: Hatch Divergence"]=11
 
 # Input functions
 #----------------------------------------------------------------------
@@ -326,7 +499,8 @@ def readConf(CfgFile):
                         #-------------------------------------------
                         elif Key=='SAMPLING_RATE':
                             # Check parameter and load it in Conf
-                            Conf[Key] = checkConfParam(Key, Fields, 1, 1, [1], [Const.S_IN_D])
+                            # (sub-second for high-rate data)
+                            Conf[Key] = checkConfParam(Key, Fields, 1, 1, [1e-3], [Const.S_IN_D])
 
                             # Increment number of read parameters
                             NReadParams = NReadParams + 1
@@ -402,6 +576,125 @@ def readConf(CfgFile):
                             # Increment number of read parameters
                             NReadParams = NReadParams + 1
 
+                        # AATR outputs selection [0:OFF (Default)|1:ON]
+                        #--------------------------------------------------------------------
+                        elif Key=='AATR_OUT':
+                            # Check parameter and load it in Conf
+                            Conf[Key] = checkConfParam(Key, Fields, 1, 1, [0], [1])
+
+                            # Increment number of read parameters
+                            NReadParams = NReadParams + 1
+
+                        # DOP outputs selection [0:OFF (Default)|1:ON]
+                        #--------------------------------------------------------------------
+                        elif Key=='DOP_OUT':
+                            # Check parameter and load it in Conf
+                            Conf[Key] = checkConfParam(Key, Fields, 1, 1, [0], [1])
+
+                            # Increment number of read parameters
+                            NReadParams = NReadParams + 1
+
+                        # Service Levels outputs selection [0:OFF (Default)|1:ON]
+                        # Availability and continuity of the activated
+                        # Service Levels from the Protection Levels
+                        #--------------------------------------------------------------------
+                        elif Key=='SERVICE_OUT':
+                            # Check parameter and load it in Conf
+                            Conf[Key] = checkConfParam(Key, Fields, 1, 1, [0], [1])
+
+                            # Increment number of read parameters
+                            NReadParams = NReadParams + 1
+
+                        # Network Ionospheric Grid outputs selection [0:OFF (Default)|1:ON]
+                        # Requires PREPRO_OUT
+                        #--------------------------------------------------------------------
+                        elif Key=='IONO_GRID_OUT':
+                            # Check parameter and load it in Conf
+                            Conf[Key] = checkConfParam(Key, Fields, 1, 1, [0], [1])
+
+                            # Increment number of read parameters
+                            NReadParams = NReadParams + 1
+
+                        # Network Ionospheric Grid definition
+                        #----------------------------------------
+                        # p1: Latitude resolution [deg]
+                        # p2: Longitude resolution [deg]
+                        # p3: Time bin [s]
+                        # Default: 5 5 300
+                        #----------------------------------------
+                        elif Key=='IONO_GRID':
+                            # Check parameter and load it in Conf
+                            Conf[Key] = checkConfParam(Key, Fields, 3, 3,
+                            [0.1, 0.1, 1], [90, 180, Const.S_IN_D])
+
+                            # Increment number of read parameters
+                            NReadParams = NReadParams + 1
+
+                        # Number of processes building the Ionospheric Grid
+                        #--------------------------------------------------------------------
+                        # 0: One process per CPU
+                        # 1: Serial processing in the main process (Default)
+                        # N: N processes
+                        #--------------------------------------------------------------------
+                        elif Key=='IONO_GRID_NPROC':
+                            # Check parameter and load it in Conf
+                            Conf[Key] = checkConfParam(Key, Fields, 1, 1, [0], [64])
+
+                            # Increment number of read parameters
+                            NReadParams = NReadParams + 1
+
+                        # User Grid simulation outputs selection [0:OFF (Default)|1:ON]
+                        # Visibility, DOPs and Service Levels availability of
+                        # the users of USR_GRID, from the SP3, NAV or YUMA
+                        # almanac orbits of the day
+                        #--------------------------------------------------------------------
+                        elif Key=='USR_GRID_OUT':
+                            # Check parameter and load it in Conf
+                            Conf[Key] = checkConfParam(Key, Fields, 1, 1, [0], [1])
+
+                            # Increment number of read parameters
+                            NReadParams = NReadParams + 1
+
+                        # User Grid definition
+                        #----------------------------------------
+                        # p1, p2: Minimum and maximum latitude [deg]
+                        # p3, p4: Minimum and maximum longitude [deg]
+                        # p5: Latitude resolution [deg]
+                        # p6: Longitude resolution [deg]
+                        # Default: 30 70 -20 40 2.5 2.5
+                        #----------------------------------------
+                        elif Key=='USR_GRID':
+                            # Check parameter and load it in Conf
+                            Conf[Key] = checkConfParam(Key, Fields, 6, 6,
+                            [Const.MIN_LAT, Const.MIN_LAT, Const.MIN_LON, Const.MIN_LON, 0.1, 0.1],
+                            [Const.MAX_LAT, Const.MAX_LAT, Const.MAX_LON, Const.MAX_LON, 90, 180])
+
+                            # Increment number of read parameters
+                            NReadParams = NReadParams + 1
+
+                        # User Grid simulation sampling rate [s]
+                        # Default: 300
+                        #----------------------------------------
+                        elif Key=='USR_GRID_RATE':
+                            # Check parameter and load it in Conf
+                            Conf[Key] = checkConfParam(Key, Fields, 1, 1, [1], [Const.S_IN_D])
+
+                            # Increment number of read parameters
+                            NReadParams = NReadParams + 1
+
+                        # Number of processes rendering the figures
+                        #--------------------------------------------------------------------
+                        # 0: One process per CPU
+                        # 1: Serial rendering in the main process (Default)
+                        # N: N processes
+                        #--------------------------------------------------------------------
+                        elif Key=='PLOTS_NPROC':
+                            # Check parameter and load it in Conf
+                            Conf[Key] = checkConfParam(Key, Fields, 1, 1, [0], [64])
+
+                            # Increment number of read parameters
+                            NReadParams = NReadParams + 1
+
                         # Corrected outputs selection [0:OFF|1:ON]
                         #--------------------------------------------------------------------       
                         elif Key=='CORR_OUT':
@@ -411,6 +704,101 @@ def readConf(CfgFile):
                             # Increment number of read parameters
                             NReadParams = NReadParams + 1
 
+                        # PVT outputs selection [0:OFF (Default)|1:ON]
+                        # WLSQ solution of the corrected measurements and its
+                        # position errors, with the NAV or SP3 orbits
+                        #--------------------------------------------------------------------
+                        elif Key=='PVT_OUT':
+                            # Check parameter and load it in Conf
+                            Conf[Key] = checkConfParam(Key, Fields, 1, 1, [0], [1])
+
+                            # Increment number of read parameters
+                            NReadParams = NReadParams + 1
+
+                        # Dual-Frequency combinations outputs selection [0:OFF (Default)|1:ON]
+                        #--------------------------------------------------------------------
+                        elif Key=='COMB_OUT':
+                            # Check parameter and load it in Conf
+                            Conf[Key] = checkConfParam(Key, Fields, 1, 1, [0], [1])
+
+                            # Increment number of read parameters
+                            NReadParams = NReadParams + 1
+
+                        # Dual-Frequency combinations to output
+                        #--------------------------------------------------------------------
+                        # CODE1 PHASE1: L1 code and phase [m]
+                        # IF_CODE IF_PHASE: Ionosphere-free
+                        # GF_CODE GF_PHASE: Geometry-free
+                        # WL_CODE WL_PHASE NL_CODE NL_PHASE: Wide-lane and narrow-lane
+                        # MW: Melbourne-Wubbena
+                        # DF_PHASE: Divergence-free L1 phase
+                        # SMOOTH_CODE1 SMOOTH_DFREE SMOOTH_IFREE: Hatch smoothed codes
+                        # Default: all of them
+                        #--------------------------------------------------------------------
+                        elif Key=='COMB_LIST':
+                            # Check parameter and load it in Conf
+                            Conf[Key] = checkConfParam(Key, Fields, 1, len(COMB_NAMES),
+                            [None] * len(COMB_NAMES), [None] * len(COMB_NAMES))
+                            if not isinstance(Conf[Key], list):
+                                Conf[Key] = [Conf[Key]]
+
+                            # Check the combinations
+                            for Name in Conf[Key]:
+                                if Name not in COMB_NAMES:
+                                    sys.stderr.write("ERROR: Unknown combination %s "\
+                                    "in %s. Available: %s\n" % (Name, Key, " ".join(COMB_NAMES)))
+                                    sys.exit(-1)
+
+                            # Increment number of read parameters
+                            NReadParams = NReadParams + 1
+
+                        # Levelled TEC outputs selection [0:OFF (Default)|1:ON]
+                        # Slant and vertical TEC from the geometry-free phase
+                        # levelled to the code along each arc
+                        #--------------------------------------------------------------------
+                        elif Key=='TEC_OUT':
+                            # Check parameter and load it in Conf
+                            Conf[Key] = checkConfParam(Key, Fields, 1, 1, [0], [1])
+
+                            # Increment number of read parameters
+                            NReadParams = NReadParams + 1
+
+                        # Minimum length of the levelled arcs [s]
+                        # Default: 600
+                        #----------------------------------------
+                        elif Key=='TEC_MIN_ARC':
+                            # Check parameter and load it in Conf
+                            Conf[Key] = checkConfParam(Key, Fields, 1, 1, [0], [Const.S_IN_D])
+
+                            # Increment number of read parameters
+                            NReadParams = NReadParams + 1
+
+                        # Code multipath statistics outputs selection [0:OFF (Default)|1:ON]
+                        # Statistics of C1 - SmoothC1 per elevation, C/N0 and
+                        # PRN, with mergeable summary files per RCVR and day
+                        #--------------------------------------------------------------------
+                        elif Key=='MPATH_OUT':
+                            # Check parameter and load it in Conf
+                            Conf[Key] = checkConfParam(Key, Fields, 1, 1, [0], [1])
+
+                            # Increment number of read parameters
+                            NReadParams = NReadParams + 1
+
+                        # Code multipath statistics bins
+                        #----------------------------------------
+                        # p1: Elevation resolution [deg]
+                        # p2, p3: Minimum and maximum C/N0 [dB-Hz]
+                        # p4: C/N0 resolution [dB-Hz]
+                        # Default: 5 20 60 2
+                        #----------------------------------------
+                        elif Key=='MPATH_BINS':
+                            # Check parameter and load it in Conf
+                            Conf[Key] = checkConfParam(Key, Fields, 4, 4,
+                            [0.1, 0, 0, 0.1], [90, 100, 100, 100])
+
+                            # Increment number of read parameters
+                            NReadParams = NReadParams + 1
+
                         # Rx Position Information [STATIC|DYN]
                         #-----------------------------------------------
                         # STAT: RIMS static positions
@@ -636,7 +1024,9 @@ def readConf(CfgFile):
                             # Increment number of read parameters
                             NReadParams = NReadParams + 1
 
-                        # Hatch filter Divergence Epochs to reset [s]
+                        # Hatch filter Divergence averaging time [s]
+                        # The divergence is the average of the code minus
+                        # carrier over this time, minus its mean in the arc
                         #---------------------------------------------
                         elif Key== 'HATCH_DIV_TIME':
                             # Check parameter and load it in Conf
@@ -646,6 +1036,34 @@ def readConf(CfgFile):
                             # Increment number of read parameters
                             NReadParams = NReadParams + 1
 
+                        # Hatch filter Divergence persistence time [s]
+                        # The satellite is rejected and the filter reset
+                        # when the divergence exceeds HATCH_DIV_TH during
+                        # this time
+                        # Default: 5
+                        #---------------------------------------------
+                        elif Key== 'HATCH_DIV_PERSIST':
+                            # Check parameter and load it in Conf
+                            Conf[Key] = checkConfParam(Key, Fields, 1, 1, 
+                            [0], [Const.S_IN_D])
+
+                            # Increment number of read parameters
+                            NReadParams = NReadParams + 1
+
+                        # Iono Mapping Function look-up table step [deg]
+                        #------------------------------------------------
+                        # 0: OFF, exact computation (Default)
+                        # >0: Linear interpolation in a table with this
+                        #     elevation step (e.g. 0.01)
+                        #------------------------------------------------
+                        elif Key== 'MPP_LUT_STEP':
+                            # Check parameter and load it in Conf
+                            Conf[Key] = checkConfParam(Key, Fields, 1, 1, 
+                            [0], [1])
+
+                            # Increment number of read parameters
+                            NReadParams = NReadParams + 1
+
                         # Max. Number of interations for Navigation Solution
                         #----------------------------------------------------
                         elif Key== 'MAX_LSQ_ITER': 
@@ -789,8 +1207,14 @@ def processConf(Conf):
     # =======
     # Conf: dict
     #         Dictionary containing configuration with
-    #         Julian Days
+    #         Julian Days and default values of the optional
+    #         parameters not present in the conf file
     
+    # Set default values of the optional parameters
+    for Key, Value in ConfDefaults.items():
+        if Key not in Conf:
+            Conf[Key] = Value
+
     ConfCopy = Conf.copy()
     for Key in ConfCopy:
         Value = ConfCopy[Key]
@@ -942,7 +1366,8 @@ def readObsEpoch(f):
     if(not Line):
         return []
     LineSplit = splitLine(Line)
-    Sod = LineSplit[ObsIdx["SOD"]]
+    # SODs compared in integer ns, not as text
+    Sod = convertSod2Ns(LineSplit[ObsIdx["SOD"]])
     SodNext = Sod
 
     while SodNext == Sod:
@@ -951,7 +1376,7 @@ def readObsEpoch(f):
         Line = f.readline()
         LineSplit = splitLine(Line)
         try: 
-            SodNext = LineSplit[ObsIdx["SOD"]]
+            SodNext = convertSod2Ns(LineSplit[ObsIdx["SOD"]])
 
         except:
             return EpochInfo
@@ -962,6 +1387,34 @@ def readObsEpoch(f):
 
 # End of readObsEpoch()
 
+def readObsEpochs(ObsFile):
+
+    # Purpose: stream the epochs of an OBS file
+
+    # Parameters
+    # ==========
+    # ObsFile: str
+    #         Path to the OBS file
+
+    # Returns
+    # =======
+    # Generator of EpochInfo, as given by readObsEpoch()
+
+    with open(ObsFile, 'r') as f:
+        # Read header line of OBS file
+        f.readline()
+
+        # Group the consecutive lines of the same SOD, reading the file
+        # sequentially (high-rate files have millions of epochs)
+        # The SODs are compared in integer ns, not as text, so that
+        # "1.0" and "1.000" are the same epoch
+        Rows = (Line.split() for Line in f)
+        for SodNs, EpochInfo in groupby((Row for Row in Rows if Row),
+            key=lambda Row: convertSod2Ns(Row[ObsIdx["SOD"]])):
+            yield list(EpochInfo)
+
+# End of readObsEpochs()
+
 
 def createOutputFile(Path, Hdr):
     
@@ -997,14 +1450,119 @@ def createOutputFile(Path, Hdr):
 # End of createOutputFile()
 
 
-def generatePreproFile(fpreprobs, PreproObsInfo):
+def setSodFormat(SamplingRate):
+
+    # Purpose: set the format of the SOD of the epoch outputs (PREPRO,
+    #          AATR, DOP, CORR, PVT, COMB and TEC) to the resolution of
+    #          the sampling rate: integer seconds, or fixed-point seconds
+    #          with the decimals of a sub-second rate (up to ns)
+
+    # Parameters
+    # ==========
+    # SamplingRate: float
+    #         Sampling rate of the scenario [s]
+
+    # Returns
+    # =======
+    # Nothing, the output formats are updated
+
+    Decimals = 0
+    while Decimals < 9 and \
+        abs(SamplingRate * 10**Decimals - round(SamplingRate * 10**Decimals)) > 1e-6:
+        Decimals = Decimals + 1
+
+    if Decimals == 0:
+        SodFmt = "%05d"
+    else:
+        SodFmt = "%%0%d.%df" % (6 + Decimals, Decimals)
+
+    for Fmt in [PreproFmt, AatrFmt, DopFmt, CorrFmt, PvtFmt, CombFmt,
+        TecFmt]:
+        Fmt[0] = SodFmt
+
+# End of setSodFormat()
+
+def initOutputBuffer(f, Fmt, LineEnd="\n"):
+
+    # Purpose: initialize the buffer of formatted lines of an output
+    #          file, written at once every OUTPUT_BUFFER_LINES lines
+
+    # Parameters
+    # ==========
+    # f: file descriptor
+    #         Descriptor of output file
+    # Fmt: list
+    #         Format of each field
+    # LineEnd: str
+    #         End of each line
+
+    # Returns
+    # =======
+    # Buffer: dict
+    #         Dictionary containing the file, the line format and
+    #         the pending lines
+
+    Buffer = {
+        "File": f,
+        "LineFmt": "".join([Field + " " for Field in Fmt]) + LineEnd,
+        "Lines": [],
+    }
+
+    return Buffer
+
+# End of initOutputBuffer()
+
+def writeOutputBuffer(Buffer, Rows):
+
+    # Purpose: format the rows (tuples of fields) in the buffer and
+    #          write the buffer when it is full
+
+    # Parameters
+    # ==========
+    # Buffer: dict
+    #         Output buffer, as given by initOutputBuffer()
+    # Rows: iterable
+    #         Tuples of fields
+
+    # Returns
+    # =======
+    # Nothing
+
+    LineFmt = Buffer["LineFmt"]
+    Buffer["Lines"].extend([LineFmt % Row for Row in Rows])
+
+    if len(Buffer["Lines"]) >= OUTPUT_BUFFER_LINES:
+        flushOutputBuffer(Buffer)
+
+# End of writeOutputBuffer()
+
+def flushOutputBuffer(Buffer):
+
+    # Purpose: write the pending lines of the buffer
+
+    Buffer["File"].write("".join(Buffer["Lines"]))
+    Buffer["Lines"] = []
+
+# End of flushOutputBuffer()
+
+def closeOutputBuffer(Buffer):
+
+    # Purpose: write the pending lines and close the output file
+
+    flushOutputBuffer(Buffer)
+    Buffer["File"].close()
+
+# End of closeOutputBuffer()
+
+def generatePreproFile(PreproBuffer, PreproObsInfo):
 
     # Purpose: generate output file with Preprocessing results
 
     # Parameters
     # ==========
-    # fpreprobs: file descriptor
-    #         Descriptor for PREPRO OBS output file
+    # PreproBuffer: dict
+    #         Output buffer of the PREPRO OBS file, as given by
+    #         initOutputBuffer(fpreprobs, PreproFmt, "\n\n")
     # PreproObsInfo: dict
     #         Dictionary containing Preprocessing info for the 
     #         current epoch
@@ -1013,40 +1571,374 @@ def generatePreproFile(fpreprobs, PreproObsInfo):
     # =======
     # Nothing
 
-    # Loop over satellites
-
-    for SatLabel, SatPreproObs in PreproObsInfo.items():
-        # Prepare outputs
-        Outputs = OrderedDict({})
-        Outputs["SOD"] = SatPreproObs["Sod"]
-        Outputs["DOY"] = SatPreproObs["Doy"]
-        Outputs["CONST"] = SatLabel[0]
-        Outputs["PRN"] = int(SatLabel[1:])
-        Outputs["ELEV"] = SatPreproObs["Elevation"]
-        Outputs["AZIM"] = SatPreproObs["Azimuth"]
-        Outputs["VALID"] = SatPreproObs["ValidL1"]
-        Outputs["REJECT"] = SatPreproObs["RejectionCause"]
-        Outputs["STATUS"] = SatPreproObs["Status"]
-        Outputs["C1"] = SatPreproObs["C1"]
-        Outputs["C1SMOOTHED"] = SatPreproObs["SmoothC1"]
-        Outputs["L1"] = SatPreproObs["L1Meters"]
-        Outputs["S1"] = SatPreproObs["S1"]
-        Outputs["CODE RATE"] = SatPreproObs["RangeRateL1"]
-        Outputs["CODE ACC"] = SatPreproObs["RangeRateStepL1"]
-        Outputs["PHASE RATE"] = SatPreproObs["PhaseRateL1"]
-        Outputs["PHASE ACC"] = SatPreproObs["PhaseRateStepL1"]
-        Outputs["GEOM FREE"] = SatPreproObs["GeomFree"]
-        Outputs["VTEC RATE"] = SatPreproObs["VtecRate"]
-        Outputs["iAATR"] = SatPreproObs["iAATR"]
+    # One row per satellite, with the fields in PreproIdx order
+    writeOutputBuffer(PreproBuffer, [(
+        SatPreproObs["Sod"],
+        SatPreproObs["Doy"],
+        SatLabel[0],
+        int(SatLabel[1:]),
+        SatPreproObs["Elevation"],
+        SatPreproObs["Azimuth"],
+        SatPreproObs["ValidL1"],
+        SatPreproObs["RejectionCause"],
+        SatPreproObs["Status"],
+        SatPreproObs["C1"],
+        SatPreproObs["SmoothC1"],
+        SatPreproObs["L1Meters"],
+        SatPreproObs["S1"],
+        SatPreproObs["RangeRateL1"],
+        SatPreproObs["RangeRateStepL1"],
+        SatPreproObs["PhaseRateL1"],
+        SatPreproObs["PhaseRateStepL1"],
+        SatPreproObs["GeomFree"],
+        SatPreproObs["VtecRate"],
+        SatPreproObs["iAATR"],
+        ) for SatLabel, SatPreproObs in PreproObsInfo.items()])
+
+# End of generatePreproFile
+
+def generateCorrFile(CorrBuffer, CorrInfo):
+
+    # Purpose: generate output file with the corrected measurements of
+    #          a batch of epochs
+
+    # Parameters
+    # ==========
+    # CorrBuffer: dict
+    #         Output buffer of the CORR file, as given by
+    #         initOutputBuffer(fcorr, CorrFmt)
+    # CorrInfo: dict
+    #         Columns of the corrected measurements, as given by
+    #         computeCorrectionsBatch()
+
+    # Returns
+    # =======
+    # Nothing
+
+    writeOutputBuffer(CorrBuffer, zip(*[Column.tolist()
+        if hasattr(Column, "tolist") else Column
+        for Column in CorrInfo.values()]))
+
+# End of generateCorrFile
+
+def generatePvtFile(PvtBuffer, PvtOut):
+
+    # Purpose: generate output file with the PVT solution of a batch of
+    #          epochs
+
+    # Parameters
+    # ==========
+    # PvtBuffer: dict
+    #         Output buffer of the PVT file, as given by
+    #         initOutputBuffer(fpvt, PvtFmt)
+    # PvtOut: dict
+    #         Columns of the PVT solution, as given by
+    #         computePvtBatch()
+
+    # Returns
+    # =======
+    # Nothing
+
+    writeOutputBuffer(PvtBuffer, zip(*[Column.tolist()
+        for Column in PvtOut.values()]))
+
+# End of generatePvtFile
+
+def getCombOutputFormat(Names):
+
+    # Purpose: build the header and line format of the COMB file
+
+    # Parameters
+    # ==========
+    # Names: list
+    #         Combinations of the file, as COMB_LIST
+
+    # Returns
+    # =======
+    # Hdr: str
+    #         File header
+    # Fmt: list
+    #         Format of each field
+
+    Hdr = CombHdr + "".join([" %15s" % Name for Name in Names]) + "\n"
+    Fmt = CombFmt + [CombValueFmt] * len(Names)
+
+    return Hdr, Fmt
+
+# End of getCombOutputFormat()
+
+def generateCombFile(CombBuffer, CombOut):
+
+    # Purpose: generate output file with the Dual-Frequency
+    #          combinations of a batch of epochs
+
+    # Parameters
+    # ==========
+    # CombBuffer: dict
+    #         Output buffer of the COMB file, as given by
+    #         initOutputBuffer(fcomb, Fmt) with the format of
+    #         getCombOutputFormat()
+    # CombOut: dict
+    #         Columns of the combinations, as given by
+    #         computeCombinationsBatch()
+
+    # Returns
+    # =======
+    # Nothing
+
+    writeOutputBuffer(CombBuffer, zip(*[Column.tolist()
+        if hasattr(Column, "tolist") else Column
+        for Column in CombOut.values()]))
+
+# End of generateCombFile
+
+def generateTecFile(TecBuffer, TecOut):
+
+    # Purpose: generate output file with the levelled TEC of the arcs
+    #          ended in a batch of epochs
+
+    # Parameters
+    # ==========
+    # TecBuffer: dict
+    #         Output buffer of the TEC file, as given by
+    #         initOutputBuffer(ftec, TecFmt)
+    # TecOut: dict
+    #         Columns of the levelled TEC, as given by
+    #         computeLevellingBatch()
+
+    # Returns
+    # =======
+    # Nothing
+
+    writeOutputBuffer(TecBuffer, zip(*[Column.tolist()
+        for Column in TecOut.values()]))
+
+# End of generateTecFile
+
+def generateAatrFile(faatr, AatrInfo, Doy):
+
+    # Purpose: write the current epoch of the AATR output file
+
+    # Parameters
+    # ==========
+    # faatr: file descriptor
+    #         Descriptor for AATR output file
+    # AatrInfo: dict
+    #         Dictionary containing the AATR aggregator state
+    # Doy: int
+    #         Day of Year
+
+    # Returns
+    # =======
+    # Nothing
+
+    # Epochs without any satellite contributing are not written
+    if AatrInfo["NSats"] == 0:
+        return
+
+    # Prepare outputs
+    Outputs = OrderedDict({})
+    Outputs["SOD"] = AatrInfo["Sod"]
+    Outputs["DOY"] = Doy
+    Outputs["NSATS"] = AatrInfo["NSats"]
+    Outputs["AATR"] = AatrInfo["Aatr"]
+    Outputs["AATR5MIN"] = AatrInfo["Windows"]["5MIN"]["Aatr"]
+    Outputs["AATR1H"] = AatrInfo["Windows"]["1H"]["Aatr"]
+    Outputs["VTECRATERMS"] = AatrInfo["VtecRateRms"]
+
+    # Write line
+    for i, result in enumerate(Outputs):
+        faatr.write(((AatrFmt[i] + " ") % Outputs[result]))
+
+    faatr.write("\n")
+
+# End of generateAatrFile
+
+def generateAatrStatsFile(fstats, Rcvr, Year, Doy, AatrStats):
+
+    # Purpose: write the daily AATR statistics of one receiver
+
+    # Parameters
+    # ==========
+    # fstats: file descriptor
+    #         Descriptor for AATR statistics output file
+    # Rcvr: str
+    #         Receiver acronym
+    # Year: int
+    #         Year
+    # Doy: int
+    #         Day of Year
+    # AatrStats: dict
+    #         Dictionary containing the daily statistics
+
+    # Returns
+    # =======
+    # Nothing
+
+    Outputs = [Rcvr, Year, Doy] + list(AatrStats.values())
+
+    # Write line
+    for i, result in enumerate(Outputs):
+        fstats.write(((AatrStatsFmt[i] + " ") % result))
+
+    fstats.write("\n")
+
+# End of generateAatrStatsFile
+
+def generateDopFile(fdop, DopInfo, Doy, PdopMax):
+
+    # Purpose: write a batch of epochs of the DOP output file
+
+    # Parameters
+    # ==========
+    # fdop: file descriptor
+    #         Descriptor for DOP output file
+    # DopInfo: dict
+    #         SoD, number of satellites and DOPs of each epoch, as
+    #         given by computeGeometryBatch()
+    # Doy: int
+    #         Day of Year
+    # PdopMax: float
+    #         Maximum PDOP for the geometry to be available
+
+    # Returns
+    # =======
+    # Nothing
+
+    # Line format
+    LineFmt = " ".join(DopFmt) + "\n"
+
+    # Geometry availability (NaN PDOPs are not available)
+    Avail = DopInfo["PDOP"] <= PdopMax
+
+    # Loop over epochs
+    for Epoch in zip(DopInfo["SOD"], DopInfo["NSATS"], DopInfo["GDOP"],
+        DopInfo["PDOP"], DopInfo["HDOP"], DopInfo["VDOP"], DopInfo["TDOP"],
+        Avail):
+        # Write line
+        fdop.write(LineFmt % ((Epoch[0], Doy) + Epoch[1:]))
+
+# End of generateDopFile
+
+def generateServiceLevelsFile(fsrv, SrvPerf):
+
+    # Purpose: write the performances of the activated Service Levels
+
+    # Parameters
+    # ==========
+    # fsrv: file descriptor
+    #         Descriptor for SERVICE LEVELS output file
+    # SrvPerf: dict
+    #         Performances of each service, as given by
+    #         computeServiceLevels()
+
+    # Returns
+    # =======
+    # Nothing
+
+    # Line format
+    LineFmt = " ".join(ServiceLevelsFmt) + "\n"
 
+    # Loop over services
+    for Service in zip(*SrvPerf.values()):
         # Write line
-        for i, result in enumerate(Outputs):
-            fpreprobs.write(((PreproFmt[i] + " ") % Outputs[result]))
+        fsrv.write(LineFmt % Service)
 
-        fpreprobs.write("\n")
-        fpreprobs.write("\n")
+# End of generateServiceLevelsFile
 
-# End of generatePreproFile
+def generateMpathFile(fmpath, MpathModel):
+
+    # Purpose: write the code multipath statistics of each non-empty
+    #          (elevation, C/N0, PRN) cell
+
+    # Parameters
+    # ==========
+    # fmpath: file descriptor
+    #         Descriptor for MPATH STATS output file
+    # MpathModel: dict
+    #         Statistics of each cell, as given by computeMpathModel()
+
+    # Returns
+    # =======
+    # Nothing
+
+    # Line format
+    LineFmt = " ".join(MpathFmt) + "\n"
+
+    # Write all the cells at once
+    fmpath.write("".join([LineFmt % Cell for Cell in zip(*[Column.tolist()
+        for Column in MpathModel.values()])]))
+
+# End of generateMpathFile
+
+def generateIonoGridFile(fgrid, GridStats, Doy):
+
+    # Purpose: write the non-empty cells of the Ionospheric Grid
+
+    # Parameters
+    # ==========
+    # fgrid: file descriptor
+    #         Descriptor for IONO GRID output file
+    # GridStats: dict
+    #         Statistics of the non-empty cells, as given by
+    #         computeIonoGridCells()
+    # Doy: int
+    #         Day of Year
+
+    # Returns
+    # =======
+    # Nothing
+
+    # Line format
+    LineFmt = " ".join(IonoGridFmt) + "\n"
+
+    # Loop over cells
+    for Cell in zip(GridStats["SOD"], GridStats["LAT"], GridStats["LON"],
+        GridStats["NSAMPLES"], GridStats["VTECRATE"],
+        GridStats["VTECRATERMS"], GridStats["MAXVTECRATE"],
+        GridStats["AATR"]):
+        # Write line
+        fgrid.write(LineFmt % ((Cell[0], Doy) + Cell[1:]))
+
+# End of generateIonoGridFile
+
+def generateUsrGridFiles(fgrid, fsrv, UsrGridInfo):
+
+    # Purpose: write the geometry and the Service Levels of the users
+    #          of the User Grid
+
+    # Parameters
+    # ==========
+    # fgrid, fsrv: file descriptors
+    #         Descriptors for USER GRID and USER GRID SERVICE LEVELS
+    #         output files
+    # UsrGridInfo: dict
+    #         Results of each user, as given by simulateUserGrid()
+
+    # Returns
+    # =======
+    # Nothing
+
+    # Line formats
+    GridFmt = " ".join(UsrGridFmt) + "\n"
+    SrvFmt = " ".join(UsrGridSrvFmt) + "\n"
+
+    # Loop over users
+    for User in range(len(UsrGridInfo["LAT"])):
+        # Write lines
+        fgrid.write(GridFmt % (User, UsrGridInfo["LAT"][User],
+            UsrGridInfo["LON"][User], UsrGridInfo["NEPOCHS"],
+            UsrGridInfo["MINNSATS"][User], UsrGridInfo["AVGNSATS"][User],
+            UsrGridInfo["AVGPDOP"][User], UsrGridInfo["MAXPDOP"][User],
+            UsrGridInfo["SOLAVAIL"][User]))
+
+        for Srv, Service in enumerate(UsrGridInfo["SERVICE"]):
+            fsrv.write(SrvFmt % (User, UsrGridInfo["LAT"][User],
+                UsrGridInfo["LON"][User], Service,
+                UsrGridInfo["AVAIL"][User, Srv], UsrGridInfo["CONTRISK"][User, Srv],
+                UsrGridInfo["COMPLIANT"][User, Srv]))
+
+# End of generateUsrGridFiles
 
 def rejectSatsMinElevation(PreproObsInfo,NVisSats,MaxChannels):
 
@@ -0,0 +1,317 @@
+#!/usr/bin/env python
+
+########################################################################
+# PETRUS/SRC/Integrity.py:
+# This is the Integrity and Service Levels Module of PETRUS tool
+#
+#  Project:        PETRUS
+#  File:           Integrity.py
+#  Date(YY/MM/DD): 01/02/21
+#
+#   Author: GNSS Academy
+#   Copyright 2021 GNSS Academy
+#
+# -----------------------------------------------------------------
+# Date       | Author             | Action
+# -----------------------------------------------------------------
+#
+# The Protection Levels of a batch of epochs are computed from their
+# stacked weighted geometry matrices. All the activated Service Levels
+# are evaluated at once on (service, epoch) arrays, and only counters
+# and Position Error histograms are kept between batches, so that the
+# statistics of many receivers and days can be accumulated and merged
+# in a fixed amount of memory. The accuracy, the integrity and the
+# compliance are only evaluated when the Position Errors of all the
+# epochs are known.
+########################################################################
+
+
+# Import External and Internal functions and Libraries
+#----------------------------------------------------------------------
+import sys, os
+from collections import OrderedDict
+import numpy as np
+from COMMON import GnssConstants as Const
+from InputOutput import SERVICE_LEVELS
+from InputOutput import SrvIdx
+
+# Position Error histograms: bin size and upper limit [m]
+# (larger errors are kept in the last bin)
+PE_HIST_STEP = 0.01
+PE_HIST_MAX = 100.0
+
+def computeProtectionLevels(G, W):
+
+    # Purpose: compute the HPL and VPL of a stack of epochs
+    #          Ref.: RTCA MOPS DO-229 Appendix J
+
+    # Parameters
+    # ==========
+    # G: numpy array
+    #         (NEpochs, NMaxSats, 4) geometry matrices in the local
+    #         ENU frame, with zero rows where there is no satellite
+    # W: numpy array
+    #         (NEpochs, NMaxSats) weights (inverse of the variances of
+    #         the measurements [m^-2]), 0 where there is no satellite
+
+    # Returns
+    # =======
+    # Hpl, Vpl: numpy arrays
+    #         Protection Levels of each epoch [m], NaN where the
+    #         geometry cannot be solved
+
+    NSats = np.sum(W > 0, axis=1)
+
+    # Stacked weighted normal matrices
+    N = np.matmul(np.swapaxes(G, 1, 2) * W[:, None, :], G)
+    Valid = (NSats >= Const.MIN_NUM_SATS_PVT) & (np.abs(np.linalg.det(N)) > 1e-12)
+
+    D = np.full(N.shape, np.nan)
+    if Valid.any():
+        D[Valid] = np.linalg.inv(N[Valid])
+
+    # Semi-major axis of the horizontal error ellipse
+    DEast2 = D[:, 0, 0]
+    DNorth2 = D[:, 1, 1]
+    DEastNorth = D[:, 0, 1]
+    DMajor = np.sqrt((DEast2 + DNorth2) / 2 + \
+        np.sqrt(((DEast2 - DNorth2) / 2)**2 + DEastNorth**2))
+
+    Hpl = Const.MOPS_KH_PA * DMajor
+    Vpl = Const.MOPS_KV_PA * np.sqrt(D[:, 2, 2])
+
+    return Hpl, Vpl
+
+# End of computeProtectionLevels()
+
+def initIntegrityInfo(Conf):
+
+    # Purpose: initialize the Service Levels accumulator with the
+    #          activated Service Levels of the configuration
+
+    # Parameters
+    # ==========
+    # Conf: dict
+    #         Configuration dictionary
+
+    # Returns
+    # =======
+    # IntegrityInfo: dict
+    #         Dictionary containing the thresholds of the activated
+    #         Service Levels, and their counters and histograms
+
+    Services = [Service for Service in SERVICE_LEVELS
+        if Service in Conf and Conf[Service][SrvIdx["ON"]] == 1]
+    NServices = len(Services)
+    NBins = int(round(PE_HIST_MAX / PE_HIST_STEP))
+
+    IntegrityInfo = OrderedDict({})
+    IntegrityInfo["Services"] = Services
+    IntegrityInfo["SamplingRate"] = Conf["SAMPLING_RATE"]
+
+    # Thresholds, one per service
+    for Threshold in ["HAL", "VAL", "HPE95", "VPE95", "VPE1E7", "AVAI",
+        "CONT", "CINT"]:
+        IntegrityInfo[Threshold] = np.array(
+            [Conf[Service][SrvIdx[Threshold]] for Service in Services],
+            dtype=float)
+
+    # Counters, one per service
+    IntegrityInfo["NEpochs"] = 0                          # Processed epochs
+    IntegrityInfo["NPeEpochs"] = 0                        # With known PEs
+    IntegrityInfo["NAvail"] = np.zeros(NServices, dtype=int)   # Available
+    IntegrityInfo["NLoss"] = np.zeros(NServices, dtype=int)    # Losses of service
+    IntegrityInfo["NHmi"] = np.zeros(NServices, dtype=int)     # HPE > HPL
+    IntegrityInfo["NVmi"] = np.zeros(NServices, dtype=int)     # VPE > VPL
+    IntegrityInfo["LastAvail"] = np.zeros(NServices, dtype=bool)
+
+    # Histograms of the Position Errors of the available epochs
+    IntegrityInfo["HpeHist"] = np.zeros((NServices, NBins), dtype=int)
+    IntegrityInfo["VpeHist"] = np.zeros((NServices, NBins), dtype=int)
+
+    return IntegrityInfo
+
+# End of initIntegrityInfo()
+
+def updateIntegrityInfo(IntegrityInfo, Sol, Hpl, Vpl, Hpe=None, Vpe=None):
+
+    # Purpose: evaluate a batch of consecutive epochs against all the
+    #          activated Service Levels and accumulate the results
+
+    # Parameters
+    # ==========
+    # IntegrityInfo: dict
+    #         Dictionary containing the Service Levels accumulator
+    # Sol: numpy array
+    #         Epochs with solution
+    # Hpl, Vpl: numpy arrays
+    #         Protection Levels [m]
+    # Hpe, Vpe: numpy arrays
+    #         Horizontal and Vertical Position Errors [m], or None if
+    #         they are not known (no accuracy nor integrity results)
+
+    # Returns
+    # =======
+    # Nothing, IntegrityInfo is updated
+
+    NServices = len(IntegrityInfo["Services"])
+    NEpochs = len(Sol)
+    if NServices == 0 or NEpochs == 0:
+        IntegrityInfo["NEpochs"] += NEpochs
+        if Hpe is not None and Vpe is not None:
+            IntegrityInfo["NPeEpochs"] += NEpochs
+        return
+
+    HAL = IntegrityInfo["HAL"][:, None]
+    VAL = IntegrityInfo["VAL"][:, None]
+
+    # (service, epoch) availability, the alarm limits set to -1 do
+    # not apply (NaN PLs are not available)
+    Avail = Sol[None, :] & \
+        ((HAL < 0) | (Hpl[None, :] <= HAL)) & \
+        ((VAL < 0) | (Vpl[None, :] <= VAL))
+
+    IntegrityInfo["NEpochs"] += NEpochs
+    IntegrityInfo["NAvail"] += np.sum(Avail, axis=1)
+
+    # Losses of service, continuing from the previous batch
+    Prev = np.concatenate((IntegrityInfo["LastAvail"][:, None],
+        Avail[:, :-1]), axis=1)
+    IntegrityInfo["NLoss"] += np.sum(Prev & ~Avail, axis=1)
+    IntegrityInfo["LastAvail"] = Avail[:, -1].copy()
+
+    if Hpe is None or Vpe is None:
+        return
+
+    IntegrityInfo["NPeEpochs"] += NEpochs
+    Hpe = np.abs(Hpe)
+    Vpe = np.abs(Vpe)
+
+    # Misleading Information
+    IntegrityInfo["NHmi"] += np.sum(Avail & (Hpe > Hpl)[None, :], axis=1)
+    IntegrityInfo["NVmi"] += np.sum(Avail & (Vpe > Vpl)[None, :], axis=1)
+
+    # Histograms of all the services at once, on flat indices
+    NBins = IntegrityInfo["HpeHist"].shape[1]
+    Service = np.nonzero(Avail)[0]
+    for Hist, Pe in [("HpeHist", Hpe), ("VpeHist", Vpe)]:
+        # Only the available epochs, with a solution, are binned
+        Bin = np.minimum((np.broadcast_to(Pe, Avail.shape)[Avail] / \
+            PE_HIST_STEP).astype(int), NBins - 1)
+        FlatIdx = Service * NBins + Bin
+        IntegrityInfo[Hist] += np.bincount(FlatIdx,
+            minlength=NServices * NBins).reshape(NServices, NBins)
+
+# End of updateIntegrityInfo()
+
+def mergeIntegrityInfo(IntegrityInfo, Other):
+
+    # Purpose: add the counters and histograms of other accumulator
+    #          (e.g. of other receiver or day) with the same services
+
+    # Parameters
+    # ==========
+    # IntegrityInfo: dict
+    #         Dictionary containing the Service Levels accumulator
+    # Other: dict
+    #         Accumulator to be merged
+
+    # Returns
+    # =======
+    # Nothing, IntegrityInfo is updated
+
+    for Key in ["NEpochs", "NPeEpochs", "NAvail", "NLoss", "NHmi", "NVmi",
+        "HpeHist", "VpeHist"]:
+        IntegrityInfo[Key] = IntegrityInfo[Key] + Other[Key]
+
+# End of mergeIntegrityInfo()
+
+def computeHistPercentile(Hist, Percentile):
+
+    # Purpose: compute a percentile of the Position Errors of each
+    #          service from their histograms (upper edge of the bin)
+
+    # Parameters
+    # ==========
+    # Hist: numpy array
+    #         (NServices, NBins) histograms
+    # Percentile: float
+    #         Percentile [%]
+
+    # Returns
+    # =======
+    # Pe: numpy array
+    #         Percentile of each service [m], NaN if no samples
+
+    NSamples = np.sum(Hist, axis=1)
+    Cumulative = np.cumsum(Hist, axis=1)
+
+    # First bin reaching the percentile
+    Bin = np.argmax(Cumulative >= (Percentile / 100.0) * NSamples[:, None],
+        axis=1)
+
+    return np.where(NSamples > 0, (Bin + 1) * PE_HIST_STEP, np.nan)
+
+# End of computeHistPercentile()
+
+def computeServiceLevels(IntegrityInfo):
+
+    # Purpose: compute the performances of the activated Service
+    #          Levels and check them against their requirements
+
+    # Parameters
+    # ==========
+    # IntegrityInfo: dict
+    #         Dictionary containing the Service Levels accumulator
+
+    # Returns
+    # =======
+    # SrvPerf: dict
+    #         Performances and compliance of each service (NaN
+    #         accuracies, -1 MIs and -1 compliance when they are not
+    #         evaluated)
+
+    NEpochs = max(IntegrityInfo["NEpochs"], 1)
+    NAvail = IntegrityInfo["NAvail"]
+
+    SrvPerf = OrderedDict({})
+    SrvPerf["SERVICE"] = IntegrityInfo["Services"]
+    SrvPerf["NEPOCHS"] = np.full(len(NAvail), IntegrityInfo["NEpochs"])
+    SrvPerf["AVAIL"] = 100.0 * NAvail / NEpochs
+
+    # Continuity risk: losses of service per CINT seconds of service
+    AvailTime = np.maximum(NAvail, 1) * IntegrityInfo["SamplingRate"]
+    SrvPerf["CONTRISK"] = IntegrityInfo["NLoss"] * IntegrityInfo["CINT"] / \
+        AvailTime
+
+    SrvPerf["HPE95"] = computeHistPercentile(IntegrityInfo["HpeHist"], 95.0)
+    SrvPerf["VPE95"] = computeHistPercentile(IntegrityInfo["VpeHist"], 95.0)
+    SrvPerf["VPE1E7"] = computeHistPercentile(IntegrityInfo["VpeHist"],
+        100.0 * (1 - 1e-7))
+    # The Misleading Information is not evaluated without Position Errors
+    PeKnown = IntegrityInfo["NPeEpochs"] > 0
+    SrvPerf["NHMI"] = np.where(PeKnown, IntegrityInfo["NHmi"], -1)
+    SrvPerf["NVMI"] = np.where(PeKnown, IntegrityInfo["NVmi"], -1)
+
+    # Compliance with all the requirements (-1: not applicable). The
+    # accuracies are NaN without available epochs, which does not meet
+    # their requirements
+    Compliant = (SrvPerf["AVAIL"] >= IntegrityInfo["AVAI"]) & \
+        (SrvPerf["CONTRISK"] <= IntegrityInfo["CONT"]) & \
+        (IntegrityInfo["NHmi"] + IntegrityInfo["NVmi"] == 0)
+    for Pe in ["HPE95", "VPE95", "VPE1E7"]:
+        Compliant &= (IntegrityInfo[Pe] < 0) | (SrvPerf[Pe] <= IntegrityInfo[Pe])
+
+    # The compliance is only evaluated (1: compliant, 0: not compliant)
+    # when the Position Errors of all the epochs are known
+    Evaluated = IntegrityInfo["NEpochs"] > 0 and \
+        IntegrityInfo["NPeEpochs"] == IntegrityInfo["NEpochs"]
+    SrvPerf["COMPLIANT"] = np.where(Evaluated, Compliant.astype(int), -1)
+
+    return SrvPerf
+
+# End of computeServiceLevels()
+
+########################################################################
+# END OF INTEGRITY FUNCTIONS MODULE
+########################################################################
@@ -0,0 +1,372 @@
+#!/usr/bin/env python
+
+########################################################################
+# PETRUS/SRC/IonoGrid.py:
+# This is the Ionospheric Grid Module of PETRUS tool
+#
+#  Project:        PETRUS
+#  File:           IonoGrid.py
+#  Date(YY/MM/DD): 01/02/21
+#
+#   Author: GNSS Academy
+#   Copyright 2021 GNSS Academy
+#
+# -----------------------------------------------------------------
+# Date       | Author             | Action
+# -----------------------------------------------------------------
+#
+# Combines the VTEC Rate and iAATR of all the receivers in a network
+# into a Lat/Lon grid per time bin. The samples are located at their
+# Ionospheric Pierce Point and accumulated in the cells as running
+# sums, so that the partial grids of every receiver can be computed
+# in parallel and merged by just adding them.
+#
+# The grids are sparse: only the cells with samples are kept, as a
+# sorted array of their flat indices and the sums of each of them, so
+# that the memory of a receiver grid does not depend on the grid
+# resolution but on the cells its IPPs cross.
+########################################################################
+
+
+# Import External and Internal functions and Libraries
+#----------------------------------------------------------------------
+import sys, os
+import multiprocessing
+from collections import OrderedDict
+import numpy as np
+from COMMON import GnssConstants as Const
+from COMMON.Iono import computeIonoPiercePoint
+from InputOutput import RcvrIdx
+from InputOutput import PreproIdx
+
+# Number of PREPRO OBS rows read at once
+IONO_GRID_CHUNK = 100000
+
+# Accumulated quantities of each grid cell
+IONO_GRID_SUMS = [
+    "NSamples",      # Number of samples
+    "SumVtecRate",   # Sum of the VTEC Rates
+    "SumVtecRate2",  # Sum of the squared VTEC Rates
+    "SumAatr2",      # Sum of the squared iAATR
+]
+
+def initIonoGrid(LatRes, LonRes, TimeBin):
+
+    # Purpose: initialize an empty ionospheric grid
+
+    # Parameters
+    # ==========
+    # LatRes: float
+    #         Latitude resolution of the grid [deg]
+    # LonRes: float
+    #         Longitude resolution of the grid [deg]
+    # TimeBin: float
+    #         Length of the time bins [s]
+
+    # Returns
+    # =======
+    # IonoGrid: dict
+    #         Dictionary containing the grid definition and the
+    #         running sums of the non-empty cells, by increasing flat
+    #         index of (time bin, latitude, longitude)
+
+    IonoGrid = OrderedDict({})
+    IonoGrid["LatRes"] = LatRes
+    IonoGrid["LonRes"] = LonRes
+    IonoGrid["TimeBin"] = TimeBin
+    IonoGrid["NLat"] = int(np.ceil((Const.MAX_LAT - Const.MIN_LAT) / LatRes))
+    IonoGrid["NLon"] = int(np.ceil((Const.MAX_LON - Const.MIN_LON) / LonRes))
+    IonoGrid["NBins"] = int(np.ceil(Const.S_IN_D / TimeBin))
+
+    IonoGrid["CellIdx"] = np.zeros(0, dtype=np.int64)
+    for Sum in IONO_GRID_SUMS + ["MaxAbsVtecRate"]:
+        IonoGrid[Sum] = np.zeros(0)
+
+    return IonoGrid
+
+# End of initIonoGrid()
+
+def computeIonoGridIndex(IonoGrid, Sod, IppLon, IppLat):
+
+    # Purpose: map the samples to the flat index of their grid cell
+
+    # Parameters
+    # ==========
+    # IonoGrid: dict
+    #         Dictionary containing the grid
+    # Sod: numpy array
+    #         Seconds of day of the samples
+    # IppLon, IppLat: numpy arrays
+    #         IPP longitude and latitude of the samples [deg]
+
+    # Returns
+    # =======
+    # CellIdx: numpy array
+    #         Flat index of the cell of each sample
+
+    BinIdx = np.clip((Sod // IonoGrid["TimeBin"]).astype(int),
+        0, IonoGrid["NBins"] - 1)
+    LatIdx = np.clip(((IppLat - Const.MIN_LAT) // IonoGrid["LatRes"]).astype(int),
+        0, IonoGrid["NLat"] - 1)
+    LonIdx = np.clip(((IppLon - Const.MIN_LON) // IonoGrid["LonRes"]).astype(int),
+        0, IonoGrid["NLon"] - 1)
+
+    return (BinIdx * IonoGrid["NLat"] + LatIdx) * IonoGrid["NLon"] + LonIdx
+
+# End of computeIonoGridIndex()
+
+def accumulateIonoGrid(IonoGrid, CellIdx, VtecRate, Aatr):
+
+    # Purpose: add samples to the running sums of their cells
+
+    # Parameters
+    # ==========
+    # IonoGrid: dict
+    #         Dictionary containing the grid
+    # CellIdx: numpy array
+    #         Flat cell index of the samples
+    # VtecRate: numpy array
+    #         VTEC Rate of the samples [mm/s]
+    # Aatr: numpy array
+    #         iAATR of the samples [mm/s]
+
+    # Returns
+    # =======
+    # Nothing, IonoGrid is updated
+
+    # Sums of the batch in its cells
+    BatchIdx, Cell = np.unique(CellIdx, return_inverse=True)
+    NCells = len(BatchIdx)
+
+    GridCells = OrderedDict({})
+    GridCells["CellIdx"] = BatchIdx
+    GridCells["NSamples"] = np.bincount(Cell, minlength=NCells).astype(float)
+    GridCells["SumVtecRate"] = np.bincount(Cell, VtecRate, NCells)
+    GridCells["SumVtecRate2"] = np.bincount(Cell, VtecRate**2, NCells)
+    GridCells["SumAatr2"] = np.bincount(Cell, Aatr**2, NCells)
+    GridCells["MaxAbsVtecRate"] = np.zeros(NCells)
+    np.maximum.at(GridCells["MaxAbsVtecRate"], Cell, np.abs(VtecRate))
+
+    mergeIonoGrid(IonoGrid, GridCells)
+
+# End of accumulateIonoGrid()
+
+def extractIonoGridCells(IonoGrid):
+
+    # Purpose: extract the non-empty cells of a grid, to exchange
+    #          compact partial sums between processes
+
+    # Parameters
+    # ==========
+    # IonoGrid: dict
+    #         Dictionary containing the grid
+
+    # Returns
+    # =======
+    # GridCells: dict
+    #         Flat index and sums of the non-empty cells
+
+    GridCells = OrderedDict({})
+    GridCells["CellIdx"] = IonoGrid["CellIdx"]
+    for Sum in IONO_GRID_SUMS + ["MaxAbsVtecRate"]:
+        GridCells[Sum] = IonoGrid[Sum]
+
+    return GridCells
+
+# End of extractIonoGridCells()
+
+def mergeIonoGrid(IonoGrid, GridCells):
+
+    # Purpose: merge the partial sums of other grid into the grid
+
+    # Parameters
+    # ==========
+    # IonoGrid: dict
+    #         Dictionary containing the grid
+    # GridCells: dict
+    #         Non-empty cells of a grid with the same definition,
+    #         as given by extractIonoGridCells()
+
+    # Returns
+    # =======
+    # Nothing, IonoGrid is updated
+
+    # Union of the cells of both grids, both sorted
+    CellIdx = np.union1d(IonoGrid["CellIdx"], GridCells["CellIdx"])
+    Own = np.searchsorted(CellIdx, IonoGrid["CellIdx"])
+    Other = np.searchsorted(CellIdx, GridCells["CellIdx"])
+
+    IonoGrid["CellIdx"] = CellIdx
+    for Sum in IONO_GRID_SUMS + ["MaxAbsVtecRate"]:
+        Merged = np.zeros(len(CellIdx))
+        Merged[Own] = IonoGrid[Sum]
+        if Sum == "MaxAbsVtecRate":
+            Merged[Other] = np.maximum(Merged[Other], GridCells[Sum])
+        else:
+            Merged[Other] += GridCells[Sum]
+        IonoGrid[Sum] = Merged
+
+# End of mergeIonoGrid()
+
+def buildRcvrIonoGrid(Args):
+
+    # Purpose: build the partial grid of one receiver from its PREPRO
+    #          OBS file, read in chunks of IONO_GRID_CHUNK rows
+
+    # Parameters
+    # ==========
+    # Args: tuple
+    #         (Rcvr, PreproObsFile, LatRes, LonRes, TimeBin), with
+    #         Rcvr the receiver info as given by readRcvr()
+
+    # Returns
+    # =======
+    # GridCells: dict
+    #         Non-empty cells of the receiver grid
+
+    Rcvr, PreproObsFile, LatRes, LonRes, TimeBin = Args
+
+    # Import pandas only in the stages that need it
+    from pandas import read_csv
+
+    IonoGrid = initIonoGrid(LatRes, LonRes, TimeBin)
+
+    Columns = [
+        PreproIdx["SOD"],
+        PreproIdx["ELEV"],
+        PreproIdx["AZIM"],
+        PreproIdx["VALID"],
+        PreproIdx["VTEC RATE"],
+        PreproIdx["iAATR"],
+    ]
+
+    for Chunk in read_csv(PreproObsFile, delim_whitespace=True, skiprows=1,
+        header=None, usecols=Columns, chunksize=IONO_GRID_CHUNK):
+
+        # Keep the valid samples with iAATR computed
+        Filter = (Chunk[PreproIdx["VALID"]] == 1).to_numpy() & \
+            (Chunk[PreproIdx["iAATR"]] != 0.0).to_numpy()
+        if not Filter.any():
+            continue
+        Chunk = Chunk[Filter]
+
+        # Locate the samples at their IPP
+        IppLon, IppLat = computeIonoPiercePoint(
+            float(Rcvr[RcvrIdx["LON"]]), float(Rcvr[RcvrIdx["LAT"]]),
+            Chunk[PreproIdx["ELEV"]].to_numpy(),
+            Chunk[PreproIdx["AZIM"]].to_numpy())
+
+        CellIdx = computeIonoGridIndex(IonoGrid,
+            Chunk[PreproIdx["SOD"]].to_numpy(), IppLon, IppLat)
+
+        accumulateIonoGrid(IonoGrid, CellIdx,
+            Chunk[PreproIdx["VTEC RATE"]].to_numpy(),
+            Chunk[PreproIdx["iAATR"]].to_numpy())
+
+    return extractIonoGridCells(IonoGrid)
+
+# End of buildRcvrIonoGrid()
+
+def buildIonoGrid(Conf, RcvrInfo, PreproObsFiles):
+
+    # Purpose: build the network ionospheric grid of one day, merging
+    #          the partial grids of all the receivers
+
+    # Parameters
+    # ==========
+    # Conf: dict
+    #         Configuration dictionary
+    # RcvrInfo: dict
+    #         Receivers info as given by readRcvr()
+    # PreproObsFiles: dict
+    #         PREPRO OBS file of each receiver
+
+    # Returns
+    # =======
+    # IonoGrid: dict
+    #         Dictionary containing the network grid
+
+    LatRes, LonRes, TimeBin = Conf["IONO_GRID"]
+
+    IonoGrid = initIonoGrid(LatRes, LonRes, TimeBin)
+
+    ArgsList = [(RcvrInfo[Rcvr], PreproObsFile, LatRes, LonRes, TimeBin)
+        for Rcvr, PreproObsFile in PreproObsFiles.items()]
+
+    NProc = int(Conf["IONO_GRID_NPROC"])
+    if NProc == 0:
+        NProc = os.cpu_count() or 1
+    NProc = min(NProc, len(ArgsList))
+
+    # Receivers whose grid is still to be merged
+    Pending = list(range(len(ArgsList)))
+
+    # The workers are forked, so that Petrus.py is not executed again
+    if NProc > 1 and not "fork" in multiprocessing.get_all_start_methods():
+        sys.stderr.write("WARNING: fork not available, building the "\
+            "ionospheric grid serially\n")
+        NProc = 1
+
+    if NProc > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        from concurrent.futures import as_completed
+
+        try:
+            # Merge each receiver grid as soon as it is available
+            with ProcessPoolExecutor(max_workers=NProc,
+                mp_context=multiprocessing.get_context("fork")) as Pool:
+                Futures = OrderedDict([(Pool.submit(buildRcvrIonoGrid,
+                    ArgsList[Idx]), Idx) for Idx in Pending])
+                for Future in as_completed(Futures):
+                    mergeIonoGrid(IonoGrid, Future.result())
+                    Pending.remove(Futures[Future])
+
+        except Exception as Error:
+            sys.stderr.write("WARNING: parallel ionospheric grid failed (%s), "\
+                "building the remaining receivers serially\n" % Error)
+
+    # Serial building
+    for Idx in Pending:
+        mergeIonoGrid(IonoGrid, buildRcvrIonoGrid(ArgsList[Idx]))
+
+    return IonoGrid
+
+# End of buildIonoGrid()
+
+def computeIonoGridCells(IonoGrid):
+
+    # Purpose: compute the statistics of the non-empty grid cells
+
+    # Parameters
+    # ==========
+    # IonoGrid: dict
+    #         Dictionary containing the grid
+
+    # Returns
+    # =======
+    # GridStats: dict
+    #         Time bin start, cell center and statistics of the
+    #         non-empty cells
+
+    CellIdx = IonoGrid["CellIdx"]
+    BinIdx, LatIdx, LonIdx = np.unravel_index(CellIdx,
+        (IonoGrid["NBins"], IonoGrid["NLat"], IonoGrid["NLon"]))
+    NSamples = IonoGrid["NSamples"]
+
+    GridStats = OrderedDict({})
+    GridStats["SOD"] = BinIdx * IonoGrid["TimeBin"]
+    GridStats["LAT"] = Const.MIN_LAT + (LatIdx + 0.5) * IonoGrid["LatRes"]
+    GridStats["LON"] = Const.MIN_LON + (LonIdx + 0.5) * IonoGrid["LonRes"]
+    GridStats["NSAMPLES"] = NSamples
+    GridStats["VTECRATE"] = IonoGrid["SumVtecRate"] / NSamples
+    GridStats["VTECRATERMS"] = np.sqrt(IonoGrid["SumVtecRate2"] / NSamples)
+    GridStats["MAXVTECRATE"] = IonoGrid["MaxAbsVtecRate"]
+    GridStats["AATR"] = np.sqrt(IonoGrid["SumAatr2"] / NSamples)
+
+    return GridStats
+
+# End of computeIonoGridCells()
+
+########################################################################
+# END OF IONO GRID FUNCTIONS MODULE
+########################################################################
@@ -0,0 +1,263 @@
+#!/usr/bin/env python
+
+########################################################################
+# PETRUS/SRC/Levelling.py:
+# This is the Carrier-to-Code Levelling Module of PETRUS tool
+#
+#  Project:        PETRUS
+#  File:           Levelling.py
+#  Date(YY/MM/DD): 01/02/21
+#
+#   Author: GNSS Academy
+#   Copyright 2021 GNSS Academy
+#
+# -----------------------------------------------------------------
+# Date       | Author             | Action
+# -----------------------------------------------------------------
+#
+# The geometry-free phase is precise but ambiguous, and the
+# geometry-free code is absolute but noisy. Along each continuous arc
+# of a satellite, the phase is levelled to the code with the
+# elevation-weighted mean of their difference:
+#   Offset = sum(W * (GfCode - GfPhase)) / sum(W),  W = sin(Elev)^2
+#   STEC = (GfPhase + Offset) / K,  VTEC = STEC / Mpp
+# which gives the absolute slant and vertical TEC [TECU] at the
+# Ionospheric Pierce Points (the satellite and receiver code biases
+# are not removed).
+#
+# The measurements are buffered while the Preprocessing runs and every
+# TEC_BATCH epochs the arcs that have ended are levelled at once, with
+# grouped reductions over their rows. Only the rows of the arcs still
+# open are kept for the next batch. The arcs are split at the rejected
+# L1 measurements and at the jumps of the geometry-free phase (cycle
+# slips of L2), which would bias the levelled TEC.
+########################################################################
+
+
+# Import External and Internal functions and Libraries
+#----------------------------------------------------------------------
+import sys, os
+from collections import OrderedDict
+import numpy as np
+from COMMON import GnssConstants as Const
+from COMMON.Arcs import findValidArcs
+from COMMON.Combinations import COMB_FREQS
+from COMMON.Combinations import computeCombinations
+from COMMON.Combinations import detectGeometryFreeJumps
+from COMMON.Dates import NS_IN_S
+from COMMON.Dates import convertSod2Ns
+from COMMON.Iono import computeIonoMappingFunction
+from COMMON.Iono import computeIonoPiercePoint
+from InputOutput import RcvrIdx
+
+# Number of epochs buffered before levelling the ended arcs
+TEC_BATCH = 3600
+
+# Geometry-free delay of 1 TECU (P2 - C1 or L1 - L2) [m]
+# Ref.: ESA_GNSS-Book_TM-23_Vol_I.pdf Section 5.4.1
+TECU_TO_METERS_GF = 40.3e16 * \
+    (1.0 / COMB_FREQS["L2"]**2 - 1.0 / COMB_FREQS["L1"]**2)
+
+# Columns of the buffered rows
+LEVELLING_COLUMNS = ["SodNs", "Sod", "Doy", "Prn", "Valid", "Elev", "Azim",
+    "C1", "P2", "L1", "L2"]
+
+def initLevellingInfo():
+
+    # Purpose: initialize the buffer of measurements of a receiver
+
+    # Returns
+    # =======
+    # LevInfo: dict
+    #         Dictionary containing one entry per buffered row, and
+    #         the rows of the arcs still open
+
+    LevInfo = {
+        "NEpochs": 0,       # Number of buffered epochs
+        "Rows": [],         # Tuples of LEVELLING_COLUMNS
+        "Const": [],        # Constellation of each row
+        "Pending": None,    # Columns of the rows of the open arcs
+    }
+
+    return LevInfo
+
+# End of initLevellingInfo()
+
+def updateLevellingInfo(LevInfo, PreproObsInfo):
+
+    # Purpose: buffer the measurements of the current epoch
+
+    # Parameters
+    # ==========
+    # LevInfo: dict
+    #         Dictionary containing the buffered rows
+    # PreproObsInfo: dict
+    #         Dictionary containing Preprocessing info for the
+    #         current epoch
+
+    # Returns
+    # =======
+    # Nothing, LevInfo is updated
+
+    LevInfo["NEpochs"] = LevInfo["NEpochs"] + 1
+
+    for SatLabel, SatPreproObs in PreproObsInfo.items():
+        LevInfo["Rows"].append((
+            SatPreproObs["SodNs"],
+            SatPreproObs["Sod"],
+            SatPreproObs["Doy"],
+            SatPreproObs["PRN"],
+            SatPreproObs["ValidL1"] == 1,
+            SatPreproObs["Elevation"],
+            SatPreproObs["Azimuth"],
+            SatPreproObs["C1"],
+            SatPreproObs["P2"],
+            SatPreproObs["L1"],
+            SatPreproObs["L2"],
+            ))
+        LevInfo["Const"].append(SatLabel[0])
+
+# End of updateLevellingInfo()
+
+def computeArcLevelling(Arcs, GfCode, GfPhase, Weight):
+
+    # Purpose: level the geometry-free phase of each arc to its code
+
+    # Parameters
+    # ==========
+    # Arcs: dict
+    #         Arcs of the rows, as given by findArcs()
+    # GfCode, GfPhase: numpy arrays
+    #         Geometry-free code and phase of the sorted rows [m]
+    # Weight: numpy array
+    #         Weight of the sorted rows
+
+    # Returns
+    # =======
+    # Offset: numpy array
+    #         Levelling offset of each arc [m]
+    # Std: numpy array
+    #         Weighted standard deviation of the code minus levelled
+    #         phase of each arc [m]
+
+    ArcIdx = Arcs["ArcIdx"]
+    NArcs = ArcIdx[-1] + 1 if len(ArcIdx) > 0 else 0
+    SumW = np.bincount(ArcIdx, Weight, NArcs)
+
+    Offset = np.bincount(ArcIdx, Weight * (GfCode - GfPhase), NArcs) / SumW
+    Residual = GfCode - GfPhase - Offset[ArcIdx]
+    Std = np.sqrt(np.bincount(ArcIdx, Weight * Residual**2, NArcs) / SumW)
+
+    return Offset, Std
+
+# End of computeArcLevelling()
+
+def computeLevellingBatch(Conf, LevInfo, Rcvr, Final=False):
+
+    # Purpose: level the arcs ended in the buffered measurements and
+    #          keep the rows of the open arcs for the next batch
+
+    # Parameters
+    # ==========
+    # Conf: dict
+    #         Configuration dictionary
+    # LevInfo: dict
+    #         Dictionary containing the buffered rows
+    # Rcvr: list
+    #         Receiver info, as given by readRcvr()
+    # Final: bool
+    #         True at the end of the day, to level all the arcs
+
+    # Returns
+    # =======
+    # TecOut: dict
+    #         Columns of the levelled TEC of the rows of the ended arcs
+    #         longer than TEC_MIN_ARC, sorted by epoch and satellite
+
+    # Columns of the new rows, after those of the open arcs
+    Rows = np.array(LevInfo["Rows"], dtype=float).reshape(-1,
+        len(LEVELLING_COLUMNS))
+    Cols = OrderedDict(zip(LEVELLING_COLUMNS, Rows.T))
+    Cols["SodNs"] = np.array([Row[0] for Row in LevInfo["Rows"]], dtype=np.int64)
+    Cols["Prn"] = Cols["Prn"].astype(np.int64)
+    Cols["Valid"] = Cols["Valid"] == 1
+    Cols["Const"] = np.array(LevInfo["Const"], dtype=str)
+    if LevInfo["Pending"] is not None:
+        for Key, Pending in LevInfo["Pending"].items():
+            Cols[Key] = np.concatenate((Pending, Cols[Key]))
+    NowNs = Cols["SodNs"].max() if len(Cols["SodNs"]) > 0 else 0
+    LevInfo.update(initLevellingInfo())
+
+    # Arcs of the rows with both geometry-free combinations, restarted
+    # at the jumps of the phase. The open arcs are kept from their start,
+    # so the jumps are found without the state of the previous batch
+    Gf = computeCombinations(Cols["C1"], Cols["P2"], Cols["L1"], Cols["L2"],
+        ["GF_CODE", "GF_PHASE"])
+    Valid = Cols["Valid"] & np.isfinite(Gf["GF_CODE"]) & \
+        np.isfinite(Gf["GF_PHASE"])
+    GapNs = convertSod2Ns(Conf["HATCH_GAP_TH"])
+    Reset = detectGeometryFreeJumps(Cols["Prn"], Cols["SodNs"],
+        Gf["GF_PHASE"], Valid, GapNs)
+    Arcs = findValidArcs(Cols["Prn"], Cols["SodNs"], GapNs, Valid, Reset)
+    Sorted = np.flatnonzero(Valid)[Arcs["Order"]]
+    ArcIdx = Arcs["ArcIdx"]
+
+    # First and last rows of each arc
+    NRows = len(ArcIdx)
+    ArcFirst = np.flatnonzero(np.diff(ArcIdx, prepend=-1) != 0)
+    ArcLast = np.append(ArcFirst[1:] - 1, NRows - 1) if NRows > 0 else ArcFirst
+    ArcSat = Arcs["Sat"][ArcLast]
+    ArcEndNs = Arcs["TimeNs"][ArcLast]
+
+    # An arc has ended if there is a later row of its satellite (invalid
+    # or of a new arc) or if the satellite is not seen anymore
+    SatLastNs = np.full(Const.MAX_NUM_SATS_CONSTEL + 1, -1, dtype=np.int64)
+    np.maximum.at(SatLastNs, Cols["Prn"], Cols["SodNs"])
+    Ended = Final | (ArcEndNs < SatLastNs[ArcSat]) | \
+        (ArcEndNs + GapNs < NowNs)
+
+    # Keep the rows of the open arcs, from their start
+    SatOpenNs = np.full(len(SatLastNs), np.iinfo(np.int64).max)
+    SatOpenNs[ArcSat[~Ended]] = Arcs["TimeNs"][ArcFirst][~Ended]
+    Open = Cols["SodNs"] >= SatOpenNs[Cols["Prn"]]
+    LevInfo["Pending"] = OrderedDict(
+        [(Key, Column[Open]) for Key, Column in Cols.items()])
+
+    # Level all the arcs, and output the ended ones long enough
+    Weight = np.sin(np.radians(Cols["Elev"][Sorted]))**2
+    Offset, Std = computeArcLevelling(Arcs, Gf["GF_CODE"][Sorted],
+        Gf["GF_PHASE"][Sorted], Weight)
+    ArcLen = Arcs["Elapsed"][ArcLast] / NS_IN_S
+    Output = (Ended & (ArcLen >= Conf["TEC_MIN_ARC"]))[ArcIdx]
+
+    # Rows of the output, by epoch and satellite
+    OutIdx = np.flatnonzero(Output)
+    OutIdx = OutIdx[np.lexsort((Arcs["Sat"][OutIdx], Arcs["TimeNs"][OutIdx]))]
+    Rows = Sorted[OutIdx]
+    OutArc = ArcIdx[OutIdx]
+    Elev = Cols["Elev"][Rows]
+
+    Stec = (Gf["GF_PHASE"][Rows] + Offset[OutArc]) / TECU_TO_METERS_GF
+    IppLon, IppLat = computeIonoPiercePoint(float(Rcvr[RcvrIdx["LON"]]),
+        float(Rcvr[RcvrIdx["LAT"]]), Elev, Cols["Azim"][Rows])
+
+    TecOut = OrderedDict({})
+    TecOut["SOD"] = Cols["Sod"][Rows]
+    TecOut["DOY"] = Cols["Doy"][Rows]
+    TecOut["CONST"] = Cols["Const"][Rows]
+    TecOut["PRN"] = Cols["Prn"][Rows]
+    TecOut["ELEV"] = Elev
+    TecOut["IPPLON"] = IppLon
+    TecOut["IPPLAT"] = IppLat
+    TecOut["ARCLEN"] = ArcLen[OutArc]
+    TecOut["STEC"] = Stec
+    TecOut["VTEC"] = Stec / computeIonoMappingFunction(Elev)
+    TecOut["LEVSTD"] = Std[OutArc] / TECU_TO_METERS_GF
+
+    return TecOut
+
+# End of computeLevellingBatch()
+
+########################################################################
+# END OF CARRIER-TO-CODE LEVELLING FUNCTIONS MODULE
+########################################################################
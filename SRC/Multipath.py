@@ -0,0 +1,412 @@
+#!/usr/bin/env python
+
+########################################################################
+# PETRUS/SRC/Multipath.py:
+# This is the Code Multipath Statistics Module of PETRUS tool
+#
+#  Project:        PETRUS
+#  File:           Multipath.py
+#  Date(YY/MM/DD): 01/02/21
+#
+#   Author: GNSS Academy
+#   Copyright 2021 GNSS Academy
+#
+# -----------------------------------------------------------------
+# Date       | Author             | Action
+# -----------------------------------------------------------------
+#
+# Statistics of the code multipath and noise C1 - SmoothC1 of the
+# converged Hatch filters, per (elevation bin, C/N0 bin, PRN) cell:
+# number of samples, mean, sum of squared deviations (M2) and a
+# histogram from which the percentiles are taken.
+#
+# The samples are buffered while the Preprocessing runs and added to
+# the cells every MPATH_BATCH epochs. The statistics of different
+# batches, days or receivers with the same bins are merged exactly
+# (Chan et al. for the mean and M2, sums for the histograms), so that
+# the noise models of long periods are computed from the small summary
+# files of each receiver and day instead of their PREPRO files.
+########################################################################
+
+
+# Import External and Internal functions and Libraries
+#----------------------------------------------------------------------
+import sys, os
+from collections import OrderedDict
+import numpy as np
+from COMMON import GnssConstants as Const
+
+# Number of epochs buffered before updating the statistics
+MPATH_BATCH = 3600
+
+# C1 - SmoothC1 histograms: bin size and limit [m] (larger residuals
+# are kept in the first and last bins)
+MPATH_HIST_STEP = 0.05
+MPATH_HIST_MAX = 5.0
+
+# Statistics of each cell
+MPATH_STATS = ["NSamples", "Mean", "M2", "Hist"]
+
+def initMpathInfo():
+
+    # Purpose: initialize the buffer of code residuals
+
+    # Returns
+    # =======
+    # MpathInfo: dict
+    #         Dictionary containing one entry per buffered row
+
+    MpathInfo = {
+        "NEpochs": 0,   # Number of buffered epochs
+        "Rows": [],     # (Elev, S1, Prn, C1 - SmoothC1)
+    }
+
+    return MpathInfo
+
+# End of initMpathInfo()
+
+def updateMpathInfo(MpathInfo, PreproObsInfo):
+
+    # Purpose: buffer the code residuals of the converged Hatch filters
+    #          of the current epoch
+
+    # Parameters
+    # ==========
+    # MpathInfo: dict
+    #         Dictionary containing the buffered rows
+    # PreproObsInfo: dict
+    #         Dictionary containing Preprocessing info for the
+    #         current epoch
+
+    # Returns
+    # =======
+    # Nothing, MpathInfo is updated
+
+    MpathInfo["NEpochs"] = MpathInfo["NEpochs"] + 1
+
+    for SatPreproObs in PreproObsInfo.values():
+        if SatPreproObs["ValidL1"] == 1 and SatPreproObs["Status"] == 1:
+            MpathInfo["Rows"].append((
+                SatPreproObs["Elevation"],
+                SatPreproObs["S1"],
+                SatPreproObs["PRN"],
+                SatPreproObs["C1"] - SatPreproObs["SmoothC1"],
+                ))
+
+# End of updateMpathInfo()
+
+def initMpathStats(Bins):
+
+    # Purpose: initialize empty multipath statistics
+
+    # Parameters
+    # ==========
+    # Bins: list
+    #         [Elevation step [deg], C/N0 minimum, C/N0 maximum,
+    #         C/N0 step [dB-Hz]], as MPATH_BINS
+
+    # Returns
+    # =======
+    # MpathStats: dict
+    #         Dictionary containing the bins and the statistics of
+    #         each cell, flattened as (elevation, C/N0, PRN)
+
+    ElevStep, Cn0Min, Cn0Max, Cn0Step = [float(Bin) for Bin in Bins]
+
+    MpathStats = OrderedDict({})
+    MpathStats["Bins"] = np.array([ElevStep, Cn0Min, Cn0Max, Cn0Step])
+    MpathStats["HistStep"] = MPATH_HIST_STEP
+    MpathStats["NElev"] = int(np.ceil(90.0 / ElevStep))
+    MpathStats["NCn0"] = int(np.ceil((Cn0Max - Cn0Min) / Cn0Step))
+    MpathStats["NPrn"] = Const.MAX_NUM_SATS_CONSTEL
+    MpathStats["NHist"] = 2 * int(round(MPATH_HIST_MAX / MPATH_HIST_STEP))
+
+    NCells = MpathStats["NElev"] * MpathStats["NCn0"] * MpathStats["NPrn"]
+    MpathStats["NSamples"] = np.zeros(NCells, dtype=np.int64)
+    MpathStats["Mean"] = np.zeros(NCells)
+    MpathStats["M2"] = np.zeros(NCells)
+    MpathStats["Hist"] = np.zeros((NCells, MpathStats["NHist"]), dtype=np.int32)
+
+    return MpathStats
+
+# End of initMpathStats()
+
+def computeMpathCellIndex(MpathStats, Elev, Cn0, Prn):
+
+    # Purpose: map the samples to the flat index of their cell
+
+    # Parameters
+    # ==========
+    # MpathStats: dict
+    #         Dictionary containing the statistics
+    # Elev, Cn0, Prn: numpy arrays
+    #         Elevation [deg], C/N0 [dB-Hz] and PRN of the samples
+
+    # Returns
+    # =======
+    # CellIdx: numpy array
+    #         Flat index of the cell of each sample
+
+    ElevStep, Cn0Min, _, Cn0Step = MpathStats["Bins"]
+
+    ElevIdx = np.clip((Elev // ElevStep).astype(int), 0, MpathStats["NElev"] - 1)
+    Cn0Idx = np.clip(((Cn0 - Cn0Min) // Cn0Step).astype(int),
+        0, MpathStats["NCn0"] - 1)
+    PrnIdx = np.clip(Prn.astype(int) - 1, 0, MpathStats["NPrn"] - 1)
+
+    return (ElevIdx * MpathStats["NCn0"] + Cn0Idx) * MpathStats["NPrn"] + PrnIdx
+
+# End of computeMpathCellIndex()
+
+def addMpathStats(MpathStats, CellIdx, NSamples, Mean, M2, Hist):
+
+    # Purpose: merge the statistics of some cells into the statistics
+    #          Ref.: Chan, Golub & LeVeque (1979), pairwise update
+
+    # Parameters
+    # ==========
+    # MpathStats: dict
+    #         Dictionary containing the statistics
+    # CellIdx: numpy array
+    #         Flat index of the merged cells (no repetitions)
+    # NSamples, Mean, M2, Hist: numpy arrays
+    #         Statistics of the merged cells
+
+    # Returns
+    # =======
+    # Nothing, MpathStats is updated
+
+    N1 = MpathStats["NSamples"][CellIdx]
+    N = N1 + NSamples
+    Delta = Mean - MpathStats["Mean"][CellIdx]
+    Ratio = np.where(N > 0, NSamples / np.maximum(N, 1), 0.0)
+
+    MpathStats["Mean"][CellIdx] += Delta * Ratio
+    MpathStats["M2"][CellIdx] += M2 + Delta**2 * N1 * Ratio
+    MpathStats["NSamples"][CellIdx] = N
+    MpathStats["Hist"][CellIdx] += Hist
+
+# End of addMpathStats()
+
+def accumulateMpathStats(MpathStats, MpathInfo):
+
+    # Purpose: add the buffered code residuals to the statistics and
+    #          empty the buffer
+
+    # Parameters
+    # ==========
+    # MpathStats: dict
+    #         Dictionary containing the statistics
+    # MpathInfo: dict
+    #         Dictionary containing the buffered rows
+
+    # Returns
+    # =======
+    # Nothing, MpathStats is updated
+
+    Rows = np.array(MpathInfo["Rows"], dtype=float).reshape(-1, 4)
+    Elev, Cn0, Prn, Res = Rows.T
+    MpathInfo.update(initMpathInfo())
+
+    # Statistics of the batch in its non-empty cells
+    CellIdx, Cell, NSamples = np.unique(
+        computeMpathCellIndex(MpathStats, Elev, Cn0, Prn),
+        return_inverse=True, return_counts=True)
+    Mean = np.bincount(Cell, Res, len(CellIdx)) / NSamples
+    M2 = np.bincount(Cell, (Res - Mean[Cell])**2, len(CellIdx))
+
+    NHist = MpathStats["NHist"]
+    Bin = np.clip(np.floor(Res / MPATH_HIST_STEP).astype(int) + NHist // 2,
+        0, NHist - 1)
+    Hist = np.bincount(Cell * NHist + Bin,
+        minlength=len(CellIdx) * NHist).reshape(-1, NHist)
+
+    addMpathStats(MpathStats, CellIdx, NSamples, Mean, M2, Hist)
+
+# End of accumulateMpathStats()
+
+def extractMpathCells(MpathStats):
+
+    # Purpose: extract the non-empty cells of the statistics, to save
+    #          or exchange compact summaries
+
+    # Parameters
+    # ==========
+    # MpathStats: dict
+    #         Dictionary containing the statistics
+
+    # Returns
+    # =======
+    # MpathCells: dict
+    #         Bins, and flat index and statistics of the non-empty
+    #         cells
+
+    CellIdx = np.flatnonzero(MpathStats["NSamples"])
+
+    MpathCells = OrderedDict({})
+    MpathCells["Bins"] = MpathStats["Bins"]
+    MpathCells["HistStep"] = MpathStats["HistStep"]
+    MpathCells["CellIdx"] = CellIdx
+    for Stat in MPATH_STATS:
+        MpathCells[Stat] = MpathStats[Stat][CellIdx]
+
+    return MpathCells
+
+# End of extractMpathCells()
+
+def mergeMpathStats(MpathStats, MpathCells):
+
+    # Purpose: merge the statistics of other receiver or day into the
+    #          statistics
+
+    # Parameters
+    # ==========
+    # MpathStats: dict
+    #         Dictionary containing the statistics
+    # MpathCells: dict
+    #         Non-empty cells of statistics with the same bins, as
+    #         given by extractMpathCells() or readMpathStatsFile()
+
+    # Returns
+    # =======
+    # Nothing, MpathStats is updated
+
+    if not np.array_equal(MpathStats["Bins"], MpathCells["Bins"]) or \
+        MpathStats["HistStep"] != MpathCells["HistStep"]:
+        sys.stderr.write("ERROR: multipath statistics with different bins "\
+            "%s and %s cannot be merged\n" %
+            (str(MpathStats["Bins"]), str(MpathCells["Bins"])))
+        sys.exit(-1)
+
+    addMpathStats(MpathStats, *[MpathCells[Stat]
+        for Stat in ["CellIdx"] + MPATH_STATS])
+
+# End of mergeMpathStats()
+
+def writeMpathStatsFile(Path, MpathStats):
+
+    # Purpose: save the non-empty cells of the statistics in a
+    #          compressed summary file (.npz)
+
+    # Parameters
+    # ==========
+    # Path: str
+    #         Path to file
+    # MpathStats: dict
+    #         Dictionary containing the statistics
+
+    # Returns
+    # =======
+    # Nothing
+
+    # Display Message
+    print("INFO: Creating file: %s..." % Path)
+
+    # Create output directory, if needed
+    if not os.path.exists(os.path.dirname(Path)):
+        os.makedirs(os.path.dirname(Path))
+
+    with open(Path, 'wb') as f:
+        np.savez_compressed(f, **extractMpathCells(MpathStats))
+
+# End of writeMpathStatsFile()
+
+def readMpathStatsFile(Path):
+
+    # Purpose: read a summary file of statistics
+
+    # Parameters
+    # ==========
+    # Path: str
+    #         Path to file, as written by writeMpathStatsFile()
+
+    # Returns
+    # =======
+    # MpathCells: dict
+    #         Non-empty cells, as given by extractMpathCells()
+
+    with np.load(Path) as Data:
+        MpathCells = OrderedDict([(Key, Data[Key]) for Key in Data.files])
+    MpathCells["HistStep"] = float(MpathCells["HistStep"])
+
+    return MpathCells
+
+# End of readMpathStatsFile()
+
+def computeMpathHistPercentile(Hist, Percentile, Lower):
+
+    # Purpose: compute a percentile of the samples of each cell from
+    #          their histograms (upper edge of the bin)
+
+    # Parameters
+    # ==========
+    # Hist: numpy array
+    #         (NCells, NBins) histograms, of bins of MPATH_HIST_STEP
+    # Percentile: float
+    #         Percentile [%]
+    # Lower: float
+    #         Lower edge of the first bin
+
+    # Returns
+    # =======
+    # Value: numpy array
+    #         Percentile of each cell, NaN if no samples
+
+    NSamples = np.sum(Hist, axis=1)
+    Cumulative = np.cumsum(Hist, axis=1)
+
+    # First bin reaching the percentile
+    Bin = np.argmax(Cumulative >= (Percentile / 100.0) * NSamples[:, None],
+        axis=1)
+
+    return np.where(NSamples > 0, Lower + (Bin + 1) * MPATH_HIST_STEP, np.nan)
+
+# End of computeMpathHistPercentile()
+
+def computeMpathModel(MpathStats):
+
+    # Purpose: compute the statistics of the non-empty cells
+
+    # Parameters
+    # ==========
+    # MpathStats: dict
+    #         Dictionary containing the statistics
+
+    # Returns
+    # =======
+    # MpathModel: dict
+    #         Per non-empty cell: lower edges of its elevation [deg]
+    #         and C/N0 [dB-Hz] bins, PRN, number of samples, and mean,
+    #         standard deviation, median, and 68% and 95% of the
+    #         absolute value of C1 - SmoothC1 [m]
+
+    ElevStep, Cn0Min, _, Cn0Step = MpathStats["Bins"]
+    CellIdx = np.flatnonzero(MpathStats["NSamples"])
+    ElevIdx, Cn0Idx, PrnIdx = np.unravel_index(CellIdx,
+        (MpathStats["NElev"], MpathStats["NCn0"], MpathStats["NPrn"]))
+    NSamples = MpathStats["NSamples"][CellIdx]
+    Hist = MpathStats["Hist"][CellIdx]
+
+    # Histograms of the absolute values, folded around 0
+    Half = MpathStats["NHist"] // 2
+    AbsHist = Hist[:, Half:] + Hist[:, Half - 1::-1]
+
+    MpathModel = OrderedDict({})
+    MpathModel["ELEV"] = ElevIdx * ElevStep
+    MpathModel["CN0"] = Cn0Min + Cn0Idx * Cn0Step
+    MpathModel["PRN"] = PrnIdx + 1
+    MpathModel["NSAMPLES"] = NSamples
+    MpathModel["MEAN"] = MpathStats["Mean"][CellIdx]
+    MpathModel["STD"] = np.sqrt(MpathStats["M2"][CellIdx] / NSamples)
+    MpathModel["MEDIAN"] = computeMpathHistPercentile(Hist, 50.0,
+        -MPATH_HIST_MAX)
+    MpathModel["ABS68"] = computeMpathHistPercentile(AbsHist, 68.0, 0.0)
+    MpathModel["ABS95"] = computeMpathHistPercentile(AbsHist, 95.0, 0.0)
+
+    return MpathModel
+
+# End of computeMpathModel()
+
+########################################################################
+# END OF CODE MULTIPATH STATISTICS FUNCTIONS MODULE
+########################################################################
@@ -29,22 +29,99 @@ sys.path.insert(0, Common)
 # Import External and Internal functions and Libraries
 #----------------------------------------------------------------------
 from collections import OrderedDict
-from yaml import dump
-from pandas import read_csv
 from COMMON import GnssConstants as Const
 from InputOutput import readConf
 from InputOutput import processConf
-from InputOutput import readRcvr
 from InputOutput import createOutputFile
-from InputOutput import ObsIdx
-from InputOutput import readObsEpoch
+from InputOutput import setSodFormat
+from InputOutput import readObsEpochs
 from InputOutput import generatePreproFile
+from InputOutput import initOutputBuffer
+from InputOutput import closeOutputBuffer
+from InputOutput import PreproFmt
+from InputOutput import CorrHdr
+from InputOutput import CorrFmt
+from InputOutput import generateCorrFile
+from InputOutput import PvtHdr
+from InputOutput import PvtFmt
+from InputOutput import generatePvtFile
+from InputOutput import RcvrIdx
+from InputOutput import getCombOutputFormat
+from InputOutput import generateCombFile
+from InputOutput import TecHdr
+from InputOutput import TecFmt
+from InputOutput import generateTecFile
+from InputOutput import MpathHdr
+from InputOutput import generateMpathFile
 from InputOutput import PreproHdr
 from InputOutput import CSNEPOCHS
+from InputOutput import AatrHdr
+from InputOutput import AatrStatsHdr
+from InputOutput import generateAatrFile
+from InputOutput import generateAatrStatsFile
+from InputOutput import DopHdr
+from InputOutput import generateDopFile
+from InputOutput import IonoGridHdr
+from InputOutput import ServiceLevelsHdr
+from InputOutput import generateServiceLevelsFile
+from InputOutput import generateIonoGridFile
+from InputOutput import UsrGridHdr
+from InputOutput import UsrGridSrvHdr
+from InputOutput import generateUsrGridFiles
 from Preprocessing import runPreProcMeas
-from PreprocessingPlots import generatePreproPlots
+from RcvrCatalog import readRcvrCatalog
+from RcvrCatalog import selectActiveRcvrs
+from RcvrCatalog import getRcvrInfo
+from Sbas import readSbasFile
+from Rinex import readRinexObsEpochs
+from Ephemeris import readRinexNav
+from Ephemeris import readEpochsSatGeometry
+from Ephemeris import readYumaAlmanac
+from Ephemeris import computeSatGeometry
+from Sp3 import readSp3Files
+from Sp3 import buildSp3Segments
+from Sp3 import computeSp3SatGeometry
+from Aatr import initAatrInfo
+from Aatr import updateAatrInfo
+from Aatr import computeAatrDailyStats
+from Geometry import GEOMETRY_BATCH
+from Geometry import initGeometryInfo
+from Geometry import updateGeometryInfo
+from Geometry import computeGeometryBatch
+from Integrity import initIntegrityInfo
+from Integrity import updateIntegrityInfo
+from Integrity import mergeIntegrityInfo
+from Integrity import computeServiceLevels
+from COMMON.Uere import buildUereLut
+from Corrections import CORR_BATCH
+from Corrections import initCorrInfo
+from Corrections import updateCorrInfo
+from Corrections import computeCorrectionsBatch
+from Pvt import initPvtInfo
+from Pvt import updatePvtInfo
+from Pvt import computePvtBatch
+from Pvt import selectPvtEpochs
+from DualFrequency import COMB_BATCH
+from DualFrequency import initCombInfo
+from DualFrequency import updateCombInfo
+from DualFrequency import computeCombinationsBatch
+from Levelling import TEC_BATCH
+from Levelling import initLevellingInfo
+from Levelling import updateLevellingInfo
+from Levelling import computeLevellingBatch
+from Multipath import MPATH_BATCH
+from Multipath import initMpathInfo
+from Multipath import updateMpathInfo
+from Multipath import initMpathStats
+from Multipath import accumulateMpathStats
+from Multipath import extractMpathCells
+from Multipath import mergeMpathStats
+from Multipath import writeMpathStatsFile
+from Multipath import computeMpathModel
 from COMMON.Dates import convertJulianDay2YearMonthDay
 from COMMON.Dates import convertYearMonthDay2Doy
+from COMMON.Dates import convertYearMonthDay2JulianDay
+from COMMON.Dates import NS_IN_S
 
 #----------------------------------------------------------------------
 # INTERNAL FUNCTIONS
@@ -53,6 +130,97 @@ from COMMON.Dates import convertYearMonthDay2Doy
 def displayUsage():
     sys.stderr.write("ERROR: Please provide path to SCENARIO as a unique argument\n")
 
+def findInputFile(Path):
+    # Return the path of an input file, plain or compressed, or None
+    for Suffix in ["", ".gz", ".bz2"]:
+        if os.path.isfile(Path + Suffix):
+            return Path + Suffix
+
+    return None
+
+def findSp3File(Scen, Jd):
+    # Return the path of the SP3 file of a day, or None
+    Year, Month, Day = convertJulianDay2YearMonthDay(Jd)
+
+    return findInputFile(Scen + \
+        '/INP/SP3/' + "SP3_Y%02dD%03d.sp3" % \
+            (Year % 100, convertYearMonthDay2Doy(Year, Month, Day)))
+
+def getSp3Segments(Sp3Cache, Scen, Jd):
+    # Return the precise orbits polynomials of a day, None without SP3
+    # file. They are computed once per day for all the RCVRs, with the
+    # SP3 files of the neighbour days to interpolate up to midnight
+    if Jd not in Sp3Cache:
+        Sp3Cache[Jd] = None
+        if findSp3File(Scen, Jd) is not None:
+            Sp3Files = [findSp3File(Scen, Sp3Jd) for Sp3Jd in [Jd - 1, Jd, Jd + 1]]
+            print("INFO: Reading SP3 files: %s" % \
+                ", ".join(Sp3File for Sp3File in Sp3Files if Sp3File is not None))
+            Sp3Cache[Jd] = buildSp3Segments(readSp3Files(
+                [Sp3File for Sp3File in Sp3Files if Sp3File is not None]))
+
+    return Sp3Cache[Jd]
+
+def getSbasInfo(SbasCache, Conf, Scen, Year, Month, Day):
+    # Return the decoded SBAS messages of the GEO of a day, None without
+    # SBAS file or for DF users. They are decoded once per day for all
+    # the RCVRs, with times from 0h of the day
+    Jd0 = convertYearMonthDay2JulianDay(Year, Month, Day)
+    if Jd0 not in SbasCache:
+        SbasCache[Jd0] = None
+
+        # SBAS messages of the GEO, used by SF users if they are available
+        SbasFile = Scen + \
+            '/INP/SBAS/' + "SBAS_%03d_Y%02dD%03d.ems" % \
+                (Conf["GEO"], Year % 100,
+                convertYearMonthDay2Doy(Year, Month, Day))
+        if Conf["SBAS_MODE"] == "SBASL1" and os.path.isfile(SbasFile):
+            print("INFO: Reading SBAS messages file: %s" % SbasFile)
+            SbasCache[Jd0] = readSbasFile(SbasFile, Conf["GEO"], Jd0)
+
+    return SbasCache[Jd0]
+
+def processCorrectionsBatch(Conf, CorrInfo, PvtInfo, Rcvr, UereLut, SbasInfo,
+    CorrBuffer, PvtBuffer):
+    # Correct the buffered measurements, write them and solve the PVT of
+    # their epochs, if it is requested
+    CorrOut = computeCorrectionsBatch(CorrInfo, Rcvr, UereLut, SbasInfo)
+
+    if Conf["CORR_OUT"] == 1:
+        generateCorrFile(CorrBuffer, CorrOut)
+
+    PvtOut = None
+    if PvtInfo is not None:
+        PvtOut = computePvtBatch(PvtInfo, CorrOut, (float(Rcvr[RcvrIdx["LON"]]),
+            float(Rcvr[RcvrIdx["LAT"]]), float(Rcvr[RcvrIdx["ALT"]]),
+            Rcvr[RcvrIdx["XYZ"]]), Conf)
+
+        if Conf["PVT_OUT"] == 1:
+            generatePvtFile(PvtBuffer, PvtOut)
+
+    return PvtOut
+
+def processGeometryBatch(Conf, GeomInfo, UereLut, fdop, IntegrityInfo, Doy,
+    PvtOut=None):
+    # Compute the DOPs of the buffered epochs, write them and accumulate
+    # the Service Levels with the solutions, position errors and PLs of
+    # the PVT (without PVT, the epochs with a geometry within PDOP_MAX
+    # are available with the PLs of the UERE table, and the position
+    # errors are not known)
+    DopInfo = computeGeometryBatch(GeomInfo,
+        UereLut if PvtOut is None else None)
+
+    if Conf["DOP_OUT"] == 1:
+        generateDopFile(fdop, DopInfo, Doy, Conf["PDOP_MAX"])
+
+    if Conf["SERVICE_OUT"] == 1:
+        if PvtOut is None:
+            Sol = DopInfo["PDOP"] <= Conf["PDOP_MAX"]
+            Hpl, Vpl, Hpe, Vpe = DopInfo["HPL"], DopInfo["VPL"], None, None
+        else:
+            Sol, Hpe, Vpe, Hpl, Vpl = selectPvtEpochs(PvtOut, DopInfo["SOD"])
+        updateIntegrityInfo(IntegrityInfo, Sol, Hpl, Vpl, Hpe, Vpe)
+
 #######################################################
 # MAIN BODY
 #######################################################
@@ -70,22 +238,78 @@ CfgFile = Scen + '/CFG/petrus.cfg'
 
 # Read conf file
 Conf = readConf(CfgFile)
-# print(dump(Conf))
+# from yaml import dump; print(dump(Conf))
 
 # Process Configuration Parameters
 Conf = processConf(Conf)
 
+# Write the SOD of the epoch outputs at the resolution of the rate
+setSodFormat(Conf["SAMPLING_RATE"])
+
 # Select the RCVR Positions file name
 RcvrFile = Scen + '/INP/RCVR/' + Conf["RCVR_FILE"]
 
-# Read RCVR Positions file
-RcvrInfo = readRcvr(RcvrFile)
+# Read RCVR Positions file and keep the activated receivers
+RcvrCatalog = readRcvrCatalog(RcvrFile)
+RcvrInfo = getRcvrInfo(selectActiveRcvrs(RcvrCatalog))
+if len(RcvrInfo) == 0:
+    sys.stderr.write("ERROR: Any of the receiver is activated in RCVR file" + "\n")
+    sys.exit(-1)
 
 # Print header
 print( '------------------------------------')
 print( '--> RUNNING PETRUS:')
 print( '------------------------------------')
 
+# The Ionospheric Grid is built from the PREPRO OBS files
+if Conf["IONO_GRID_OUT"] == 1 and Conf["PREPRO_OUT"] != 1:
+    sys.stderr.write("ERROR: IONO_GRID_OUT requires PREPRO_OUT\n")
+    sys.exit(-1)
+
+# PREPRO OBS files of each day and RCVR
+PreproObsFiles = OrderedDict({})
+
+# If AATR outputs are activated
+if Conf["AATR_OUT"] == 1:
+    # Create the AATR daily statistics file, one line per RCVR and day
+    fstats = createOutputFile(Scen + '/OUT/AATR/AATR_STATS.dat', AatrStatsHdr)
+
+# The geometry stage computes the DOPs and the Service Levels
+GeomOut = Conf["DOP_OUT"] == 1 or Conf["SERVICE_OUT"] == 1
+fdop = None
+UereLut = None
+IntegrityInfo = None
+
+# The PVT stage gives the solutions of the Service Levels, when there
+# are satellite orbits
+PvtStage = Conf["PVT_OUT"] == 1 or Conf["SERVICE_OUT"] == 1
+CorrBuffer = None
+PvtBuffer = None
+
+# If Service Levels, Corrected, PVT or User Grid outputs are activated
+if Conf["SERVICE_OUT"] == 1 or Conf["CORR_OUT"] == 1 or \
+    Conf["PVT_OUT"] == 1 or Conf["USR_GRID_OUT"] == 1:
+    # Build the UERE table used to weight the measurements
+    # (DF users take the noise of the DF combination)
+    UereLut = buildUereLut(Conf["AIR_ACC_DESIG"], Conf["ELEV_NOISE_TH"],
+        Conf["SIGMA_NOISE_DF"] if Conf["SBAS_MODE"] == "SBASL5" else None)
+
+# If Service Levels outputs are activated
+if Conf["SERVICE_OUT"] == 1:
+    # Initialize the Service Levels of the whole network
+    NetIntegrityInfo = initIntegrityInfo(Conf)
+
+# If code multipath statistics outputs are activated
+if Conf["MPATH_OUT"] == 1:
+    # Initialize the multipath statistics of the whole network
+    NetMpathStats = initMpathStats(Conf["MPATH_BINS"])
+
+# Precise orbits polynomials of each day, shared by all the RCVRs
+Sp3Cache = OrderedDict({})
+
+# Decoded SBAS messages of each day, shared by all the RCVRs
+SbasCache = OrderedDict({})
+
 # Loop over RCVRs
 #-----------------------------------------------------------------------
 for Rcvr in RcvrInfo.keys():
@@ -94,6 +318,16 @@ for Rcvr in RcvrInfo.keys():
     print( '*** Processing receiver: ' + Rcvr + '   ***')
     print( '***-----------------------------***')
 
+    # If Service Levels outputs are activated
+    if Conf["SERVICE_OUT"] == 1:
+        # Initialize the Service Levels of the receiver
+        IntegrityInfo = initIntegrityInfo(Conf)
+
+    # If code multipath statistics outputs are activated
+    if Conf["MPATH_OUT"] == 1:
+        # Initialize the multipath statistics of the receiver
+        RcvrMpathStats = initMpathStats(Conf["MPATH_BINS"])
+
     # Loop over Julian Days in simulation
     #-----------------------------------------------------------------------
     for Jd in range(Conf["INI_DATE_JD"], Conf["END_DATE_JD"] + 1):
@@ -111,6 +345,41 @@ for Rcvr in RcvrInfo.keys():
             '/INP/OBS/' + "OBS_%s_Y%02dD%03d.dat" % \
                 (Rcvr, Year % 100, Doy)
 
+        # Define the full path and name to the RINEX files, read when
+        # there is no OBS file (optionally compressed)
+        RinexFile = findInputFile(Scen + \
+            '/INP/RINEX/' + "OBS_%s_Y%02dD%03d.rnx" % \
+                (Rcvr, Year % 100, Doy))
+        NavFile = findInputFile(Scen + \
+            '/INP/NAV/' + "NAV_Y%02dD%03d.rnx" % \
+                (Year % 100, Doy))
+
+        Sp3Segments = getSp3Segments(Sp3Cache, Scen, Jd)
+
+        # Open the OBS epochs stream
+        if os.path.isfile(ObsFile):
+            ObsEpochs = readObsEpochs(ObsFile)
+        elif RinexFile is not None and (NavFile is not None or \
+            Sp3Segments is not None):
+            print("INFO: Reading RINEX observation file: %s" % RinexFile)
+            ObsEpochs = readRinexObsEpochs(RinexFile)
+        else:
+            sys.stderr.write("ERROR: OBS file not found: %s\n" % ObsFile)
+            sys.exit(-1)
+
+        # If there are precise orbits or broadcast ephemerides, compute
+        # the satellite geometry of the epochs, filling the elevations
+        # and azimuths of the RINEX observations
+        if Sp3Segments is not None:
+            ObsEpochs = readEpochsSatGeometry(Sp3Segments, RcvrInfo[Rcvr],
+                ObsEpochs, not os.path.isfile(ObsFile), computeSp3SatGeometry)
+        elif NavFile is not None:
+            print("INFO: Reading navigation file: %s" % NavFile)
+            ObsEpochs = readEpochsSatGeometry(readRinexNav(NavFile),
+                RcvrInfo[Rcvr], ObsEpochs, not os.path.isfile(ObsFile))
+        else:
+            ObsEpochs = ((ObsInfo, None) for ObsInfo in ObsEpochs)
+
         # If Preprocessing outputs are activated
         if Conf["PREPRO_OUT"] == 1:
             # Define the full path and name to the output PREPRO OBS file
@@ -120,6 +389,120 @@ for Rcvr in RcvrInfo.keys():
 
             # Create output file
             fpreprobs = createOutputFile(PreproObsFile, PreproHdr)
+            PreproBuffer = initOutputBuffer(fpreprobs, PreproFmt, "\n\n")
+
+            # Keep the file for the network products
+            PreproObsFiles.setdefault(Jd, OrderedDict({}))[Rcvr] = PreproObsFile
+
+        # If AATR outputs are activated
+        if Conf["AATR_OUT"] == 1:
+            # Define the full path and name to the output AATR file
+            AatrFile = Scen + \
+                '/OUT/AATR/' + "AATR_%s_Y%02dD%03d.dat" % \
+                    (Rcvr, Year % 100, Doy)
+
+            # Create output file
+            faatr = createOutputFile(AatrFile, AatrHdr)
+
+            # Initialize the AATR aggregator
+            AatrInfo = initAatrInfo()
+
+        # The PVT is solved from the corrected measurements, with the
+        # satellite positions of the NAV or SP3 orbits
+        PvtDay = PvtStage and (Sp3Segments is not None or NavFile is not None)
+        if Conf["PVT_OUT"] == 1 and not PvtDay:
+            sys.stderr.write("ERROR: PVT_OUT requires the NAV or SP3 orbits "\
+                "of DoY %03d\n" % Doy)
+            sys.exit(-1)
+        CorrDay = Conf["CORR_OUT"] == 1 or PvtDay
+        PvtInfo = None
+        PvtOut = None
+
+        # If Corrected outputs are activated
+        if Conf["CORR_OUT"] == 1:
+            # Define the full path and name to the output CORR file
+            CorrFile = Scen + \
+                '/OUT/CORR/' + "CORR_%s_Y%02dD%03d.dat" % \
+                    (Rcvr, Year % 100, Doy)
+
+            # Create output file
+            CorrBuffer = initOutputBuffer(createOutputFile(CorrFile, CorrHdr),
+                CorrFmt)
+
+        # If PVT outputs are activated
+        if Conf["PVT_OUT"] == 1:
+            # Define the full path and name to the output PVT file
+            PvtFile = Scen + \
+                '/OUT/PVT/' + "PVT_%s_Y%02dD%03d.dat" % \
+                    (Rcvr, Year % 100, Doy)
+
+            # Create output file
+            PvtBuffer = initOutputBuffer(createOutputFile(PvtFile, PvtHdr),
+                PvtFmt)
+
+        # If the PVT is solved
+        if PvtDay:
+            # Initialize the buffer of satellite positions
+            PvtInfo = initPvtInfo()
+
+        # If the corrected measurements are needed
+        if CorrDay:
+            # Initialize the buffer of measurements to correct
+            CorrInfo = initCorrInfo()
+
+            # Decoded SBAS messages of the day
+            SbasInfo = getSbasInfo(SbasCache, Conf, Scen, Year, Month, Day)
+
+        # If Dual-Frequency combinations outputs are activated
+        if Conf["COMB_OUT"] == 1:
+            # Define the full path and name to the output COMB file
+            CombFile = Scen + \
+                '/OUT/COMB/' + "COMB_%s_Y%02dD%03d.dat" % \
+                    (Rcvr, Year % 100, Doy)
+
+            # Create output file with the requested combinations
+            CombHdr, CombFmt = getCombOutputFormat(Conf["COMB_LIST"])
+            CombBuffer = initOutputBuffer(createOutputFile(CombFile, CombHdr),
+                CombFmt)
+
+            # Initialize the buffer of measurements to combine
+            CombInfo = initCombInfo()
+
+        # If levelled TEC outputs are activated
+        if Conf["TEC_OUT"] == 1:
+            # Define the full path and name to the output TEC file
+            TecFile = Scen + \
+                '/OUT/TEC/' + "TEC_%s_Y%02dD%03d.dat" % \
+                    (Rcvr, Year % 100, Doy)
+
+            # Create output file
+            TecBuffer = initOutputBuffer(createOutputFile(TecFile, TecHdr),
+                TecFmt)
+
+            # Initialize the buffer of measurements to level
+            LevInfo = initLevellingInfo()
+
+        # If code multipath statistics outputs are activated
+        if Conf["MPATH_OUT"] == 1:
+            # Initialize the buffer of code residuals and the
+            # statistics of the day
+            MpathInfo = initMpathInfo()
+            MpathStats = initMpathStats(Conf["MPATH_BINS"])
+
+        # If DOP outputs are activated
+        if Conf["DOP_OUT"] == 1:
+            # Define the full path and name to the output DOP file
+            DopFile = Scen + \
+                '/OUT/GEOM/' + "DOP_%s_Y%02dD%03d.dat" % \
+                    (Rcvr, Year % 100, Doy)
+
+            # Create output file
+            fdop = createOutputFile(DopFile, DopHdr)
+
+        # If the geometry stage is activated
+        if GeomOut:
+            # Initialize the buffer of epoch geometries
+            GeomInfo = initGeometryInfo()
 
         # Initialize Variables
         EndOfFile = False
@@ -130,92 +513,333 @@ for Rcvr in RcvrInfo.keys():
             "L1_n_1": 0.0,           # t-1 Carrier Phase in L1
             "L1_n_2": 0.0,           # t-2 Carrier Phase in L1
             "L1_n_3": 0.0,           # t-3 Carrier Phase in L1
-            "t_n_1": 0.0,            # t-1 epoch
-            "t_n_2": 0.0,            # t-2 epoch
-            "t_n_3": 0.0,            # t-3 epoch
+            "t_n_1": 0,              # t-1 epoch [ns]
+            "t_n_2": 0,              # t-2 epoch [ns]
+            "t_n_3": 0,              # t-3 epoch [ns]
             "CsBuff": [0] * int(Conf["MIN_NCS_TH"][CSNEPOCHS]),  # Number of consecutive epochs for CS
             "CsIdx": 0,              # Index of CS detector buffer
             "ResetHatchFilter": 1,   # Flag to reset Hatch filter
             "Ksmooth": 0,            # Hatch filter K
-            "PrevEpoch": 86400,      # Previous SoD
+            "PrevEpoch": Const.S_IN_D * NS_IN_S, # Previous SoD [ns]
             "PrevL1": 0.0,           # Previous L1
             "PrevSmoothC1": 0.0,     # Previous Smoothed C1
             "PrevRangeRateL1": 0.0,  # Previous Code Rate
             "PrevPhaseRateL1": 0.0,  # Previous Phase Rate
             "PrevGeomFree": 0.0,     # Previous Geometry-Free Observable
-            "PrevGeomFreeEpoch": 0.0,# Previous Geometry-Free Observable
+            "PrevGeomFreeEpoch": 0,  # Previous Geometry-Free epoch [ns]
             "PrevRej": 0,            # Previous Rejection flag
+            "HatchDiv": 0.0,         # Average of C1 - L1 over HATCH_DIV_TIME
+            "HatchDivRef": 0.0,      # Mean of C1 - L1 in the arc
+            "HatchDivN": 0,          # Number of epochs in the arc
+            "HatchDivEpoch": 0,      # Previous divergence epoch [ns]
+            "HatchDivTime": 0.0,     # Time with divergence over threshold
                                      # ...
         } # End of SatPreproObsInfo
 
-        # Open OBS file
-        ObsData=read_csv(ObsFile, delim_whitespace=True, skiprows=1, header=None,\
-                         usecols=[ObsIdx["PRN"]])
+        # LOOP over all Epochs of UPOS file
+        # ----------------------------------------------------------
+        print("Prepocessing...")
+        while not EndOfFile:
+
+            # If ObsInfo is not empty
+            if ObsInfo != []:
+
+                # Read Only One Epoch
+                ObsInfo, SatGeomInfo = next(ObsEpochs, ([], None))
+                # If ObsInfo is empty, exit loop
+                if ObsInfo == []:
+                    break
+
+                # Preprocess OBS measurements
+                # ----------------------------------------------------------
+
+                PreproObsInfo = runPreProcMeas(Conf, RcvrInfo[Rcvr], ObsInfo, PrevPreproObsInfo)
+                #print("out")
+                # If PREPRO outputs are requested
+                if Conf["PREPRO_OUT"] == 1:
+                    # Generate output file
+                    # for y in PreproObsInfo:
+                    #     if PreproObsInfo[y]['ValidL1']==0 and PreproObsInfo[y]['RejectionCause']==0:
+                    #         print("error")
+                    #         print(y)
+                    #         print(PreproObsInfo[y]['Sod'])
+                    #         print("----")
+
+                    generatePreproFile(PreproBuffer, PreproObsInfo)
+
+                # If the corrected measurements are needed
+                if CorrDay:
+                    # Buffer the measurements (and the satellite positions
+                    # of the PVT), and correct the whole batch and solve
+                    # its PVT when it is full. The batch is processed on
+                    # the same epoch as the geometry one, which takes its
+                    # PVT solutions
+                    updateCorrInfo(CorrInfo, PreproObsInfo, SatGeomInfo)
+                    if PvtDay:
+                        updatePvtInfo(PvtInfo, PreproObsInfo, SatGeomInfo,
+                            Conf["NAV_SOLUTION"])
+                    if CorrInfo["NEpochs"] >= CORR_BATCH:
+                        PvtOut = processCorrectionsBatch(Conf, CorrInfo,
+                            PvtInfo, RcvrInfo[Rcvr], UereLut, SbasInfo,
+                            CorrBuffer, PvtBuffer)
+
+                # If Dual-Frequency combinations outputs are requested
+                if Conf["COMB_OUT"] == 1:
+                    # Buffer the measurements and combine the whole
+                    # batch when it is full
+                    updateCombInfo(CombInfo, PreproObsInfo)
+                    if CombInfo["NEpochs"] >= COMB_BATCH:
+                        generateCombFile(CombBuffer,
+                            computeCombinationsBatch(Conf, CombInfo))
+
+                # If levelled TEC outputs are requested
+                if Conf["TEC_OUT"] == 1:
+                    # Buffer the measurements and level the ended arcs
+                    # when the batch is full
+                    updateLevellingInfo(LevInfo, PreproObsInfo)
+                    if LevInfo["NEpochs"] >= TEC_BATCH:
+                        generateTecFile(TecBuffer, computeLevellingBatch(
+                            Conf, LevInfo, RcvrInfo[Rcvr]))
+
+                # If code multipath statistics outputs are requested
+                if Conf["MPATH_OUT"] == 1:
+                    # Buffer the code residuals and add them to the
+                    # statistics when the batch is full
+                    updateMpathInfo(MpathInfo, PreproObsInfo)
+                    if MpathInfo["NEpochs"] >= MPATH_BATCH:
+                        accumulateMpathStats(MpathStats, MpathInfo)
+
+                # If AATR outputs are requested
+                if Conf["AATR_OUT"] == 1:
+                    # Aggregate the epoch AATR and write it
+                    updateAatrInfo(AatrInfo, PreproObsInfo)
+                    generateAatrFile(faatr, AatrInfo, Doy)
+
+                # If the geometry stage is requested
+                if GeomOut:
+                    # Buffer the epoch geometry and process the whole
+                    # batch when it is full
+                    updateGeometryInfo(GeomInfo, PreproObsInfo)
+                    if len(GeomInfo["Sod"]) >= GEOMETRY_BATCH:
+                        processGeometryBatch(Conf, GeomInfo, UereLut,
+                            fdop, IntegrityInfo, Doy, PvtOut)
+
+                # To be continued in next WP...
+
+            # End of if ObsInfo != []:
+
+            else:
+                EndOfFile = True
+
+            # End of if ObsInfo != []:
+            
+        # End of while not EndOfFile:
+
+        # If AATR outputs are requested
+        if Conf["AATR_OUT"] == 1:
+            # Close AATR output file
+            faatr.close()
+
+            # Write the daily statistics of the receiver
+            generateAatrStatsFile(fstats, Rcvr, Year, Doy,
+                computeAatrDailyStats(AatrInfo))
+
+        # If the corrected measurements are needed
+        if CorrDay:
+            # Correct the last batch and solve its PVT
+            if CorrInfo["NEpochs"] > 0:
+                PvtOut = processCorrectionsBatch(Conf, CorrInfo, PvtInfo,
+                    RcvrInfo[Rcvr], UereLut, SbasInfo, CorrBuffer, PvtBuffer)
+
+        # If Corrected outputs are requested
+        if Conf["CORR_OUT"] == 1:
+            # Close CORR output file
+            closeOutputBuffer(CorrBuffer)
+
+        # If PVT outputs are requested
+        if Conf["PVT_OUT"] == 1:
+            # Close PVT output file
+            closeOutputBuffer(PvtBuffer)
+
+        # If Dual-Frequency combinations outputs are requested
+        if Conf["COMB_OUT"] == 1:
+            # Combine the last batch and close COMB output file
+            if CombInfo["NEpochs"] > 0:
+                generateCombFile(CombBuffer,
+                    computeCombinationsBatch(Conf, CombInfo))
+            closeOutputBuffer(CombBuffer)
+
+        # If levelled TEC outputs are requested
+        if Conf["TEC_OUT"] == 1:
+            # Level all the remaining arcs and close TEC output file
+            generateTecFile(TecBuffer, computeLevellingBatch(
+                Conf, LevInfo, RcvrInfo[Rcvr], Final=True))
+            closeOutputBuffer(TecBuffer)
+
+        # If code multipath statistics outputs are requested
+        if Conf["MPATH_OUT"] == 1:
+            # Add the last batch and save the summary of the day
+            accumulateMpathStats(MpathStats, MpathInfo)
+            writeMpathStatsFile(Scen + '/OUT/MPATH/' + \
+                "MPATH_%s_Y%02dD%03d.npz" % (Rcvr, Year % 100, Doy),
+                MpathStats)
+
+            # Add it to the statistics of the receiver
+            mergeMpathStats(RcvrMpathStats, extractMpathCells(MpathStats))
+
+        # If the geometry stage is requested
+        if GeomOut:
+            # Process the last batch
+            if len(GeomInfo["Sod"]) > 0:
+                processGeometryBatch(Conf, GeomInfo, UereLut,
+                    fdop, IntegrityInfo, Doy, PvtOut)
+
+        # If DOP outputs are requested
+        if Conf["DOP_OUT"] == 1:
+            # Close DOP output file
+            fdop.close()
+
+        # If PREPRO outputs are requested
+        if Conf["PREPRO_OUT"] == 1:
+            # Close PREPRO output file
+            closeOutputBuffer(PreproBuffer)
 
+            # Display Message
+            print("INFO: Reading file: %s and generating PREPRO figures..." %
+            PreproObsFile)
 
-        with open(ObsFile, 'r') as fobs:
-            # Read header line of OBS file
-            fobs.readline()
+            # Import the plotting stage only when it is needed, as it
+            # loads pandas and matplotlib
+            from PreprocessingPlots import generatePreproPlots
 
-            # LOOP over all Epochs of UPOS file
-            # ----------------------------------------------------------
-            print("Prepocessing...")
-            while not EndOfFile:
+            # Generate Preprocessing plots
+            generatePreproPlots(PreproObsFile, Conf["PLOTS_NPROC"])
 
-                # If ObsInfo is not empty
-                if ObsInfo != []:
+    # End of JD loop
 
-                    # Read Only One Epoch
-                    ObsInfo = readObsEpoch(fobs)
-                    # If ObsInfo is empty, exit loop
-                    if ObsInfo == []:
-                        break
+    # If Service Levels outputs are requested
+    if Conf["SERVICE_OUT"] == 1:
+        # Write the Service Levels of the receiver
+        fsrv = createOutputFile(Scen + '/OUT/INTEGRITY/' + \
+            "SERVICE_LEVELS_%s.dat" % Rcvr, ServiceLevelsHdr)
+        generateServiceLevelsFile(fsrv, computeServiceLevels(IntegrityInfo))
+        fsrv.close()
 
-                    # Preprocess OBS measurements
-                    # ----------------------------------------------------------
+        # Add them to the Service Levels of the network
+        mergeIntegrityInfo(NetIntegrityInfo, IntegrityInfo)
 
-                    PreproObsInfo = runPreProcMeas(Conf, RcvrInfo[Rcvr], ObsInfo, PrevPreproObsInfo,ObsData)
-                    #print("out")
-                    # If PREPRO outputs are requested
-                    if Conf["PREPRO_OUT"] == 1:
-                        # Generate output file
-                        # for y in PreproObsInfo:
-                        #     if PreproObsInfo[y]['ValidL1']==0 and PreproObsInfo[y]['RejectionCause']==0:
-                        #         print("error")
-                        #         print(y)
-                        #         print(PreproObsInfo[y]['Sod'])
-                        #         print("----")
+    # If code multipath statistics outputs are requested
+    if Conf["MPATH_OUT"] == 1:
+        # Write the multipath statistics of the receiver
+        fmpath = createOutputFile(Scen + '/OUT/MPATH/' + \
+            "MPATH_STATS_%s.dat" % Rcvr, MpathHdr)
+        generateMpathFile(fmpath, computeMpathModel(RcvrMpathStats))
+        fmpath.close()
 
-                        generatePreproFile(fpreprobs, PreproObsInfo)
+        # Add them to the statistics of the network
+        mergeMpathStats(NetMpathStats, extractMpathCells(RcvrMpathStats))
 
-                    # To be continued in next WP...
+# End of RCVR loop
 
-                # End of if ObsInfo != []:
+# If Service Levels outputs are requested
+if Conf["SERVICE_OUT"] == 1:
+    # Write the Service Levels of the network
+    fsrv = createOutputFile(Scen + '/OUT/INTEGRITY/' + \
+        "SERVICE_LEVELS_ALL.dat", ServiceLevelsHdr)
+    generateServiceLevelsFile(fsrv, computeServiceLevels(NetIntegrityInfo))
+    fsrv.close()
+
+# If code multipath statistics outputs are requested
+if Conf["MPATH_OUT"] == 1:
+    # Write the multipath statistics of the network, and its summary
+    fmpath = createOutputFile(Scen + '/OUT/MPATH/' + \
+        "MPATH_STATS_ALL.dat", MpathHdr)
+    generateMpathFile(fmpath, computeMpathModel(NetMpathStats))
+    fmpath.close()
+    writeMpathStatsFile(Scen + '/OUT/MPATH/MPATH_ALL.npz', NetMpathStats)
+
+# If AATR outputs are requested
+if Conf["AATR_OUT"] == 1:
+    # Close AATR statistics file
+    fstats.close()
+
+# If Ionospheric Grid outputs are requested
+if Conf["IONO_GRID_OUT"] == 1:
+    # Import the network stage only when it is needed
+    from IonoGrid import buildIonoGrid
+    from IonoGrid import computeIonoGridCells
 
-                else:
-                    EndOfFile = True
+    # Loop over Julian Days in simulation
+    for Jd, DayPreproObsFiles in PreproObsFiles.items():
+        Year, Month, Day = convertJulianDay2YearMonthDay(Jd)
+        Doy = convertYearMonthDay2Doy(Year, Month, Day)
 
-                # End of if ObsInfo != []:
-                
-            # End of while not EndOfFile:
-    
-        # End of with open(ObsFile, 'r') as f:
+        # Display Message
+        print("\nINFO: Building Ionospheric Grid of Day of Year %d from %d receivers..." %
+            (Doy, len(DayPreproObsFiles)))
 
-        # If PREPRO outputs are requested
-        if Conf["PREPRO_OUT"] == 1:
-            # Close PREPRO output file
-            fpreprobs.close()
+        # Merge the grids of all the receivers
+        IonoGrid = buildIonoGrid(Conf, RcvrInfo, DayPreproObsFiles)
 
-            # Display Message
-            print("INFO: Reading file: %s and generating PREPRO figures..." %
-            PreproObsFile)
+        # Write the non-empty cells
+        fgrid = createOutputFile(Scen + '/OUT/IONO/' + \
+            "IONO_GRID_Y%02dD%03d.dat" % (Year % 100, Doy), IonoGridHdr)
+        generateIonoGridFile(fgrid, computeIonoGridCells(IonoGrid), Doy)
+        fgrid.close()
 
-            # Generate Preprocessing plots
-            generatePreproPlots(PreproObsFile)
+# If User Grid outputs are requested
+if Conf["USR_GRID_OUT"] == 1:
+    # Import the simulation stage only when it is needed
+    from UserGrid import buildUserGrid
+    from UserGrid import simulateUserGrid
 
-    # End of JD loop
+    UserGrid = buildUserGrid(Conf)
 
-# End of RCVR loop
+    # Loop over Julian Days in simulation
+    for Jd in range(Conf["INI_DATE_JD"], Conf["END_DATE_JD"] + 1):
+        Year, Month, Day = convertJulianDay2YearMonthDay(Jd)
+        Doy = convertYearMonthDay2Doy(Year, Month, Day)
+
+        # Orbits of the day: precise orbits, broadcast ephemerides or
+        # YUMA almanac
+        Sp3Segments = getSp3Segments(Sp3Cache, Scen, Jd)
+        NavFile = findInputFile(Scen + \
+            '/INP/NAV/' + "NAV_Y%02dD%03d.rnx" % (Year % 100, Doy))
+        AlmFile = findInputFile(Scen + \
+            '/INP/ALM/' + "ALM_Y%02dD%03d.alm" % (Year % 100, Doy))
+        if Sp3Segments is not None:
+            OrbitInfo, computeGeometry = Sp3Segments, computeSp3SatGeometry
+        elif NavFile is not None:
+            OrbitInfo, computeGeometry = readRinexNav(NavFile), computeSatGeometry
+        elif AlmFile is not None:
+            OrbitInfo, computeGeometry = readYumaAlmanac(AlmFile,
+                (Jd - Const.JD_0) * Const.S_IN_D), computeSatGeometry
+        else:
+            sys.stderr.write("ERROR: no SP3, NAV nor ALM file for the User Grid "\
+                "of Day of Year %d\n" % Doy)
+            sys.exit(-1)
+
+        # Display Message
+        print("\nINFO: Simulating User Grid of Day of Year %d (%d users)..." %
+            (Doy, len(UserGrid["Lat"])))
+
+        UsrGridInfo = simulateUserGrid(Conf, UserGrid, OrbitInfo,
+            computeGeometry, Year, Doy, UereLut)
+
+        # Write the results of each user
+        fgrid = createOutputFile(Scen + '/OUT/USRGRID/' + \
+            "USR_GRID_Y%02dD%03d.dat" % (Year % 100, Doy), UsrGridHdr)
+        fsrv = createOutputFile(Scen + '/OUT/USRGRID/' + \
+            "USR_GRID_SERVICE_Y%02dD%03d.dat" % (Year % 100, Doy), UsrGridSrvHdr)
+        generateUsrGridFiles(fgrid, fsrv, UsrGridInfo)
+        fgrid.close()
+        fsrv.close()
+
+# If PREPRO outputs are requested
+if Conf["PREPRO_OUT"] == 1:
+    # Release the figures and rendering processes
+    from PreprocessingPlots import closePreproPlots
+    closePreproPlots()
 
 print( '\n------------------------------------')
 print( '--> END OF PETRUS ANALYSIS')
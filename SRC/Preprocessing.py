@@ -30,14 +30,21 @@ from COMMON import GnssConstants as Const
 from InputOutput import RcvrIdx, ObsIdx, REJECTION_CAUSE
 from InputOutput import FLAG, VALUE, TH, CSNEPOCHS
 from InputOutput import rejectSatsMinElevation
-from numpy import *
+import numpy as np
 from COMMON.Iono import computeIonoMappingFunction
+from COMMON.Iono import buildIonoMappingLut
+from COMMON.Iono import interpolateIonoMappingFunction
+from COMMON.Dates import convertSod2Ns, NS_IN_S
+
+# Iono mapping function look-up table, built on first use
+# if configured (MPP_LUT_STEP > 0)
+IonoMappingLut = None
 
 # Preprocessing internal functions
 #-----------------------------------------------------------------------
 
 
-def runPreProcMeas(Conf, Rcvr, ObsInfo, PrevPreproObsInfo, ObsData):
+def runPreProcMeas(Conf, Rcvr, ObsInfo, PrevPreproObsInfo):
     
     # Purpose: preprocess GNSS raw measurements from OBS file
     #          and generate PREPRO OBS file with the cleaned,
@@ -57,6 +64,7 @@ def runPreProcMeas(Conf, Rcvr, ObsInfo, PrevPreproObsInfo, ObsData):
     #             - Maximum Carrier Phase Increase Rate
     #             - Data Gaps checks and handling 
     #             - Cycle Slips detection
+    #             - Hatch filter divergence
 
     #         * Filtering/Smoothing of Code-Phase Measurements with a Hatch filter 
 
@@ -99,12 +107,14 @@ def runPreProcMeas(Conf, Rcvr, ObsInfo, PrevPreproObsInfo, ObsData):
     MaxNoise = Conf["MIN_CNR"][1]
     MinElevation = Conf["RCVR_MASK"]
     MaxPSR=Conf["MAX_PSR_OUTRNG"][1]
+    SamplingRateNs = convertSod2Ns(Conf["SAMPLING_RATE"])
 
     # Loop over satellites
     for SatObs in ObsInfo:
         # Initialize output info
         SatPreproObsInfo = {
             "Sod": 0.0,             # Second of day
+            "SodNs": 0,             # Second of day [ns]
             "Doy": 0,               # Day of year
             "Elevation": 0.0,       # Elevation
             "Azimuth": 0.0,         # Azimuth
@@ -130,6 +140,7 @@ def runPreProcMeas(Conf, Rcvr, ObsInfo, PrevPreproObsInfo, ObsData):
             "VtecRate": 0.0,        # VTEC Rate
             "iAATR": 0.0,           # Instantaneous AATR
             "Mpp": 0.0,             # Iono Mapping
+            "HatchDiv": 0.0,        # Hatch filter divergence
 
         } # End of SatPreproObsInfo
 
@@ -139,6 +150,7 @@ def runPreProcMeas(Conf, Rcvr, ObsInfo, PrevPreproObsInfo, ObsData):
         # Prepare outputs
         # Get SoD
         SatPreproObsInfo["Sod"] = float(SatObs[ObsIdx["SOD"]])
+        SatPreproObsInfo["SodNs"] = convertSod2Ns(SatPreproObsInfo["Sod"])
         # Get DoY
         SatPreproObsInfo["Doy"] = float(SatObs[ObsIdx["DOY"]])
         # Get PRN
@@ -154,8 +166,12 @@ def runPreProcMeas(Conf, Rcvr, ObsInfo, PrevPreproObsInfo, ObsData):
         SatPreproObsInfo["L1Meters"] = float(SatObs[ObsIdx["L1"]]) * Const.GPS_L1_WAVE
         #Get S1
         SatPreproObsInfo["S1"] = float(SatObs[ObsIdx["S1"]])
+        # Get P2
+        SatPreproObsInfo["P2"] = float(SatObs[ObsIdx["P2"]])
         # Get L2
         SatPreproObsInfo["L2"] = float(SatObs[ObsIdx["L2"]])
+        # Get S2
+        SatPreproObsInfo["S2"] = float(SatObs[ObsIdx["S2"]])
 
 
         # Prepare output for the satellite
@@ -164,7 +180,7 @@ def runPreProcMeas(Conf, Rcvr, ObsInfo, PrevPreproObsInfo, ObsData):
     # CODE HERE
     # Limit the satellites to the Number of Channels
     #Implementation only for gps
-    NVisSats = len(unique(ObsInfo[ObsIdx["PRN"]]))
+    NVisSats = len(np.unique(ObsInfo[ObsIdx["PRN"]]))
 
 
     if NVisSats>Conf["NCHANNELS_GPS"]:
@@ -212,8 +228,10 @@ def runPreProcMeas(Conf, Rcvr, ObsInfo, PrevPreproObsInfo, ObsData):
         previousValidEpoch = PrevPreproObsInfo[SatLabel]["PrevRej"] != REJECTION_CAUSE['MASKANGLE']
 
         if validEpoch and previousValidEpoch:
-            dT=PreproObsInfo[SatLabel]['Sod'] - PrevPreproObsInfo[SatLabel]['PrevEpoch']
-            if dT > Conf["SAMPLING_RATE"]:
+            # Epochs compared in integer ns, exact at any rate
+            dTNs=PreproObsInfo[SatLabel]['SodNs'] - PrevPreproObsInfo[SatLabel]['PrevEpoch']
+            dT=dTNs / NS_IN_S
+            if dTNs > SamplingRateNs:
                 gapCounter[SatLabel]=dT
                 # if T2 == 1:
                 #     print(gapCounter[SatLabel])
@@ -240,7 +258,7 @@ def runPreProcMeas(Conf, Rcvr, ObsInfo, PrevPreproObsInfo, ObsData):
 
 
             # time meas
-            t1 = PreproObsInfo[SatLabel]["Sod"] - PrevPreproObsInfo[SatLabel]["t_n_1"]
+            t1 = PreproObsInfo[SatLabel]["SodNs"] - PrevPreproObsInfo[SatLabel]["t_n_1"]
             t2 = PrevPreproObsInfo[SatLabel]["t_n_1"] - PrevPreproObsInfo[SatLabel]["t_n_2"]
             t3 = PrevPreproObsInfo[SatLabel]["t_n_2"] - PrevPreproObsInfo[SatLabel]["t_n_3"]
 
@@ -274,13 +292,13 @@ def runPreProcMeas(Conf, Rcvr, ObsInfo, PrevPreproObsInfo, ObsData):
 
             PrevPreproObsInfo[SatLabel]["CsIdx"] = (PrevPreproObsInfo[SatLabel]["CsIdx"] + 1) % int(Conf["MIN_NCS_TH"][2])
 
-            if sum(PrevPreproObsInfo[SatLabel]["CsBuff"]==0):
+            if np.sum(PrevPreproObsInfo[SatLabel]["CsBuff"]==0):
                 PrevPreproObsInfo[SatLabel]["L1_n_1"]=CS
                 PrevPreproObsInfo[SatLabel]["L1_n_2"]=CS_1
                 PrevPreproObsInfo[SatLabel]["L1_n_3"]=CS_2
                 PrevPreproObsInfo[SatLabel]["t_n_3"]=PrevPreproObsInfo[SatLabel]["t_n_2"]
                 PrevPreproObsInfo[SatLabel]["t_n_2"]=PrevPreproObsInfo[SatLabel]["t_n_1"]
-                PrevPreproObsInfo[SatLabel]["t_n_1"]=PreproObsInfo[SatLabel]["Sod"]
+                PrevPreproObsInfo[SatLabel]["t_n_1"]=PreproObsInfo[SatLabel]["SodNs"]
 
 
         #reset hatch filter
@@ -290,7 +308,7 @@ def runPreProcMeas(Conf, Rcvr, ObsInfo, PrevPreproObsInfo, ObsData):
             PrevPreproObsInfo[SatLabel]["SmoothC1"]=PreproObsInfo[SatLabel]["C1"]
             PrevPreproObsInfo[SatLabel]["SmoothC1"]=PreproObsInfo[SatLabel]["SmoothC1"]
             PrevPreproObsInfo[SatLabel]["PrevL1"]=PreproObsInfo[SatLabel]["L1"]
-            PrevPreproObsInfo[SatLabel]['PrevEpoch']=PreproObsInfo[SatLabel]["Sod"]
+            PrevPreproObsInfo[SatLabel]['PrevEpoch']=PreproObsInfo[SatLabel]["SodNs"]
             PrevPreproObsInfo[SatLabel]["PrevRangeRateL1"]= -1000
             PrevPreproObsInfo[SatLabel]["PrevPhaseRateL1"]= -1000
             ResetHF[SatLabel]=0
@@ -298,10 +316,12 @@ def runPreProcMeas(Conf, Rcvr, ObsInfo, PrevPreproObsInfo, ObsData):
             PrevPreproObsInfo[SatLabel]["L1_n_1"] = 0.0
             PrevPreproObsInfo[SatLabel]["L1_n_2"] = 0.0
             PrevPreproObsInfo[SatLabel]["L1_n_3"] = 0.0
-            PrevPreproObsInfo[SatLabel]["t_n_3"] = 0.0
-            PrevPreproObsInfo[SatLabel]["t_n_2"] = 0.0
-            PrevPreproObsInfo[SatLabel]["t_n_1"] = 0.0
+            PrevPreproObsInfo[SatLabel]["t_n_3"] = 0
+            PrevPreproObsInfo[SatLabel]["t_n_2"] = 0
+            PrevPreproObsInfo[SatLabel]["t_n_1"] = 0
             PrevPreproObsInfo[SatLabel]["CsBuff"]= [0]*int(Conf["MIN_NCS_TH"][2])
+            PrevPreproObsInfo[SatLabel]["HatchDivN"] = 0
+            PrevPreproObsInfo[SatLabel]["HatchDivTime"] = 0.0
             continue
 
             # code smooothing REQ-100
@@ -374,6 +394,50 @@ def runPreProcMeas(Conf, Rcvr, ObsInfo, PrevPreproObsInfo, ObsData):
                 ResetHF[SatLabel] = 1
                 continue
 #-----------------------------------------------------------------------------------------------------------------------
+        # hatch filter divergence monitor
+        # Exponential average of the code minus carrier over HATCH_DIV_TIME
+        # and its mean in the arc, updated in O(1) per epoch. Their difference
+        # is the divergence, rejected when over HATCH_DIV_TH for
+        # HATCH_DIV_PERSIST
+        Cmc = PreproObsInfo[SatLabel]["C1"] - PreproObsInfo[SatLabel]["L1"] * Const.GPS_L1_WAVE
+        if PrevPreproObsInfo[SatLabel]["HatchDivN"] == 0:
+            DivDt = 0.0
+            PrevPreproObsInfo[SatLabel]["HatchDiv"] = Cmc
+            PrevPreproObsInfo[SatLabel]["HatchDivRef"] = Cmc
+        else:
+            # Time since the previous epoch of this satellite
+            DivDt = (PreproObsInfo[SatLabel]["SodNs"] - \
+                PrevPreproObsInfo[SatLabel]["HatchDivEpoch"]) / NS_IN_S
+        PrevPreproObsInfo[SatLabel]["HatchDivEpoch"] = PreproObsInfo[SatLabel]["SodNs"]
+        PrevPreproObsInfo[SatLabel]["HatchDivN"] = PrevPreproObsInfo[SatLabel]["HatchDivN"] + 1
+
+        Beta = min(DivDt / Conf["HATCH_DIV_TIME"], 1.0) if Conf["HATCH_DIV_TIME"] > 0 else 1.0
+        PrevPreproObsInfo[SatLabel]["HatchDiv"] = PrevPreproObsInfo[SatLabel]["HatchDiv"] + \
+            Beta * (Cmc - PrevPreproObsInfo[SatLabel]["HatchDiv"])
+        PrevPreproObsInfo[SatLabel]["HatchDivRef"] = PrevPreproObsInfo[SatLabel]["HatchDivRef"] + \
+            (Cmc - PrevPreproObsInfo[SatLabel]["HatchDivRef"]) / PrevPreproObsInfo[SatLabel]["HatchDivN"]
+        HatchDiv = PrevPreproObsInfo[SatLabel]["HatchDiv"] - PrevPreproObsInfo[SatLabel]["HatchDivRef"]
+        PreproObsInfo[SatLabel]["HatchDiv"] = HatchDiv
+
+        if abs(HatchDiv) > Conf["HATCH_DIV_TH"]:
+            PrevPreproObsInfo[SatLabel]["HatchDivTime"] = \
+                PrevPreproObsInfo[SatLabel]["HatchDivTime"] + DivDt
+        else:
+            PrevPreproObsInfo[SatLabel]["HatchDivTime"] = 0.0
+
+        if Conf["HATCH_DIV_TH"] > 0 and \
+                PrevPreproObsInfo[SatLabel]["HatchDivTime"] >= Conf["HATCH_DIV_PERSIST"] and \
+                PrevPreproObsInfo[SatLabel]["HatchDivTime"] > 0:
+            PreproObsInfo[SatLabel]["RejectionCause"] = REJECTION_CAUSE["HATCH_DIV"]
+            PreproObsInfo[SatLabel]["ValidL1"] = 0
+            # Restart the smoothing from the raw code in the next epoch,
+            # and the divergence statistics with the new arc
+            PreproObsInfo[SatLabel]["SmoothC1"] = PreproObsInfo[SatLabel]["C1"]
+            PrevPreproObsInfo[SatLabel]["Ksmooth"] = 0
+            PrevPreproObsInfo[SatLabel]["HatchDivN"] = 0
+            PrevPreproObsInfo[SatLabel]["HatchDivTime"] = 0.0
+            continue
+#-----------------------------------------------------------------------------------------------------------------------
 
         #update meas smoothing status and hf convergence
         if PrevPreproObsInfo[SatLabel]["Ksmooth"]> Conf["HATCH_STATE_F"]*Conf["HATCH_TIME"] and\
@@ -383,20 +447,30 @@ def runPreProcMeas(Conf, Rcvr, ObsInfo, PrevPreproObsInfo, ObsData):
             PreproObsInfo[SatLabel]["Status"] = 0
 
     #REQ-110 AATR
-    for x in PreproObsInfo:
-        PreproObsInfo[x]["Mpp"]=computeIonoMappingFunction(PreproObsInfo[x]["Elevation"])
+    # Compute the iono mapping function of all the satellites at once
+    global IonoMappingLut
+    Elevations = [PreproObsInfo[x]["Elevation"] for x in PreproObsInfo]
+    if Conf["MPP_LUT_STEP"] > 0:
+        if IonoMappingLut is None or IonoMappingLut["Step"] != Conf["MPP_LUT_STEP"]:
+            IonoMappingLut = buildIonoMappingLut(Conf["MPP_LUT_STEP"])
+        Mpps = [interpolateIonoMappingFunction(IonoMappingLut, Elev) for Elev in Elevations]
+    else:
+        Mpps = computeIonoMappingFunction(np.array(Elevations)).tolist()
+
+    for x, Mpp in zip(PreproObsInfo, Mpps):
+        PreproObsInfo[x]["Mpp"]=Mpp
         if PreproObsInfo[x]["ValidL1"]>0 and PreproObsInfo[x]["L2"]>0:
             PreproObsInfo[x]["GeomFree"]=Const.GPS_L1_WAVE*PreproObsInfo[x]["L1"]-\
                                          Const.GPS_L2_WAVE*PreproObsInfo[x]["L2"]
             PreproObsInfo[x]["GeomFree"]=PreproObsInfo[x]["GeomFree"]/(1-Const.GPS_GAMMA_L1L2)
             if (PrevPreproObsInfo[x]["PrevGeomFree"])>0:
                 dSTEC=(PreproObsInfo[x]["GeomFree"] - PrevPreproObsInfo[x]["PrevGeomFree"]) / \
-                      (PreproObsInfo[x]["Sod"] - PrevPreproObsInfo[x]["PrevGeomFreeEpoch"])
+                      ((PreproObsInfo[x]["SodNs"] - PrevPreproObsInfo[x]["PrevGeomFreeEpoch"]) / NS_IN_S)
                 dVTEC=dSTEC/PreproObsInfo[x]["Mpp"]
                 PreproObsInfo[x]["VtecRate"]=dVTEC*1000
                 PreproObsInfo[x]["iAATR"]=PreproObsInfo[x]["VtecRate"]/PreproObsInfo[x]["Mpp"]
         PrevPreproObsInfo[x]["PrevGeomFree"]= PreproObsInfo[x]["GeomFree"]
-        PrevPreproObsInfo[x]["PrevGeomFreeEpoch"]=PreproObsInfo[x]["Sod"]
+        PrevPreproObsInfo[x]["PrevGeomFreeEpoch"]=PreproObsInfo[x]["SodNs"]
         # update prev status for functions
 
     for y in PreproObsInfo:
@@ -408,10 +482,10 @@ def runPreProcMeas(Conf, Rcvr, ObsInfo, PrevPreproObsInfo, ObsData):
         # Update epoch
         PrevPreproObsInfo[y]['t_n_3'] = PrevPreproObsInfo[y]['t_n_2']
         PrevPreproObsInfo[y]['t_n_2'] = PrevPreproObsInfo[y]['t_n_1']
-        PrevPreproObsInfo[y]['t_n_1'] = PreproObsInfo[y]['Sod']
+        PrevPreproObsInfo[y]['t_n_1'] = PreproObsInfo[y]['SodNs']
 
 
-        PrevPreproObsInfo[y]['PrevEpoch'] = PreproObsInfo[y]['Sod']
+        PrevPreproObsInfo[y]['PrevEpoch'] = PreproObsInfo[y]['SodNs']
         PrevPreproObsInfo[y]['PrevL1'] = PreproObsInfo[y]['L1']
         PrevPreproObsInfo[y]['PrevRej'] = PreproObsInfo[y]['RejectionCause']
         PrevPreproObsInfo[y]["PrevSmoothC1"] = PreproObsInfo[y]["SmoothC1"]
@@ -19,6 +19,10 @@
 
 
 import sys, os
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing.shared_memory import SharedMemory
 from pandas import unique
 from pandas import read_csv
 from InputOutput import PreproIdx
@@ -28,6 +32,7 @@ sys.path.append(os.getcwd() + '/' + \
                 os.path.dirname(sys.argv[0]) + '/' + 'COMMON')
 from COMMON import GnssConstants
 from COMMON.Plots import generatePlot
+from COMMON.Plots import closeFigureTemplates
 import numpy as np
 
 
@@ -50,6 +55,9 @@ def initPlot(PreproObsFile, PlotConf, Title, Label):
     PlotConf["Path"] = sys.argv[1] + '/OUT/PPVE/figures/%s/' % Label + \
                        '%s_%s_Y%sD%s.png' % (Label, Rcvr, Year, Doy)
 
+    # Reuse the same figure for all the days and receivers
+    PlotConf["Template"] = Label
+
 def plotSatVisibility(PreproObsFile, PreproObsData):
     PlotConf = {}
 
@@ -73,6 +81,8 @@ def plotSatVisibility(PreproObsFile, PreproObsData):
     PlotConf["Legend"] = False
     PlotConf["DoubleAxis"] = False
     PlotConf["NotConv"] = True
+    # PRNs are categories, keep one marker per point
+    PlotConf["Render"] = "SCATTER"
     #   filter the output x sat
     PlotConf["xData"] = {}
     PlotConf["yData"] = {}
@@ -110,12 +120,12 @@ def plotNumSats(PreproObsFile, PreproObsData):
     Sats = []
     SmSats = []
 
-    for SOD in unique(PreproObsData[PreproIdx["SOD"]]):
-        Filter = (PreproObsData[PreproIdx["SOD"]] == SOD)
-        Sats.append(len(PreproObsData[PreproIdx["SOD"]][Filter]))
-
-        Filter = ((PreproObsData[PreproIdx["SOD"]] == SOD) & (PreproObsData[PreproIdx["STATUS"]] == 1))
-        SmSats.append(len(PreproObsData[PreproIdx["SOD"]][Filter]))
+    # Satellites per epoch counted in one pass (high-rate files have
+    # hundreds of thousands of epochs)
+    Epochs, EpochIdx = np.unique(PreproObsData[PreproIdx["SOD"]], return_inverse=True)
+    Sats = np.bincount(EpochIdx)
+    SmSats = np.bincount(EpochIdx,
+        weights=PreproObsData[PreproIdx["STATUS"]] == 1).astype(int)
 
     PlotConf["xData"] = {}
     PlotConf["yData"] = {}
@@ -124,12 +134,12 @@ def plotNumSats(PreproObsFile, PreproObsData):
     Label = 0
     PlotConf["Label"][Label] = 'RAW'
     PlotConf["Color"][Label] = 'orange'
-    PlotConf["xData"][Label] = unique(PreproObsData[PreproIdx["SOD"]]) / GnssConstants.S_IN_H
+    PlotConf["xData"][Label] = Epochs / GnssConstants.S_IN_H
     PlotConf["yData"][Label] = Sats
     Label = 1
     PlotConf["Label"][Label] = 'SMOOTHED'
     PlotConf["Color"][Label] = 'green'
-    PlotConf["xData"][Label] = unique(PreproObsData[PreproIdx["SOD"]]) / GnssConstants.S_IN_H
+    PlotConf["xData"][Label] = Epochs / GnssConstants.S_IN_H
     PlotConf["yData"][Label] = SmSats
     PlotConf["Grid"] = True
     PlotConf["Legend"] = True
@@ -217,9 +227,9 @@ def plotRejectionFlags(PreproObsFile, PreproObsData):
     PlotConf["Type"] = "Lines"
     PlotConf["FigSize"] = (10, 7)
     PlotConf["yLabel"] = "Rejection Flags"
-    PlotConf["yTicks"] = range(1, 11)
+    PlotConf["yTicks"] = range(1, len(REJECTION_CAUSE_DESC) + 1)
     PlotConf["yTicksLabels"] = REJECTION_CAUSE_DESC.keys()
-    PlotConf["yLim"] = [0, 11]
+    PlotConf["yLim"] = [0, len(REJECTION_CAUSE_DESC) + 1]
     PlotConf["ColorBar"] = "gist_ncar"
     PlotConf["ColorBarLabel"] = "GPS-PRN"
     PlotConf["ColorBarMin"] = 0.
@@ -446,63 +456,224 @@ def plotAatr(PreproObsFile, PreproObsData):
 
     generatePlot(PlotConf)
 
-def generatePreproPlots(PreproObsFile):
-
-    # Satellite Visibility
-    PreproObsData = read_csv(PreproObsFile, delim_whitespace=True, skiprows=1, header=None, usecols=[PreproIdx["SOD"], PreproIdx["PRN"], PreproIdx["ELEV"], PreproIdx["STATUS"]])
-    print("Satellite Visibility")
-    plotSatVisibility(PreproObsFile, PreproObsData)
-
-    # Number of Satellites
-    PreproObsData = read_csv(PreproObsFile, delim_whitespace=True, skiprows=1, header=None, usecols=[PreproIdx["SOD"], PreproIdx["STATUS"]])
-    print("Number of Satellites")
-    plotNumSats(PreproObsFile, PreproObsData)
-
-
-    # Satellite C1 - C1Smoothed
-    PreproObsData = read_csv(PreproObsFile, delim_whitespace=True, skiprows=1, header=None, usecols=[PreproIdx["SOD"], PreproIdx["STATUS"], PreproIdx["C1"], PreproIdx["C1SMOOTHED"],
-                                      PreproIdx["S1"]])
-    print("Satellite C1 - C1Smoothed")
-    plotC1C1Smoothed(PreproObsFile, PreproObsData)
-
-    # Satellite C1 - C1Smoothed vs Elevation
-    PreproObsData = read_csv(PreproObsFile, delim_whitespace=True, skiprows=1, header=None, usecols=[PreproIdx["ELEV"], PreproIdx["STATUS"], PreproIdx["C1"], PreproIdx["C1SMOOTHED"],
-                                      PreproIdx["S1"]])
-    print("Satellite C1 - C1Smoothed vs Elevation")
-    plotC1C1SmoothedvsElev(PreproObsFile, PreproObsData)
-
-    # Satellite Rejection Flag
-    PreproObsData = read_csv(PreproObsFile, delim_whitespace=True, skiprows=1, header=None, usecols=[PreproIdx["SOD"], PreproIdx["PRN"], PreproIdx["REJECT"]])
-    print("Satellite Rejection Flag")
-    plotRejectionFlags(PreproObsFile, PreproObsData)
-
-    # Satellite Code Rate
-    PreproObsData = read_csv(PreproObsFile, delim_whitespace=True, skiprows=1, header=None, usecols=[PreproIdx["SOD"], PreproIdx["STATUS"], PreproIdx["CODE RATE"], PreproIdx["ELEV"]])
-    print("Satellite Code Rate")
-    plotCodeRate(PreproObsFile, PreproObsData)
-
-    # Satellite Code Rate Step
-    PreproObsData = read_csv(PreproObsFile, delim_whitespace=True, skiprows=1, header=None, usecols=[PreproIdx["SOD"], PreproIdx["STATUS"], PreproIdx["CODE ACC"], PreproIdx["ELEV"]])
-    print("Satellite Code Rate Step")
-    plotCodeRateStep(PreproObsFile, PreproObsData)
-
-    # Satellite Phase Rate
-    PreproObsData = read_csv(PreproObsFile, delim_whitespace=True, skiprows=1, header=None, usecols=[PreproIdx["SOD"], PreproIdx["STATUS"], PreproIdx["PHASE RATE"],
-                                      PreproIdx["ELEV"]])
-    print("Satellite Phase Rate")
-    plotPhaseRate(PreproObsFile, PreproObsData)
-
-    # Satellite Phase Rate Step
-    PreproObsData = read_csv(PreproObsFile, delim_whitespace=True, skiprows=1, header=None, usecols=[PreproIdx["SOD"], PreproIdx["STATUS"], PreproIdx["PHASE ACC"], PreproIdx["ELEV"]])
-    print("Satellite Phase Rate Step")
-    plotPhaseRateStep(PreproObsFile, PreproObsData)
-
-    # Satellite VTEC Gradient
-    PreproObsData = read_csv(PreproObsFile, delim_whitespace=True, skiprows=1, header=None, usecols=[PreproIdx["SOD"], PreproIdx["STATUS"], PreproIdx["VTEC RATE"], PreproIdx["ELEV"]])
-    print("Satellite VTEC Gradient")
-    plotVtecGradient(PreproObsFile, PreproObsData)
-
-    # Satellite Instantaneus AATR
-    PreproObsData = read_csv(PreproObsFile, delim_whitespace=True, skiprows=1, header=None, usecols=[PreproIdx["SOD"], PreproIdx["STATUS"], PreproIdx["iAATR"], PreproIdx["ELEV"]])
-    print("Satellite Instantaneus AATR")
-    plotAatr(PreproObsFile, PreproObsData)
\ No newline at end of file
+# PREPRO figure set
+PreproPlots = OrderedDict({})
+PreproPlots["Satellite Visibility"] = plotSatVisibility
+PreproPlots["Number of Satellites"] = plotNumSats
+PreproPlots["Satellite C1 - C1Smoothed"] = plotC1C1Smoothed
+PreproPlots["Satellite C1 - C1Smoothed vs Elevation"] = plotC1C1SmoothedvsElev
+PreproPlots["Satellite Rejection Flag"] = plotRejectionFlags
+PreproPlots["Satellite Code Rate"] = plotCodeRate
+PreproPlots["Satellite Code Rate Step"] = plotCodeRateStep
+PreproPlots["Satellite Phase Rate"] = plotPhaseRate
+PreproPlots["Satellite Phase Rate Step"] = plotPhaseRateStep
+PreproPlots["Satellite VTEC Gradient"] = plotVtecGradient
+PreproPlots["Satellite Instantaneus AATR"] = plotAatr
+
+# PREPRO columns used by the figure set
+PreproPlotsColumns = [
+    PreproIdx["SOD"],
+    PreproIdx["PRN"],
+    PreproIdx["ELEV"],
+    PreproIdx["REJECT"],
+    PreproIdx["STATUS"],
+    PreproIdx["C1"],
+    PreproIdx["C1SMOOTHED"],
+    PreproIdx["S1"],
+    PreproIdx["CODE RATE"],
+    PreproIdx["CODE ACC"],
+    PreproIdx["PHASE RATE"],
+    PreproIdx["PHASE ACC"],
+    PreproIdx["VTEC RATE"],
+    PreproIdx["iAATR"],
+]
+
+# Types of the PREPRO columns in memory: single precision (relative
+# error below 1e-7, far below the resolution of the figures), double
+# for the times and the ranges, whose differences are plotted
+PreproPlotsTypes = OrderedDict({})
+for Column in PreproPlotsColumns:
+    PreproPlotsTypes[Column] = np.float32
+PreproPlotsTypes[PreproIdx["SOD"]] = np.float64
+PreproPlotsTypes[PreproIdx["PRN"]] = np.int16
+PreproPlotsTypes[PreproIdx["REJECT"]] = np.int8
+PreproPlotsTypes[PreproIdx["STATUS"]] = np.int8
+PreproPlotsTypes[PreproIdx["C1"]] = np.float64
+PreproPlotsTypes[PreproIdx["C1SMOOTHED"]] = np.float64
+
+# Number of PREPRO lines parsed at once
+PREPRO_PLOTS_CHUNK = 1000000
+
+# Pool of processes rendering the figures, kept between calls
+PlotsPool = None
+
+def readPreproColumns(PreproObsFile):
+
+    # Purpose: read once the PREPRO columns used by the figure set
+
+    # Returns
+    # =======
+    # PreproObsData: dict
+    #         Column arrays indexed by PreproIdx
+
+    # Parsed by chunks, so that only the typed columns of a high-rate
+    # day are kept in memory
+    Chunks = OrderedDict([(Column, []) for Column in PreproPlotsColumns])
+    for Chunk in read_csv(PreproObsFile, delim_whitespace=True, skiprows=1,
+        header=None, usecols=PreproPlotsColumns, dtype=PreproPlotsTypes,
+        chunksize=PREPRO_PLOTS_CHUNK):
+        for Column in PreproPlotsColumns:
+            Chunks[Column].append(Chunk[Column].to_numpy())
+
+    return OrderedDict([(Column, np.concatenate(Values) if Values else
+        np.empty(0, dtype=PreproPlotsTypes[Column]))
+        for Column, Values in Chunks.items()])
+
+# End of readPreproColumns()
+
+def shareColumns(PreproObsData):
+
+    # Purpose: copy the column arrays to a shared memory block
+
+    # Returns
+    # =======
+    # Shm: SharedMemory
+    #         Shared memory block (to be unlinked by the caller)
+    # Layout: list
+    #         (Column, dtype, length, offset) of each column in Shm
+
+    Size = sum(Values.nbytes for Values in PreproObsData.values())
+    Shm = SharedMemory(create=True, size=max(Size, 1))
+
+    Layout = []
+    Offset = 0
+    for Column, Values in PreproObsData.items():
+        SharedValues = np.ndarray(Values.shape, dtype=Values.dtype,
+            buffer=Shm.buf, offset=Offset)
+        SharedValues[:] = Values
+        Layout.append((Column, Values.dtype.str, len(Values), Offset))
+        Offset = Offset + Values.nbytes
+
+    del SharedValues
+
+    return Shm, Layout
+
+# End of shareColumns()
+
+def renderPreproPlot(PlotName, PreproObsFile, ShmName, Layout):
+
+    # Purpose: render one figure of the set from the shared columns
+    #          (executed by the worker processes)
+
+    Shm = SharedMemory(name=ShmName)
+    PreproObsData = {}
+    for Column, DType, Length, Offset in Layout:
+        PreproObsData[Column] = np.ndarray((Length,), dtype=np.dtype(DType),
+            buffer=Shm.buf, offset=Offset)
+        PreproObsData[Column].flags.writeable = False
+
+    PreproPlots[PlotName](PreproObsFile, PreproObsData)
+
+    del PreproObsData
+    Shm.close()
+
+    return PlotName
+
+# End of renderPreproPlot()
+
+def renderPreproPlotsParallel(PreproObsFile, PreproObsData, NProc):
+
+    # Purpose: render the figure set in a pool of processes sharing
+    #          the read-only column arrays
+
+    # Returns
+    # =======
+    # Pending: list
+    #         Figures that could not be rendered
+
+    global PlotsPool
+
+    Pending = list(PreproPlots.keys())
+
+    # The workers are forked, so that Petrus.py is not executed again
+    if not "fork" in multiprocessing.get_all_start_methods():
+        sys.stderr.write("WARNING: fork not available, rendering figures serially\n")
+        return Pending
+
+    Shm = None
+    try:
+        if PlotsPool is None:
+            PlotsPool = ProcessPoolExecutor(max_workers=NProc,
+                mp_context=multiprocessing.get_context("fork"))
+
+        Shm, Layout = shareColumns(PreproObsData)
+
+        Futures = [PlotsPool.submit(renderPreproPlot, PlotName,
+            PreproObsFile, Shm.name, Layout) for PlotName in Pending]
+
+        for Future in as_completed(Futures):
+            PlotName = Future.result()
+            print(PlotName)
+            Pending.remove(PlotName)
+
+    except Exception as Error:
+        sys.stderr.write("WARNING: parallel rendering failed (%s), "\
+            "rendering remaining figures serially\n" % Error)
+        closePreproPlots()
+
+    finally:
+        if Shm is not None:
+            Shm.close()
+            Shm.unlink()
+
+    return Pending
+
+# End of renderPreproPlotsParallel()
+
+def generatePreproPlots(PreproObsFile, NProc=1):
+
+    # Purpose: generate the PREPRO figure set
+
+    # Parameters
+    # ==========
+    # PreproObsFile: str
+    #         Path to PREPRO OBS file
+    # NProc: int
+    #         Number of rendering processes
+    #         (0: one per CPU, 1: serial rendering)
+
+    # Returns
+    # =======
+    # Nothing
+
+    # Read all the columns at once
+    PreproObsData = readPreproColumns(PreproObsFile)
+
+    NProc = int(NProc)
+    if NProc == 0:
+        NProc = os.cpu_count() or 1
+
+    Pending = list(PreproPlots.keys())
+    if NProc > 1:
+        Pending = renderPreproPlotsParallel(PreproObsFile, PreproObsData, NProc)
+
+    # Serial rendering
+    for PlotName in Pending:
+        print(PlotName)
+        PreproPlots[PlotName](PreproObsFile, PreproObsData)
+
+# End of generatePreproPlots()
+
+def closePreproPlots():
+
+    # Purpose: release the rendering processes and the figures
+
+    global PlotsPool
+
+    if PlotsPool is not None:
+        PlotsPool.shutdown()
+        PlotsPool = None
+
+    closeFigureTemplates()
+
+# End of closePreproPlots()
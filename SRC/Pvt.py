@@ -0,0 +1,392 @@
+#!/usr/bin/env python
+
+########################################################################
+# PETRUS/SRC/Pvt.py:
+# This is the PVT Module of PETRUS tool
+#
+#  Project:        PETRUS
+#  File:           Pvt.py
+#  Date(YY/MM/DD): 01/02/21
+#
+#   Author: GNSS Academy
+#   Copyright 2021 GNSS Academy
+#
+# -----------------------------------------------------------------
+# Date       | Author             | Action
+# -----------------------------------------------------------------
+#
+# The satellite positions of each epoch are buffered row by row, in the
+# order of the measurements buffered by the Corrections, and the
+# Weighted Least Squares PVT of the epochs of a batch of corrected
+# measurements (CORRC1 weighted with SIGMAUERE) is solved at once: each
+# Gauss-Newton iteration updates the stack of the epochs that have not
+# converged yet. The Protection Levels of each solution are computed
+# with its own satellites and weights.
+########################################################################
+
+
+# Import External and Internal functions and Libraries
+#----------------------------------------------------------------------
+import sys, os
+from collections import OrderedDict
+import numpy as np
+from COMMON import GnssConstants as Const
+from COMMON.Coordinates import xyz2llhArray
+from COMMON.Coordinates import ecef2enuArray
+from Integrity import computeProtectionLevels
+
+# Constellations of each NAV_SOLUTION
+NAV_SOLUTION_CONSTS = {"GPS": "G", "GAL": "E", "GPSGAL": "GE"}
+
+def initPvtInfo():
+
+    # Purpose: initialize the buffer of PVT epochs
+
+    # Returns
+    # =======
+    # PvtInfo: dict
+    #         Dictionary containing one entry per buffered epoch, and
+    #         one per buffered row
+
+    PvtInfo = {
+        "Sod": [],     # SoD of the epochs
+        "Doy": [],     # DoY of the epochs
+        "Epoch": [],   # Epoch of each row
+        "Used": [],    # Rows of the sats of the NAV_SOLUTION with orbits
+        "SatPos": [],  # ECEF position of the sat of each row [m]
+    }
+
+    return PvtInfo
+
+# End of initPvtInfo()
+
+def updatePvtInfo(PvtInfo, PreproObsInfo, SatPosInfo, NavSolution):
+
+    # Purpose: buffer the satellite positions of the current epoch, one
+    #          row per satellite as updateCorrInfo()
+
+    # Parameters
+    # ==========
+    # PvtInfo: dict
+    #         Dictionary containing the buffered epochs
+    # PreproObsInfo: dict
+    #         Dictionary containing Preprocessing info for the
+    #         current epoch
+    # SatPosInfo: dict
+    #         Per satellite: position at transmission time in the
+    #         ECEF frame at reception time [m] ("Pos"). Satellites
+    #         without position are not used
+    # NavSolution: str
+    #         Constellations of the solution (GPS, GAL or GPSGAL)
+
+    # Returns
+    # =======
+    # Nothing, PvtInfo is updated
+
+    Epoch = len(PvtInfo["Sod"])
+    Consts = NAV_SOLUTION_CONSTS[NavSolution]
+    for SatLabel, SatPreproObs in PreproObsInfo.items():
+        Sod = SatPreproObs["Sod"]
+        Doy = SatPreproObs["Doy"]
+        Used = SatLabel[0] in Consts and SatLabel in SatPosInfo
+        PvtInfo["Epoch"].append(Epoch)
+        PvtInfo["Used"].append(Used)
+        PvtInfo["SatPos"].append(SatPosInfo[SatLabel]["Pos"] if Used
+            else (np.nan, np.nan, np.nan))
+
+    if len(PreproObsInfo) > 0:
+        PvtInfo["Sod"].append(Sod)
+        PvtInfo["Doy"].append(Doy)
+
+# End of updatePvtInfo()
+
+def packPvtBatch(NEpochs, Epoch, SatPos, Psr, Sigma):
+
+    # Purpose: pack the rows of the used satellites in padded arrays
+
+    # Parameters
+    # ==========
+    # NEpochs: int
+    #         Number of epochs
+    # Epoch: numpy array
+    #         Epoch of each row, in increasing order
+    # SatPos: numpy array
+    #         (NRows, 3) satellite positions [m]
+    # Psr, Sigma: numpy arrays
+    #         Pseudo-range and its sigma of each row [m]
+
+    # Returns
+    # =======
+    # SatPos: numpy array
+    #         (NEpochs, NMaxSats, 3) satellite positions [m]
+    # Psr: numpy array
+    #         (NEpochs, NMaxSats) pseudo-ranges [m], NaN if no sat
+    # W: numpy array
+    #         (NEpochs, NMaxSats) weights, 0 if no sat
+
+    # Slot of each row in its epoch
+    NSats = np.bincount(Epoch, minlength=NEpochs)
+    NMaxSats = max(NSats.max(initial=0), 1)
+    Slot = np.arange(len(Epoch)) - np.searchsorted(Epoch, Epoch)
+
+    PackedPos = np.zeros((NEpochs, NMaxSats, 3))
+    PackedPsr = np.full((NEpochs, NMaxSats), np.nan)
+    W = np.zeros((NEpochs, NMaxSats))
+
+    # Scatter all the satellites at once
+    PackedPos[Epoch, Slot] = SatPos
+    PackedPsr[Epoch, Slot] = Psr
+    W[Epoch, Slot] = 1.0 / Sigma**2
+
+    return PackedPos, PackedPsr, W
+
+# End of packPvtBatch()
+
+def solveWlsqPvt(SatPos, Psr, W, X0, MaxIter):
+
+    # Purpose: solve the Weighted Least Squares PVT of a stack of
+    #          epochs with Gauss-Newton iterations. The epochs are
+    #          iterated together, and leave the stack as soon as the
+    #          position update is below LSQ_DELTA_EPS.
+
+    # Parameters
+    # ==========
+    # SatPos: numpy array
+    #         (NEpochs, NMaxSats, 3) satellite positions [m]
+    # Psr: numpy array
+    #         (NEpochs, NMaxSats) pseudo-ranges [m], NaN if no sat
+    # W: numpy array
+    #         (NEpochs, NMaxSats) weights, 0 if no sat
+    # X0: numpy array
+    #         (4,) or (NEpochs, 4) a-priori position [m] and clock [m]
+    # MaxIter: int
+    #         Maximum number of iterations
+
+    # Returns
+    # =======
+    # X: numpy array
+    #         (NEpochs, 4) position [m] and receiver clock [m]
+    # Converged: numpy array
+    #         Epochs solved within MaxIter iterations
+    # NIter: numpy array
+    #         Number of iterations of each epoch
+    # Q: numpy array
+    #         (NEpochs, 4, 4) covariance of the weighted solution in ECEF
+
+    NEpochs = Psr.shape[0]
+    NSats = np.sum(W > 0, axis=1)
+
+    X = np.array(np.broadcast_to(X0, (NEpochs, 4)), dtype=float)
+    Converged = np.zeros(NEpochs, dtype=bool)
+    NIter = np.zeros(NEpochs, dtype=int)
+    Q = np.full((NEpochs, 4, 4), np.nan)
+    PsrFilled = np.where(W > 0, Psr, 0.0)
+
+    # Epochs still iterating
+    Active = np.flatnonzero(NSats >= Const.MIN_NUM_SATS_PVT)
+
+    for Iter in range(int(MaxIter)):
+        if len(Active) == 0:
+            break
+
+        Xa = X[Active]
+        Wa = W[Active]
+
+        # Geometric ranges and Line-of-Sight unit vectors
+        Los = SatPos[Active] - Xa[:, None, :3]
+        Rho = np.sqrt(np.sum(Los**2, axis=2))
+        Rho[Wa == 0] = 1.0
+        G = np.empty(Wa.shape + (4,))
+        G[..., :3] = -Los / Rho[..., None]
+        G[..., 3] = 1.0
+
+        # Pre-fit residuals
+        Res = np.where(Wa > 0, PsrFilled[Active] - Rho - Xa[:, 3:], 0.0)
+
+        # Stacked normal equations
+        N = np.einsum('eki,ek,ekj->eij', G, Wa, G)
+        b = np.einsum('eki,ek,ek->ei', G, Wa, Res)
+
+        # Drop the epochs with a singular geometry
+        Regular = np.abs(np.linalg.det(N)) > 1e-12
+        Active = Active[Regular]
+        Dx = np.linalg.solve(N[Regular], b[Regular][..., None])[..., 0]
+
+        X[Active] = X[Active] + Dx
+        NIter[Active] = Iter + 1
+
+        # Remove the converged epochs from the stack
+        Done = np.sqrt(np.sum(Dx[:, :3]**2, axis=1)) < Const.LSQ_DELTA_EPS
+        Converged[Active[Done]] = True
+        Q[Active[Done]] = np.linalg.inv(N[Regular][Done])
+        Active = Active[~Done]
+
+    return X, Converged, NIter, Q
+
+# End of solveWlsqPvt()
+
+def computePvtGeometry(SatPos, W, X, Lon, Lat):
+
+    # Purpose: compute the PDOP and the Protection Levels of the used
+    #          satellites at the solution of each epoch, with the same
+    #          weights as the solution
+
+    # Parameters
+    # ==========
+    # SatPos: numpy array
+    #         (NEpochs, NMaxSats, 3) satellite positions [m]
+    # W: numpy array
+    #         (NEpochs, NMaxSats) weights [m^-2], 0 if no sat
+    # X: numpy array
+    #         (NEpochs, 4) position [m] and receiver clock [m], NaN if
+    #         the epoch is not solved
+    # Lon, Lat: float
+    #         Longitude and latitude of the local frame [deg]
+
+    # Returns
+    # =======
+    # Pdop: numpy array
+    #         PDOP of each epoch, NaN if the epoch is not solved
+    # Hpl, Vpl: numpy arrays
+    #         Protection Levels of each epoch [m], NaN if the epoch is
+    #         not solved
+
+    Pdop = np.full(len(X), np.nan)
+    Hpl = np.full(len(X), np.nan)
+    Vpl = np.full(len(X), np.nan)
+    Solved = np.flatnonzero(np.isfinite(X[:, 0]))
+
+    # Line-of-Sight matrices in the local frame, with the rows of no
+    # sat set to 0
+    Los = SatPos[Solved] - X[Solved, None, :3]
+    Rho = np.sqrt(np.sum(Los**2, axis=2))
+    Used = W[Solved] > 0
+    Rho[~Used] = 1.0
+    G = np.empty(Used.shape + (4,))
+    G[..., :3] = ecef2enuArray(-Los / Rho[..., None], Lon, Lat)
+    G[..., 3] = 1.0
+    G[~Used] = 0.0
+
+    # The DOPs do not depend on the frame
+    Q = np.linalg.inv(np.einsum('eki,ekj->eij', G, G))
+    Pdop[Solved] = np.sqrt(Q[:, 0, 0] + Q[:, 1, 1] + Q[:, 2, 2])
+    Hpl[Solved], Vpl[Solved] = computeProtectionLevels(G, W[Solved])
+
+    return Pdop, Hpl, Vpl
+
+# End of computePvtGeometry()
+
+def computePvtBatch(PvtInfo, CorrOut, RcvrPos, Conf):
+
+    # Purpose: solve the PVT of the buffered epochs with their corrected
+    #          measurements and empty the buffer
+
+    # Parameters
+    # ==========
+    # PvtInfo: dict
+    #         Dictionary containing the buffered epochs
+    # CorrOut: dict
+    #         Corrected measurements of the same rows, as given by
+    #         computeCorrectionsBatch()
+    # RcvrPos: list
+    #         Receiver reference position: Lon [deg], Lat [deg],
+    #         Alt [m], ECEF XYZ [m]
+    # Conf: dict
+    #         Configuration dictionary
+
+    # Returns
+    # =======
+    # PvtOut: dict
+    #         Solution of each epoch, its position errors and its
+    #         Protection Levels [m] (NaN if the epoch is not solved)
+
+    Lon, Lat, Alt, Xyz = RcvrPos
+
+    # Rows of the used sats with a valid corrected measurement
+    CorrC1 = np.asarray(CorrOut["CORRC1"], dtype=float)
+    Used = np.array(PvtInfo["Used"], dtype=bool) & \
+        (np.asarray(CorrOut["FLAG"]) == 1) & np.isfinite(CorrC1)
+    SatPos, Psr, W = packPvtBatch(len(PvtInfo["Sod"]),
+        np.array(PvtInfo["Epoch"], dtype=int)[Used],
+        np.array(PvtInfo["SatPos"], dtype=float).reshape(-1, 3)[Used],
+        CorrC1[Used], np.asarray(CorrOut["SIGMAUERE"], dtype=float)[Used])
+
+    # Solve, starting from the reference position
+    X, Converged, NIter, Q = solveWlsqPvt(SatPos, Psr, W,
+        np.append(Xyz, 0.0), Conf["MAX_LSQ_ITER"])
+
+    # The epochs not solved have no position
+    X[~Converged] = np.nan
+
+    # Solution availability, with the PDOP of the geometry of the
+    # solution (the covariance of the weighted solution is in m^2), and
+    # the Protection Levels of its satellites and weights
+    Pdop, Hpl, Vpl = computePvtGeometry(SatPos, W, X, Lon, Lat)
+    Sol = Converged & (Pdop <= Conf["PDOP_MAX"])
+
+    PvtOut = OrderedDict({})
+    PvtOut["SOD"] = np.array(PvtInfo["Sod"])
+    PvtOut["DOY"] = np.array(PvtInfo["Doy"])
+    PvtOut["NSATS"] = np.sum(W > 0, axis=1)
+    PvtOut["SOL"] = Sol.astype(int)
+    PvtOut["NITER"] = NIter
+    PvtOut["LON"], PvtOut["LAT"], PvtOut["ALT"] = \
+        xyz2llhArray(X[:, 0], X[:, 1], X[:, 2])
+    PvtOut["CLK"] = X[:, 3]
+
+    # Position errors in the local frame of the reference position
+    Enu = ecef2enuArray(X[:, :3] - np.array(Xyz), Lon, Lat)
+    PvtOut["EPE"] = Enu[:, 0]
+    PvtOut["NPE"] = Enu[:, 1]
+    PvtOut["UPE"] = Enu[:, 2]
+    PvtOut["HPE"] = np.sqrt(Enu[:, 0]**2 + Enu[:, 1]**2)
+    PvtOut["VPE"] = np.abs(Enu[:, 2])
+    PvtOut["PDOP"] = Pdop
+    PvtOut["HPL"] = Hpl
+    PvtOut["VPL"] = Vpl
+
+    # Empty the buffer
+    PvtInfo.update(initPvtInfo())
+
+    return PvtOut
+
+# End of computePvtBatch()
+
+def selectPvtEpochs(PvtOut, Sod):
+
+    # Purpose: take the solution, the position errors and the
+    #          Protection Levels of the given epochs
+
+    # Parameters
+    # ==========
+    # PvtOut: dict
+    #         Solution of the epochs, as given by computePvtBatch()
+    # Sod: numpy array
+    #         SoD of the epochs
+
+    # Returns
+    # =======
+    # Sol: numpy array
+    #         Epochs with a solution (not the epochs not solved)
+    # Hpe, Vpe, Hpl, Vpl: numpy arrays
+    #         Horizontal and Vertical Position Errors and Protection
+    #         Levels [m], NaN if the epoch is not solved
+
+    Sol = np.zeros(len(Sod), dtype=bool)
+    Values = OrderedDict(
+        [(Key, np.full(len(Sod), np.nan)) for Key in ["HPE", "VPE", "HPL", "VPL"]])
+    if len(PvtOut["SOD"]) > 0:
+        Idx = np.minimum(np.searchsorted(PvtOut["SOD"], Sod),
+            len(PvtOut["SOD"]) - 1)
+        Found = PvtOut["SOD"][Idx] == Sod
+        Sol = Found & (PvtOut["SOL"][Idx] == 1)
+        for Key, Value in Values.items():
+            Value[Found] = PvtOut[Key][Idx[Found]]
+
+    return (Sol,) + tuple(Values.values())
+
+# End of selectPvtEpochs()
+
+########################################################################
+# END OF PVT FUNCTIONS MODULE
+########################################################################
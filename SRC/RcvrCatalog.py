@@ -0,0 +1,355 @@
+#!/usr/bin/env python
+
+########################################################################
+# PETRUS/SRC/RcvrCatalog.py:
+# This is the Receiver Catalog Module of PETRUS tool
+#
+#  Project:        PETRUS
+#  File:           RcvrCatalog.py
+#  Date(YY/MM/DD): 01/02/21
+#
+#   Author: GNSS Academy
+#   Copyright 2021 GNSS Academy
+#
+# -----------------------------------------------------------------
+# Date       | Author             | Action
+# -----------------------------------------------------------------
+#
+# Loads the RCVR Positions file into a catalog of arrays, one entry
+# per column of the file (RcvrIdx) plus the ECEF positions, and selects
+# its receivers by acronym, ID, activation flag, bounding box or
+# proximity, without scanning the receivers one by one.
+#
+# The nearest receivers are found with a k-d tree of their ECEF
+# positions, built on the first query. It uses scipy when available,
+# and falls back to a brute-force search otherwise.
+########################################################################
+
+
+# Import External and Internal functions and Libraries
+#----------------------------------------------------------------------
+import sys, os
+from collections import OrderedDict
+import numpy as np
+from COMMON import GnssConstants as Const
+from COMMON.Coordinates import llh2xyzArray
+from InputOutput import RcvrIdx
+
+# Range of the numeric columns of the RCVR file: FLAG, ID, LON, LAT,
+# ALT, MASK and ACQ
+RCVR_LOW_LIM = [0, 0, Const.MIN_LON, Const.MIN_LAT, 0, Const.MIN_MASK_ANGLE, 0]
+RCVR_UPP_LIM = [1, Const.MAX_NUM_RCVR, Const.MAX_LON, Const.MAX_LAT, 1e4,
+    Const.MAX_MASK_ANGLE, 100]
+
+# Number of query points of a brute-force nearest search at once
+RCVR_QUERY_BATCH = 256
+
+def readRcvrCatalog(RcvrFile):
+
+    # Purpose: read the RCVR Positions file into a receiver catalog
+
+    # Parameters
+    # ==========
+    # RcvrFile: str
+    #         Path to RCVR Positions file
+
+    # Returns
+    # =======
+    # RcvrCatalog: dict
+    #         Per receiver, in file order: "ACR", "FLAG", "ID", "LON",
+    #         "LAT", "ALT", "MASK", "ACQ" and ECEF "XYZ" (NRcvr, 3) [m]
+    #         arrays, the row of each acronym "INDEX" and the k-d tree
+    #         "TREE", built on the first proximity query
+
+    # Read all the lines at once, without comments nor blank lines
+    with open(RcvrFile, 'r') as f:
+        Lines = [Line for Line in f.read().splitlines()
+            if Line.strip() and Line[0] != '#']
+
+    Records = [Line.split() for Line in Lines]
+    NFields = len(RcvrIdx) - 1
+    for Line, Fields in zip(Lines, Records):
+        if len(Fields) != NFields:
+            sys.stderr.write("ERROR: Wrong number of fields (%d) in RCVR file, "\
+                "expected %d: %s\n" % (len(Fields), NFields, Line))
+            sys.exit(-1)
+
+        if len(Fields[0]) > 4:
+            sys.stderr.write("ERROR: Bad acronym in RCVR file: " + Fields[0] + "\n")
+            sys.exit(-1)
+
+    if len(Records) == 0:
+        sys.stderr.write("ERROR: No receivers in RCVR file %s\n" % RcvrFile)
+        sys.exit(-1)
+
+    # Numeric columns, checked all at once
+    try:
+        Values = np.array([Fields[1:] for Fields in Records], dtype=float)
+
+    except ValueError:
+        sys.stderr.write("ERROR: Wrong type of field in RCVR file %s\n" % RcvrFile)
+        sys.exit(-1)
+
+    OutOfRange = (Values < RCVR_LOW_LIM) | (Values > RCVR_UPP_LIM)
+    if OutOfRange.any():
+        Row, Column = np.argwhere(OutOfRange)[0]
+        sys.stderr.write("ERROR: RCVR %s %s %f is out of range [%f, %f]\n" %
+            (Records[Row][0], list(RcvrIdx.keys())[Column + 1], Values[Row, Column],
+            RCVR_LOW_LIM[Column], RCVR_UPP_LIM[Column]))
+        sys.exit(-1)
+
+    RcvrCatalog = OrderedDict({})
+    RcvrCatalog["ACR"] = np.array([Fields[0] for Fields in Records])
+    for Key in ["FLAG", "ID", "LON", "LAT", "ALT", "MASK", "ACQ"]:
+        RcvrCatalog[Key] = Values[:, RcvrIdx[Key] - 1]
+    RcvrCatalog["FLAG"] = RcvrCatalog["FLAG"].astype(int)
+    RcvrCatalog["ID"] = RcvrCatalog["ID"].astype(int)
+    RcvrCatalog["XYZ"] = np.stack(llh2xyzArray(RcvrCatalog["LON"],
+        RcvrCatalog["LAT"], RcvrCatalog["ALT"]), axis=-1)
+
+    # Row of each acronym
+    RcvrCatalog["INDEX"] = OrderedDict({})
+    for Row, Acr in enumerate(RcvrCatalog["ACR"]):
+        if Acr in RcvrCatalog["INDEX"]:
+            sys.stderr.write("ERROR: Duplicated receiver in RCVR file: " + Acr + "\n")
+            sys.exit(-1)
+        RcvrCatalog["INDEX"][Acr] = Row
+
+    RcvrCatalog["TREE"] = None
+
+    return RcvrCatalog
+
+# End of readRcvrCatalog()
+
+def selectRcvrs(RcvrCatalog, Rows):
+
+    # Purpose: extract some receivers of a catalog
+
+    # Parameters
+    # ==========
+    # RcvrCatalog: dict
+    #         Receiver catalog, as given by readRcvrCatalog()
+    # Rows: numpy array
+    #         Boolean mask or rows of the receivers to extract
+
+    # Returns
+    # =======
+    # RcvrCatalog: dict
+    #         Catalog of the extracted receivers, in the order of Rows
+
+    Selection = OrderedDict({})
+    for Key in RcvrIdx:
+        Selection[Key] = RcvrCatalog[Key][Rows]
+
+    Selection["INDEX"] = OrderedDict(
+        (Acr, Row) for Row, Acr in enumerate(Selection["ACR"]))
+    Selection["TREE"] = None
+
+    return Selection
+
+# End of selectRcvrs()
+
+def selectRcvrsByAcr(RcvrCatalog, Acrs):
+
+    # Purpose: select the receivers of a list of acronyms
+
+    # Parameters
+    # ==========
+    # RcvrCatalog: dict
+    #         Receiver catalog, as given by readRcvrCatalog()
+    # Acrs: list
+    #         Acronyms of the receivers
+
+    # Returns
+    # =======
+    # RcvrCatalog: dict
+    #         Catalog of the receivers, in the order of Acrs
+
+    Missing = [Acr for Acr in Acrs if Acr not in RcvrCatalog["INDEX"]]
+    if Missing:
+        sys.stderr.write("ERROR: Receivers not in RCVR file: %s\n" %
+            " ".join(Missing))
+        sys.exit(-1)
+
+    return selectRcvrs(RcvrCatalog,
+        np.array([RcvrCatalog["INDEX"][Acr] for Acr in Acrs], dtype=int))
+
+# End of selectRcvrsByAcr()
+
+def selectRcvrsById(RcvrCatalog, Ids):
+
+    # Purpose: select the receivers of a list of IDs
+
+    # Parameters
+    # ==========
+    # RcvrCatalog: dict
+    #         Receiver catalog, as given by readRcvrCatalog()
+    # Ids: list
+    #         IDs of the receivers
+
+    # Returns
+    # =======
+    # RcvrCatalog: dict
+    #         Catalog of the receivers with any of the IDs, in file order
+
+    return selectRcvrs(RcvrCatalog, np.isin(RcvrCatalog["ID"], Ids))
+
+# End of selectRcvrsById()
+
+def selectActiveRcvrs(RcvrCatalog):
+
+    # Purpose: select the activated receivers (FLAG = 1)
+
+    # Parameters
+    # ==========
+    # RcvrCatalog: dict
+    #         Receiver catalog, as given by readRcvrCatalog()
+
+    # Returns
+    # =======
+    # RcvrCatalog: dict
+    #         Catalog of the activated receivers, in file order
+
+    return selectRcvrs(RcvrCatalog, RcvrCatalog["FLAG"] == 1)
+
+# End of selectActiveRcvrs()
+
+def selectRcvrsInBox(RcvrCatalog, LonMin, LonMax, LatMin, LatMax):
+
+    # Purpose: select the receivers inside a longitude/latitude box
+
+    # Parameters
+    # ==========
+    # RcvrCatalog: dict
+    #         Receiver catalog, as given by readRcvrCatalog()
+    # LonMin, LonMax: float
+    #         Longitude limits [deg], LonMin > LonMax for a box crossing
+    #         the antimeridian
+    # LatMin, LatMax: float
+    #         Latitude limits [deg]
+
+    # Returns
+    # =======
+    # RcvrCatalog: dict
+    #         Catalog of the receivers in the box, limits included, in
+    #         file order
+
+    Lon = RcvrCatalog["LON"]
+    if LonMin <= LonMax:
+        InLon = (Lon >= LonMin) & (Lon <= LonMax)
+    else:
+        InLon = (Lon >= LonMin) | (Lon <= LonMax)
+
+    InLat = (RcvrCatalog["LAT"] >= LatMin) & (RcvrCatalog["LAT"] <= LatMax)
+
+    return selectRcvrs(RcvrCatalog, InLon & InLat)
+
+# End of selectRcvrsInBox()
+
+def buildRcvrTree(RcvrCatalog):
+
+    # Purpose: build the k-d tree of the receiver positions, if scipy
+    #          is available
+
+    # Parameters
+    # ==========
+    # RcvrCatalog: dict
+    #         Receiver catalog, as given by readRcvrCatalog()
+
+    # Returns
+    # =======
+    # Tree: cKDTree
+    #         k-d tree of the ECEF positions, None without scipy
+
+    try:
+        from scipy.spatial import cKDTree
+
+    except ImportError:
+        return None
+
+    return cKDTree(RcvrCatalog["XYZ"])
+
+# End of buildRcvrTree()
+
+def findNearestRcvrs(RcvrCatalog, Lon, Lat, NRcvr):
+
+    # Purpose: find the nearest receivers to some locations
+
+    # Parameters
+    # ==========
+    # RcvrCatalog: dict
+    #         Receiver catalog, as given by readRcvrCatalog()
+    # Lon, Lat: float or numpy array
+    #         Locations [deg], on the ellipsoid
+    # NRcvr: int
+    #         Number of receivers to find per location
+
+    # Returns
+    # =======
+    # Rows: numpy array
+    #         (..., NRcvr) rows of the receivers in the catalog, nearest
+    #         first, to be given to selectRcvrs()
+    # Dist: numpy array
+    #         (..., NRcvr) straight-line distances [m]
+
+    NRcvr = min(NRcvr, len(RcvrCatalog["ACR"]))
+    Shape = np.broadcast(np.asarray(Lon), np.asarray(Lat)).shape
+    Query = np.stack(llh2xyzArray(*np.broadcast_arrays(Lon, Lat, 0.0)),
+        axis=-1).reshape(-1, 3)
+
+    if RcvrCatalog["TREE"] is None:
+        RcvrCatalog["TREE"] = buildRcvrTree(RcvrCatalog)
+
+    if RcvrCatalog["TREE"] is not None:
+        Dist, Rows = RcvrCatalog["TREE"].query(Query, k=NRcvr)
+        Dist, Rows = Dist.reshape(len(Query), NRcvr), Rows.reshape(len(Query), NRcvr)
+
+    else:
+        # Brute-force search, by batches of locations
+        Xyz = RcvrCatalog["XYZ"]
+        Rows = np.empty((len(Query), NRcvr), dtype=int)
+        Dist = np.empty((len(Query), NRcvr))
+        for Start in range(0, len(Query), RCVR_QUERY_BATCH):
+            Batch = slice(Start, Start + RCVR_QUERY_BATCH)
+            D2 = np.sum((Query[Batch, None, :] - Xyz[None, :, :])**2, axis=-1)
+            Nearest = np.argpartition(D2, NRcvr - 1, axis=1)[:, :NRcvr]
+            Nearest = np.take_along_axis(Nearest, np.argsort(
+                np.take_along_axis(D2, Nearest, axis=1), axis=1), axis=1)
+            Rows[Batch] = Nearest
+            Dist[Batch] = np.sqrt(np.take_along_axis(D2, Nearest, axis=1))
+
+    return Rows.reshape(Shape + (NRcvr,)), Dist.reshape(Shape + (NRcvr,))
+
+# End of findNearestRcvrs()
+
+def getRcvrInfo(RcvrCatalog):
+
+    # Purpose: convert a receiver catalog to the receiver info given by
+    #          readRcvr()
+
+    # Parameters
+    # ==========
+    # RcvrCatalog: dict
+    #         Receiver catalog, as given by readRcvrCatalog()
+
+    # Returns
+    # =======
+    # RcvrInfo: dict
+    #         Per acronym, list of the receiver fields in RcvrIdx order
+
+    RcvrInfo = OrderedDict({})
+    Columns = [RcvrCatalog[Key].tolist() for Key in RcvrIdx if Key != "XYZ"]
+    for Row, Xyz in enumerate(RcvrCatalog["XYZ"].tolist()):
+        Rcvr = [Column[Row] for Column in Columns]
+        Rcvr[RcvrIdx["FLAG"]] = float(Rcvr[RcvrIdx["FLAG"]])
+        Rcvr[RcvrIdx["ID"]] = float(Rcvr[RcvrIdx["ID"]])
+        Rcvr.append(tuple(Xyz))
+        RcvrInfo[Rcvr[RcvrIdx["ACR"]]] = Rcvr
+
+    return RcvrInfo
+
+# End of getRcvrInfo()
+
+########################################################################
+# END OF RECEIVER CATALOG FUNCTIONS MODULE
+########################################################################
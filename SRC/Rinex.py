@@ -0,0 +1,363 @@
+#!/usr/bin/env python
+
+########################################################################
+# PETRUS/SRC/Rinex.py:
+# This is the RINEX Observation Reader Module of PETRUS tool
+#
+#  Project:        PETRUS
+#  File:           Rinex.py
+#  Date(YY/MM/DD): 01/02/21
+#
+#   Author: GNSS Academy
+#   Copyright 2021 GNSS Academy
+#
+# -----------------------------------------------------------------
+# Date       | Author             | Action
+# -----------------------------------------------------------------
+#
+# Reads RINEX 2.11 and 3.x observation files, plain or compressed with
+# gzip (.gz) or bzip2 (.bz2), and streams their epochs in the layout
+# of the OBS files (ObsIdx), with typed values:
+#   SOD, DOY, YEAR: float, int, int
+#   CONST, PRN: str, int
+#   ELEV, AZIM: NaN, as RINEX files have no satellite positions
+#   C1, L1, P2, L2, S1, S2: float, 0.0 when not observed
+#
+# The file is read in blocks of RINEX_BLOCK_SIZE characters and the
+# observations are sliced from their fixed-width fields, only for the
+# columns used by PETRUS.
+# Hatanaka compressed files are not supported.
+########################################################################
+
+
+# Import External and Internal functions and Libraries
+#----------------------------------------------------------------------
+import sys, os
+import re
+import gzip, bz2
+from collections import OrderedDict
+from itertools import islice
+from operator import itemgetter
+from COMMON.Dates import convertYearMonthDay2Doy
+from InputOutput import ObsIdx
+
+# Size of the blocks read from the file [characters]
+RINEX_BLOCK_SIZE = 1 << 22
+
+# Observation codes of each OBS column, by order of preference
+# RINEX 2.11: common to all the constellations
+RINEX2_OBS_CODES = OrderedDict({})
+RINEX2_OBS_CODES["C1"] = ["C1"]
+RINEX2_OBS_CODES["L1"] = ["L1"]
+RINEX2_OBS_CODES["P2"] = ["P2", "C2"]
+RINEX2_OBS_CODES["L2"] = ["L2"]
+RINEX2_OBS_CODES["S1"] = ["S1"]
+RINEX2_OBS_CODES["S2"] = ["S2"]
+
+# RINEX 3.x: GPS codes (P2 is the L2 P(Y) or L2C code)
+RINEX3_OBS_CODES = OrderedDict({})
+RINEX3_OBS_CODES["C1"] = ["C1C"]
+RINEX3_OBS_CODES["L1"] = ["L1C"]
+RINEX3_OBS_CODES["P2"] = ["C2W", "C2P", "C2L", "C2X", "C2S"]
+RINEX3_OBS_CODES["L2"] = ["L2W", "L2P", "L2L", "L2X", "L2S"]
+RINEX3_OBS_CODES["S1"] = ["S1C"]
+RINEX3_OBS_CODES["S2"] = ["S2W", "S2P", "S2L", "S2X", "S2S"]
+
+# Columns of the OBS files read from the RINEX files
+RINEX_OBS_COLUMNS = list(RINEX2_OBS_CODES.keys())
+
+# Hatanaka compressed file names: RINEX 3 .crx and RINEX 2 .yyd
+RINEX_HATANAKA_NAME = re.compile(r"(\.crx|\.\d\dd)(\.gz|\.bz2|\.z)?$")
+
+# Width of an observation field, value and flags [characters]
+RINEX_OBS_WIDTH = 16
+RINEX_VALUE_WIDTH = 14
+
+def openRinexFile(RinexFile):
+
+    # Purpose: open a RINEX file, uncompressing it if needed
+
+    # Parameters
+    # ==========
+    # RinexFile: str
+    #         Path to the RINEX file
+
+    # Returns
+    # =======
+    # f: file descriptor
+    #         Text file descriptor
+
+    Name = os.path.basename(RinexFile).lower()
+
+    if RINEX_HATANAKA_NAME.search(Name):
+        sys.stderr.write("ERROR: Hatanaka compressed RINEX file not supported: %s\n" %
+            RinexFile)
+        sys.exit(-1)
+
+    if Name.endswith(".gz"):
+        return gzip.open(RinexFile, 'rt')
+    elif Name.endswith(".bz2"):
+        return bz2.open(RinexFile, 'rt')
+
+    return open(RinexFile, 'r')
+
+# End of openRinexFile()
+
+def readRinexLines(f):
+
+    # Purpose: read the lines of a file by blocks
+
+    # Parameters
+    # ==========
+    # f: file descriptor
+    #         Text file descriptor
+
+    # Returns
+    # =======
+    # Generator of the lines, without the end of line
+
+    Tail = ""
+    while True:
+        Block = f.read(RINEX_BLOCK_SIZE)
+        if not Block:
+            break
+        Lines = (Tail + Block).split("\n")
+        Tail = Lines.pop()
+        for Line in Lines:
+            yield Line.rstrip("\r")
+
+    if Tail:
+        yield Tail.rstrip("\r")
+
+# End of readRinexLines()
+
+def readRinexObsHeader(Lines):
+
+    # Purpose: read the header of a RINEX observation file
+
+    # Parameters
+    # ==========
+    # Lines: generator
+    #         Lines of the file, as given by readRinexLines()
+
+    # Returns
+    # =======
+    # Header: dict
+    #         Version, observation types per constellation and
+    #         approximate receiver position
+
+    Header = {
+        "Version": 0.0,      # RINEX version
+        "ObsTypes": {},      # Observation types per constellation
+        "Interval": 0.0,     # Sampling interval [s]
+        "ApproxXyz": None,   # Approximate receiver position [m]
+    }
+    ObsSys = None
+    NTypes = 0
+
+    for Line in Lines:
+        Label = Line[60:].strip()
+
+        if Label == "RINEX VERSION / TYPE":
+            Header["Version"] = float(Line[:9])
+            if Line[20] != "O":
+                sys.stderr.write("ERROR: not a RINEX observation file\n")
+                sys.exit(-1)
+
+        elif Label == "# / TYPES OF OBSERV":
+            # RINEX 2: 9 types per line, common to all constellations
+            if Line[:6].strip():
+                NTypes = int(Line[:6])
+                Header["ObsTypes"][" "] = []
+            Types = Header["ObsTypes"][" "]
+            Types.extend(Line[10 + 6 * i:12 + 6 * i]
+                for i in range(min(9, NTypes - len(Types))))
+
+        elif Label == "SYS / # / OBS TYPES":
+            # RINEX 3: 13 types per line and constellation
+            if Line[0] != " ":
+                ObsSys = Line[0]
+                NTypes = int(Line[3:6])
+                Header["ObsTypes"][ObsSys] = []
+            Types = Header["ObsTypes"][ObsSys]
+            Types.extend(Line[7 + 4 * i:10 + 4 * i]
+                for i in range(min(13, NTypes - len(Types))))
+
+        elif Label == "INTERVAL":
+            Header["Interval"] = float(Line[:10])
+
+        elif Label == "APPROX POSITION XYZ":
+            Header["ApproxXyz"] = [float(Line[14 * i:14 * (i + 1)]) for i in range(3)]
+
+        elif Label == "END OF HEADER":
+            break
+
+    if Header["Version"] < 2 or Header["Version"] >= 4:
+        sys.stderr.write("ERROR: unsupported RINEX version %.2f\n" %
+            Header["Version"])
+        sys.exit(-1)
+
+    if not Header["ObsTypes"]:
+        sys.stderr.write("ERROR: no observation types in RINEX header\n")
+        sys.exit(-1)
+
+    return Header
+
+# End of readRinexObsHeader()
+
+def buildRinexObsSlices(Header, Const):
+
+    # Purpose: find the position of the OBS columns in the records
+    #          of a constellation
+
+    # Returns
+    # =======
+    # Slices: list
+    #         Per OBS column (C1, L1, P2, L2, S1, S2): start of the
+    #         field in the satellite record (RINEX 2: its lines of 80
+    #         characters joined), None if missing
+
+    if Header["Version"] < 3:
+        Codes = RINEX2_OBS_CODES
+        Types = Header["ObsTypes"].get(" ", [])
+    else:
+        Codes = RINEX3_OBS_CODES
+        Types = Header["ObsTypes"].get(Const, [])
+
+    Slices = []
+    for Column in RINEX_OBS_COLUMNS:
+        Candidates = Codes[Column]
+        Found = [Types.index(Code) for Code in Candidates if Code in Types]
+        if not Found:
+            Slices.append(None)
+        elif Header["Version"] < 3:
+            # 5 fields per line of 80 characters
+            Slices.append(80 * (Found[0] // 5) + RINEX_OBS_WIDTH * (Found[0] % 5))
+        else:
+            # After the satellite identifier
+            Slices.append(3 + RINEX_OBS_WIDTH * Found[0])
+
+    return Slices
+
+# End of buildRinexObsSlices()
+
+def readRinexObsEpochs(RinexFile, Constels="G"):
+
+    # Purpose: stream the epochs of a RINEX observation file
+
+    # Parameters
+    # ==========
+    # RinexFile: str
+    #         Path to the RINEX observation file
+    # Constels: str
+    #         Constellations to read (G: GPS, E: Galileo...)
+
+    # Returns
+    # =======
+    # Generator of EpochInfo: list
+    #         One row per satellite, in ObsIdx order, as read by
+    #         readObsEpoch() from the OBS files
+
+    with openRinexFile(RinexFile) as f:
+        Lines = readRinexLines(f)
+        Header = readRinexObsHeader(Lines)
+        Version = Header["Version"]
+
+        # Fields of the records of each constellation:
+        # (column, start, end) of the available observations
+        Fields = {}
+        for Const in Constels:
+            Fields[Const] = [(ObsIdx[Column], Start, Start + RINEX_VALUE_WIDTH)
+                for Column, Start in zip(RINEX_OBS_COLUMNS,
+                    buildRinexObsSlices(Header, Const)) if Start is not None]
+
+        # RINEX 2: lines of the records, 5 fields per line
+        if Version < 3:
+            NRecLines = (len(Header["ObsTypes"].get(" ", [])) + 4) // 5
+
+        # Row with the default values
+        Template = [0.0] * len(ObsIdx)
+        Template[ObsIdx["ELEV"]] = float("nan")
+        Template[ObsIdx["AZIM"]] = float("nan")
+        ConstIdx = ObsIdx["CONST"]
+        PrnIdx = ObsIdx["PRN"]
+        SortKey = itemgetter(ConstIdx, PrnIdx)
+        PrevDate = None
+
+        for Line in Lines:
+            if not Line.strip():
+                continue
+
+            # Epoch record
+            if Version < 3:
+                Date = (int(Line[1:3]) + 2000 if int(Line[1:3]) < 80 else
+                    int(Line[1:3]) + 1900, int(Line[4:6]), int(Line[7:9]))
+                Sod = int(Line[10:12]) * 3600 + int(Line[13:15]) * 60 + \
+                    float(Line[15:26])
+                Flag = int(Line[28])
+                NSats = int(Line[29:32])
+            else:
+                Date = (int(Line[2:6]), int(Line[7:9]), int(Line[10:12]))
+                Sod = int(Line[13:15]) * 3600 + int(Line[16:18]) * 60 + \
+                    float(Line[18:29])
+                Flag = int(Line[31])
+                NSats = int(Line[32:35])
+
+            # Events: skip the special records that follow
+            if Flag > 1:
+                for Record in islice(Lines, NSats):
+                    pass
+                continue
+
+            if Date != PrevDate:
+                Template[ObsIdx["DOY"]] = convertYearMonthDay2Doy(*Date)
+                Template[ObsIdx["YEAR"]] = Date[0]
+                PrevDate = Date
+            Template[ObsIdx["SOD"]] = Sod
+
+            if Version < 3:
+                # Satellite list in the epoch record, 12 per line
+                SatList = Line[32:68]
+                for Record in islice(Lines, (NSats - 1) // 12):
+                    SatList = SatList + Record[32:68]
+
+                # Records of several lines, joined with the satellite
+                # identifier in front as in RINEX 3
+                Records = []
+                for i in range(NSats):
+                    Records.append(SatList[3 * i:3 * i + 3] + "".join(
+                        Record.ljust(80) for Record in islice(Lines, NRecLines)))
+                Offset = 3
+            else:
+                Records = list(islice(Lines, NSats))
+                Offset = 0
+
+            EpochInfo = []
+            for Record in Records:
+                Const = Record[0] if Record[0] != " " else "G"
+                ConstFields = Fields.get(Const)
+                if ConstFields is None:
+                    continue
+
+                Row = Template[:]
+                Row[ConstIdx] = Const
+                Row[PrnIdx] = int(Record[1:3])
+
+                # Fixed-width observation fields, blank when missing
+                for Column, Start, End in ConstFields:
+                    Field = Record[Start + Offset:End + Offset]
+                    if Field.strip():
+                        Row[Column] = float(Field)
+
+                EpochInfo.append(Row)
+
+            # Sort the satellites as in the OBS files
+            EpochInfo.sort(key=SortKey)
+
+            yield EpochInfo
+
+# End of readRinexObsEpochs()
+
+########################################################################
+# END OF RINEX FUNCTIONS MODULE
+########################################################################
@@ -0,0 +1,752 @@
+#!/usr/bin/env python
+
+########################################################################
+# PETRUS/SRC/Sbas.py:
+# This is the SBAS Messages Module of PETRUS tool
+#
+#  Project:        PETRUS
+#  File:           Sbas.py
+#  Date(YY/MM/DD): 01/02/21
+#
+#   Author: GNSS Academy
+#   Copyright 2021 GNSS Academy
+#
+# -----------------------------------------------------------------
+# Date       | Author             | Action
+# -----------------------------------------------------------------
+#
+# Reads the SBAS messages of one GEO stored in EMS format, one message
+# per line:
+#   PRN YY MM DD HH MM SS MT HEXMSG
+# with the 250 bits of the message in hexadecimal.
+#
+# The messages are decoded following RTCA MOPS DO-229 Appendix A into
+# time series of the fast corrections (MT2-5, MT24), UDREs (MT6),
+# long-term corrections (MT24, MT25), IGP vertical delays (MT26) and
+# degradation parameters (MT7, MT10), with the PRN and IGP masks (MT1,
+# MT18) applied. Each series is sorted
+# by (PRN or IGP, time) so that "the last message before t" is found
+# with a binary search on all the requested satellites or IPPs at once.
+# Other message types are counted and skipped.
+########################################################################
+
+
+# Import External and Internal functions and Libraries
+#----------------------------------------------------------------------
+import sys, os
+from collections import OrderedDict
+import numpy as np
+from COMMON.Dates import convertYearMonthDay2JulianDay
+
+# Message length and preamble + type header [bits]
+SBAS_MSG_BITS = 250
+SBAS_HDR_BITS = 14
+
+# CRC-24Q generator polynomial
+SBAS_CRC24Q_POLY = 0x1864CFB
+
+# Message timeouts for Precision Approach [s]
+# Ref.: RTCA MOPS DO-229 Table A-25
+SBAS_TIMEOUT = {
+    "MASK": 600,
+    "FC": 12,
+    "LTC": 240,
+    "IONO": 600,
+    "DEG": 240,
+}
+
+# Span between the keys of two PRNs or IGPs in the time series [s]
+SBAS_KEY_SPAN = 1e7
+
+# Variances of the UDRE and GIVE indicators [m^2]
+# (NaN: Not Monitored / Do Not Use)
+# Ref.: RTCA MOPS DO-229 Tables A-6 and A-17
+SIGMA2_UDRE = np.array([0.0520, 0.0924, 0.1444, 0.2830, 0.4678, 0.8315,
+    1.2992, 1.8709, 2.5465, 3.3260, 5.1968, 20.7870, 230.9661, 2078.695,
+    np.nan, np.nan])
+SIGMA2_GIVE = np.array([0.0084, 0.0333, 0.0749, 0.1331, 0.2079, 0.2994,
+    0.4075, 0.5322, 0.6735, 0.8315, 1.1974, 1.8709, 3.3260, 20.7870,
+    187.0826, np.nan])
+
+# Fast corrections degradation factor of each indicator of MT7 [m/s^2]
+# Ref.: RTCA MOPS DO-229 Table A-8
+SBAS_FC_AI = np.array([0.0, 0.00005, 0.00009, 0.00012, 0.00015, 0.00020,
+    0.00030, 0.00045, 0.00060, 0.00090, 0.00150, 0.00210, 0.00270, 0.00330,
+    0.00460, 0.00580])
+
+# Fast corrections slots of MT2-5
+SBAS_FC_FIRST_SLOT = {2: 0, 3: 13, 4: 26, 5: 39}
+
+#----------------------------------------------------------------------
+# IGP BANDS
+#----------------------------------------------------------------------
+
+def buildIgpBands():
+
+    # Purpose: build the latitude and longitude of the IGPs of the
+    #          11 bands, in mask order
+    #          Ref.: RTCA MOPS DO-229 Section A.4.4.9
+
+    # Returns
+    # =======
+    # IgpBands: list
+    #         Per band: (Lat, Lon) arrays of its IGPs [deg]
+
+    IgpBands = []
+
+    # Vertical bands 0-8: 8 columns of 5 deg from -180 + 40 * Band
+    Lat23 = list(range(-55, 60, 5))
+    Lat27 = [-75, -65] + Lat23 + [65, 75]
+    for Band in range(9):
+        Lat = []
+        Lon = []
+        for Col in range(8):
+            ColLon = -180 + 40 * Band + 5 * Col
+            if ColLon >= 180:
+                break
+            if ColLon % 10 != 0:
+                ColLat = Lat23
+            elif ColLon in (-180, -90, 0, 90):
+                ColLat = Lat27 + [85]
+            elif ColLon in (-140, -50, 40, 130):
+                ColLat = [-85] + Lat27
+            else:
+                ColLat = Lat27
+            Lat.extend(ColLat)
+            Lon.extend([ColLon] * len(ColLat))
+        IgpBands.append((np.array(Lat, dtype=float), np.array(Lon, dtype=float)))
+
+    # Polar bands 9 (North) and 10 (South): rows of latitude
+    for Sign in [1, -1]:
+        Lat = []
+        Lon = []
+        for RowLat, Step in [(60, 5), (65, 10), (70, 10), (75, 10), (85, 30)]:
+            RowLon = list(range(-180, 180, Step))
+            Lat.extend([Sign * RowLat] * len(RowLon))
+            Lon.extend(RowLon)
+        IgpBands.append((np.array(Lat, dtype=float), np.array(Lon, dtype=float)))
+
+    return IgpBands
+
+# End of buildIgpBands()
+
+IGP_BANDS = buildIgpBands()
+
+# Offset of the global IGP identifier of each band
+IGP_BAND_OFFSET = np.cumsum([0] + [len(Lat) for Lat, Lon in IGP_BANDS])
+
+# Location of all the IGPs by global identifier
+IGP_LAT = np.concatenate([Lat for Lat, Lon in IGP_BANDS])
+IGP_LON = np.concatenate([Lon for Lat, Lon in IGP_BANDS])
+
+# 5x5 deg index of the IGPs: global identifier of the IGP at each
+# (Lat, Lon) node, -1 if there is none (the polar bands overlap the
+# vertical ones at 60-75 deg and are only used beyond them)
+IGP_GRID_LAT = np.arange(-85, 90, 5)
+IGP_GRID_LON = np.arange(-180, 180, 5)
+IGP_GRID = np.full((len(IGP_GRID_LAT), len(IGP_GRID_LON)), -1, dtype=int)
+for IgpId in range(len(IGP_LAT) - 1, -1, -1):
+    IGP_GRID[int((IGP_LAT[IgpId] + 85) // 5), int((IGP_LON[IgpId] + 180) // 5)] = IgpId
+
+#----------------------------------------------------------------------
+# MESSAGE DECODING
+#----------------------------------------------------------------------
+
+def buildCrc24qTable():
+
+    # Purpose: build the byte-wise table of the CRC-24Q
+
+    Table = []
+    for Byte in range(256):
+        Crc = Byte << 16
+        for Bit in range(8):
+            Crc = Crc << 1
+            if Crc & 0x1000000:
+                Crc = Crc ^ SBAS_CRC24Q_POLY
+        Table.append(Crc & 0xFFFFFF)
+
+    return Table
+
+# End of buildCrc24qTable()
+
+CRC24Q_TABLE = buildCrc24qTable()
+
+def checkSbasCrc(Msg):
+
+    # Purpose: check the CRC-24Q of a 250-bit message
+
+    # Parameters
+    # ==========
+    # Msg: int
+    #         Message bits
+
+    # Returns
+    # =======
+    # Valid: bool
+    #         True if the parity of the 226 first bits matches
+
+    # 6 leading zero bits align the 226 data bits to 29 bytes
+    Data = (Msg >> 24).to_bytes(29, "big")
+    Crc = 0
+    for Byte in Data:
+        Crc = ((Crc << 8) & 0xFFFFFF) ^ CRC24Q_TABLE[(Crc >> 16) ^ Byte]
+
+    return Crc == (Msg & 0xFFFFFF)
+
+# End of checkSbasCrc()
+
+def getBits(Msg, Start, Length, Signed=False):
+
+    # Purpose: extract a field of a 250-bit message
+    #          Start is the 0-based position of its first bit
+
+    Value = (Msg >> (SBAS_MSG_BITS - Start - Length)) & ((1 << Length) - 1)
+    if Signed and Value >> (Length - 1):
+        Value = Value - (1 << Length)
+
+    return Value
+
+# End of getBits()
+
+def decodeLongTermHalf(Msg, Start, Time, PrnMask, SbasMsgs):
+
+    # Purpose: decode the 106-bit half message of long-term
+    #          corrections (MT24 second half, MT25 halves)
+
+    VelCode = getBits(Msg, Start, 1)
+    Fields = []
+
+    if VelCode == 0:
+        # Two satellites, without velocity
+        Iodp = getBits(Msg, Start + 103, 2)
+        for Sat in range(2):
+            Pos = Start + 1 + 51 * Sat
+            Fields.append((getBits(Msg, Pos, 6),      # Mask slot
+                getBits(Msg, Pos + 6, 8),             # IODE
+                getBits(Msg, Pos + 14, 9, True) * 0.125,
+                getBits(Msg, Pos + 23, 9, True) * 0.125,
+                getBits(Msg, Pos + 32, 9, True) * 0.125,
+                getBits(Msg, Pos + 41, 10, True) * 2.0**-31,
+                0.0, 0.0, 0.0, 0.0, 0.0, VelCode))
+    else:
+        # One satellite, with velocity
+        Pos = Start + 1
+        Iodp = getBits(Msg, Pos + 103, 2)
+        Fields.append((getBits(Msg, Pos, 6),
+            getBits(Msg, Pos + 6, 8),
+            getBits(Msg, Pos + 14, 11, True) * 0.125,
+            getBits(Msg, Pos + 25, 11, True) * 0.125,
+            getBits(Msg, Pos + 36, 11, True) * 0.125,
+            getBits(Msg, Pos + 47, 11, True) * 2.0**-31,
+            getBits(Msg, Pos + 58, 8, True) * 2.0**-11,
+            getBits(Msg, Pos + 66, 8, True) * 2.0**-11,
+            getBits(Msg, Pos + 74, 8, True) * 2.0**-11,
+            getBits(Msg, Pos + 82, 8, True) * 2.0**-39,
+            getBits(Msg, Pos + 90, 13) * 16.0,
+            VelCode))
+
+    # The corrections refer to the PRN mask with the same IODP
+    if Iodp not in PrnMask:
+        return
+    for Slot, *Corr in Fields:
+        if 0 < Slot <= len(PrnMask[Iodp]):
+            SbasMsgs["Ltc"].append((PrnMask[Iodp][Slot - 1], Time, *Corr))
+
+# End of decodeLongTermHalf()
+
+def decodeSbasMessage(Msg, Time, State, SbasMsgs):
+
+    # Purpose: decode one message and append its content to the
+    #          time series
+
+    # Parameters
+    # ==========
+    # Msg: int
+    #         Message bits (CRC already checked)
+    # Time: float
+    #         Reception time [s]
+    # State: dict
+    #         PRN masks by IODP and IGP masks by (band, IODI)
+    # SbasMsgs: dict
+    #         Time series being built
+
+    # Returns
+    # =======
+    # Nothing, State and SbasMsgs are updated
+
+    MsgType = getBits(Msg, 8, 6)
+    Pos = SBAS_HDR_BITS
+    PrnMask = State["PrnMask"]
+
+    if MsgType == 1:
+        # PRN mask: PRN of each set bit of the 210-bit mask
+        Mask = getBits(Msg, Pos, 210)
+        PrnMask[getBits(Msg, Pos + 210, 2)] = [Prn for Prn in range(1, 211)
+            if (Mask >> (210 - Prn)) & 1]
+
+    elif MsgType in SBAS_FC_FIRST_SLOT:
+        # Fast corrections of 13 slots
+        Iodp = getBits(Msg, Pos + 2, 2)
+        if Iodp not in PrnMask:
+            return
+        for i in range(13):
+            Slot = SBAS_FC_FIRST_SLOT[MsgType] + i
+            if Slot < len(PrnMask[Iodp]):
+                SbasMsgs["Fc"].append((PrnMask[Iodp][Slot], Time,
+                    getBits(Msg, Pos + 4 + 12 * i, 12, True) * 0.125,
+                    getBits(Msg, Pos + 160 + 4 * i, 4)))
+
+    elif MsgType == 6:
+        # Integrity information: UDREI of 51 slots
+        # (IODF not checked, the latest UDREI is used)
+        for Iodp, Mask in PrnMask.items():
+            if Iodp == State["LastIodp"]:
+                for Slot in range(min(51, len(Mask))):
+                    SbasMsgs["Udre"].append((Mask[Slot], Time,
+                        getBits(Msg, Pos + 8 + 4 * Slot, 4)))
+
+    elif MsgType == 7:
+        # Fast corrections degradation factors of 51 slots
+        Tlat = getBits(Msg, Pos, 4)
+        Iodp = getBits(Msg, Pos + 4, 2)
+        if Iodp not in PrnMask:
+            return
+        for Slot in range(min(51, len(PrnMask[Iodp]))):
+            SbasMsgs["Ai"].append((PrnMask[Iodp][Slot], Time,
+                getBits(Msg, Pos + 8 + 4 * Slot, 4), Tlat))
+
+    elif MsgType == 10:
+        # Degradation parameters of the corrections
+        SbasMsgs["Deg"].append((0, Time,
+            getBits(Msg, Pos + 20, 10) * 0.00005,  # Cltc_v1 [m/s]
+            getBits(Msg, Pos + 30, 9),             # Iltc_v1 [s]
+            getBits(Msg, Pos + 39, 10) * 0.002,    # Cltc_v0 [m]
+            getBits(Msg, Pos + 49, 9),             # Iltc_v0 [s]
+            getBits(Msg, Pos + 122, 1)))           # RSS_UDRE
+
+    elif MsgType == 18:
+        # IGP mask of one band
+        Band = getBits(Msg, Pos + 4, 4)
+        Iodi = getBits(Msg, Pos + 8, 2)
+        Mask = getBits(Msg, Pos + 10, 201)
+        if Band < len(IGP_BANDS):
+            NIgps = len(IGP_BANDS[Band][0])
+            State["IgpMask"][(Band, Iodi)] = [IGP_BAND_OFFSET[Band] + Igp
+                for Igp in range(NIgps) if (Mask >> (200 - Igp)) & 1]
+
+    elif MsgType == 24:
+        # Mixed fast (6 slots) and long-term corrections
+        Iodp = getBits(Msg, Pos + 96, 2)
+        BlockId = getBits(Msg, Pos + 98, 2)
+        if Iodp in PrnMask:
+            for i in range(6):
+                Slot = 13 * BlockId + i
+                if Slot < len(PrnMask[Iodp]):
+                    SbasMsgs["Fc"].append((PrnMask[Iodp][Slot], Time,
+                        getBits(Msg, Pos + 12 * i, 12, True) * 0.125,
+                        getBits(Msg, Pos + 72 + 4 * i, 4)))
+        decodeLongTermHalf(Msg, Pos + 106, Time, PrnMask, SbasMsgs)
+
+    elif MsgType == 25:
+        # Long-term corrections, two halves
+        decodeLongTermHalf(Msg, Pos, Time, PrnMask, SbasMsgs)
+        decodeLongTermHalf(Msg, Pos + 106, Time, PrnMask, SbasMsgs)
+
+    elif MsgType == 26:
+        # Vertical delays of 15 IGPs of the band mask
+        Band = getBits(Msg, Pos, 4)
+        BlockId = getBits(Msg, Pos + 4, 4)
+        Iodi = getBits(Msg, Pos + 203, 2)
+        Mask = State["IgpMask"].get((Band, Iodi))
+        if Mask is None:
+            return
+        for i in range(15):
+            Idx = 15 * BlockId + i
+            if Idx < len(Mask):
+                Delay = getBits(Msg, Pos + 8 + 13 * i, 9)
+                Givei = getBits(Msg, Pos + 17 + 13 * i, 4)
+                # 511: Do Not Use
+                SbasMsgs["Iono"].append((Mask[Idx], Time,
+                    np.nan if Delay == 511 else Delay * 0.125, Givei))
+
+    else:
+        State["NSkipped"] = State["NSkipped"] + 1
+
+    # The UDREIs of MT6 refer to the last PRN mask received
+    if MsgType == 1:
+        State["LastIodp"] = getBits(Msg, Pos + 210, 2)
+
+# End of decodeSbasMessage()
+
+def buildSbasSeries(Rows, Columns):
+
+    # Purpose: build a time series sorted by (identifier, time)
+
+    # Parameters
+    # ==========
+    # Rows: list
+    #         Tuples (identifier, time, values...)
+    # Columns: list
+    #         Names of the values
+
+    # Returns
+    # =======
+    # Series: dict
+    #         Column arrays and the sorted search keys
+
+    Data = np.array(Rows, dtype=float).reshape(-1, 2 + len(Columns))
+    Order = np.lexsort((Data[:, 1], Data[:, 0]))
+    Data = Data[Order]
+
+    Series = OrderedDict({})
+    Series["Id"] = Data[:, 0].astype(int)
+    Series["Time"] = Data[:, 1]
+    for i, Column in enumerate(Columns):
+        Series[Column] = Data[:, 2 + i]
+    Series["Key"] = Series["Id"] * SBAS_KEY_SPAN + Series["Time"]
+
+    return Series
+
+# End of buildSbasSeries()
+
+def readSbasFile(SbasFile, Geo, Jd0):
+
+    # Purpose: read and decode the SBAS messages of one GEO
+
+    # Parameters
+    # ==========
+    # SbasFile: str
+    #         Path to the EMS file
+    # Geo: int
+    #         PRN of the GEO to read
+    # Jd0: float
+    #         Julian Day of 0h of the processed day, as given by
+    #         convertYearMonthDay2JulianDay()
+
+    # Returns
+    # =======
+    # SbasInfo: dict
+    #         Indexed time series of the decoded corrections, with
+    #         times in seconds from 0h of the processed day (negative
+    #         for the messages of the previous day)
+
+    State = {
+        "PrnMask": {},     # PRNs of each IODP
+        "IgpMask": {},     # IGP identifiers of each (band, IODI)
+        "LastIodp": None,  # IODP of the last MT1
+        "NSkipped": 0,     # Messages of other types
+    }
+    SbasMsgs = {"Fc": [], "Udre": [], "Ltc": [], "Iono": [], "Ai": [],
+        "Deg": []}
+    NMsgs = 0
+    NBadCrc = 0
+
+    with open(SbasFile, 'r') as f:
+        for Line in f:
+            Fields = Line.split()
+            if len(Fields) < 9 or Line[0] == '#' or int(Fields[0]) != Geo:
+                continue
+
+            # Reception time
+            Jd = convertYearMonthDay2JulianDay(2000 + int(Fields[1]),
+                int(Fields[2]), int(Fields[3]))
+            Time = (Jd - Jd0) * 86400 + int(Fields[4]) * 3600 + \
+                int(Fields[5]) * 60 + float(Fields[6])
+
+            # Message bits, without the padding of the last hex digits
+            Hex = Fields[8]
+            Msg = int(Hex, 16) >> (4 * len(Hex) - SBAS_MSG_BITS)
+
+            NMsgs = NMsgs + 1
+            if not checkSbasCrc(Msg):
+                NBadCrc = NBadCrc + 1
+                continue
+
+            decodeSbasMessage(Msg, Time, State, SbasMsgs)
+
+    SbasInfo = OrderedDict({})
+    SbasInfo["NMsgs"] = NMsgs
+    SbasInfo["NBadCrc"] = NBadCrc
+    SbasInfo["NSkipped"] = State["NSkipped"]
+    SbasInfo["Fc"] = buildSbasSeries(SbasMsgs["Fc"], ["Prc", "Udrei"])
+    SbasInfo["Udre"] = buildSbasSeries(SbasMsgs["Udre"], ["Udrei"])
+    SbasInfo["Ltc"] = buildSbasSeries(SbasMsgs["Ltc"], ["Iode", "Dx", "Dy",
+        "Dz", "Daf0", "DxRate", "DyRate", "DzRate", "Daf1", "T0", "VelCode"])
+    SbasInfo["Iono"] = buildSbasSeries(SbasMsgs["Iono"], ["Delay", "Givei"])
+    SbasInfo["Ai"] = buildSbasSeries(SbasMsgs["Ai"], ["Aii", "Tlat"])
+    SbasInfo["Deg"] = buildSbasSeries(SbasMsgs["Deg"], ["CltcV1", "IltcV1",
+        "CltcV0", "IltcV0", "RssUdre"])
+
+    return SbasInfo
+
+# End of readSbasFile()
+
+#----------------------------------------------------------------------
+# QUERIES
+#----------------------------------------------------------------------
+
+def findSbasLast(Series, Id, Time, Timeout):
+
+    # Purpose: find the last message of each identifier received at
+    #          or before each time, within the timeout
+
+    # Parameters
+    # ==========
+    # Series: dict
+    #         Time series, as given by buildSbasSeries()
+    # Id, Time: numpy arrays
+    #         Requested identifiers (PRN or IGP) and times [s]
+    # Timeout: float
+    #         Maximum age of the message [s]
+
+    # Returns
+    # =======
+    # Idx: numpy array
+    #         Position of the message in the series
+    # Found: numpy array
+    #         True where a message is available
+
+    Id = np.asarray(Id, dtype=int)
+    Time = np.asarray(Time, dtype=float)
+
+    Idx = np.searchsorted(Series["Key"], Id * SBAS_KEY_SPAN + Time,
+        side='right') - 1
+    Idx = np.maximum(Idx, 0)
+
+    Found = np.zeros(Idx.shape, dtype=bool)
+    if len(Series["Key"]) > 0:
+        Found = (Series["Id"][Idx] == Id) & \
+            (Time - Series["Time"][Idx] >= 0) & \
+            (Time - Series["Time"][Idx] <= Timeout)
+
+    return Idx, Found
+
+# End of findSbasLast()
+
+def getSbasFastCorrection(SbasInfo, Prn, Time):
+
+    # Purpose: get the fast correction of each PRN at each time
+
+    # Returns
+    # =======
+    # Prc: numpy array
+    #         Pseudo-range correction [m], NaN if not available
+    # Sigma2Udre: numpy array
+    #         UDRE variance [m^2] of the last UDREI (from MT2-5, MT24
+    #         or MT6), NaN if not available or not monitored
+
+    Fc = SbasInfo["Fc"]
+    Udre = SbasInfo["Udre"]
+
+    Idx, Found = findSbasLast(Fc, Prn, Time, SBAS_TIMEOUT["FC"])
+    Prc = np.where(Found, Fc["Prc"][Idx] if len(Fc["Key"]) else 0.0, np.nan)
+
+    Udrei = np.where(Found, Fc["Udrei"][Idx] if len(Fc["Key"]) else 0.0, np.nan)
+    FcTime = np.where(Found, Fc["Time"][Idx] if len(Fc["Key"]) else 0.0, -np.inf)
+
+    # A more recent MT6 overrides the UDREI
+    Idx6, Found6 = findSbasLast(Udre, Prn, Time, SBAS_TIMEOUT["FC"])
+    if len(Udre["Key"]):
+        Newer = Found6 & (Udre["Time"][Idx6] > FcTime)
+        Udrei = np.where(Newer, Udre["Udrei"][Idx6], Udrei)
+
+    Sigma2Udre = np.full(Udrei.shape, np.nan)
+    Known = ~np.isnan(Udrei)
+    Sigma2Udre[Known] = SIGMA2_UDRE[Udrei[Known].astype(int)]
+
+    return Prc, Sigma2Udre
+
+# End of getSbasFastCorrection()
+
+def getSbasLongTermCorrection(SbasInfo, Prn, Time):
+
+    # Purpose: get the long-term correction of each PRN at each time
+
+    # Returns
+    # =======
+    # Ltc: dict
+    #         IODE, position [m], clock [s] corrections and their
+    #         rates, time of applicability, velocity code and time of
+    #         the message [s], NaN where not available
+
+    Ltc = SbasInfo["Ltc"]
+    Idx, Found = findSbasLast(Ltc, Prn, Time, SBAS_TIMEOUT["LTC"])
+
+    Out = OrderedDict({})
+    for Column in ["Iode", "Dx", "Dy", "Dz", "Daf0", "DxRate", "DyRate",
+        "DzRate", "Daf1", "T0", "VelCode", "Time"]:
+        Out[Column] = np.where(Found, Ltc[Column][Idx] if len(Ltc["Key"]) else 0.0,
+            np.nan)
+
+    return Out
+
+# End of getSbasLongTermCorrection()
+
+def getSbasFltVariance(SbasInfo, Prn, Time, Sigma2Udre, Ltc):
+
+    # Purpose: degrade the UDRE variance of each PRN at each time with
+    #          the age of its fast and long-term corrections
+    #          Ref.: RTCA MOPS DO-229 Section A.4.5.1
+    #          The range-rate corrections are not applied (eps_rrc = 0),
+    #          and eps_er is 0 in Precision Approach. Without MT7 or MT10
+    #          the corresponding terms are 0.
+
+    # Parameters
+    # ==========
+    # SbasInfo: dict
+    #         Decoded SBAS messages, as given by readSbasFile()
+    # Prn, Time: numpy arrays
+    #         Requested PRNs and times [s]
+    # Sigma2Udre: numpy array
+    #         UDRE variance, as given by getSbasFastCorrection() [m^2]
+    # Ltc: dict
+    #         Long-term corrections, as given by
+    #         getSbasLongTermCorrection()
+
+    # Returns
+    # =======
+    # Sigma2Flt: numpy array
+    #         Variance of the fast and long-term corrections [m^2],
+    #         NaN where Sigma2Udre is NaN
+
+    Time = np.asarray(Time, dtype=float)
+    Fc = SbasInfo["Fc"]
+    Ai = SbasInfo["Ai"]
+    Deg = SbasInfo["Deg"]
+
+    # Fast corrections: eps_fc = a * (t - tu + tlat)^2 / 2
+    EpsFc = np.zeros(Time.shape)
+    IdxFc, FoundFc = findSbasLast(Fc, Prn, Time, SBAS_TIMEOUT["FC"])
+    IdxAi, FoundAi = findSbasLast(Ai, Prn, Time, SBAS_TIMEOUT["DEG"])
+    Use = FoundFc & FoundAi
+    if Use.any():
+        Age = Time[Use] - Fc["Time"][IdxFc[Use]] + Ai["Tlat"][IdxAi[Use]]
+        EpsFc[Use] = SBAS_FC_AI[Ai["Aii"][IdxAi[Use]].astype(int)] * Age**2 / 2
+
+    # Long-term corrections, with the parameters of the last MT10
+    EpsLtc = np.zeros(Time.shape)
+    RssUdre = np.zeros(Time.shape, dtype=bool)
+    IdxDeg, FoundDeg = findSbasLast(Deg, np.zeros(Time.shape, dtype=int),
+        Time, SBAS_TIMEOUT["DEG"])
+    if FoundDeg.any():
+        Par = OrderedDict([(Column, np.where(FoundDeg, Deg[Column][IdxDeg],
+            np.nan)) for Column in ["CltcV1", "IltcV1", "CltcV0", "IltcV0",
+            "RssUdre"]])
+        RssUdre = Par["RssUdre"] == 1
+
+        # Velocity code 1: out of the validity interval from t0
+        Dt = Time - Ltc["T0"]
+        Dt = Dt - np.round(Dt / 86400.0) * 86400.0
+        V1 = FoundDeg & (Ltc["VelCode"] == 1)
+        EpsLtc[V1] = (Par["CltcV1"] * np.maximum(0.0,
+            np.maximum(-Dt, Dt - Par["IltcV1"])))[V1]
+
+        # Velocity code 0: steps of Iltc_v0 since the message
+        V0 = FoundDeg & (Ltc["VelCode"] == 0) & (Par["IltcV0"] > 0)
+        EpsLtc[V0] = (Par["CltcV0"] * np.floor((Time - Ltc["Time"]) / \
+            np.where(V0, Par["IltcV0"], 1.0)))[V0]
+
+    SigmaUdre = np.sqrt(Sigma2Udre)
+    Eps = EpsFc + EpsLtc
+
+    return np.where(RssUdre, Sigma2Udre + EpsFc**2 + EpsLtc**2,
+        (SigmaUdre + Eps)**2)
+
+# End of getSbasFltVariance()
+
+def getSbasIgpDelays(SbasInfo, IgpId, Time):
+
+    # Purpose: get the vertical delay and GIVE variance of IGPs
+
+    Iono = SbasInfo["Iono"]
+    IgpId = np.asarray(IgpId, dtype=int)
+
+    Idx, Found = findSbasLast(Iono, np.maximum(IgpId, 0), Time,
+        SBAS_TIMEOUT["IONO"])
+    Found = Found & (IgpId >= 0)
+
+    Delay = np.full(IgpId.shape, np.nan)
+    Sigma2 = np.full(IgpId.shape, np.nan)
+    if len(Iono["Key"]):
+        Delay[Found] = Iono["Delay"][Idx[Found]]
+        Sigma2[Found] = SIGMA2_GIVE[Iono["Givei"][Idx[Found]].astype(int)]
+
+    # Not monitored IGPs are not usable
+    Delay[np.isnan(Sigma2)] = np.nan
+
+    return Delay, Sigma2
+
+# End of getSbasIgpDelays()
+
+def getSbasIonoDelay(SbasInfo, IppLat, IppLon, Time):
+
+    # Purpose: interpolate the vertical delay of the grid at each IPP
+    #          with the four IGPs of the 5x5 deg cell around it, or
+    #          of the 10x10 deg cell if any of them is not available
+    #          (10 deg longitude cells beyond 60 deg of latitude).
+    #          The three-point and polar (beyond 75 deg) cases are not
+    #          handled and give NaN.
+    #          Ref.: RTCA MOPS DO-229 Section A.4.4.10.3
+
+    # Parameters
+    # ==========
+    # SbasInfo: dict
+    #         Decoded SBAS messages, as given by readSbasFile()
+    # IppLat, IppLon: numpy arrays
+    #         IPP latitude and longitude [deg]
+    # Time: numpy array
+    #         Times [s]
+
+    # Returns
+    # =======
+    # Delay: numpy array
+    #         Vertical delay at the IPP [m], NaN if not available
+    # Sigma2: numpy array
+    #         Vertical delay variance at the IPP [m^2]
+
+    IppLat = np.asarray(IppLat, dtype=float)
+    IppLon = np.asarray(IppLon, dtype=float)
+    Time = np.broadcast_to(np.asarray(Time, dtype=float), IppLat.shape)
+
+    Delay = np.full(IppLat.shape, np.nan)
+    Sigma2 = np.full(IppLat.shape, np.nan)
+    Pending = np.abs(IppLat) <= 75.0
+
+    for LatStep, LonStep in [(5, 5), (10, 10)]:
+        # Cell size, with 10 deg of longitude beyond 60 deg of latitude
+        CellLonStep = np.where(np.abs(IppLat) > 60.0, max(LonStep, 10), LonStep)
+        Lat1 = np.floor(IppLat / LatStep) * LatStep
+        Lon1 = np.floor(IppLon / CellLonStep) * CellLonStep
+        x = (IppLon - Lon1) / CellLonStep
+        y = (IppLat - Lat1) / LatStep
+
+        # Corners: 1 NE, 2 NW, 3 SW, 4 SE
+        Corners = [(Lat1 + LatStep, Lon1 + CellLonStep, x * y),
+            (Lat1 + LatStep, Lon1, (1 - x) * y),
+            (Lat1, Lon1, (1 - x) * (1 - y)),
+            (Lat1, Lon1 + CellLonStep, x * (1 - y))]
+
+        CellDelay = np.zeros(IppLat.shape)
+        CellSigma2 = np.zeros(IppLat.shape)
+        for Lat, Lon, W in Corners:
+            Lon = (Lon + 180.0) % 360.0 - 180.0
+            Row = np.clip(((Lat + 85) // 5).astype(int), 0, len(IGP_GRID_LAT) - 1)
+            Col = ((Lon + 180) // 5).astype(int) % len(IGP_GRID_LON)
+            IgpId = np.where(np.abs(Lat) <= 85, IGP_GRID[Row, Col], -1)
+            IgpDelay, IgpSigma2 = getSbasIgpDelays(SbasInfo, IgpId, Time)
+            CellDelay = CellDelay + W * IgpDelay
+            CellSigma2 = CellSigma2 + W * IgpSigma2
+
+        # Keep the first cell with its four IGPs available
+        Use = Pending & ~np.isnan(CellDelay)
+        Delay[Use] = CellDelay[Use]
+        Sigma2[Use] = CellSigma2[Use]
+        Pending = Pending & ~Use
+
+    return Delay, Sigma2
+
+# End of getSbasIonoDelay()
+
+########################################################################
+# END OF SBAS FUNCTIONS MODULE
+########################################################################
@@ -0,0 +1,300 @@
+#!/usr/bin/env python
+
+########################################################################
+# PETRUS/SRC/Sp3.py:
+# This is the Precise Orbits Module of PETRUS tool
+#
+#  Project:        PETRUS
+#  File:           Sp3.py
+#  Date(YY/MM/DD): 01/02/21
+#
+#   Author: GNSS Academy
+#   Copyright 2021 GNSS Academy
+#
+# -----------------------------------------------------------------
+# Date       | Author             | Action
+# -----------------------------------------------------------------
+#
+# Reads the GPS precise orbits and clocks of SP3-a/b/c/d files and
+# interpolates them at any set of satellites and epochs at once.
+#
+# The positions are interpolated with Lagrange polynomials of
+# SP3_ORDER points. As the SP3 epochs are evenly spaced, the polynomial
+# through any window of SP3_ORDER consecutive epochs is the product of
+# its samples by the same matrix: the coefficients of all the windows
+# of all the satellites are computed once (buildSp3Segments()) and
+# each position costs one Horner evaluation. The segments only depend
+# on the day, so they are shared by all the receivers.
+# The clocks are interpolated linearly.
+# Times are GPS seconds since the GPS start epoch.
+########################################################################
+
+
+# Import External and Internal functions and Libraries
+#----------------------------------------------------------------------
+import sys, os
+from collections import OrderedDict
+import numpy as np
+from COMMON import GnssConstants as Const
+from COMMON.Dates import convertYearMonthDay2JulianDay
+from Rinex import openRinexFile, readRinexLines
+from Ephemeris import EPH_TRANSIT_NITER, EPH_TRANSIT_GUESS
+from Ephemeris import rotateEarthTransit
+
+# Number of points of the Lagrange interpolation (polynomials of
+# degree SP3_ORDER - 1)
+SP3_ORDER = 10
+
+# Missing clock value [us]
+SP3_BAD_CLK = 999999.0
+
+def readSp3Files(Sp3Files):
+
+    # Purpose: read the GPS orbits and clocks of SP3 files
+
+    # Parameters
+    # ==========
+    # Sp3Files: list
+    #         Paths to the SP3 files (plain, gz or bz2), e.g. those of
+    #         the previous, current and next days
+
+    # Returns
+    # =======
+    # Sp3Info: dict
+    #         "Time" (NEpochs) sorted GPS times [s],
+    #         "Pos" (MAX_NUM_SATS_CONSTEL, NEpochs, 3) ECEF positions [m]
+    #         and "Clk" (MAX_NUM_SATS_CONSTEL, NEpochs) clocks [m], with
+    #         row PRN - 1, NaN when missing
+
+    Times = []
+    Records = []
+
+    for Sp3File in Sp3Files:
+        with openRinexFile(Sp3File) as f:
+            Lines = readRinexLines(f)
+
+            Line = next(Lines, "")
+            if not Line.startswith("#"):
+                sys.stderr.write("ERROR: not a SP3 file: %s\n" % Sp3File)
+                sys.exit(-1)
+
+            for Line in Lines:
+                # Epoch header
+                if Line.startswith("* "):
+                    Jd = convertYearMonthDay2JulianDay(int(Line[3:7]),
+                        int(Line[8:10]), int(Line[11:13]))
+                    Times.append((Jd - Const.JD_0) * Const.S_IN_D + \
+                        int(Line[14:16]) * Const.S_IN_H + int(Line[17:19]) * 60 + \
+                        float(Line[20:31]))
+
+                # Position and clock record (SP3-a/b: blank system)
+                elif Line.startswith("P") and Line[1] in "G ":
+                    Records.append((len(Times) - 1, int(Line[2:4]),
+                        float(Line[4:18]), float(Line[18:32]),
+                        float(Line[32:46]), float(Line[46:60])))
+
+                elif Line.startswith("EOF"):
+                    break
+
+    # Epochs of all the files, without repetitions
+    Time, EpochIdx = np.unique(np.array(Times, dtype=float), return_inverse=True)
+    Data = np.array(Records, dtype=float).reshape(-1, 6)
+    Epoch = EpochIdx[Data[:, 0].astype(int)]
+    Sat = Data[:, 1].astype(int) - 1
+    Valid = (Sat >= 0) & (Sat < Const.MAX_NUM_SATS_CONSTEL)
+
+    Sp3Info = OrderedDict({})
+    Sp3Info["Time"] = Time
+    Sp3Info["Pos"] = np.full((Const.MAX_NUM_SATS_CONSTEL, len(Time), 3), np.nan)
+    Sp3Info["Clk"] = np.full((Const.MAX_NUM_SATS_CONSTEL, len(Time)), np.nan)
+
+    # Positions [km] and clocks [us], 0.0 and 999999.999999 if missing
+    Pos = Data[Valid, 2:5] * 1e3
+    Pos[np.all(Data[Valid, 2:5] == 0, axis=1)] = np.nan
+    Clk = np.where(Data[Valid, 5] < SP3_BAD_CLK,
+        Data[Valid, 5] * 1e-6 * Const.SPEED_OF_LIGHT, np.nan)
+    Sp3Info["Pos"][Sat[Valid], Epoch[Valid]] = Pos
+    Sp3Info["Clk"][Sat[Valid], Epoch[Valid]] = Clk
+
+    return Sp3Info
+
+# End of readSp3Files()
+
+def buildSp3Segments(Sp3Info, Order=SP3_ORDER):
+
+    # Purpose: compute the interpolation polynomials of all the windows
+    #          of Order consecutive epochs of all the satellites
+
+    # Parameters
+    # ==========
+    # Sp3Info: dict
+    #         Orbits and clocks, as given by readSp3Files()
+    # Order: int
+    #         Number of points of the polynomials
+
+    # Returns
+    # =======
+    # Sp3Segments: dict
+    #         Epochs grid ("T0", "Step" [s], "NGrid"), polynomials
+    #         "Coef" (Order, 3, MAX_NUM_SATS_CONSTEL * NWin) of the
+    #         normalized time of each window, from its first to its
+    #         last point (-1 to 1), and clocks "Clk" on the grid [m]
+
+    Time = Sp3Info["Time"]
+    if len(Time) < Order:
+        sys.stderr.write("ERROR: not enough SP3 epochs to interpolate (%d < %d)\n" %
+            (len(Time), Order))
+        sys.exit(-1)
+
+    # Evenly spaced grid, NaN at the missing epochs
+    Step = np.min(np.diff(Time))
+    GridIdx = np.round((Time - Time[0]) / Step).astype(int)
+    NGrid = GridIdx[-1] + 1
+    Pos = np.full((Const.MAX_NUM_SATS_CONSTEL, NGrid, 3), np.nan)
+    Pos[:, GridIdx] = Sp3Info["Pos"]
+    Clk = np.full((Const.MAX_NUM_SATS_CONSTEL, NGrid), np.nan)
+    Clk[:, GridIdx] = Sp3Info["Clk"]
+
+    # Polynomial coefficients from the samples of a window, at
+    # normalized times from -1 to 1 (well conditioned)
+    Half = (Order - 1) / 2
+    Nodes = (np.arange(Order) - Half) / Half
+    FromSamples = np.linalg.inv(np.vander(Nodes, increasing=True))
+
+    # Windows of all the satellites: (Sat, Win, Axis, Point), then
+    # coefficients (Power, Axis, Sat * Win)
+    Windows = np.lib.stride_tricks.sliding_window_view(Pos, Order, axis=1)
+    Coef = np.einsum("kj,swaj->kasw", FromSamples, Windows)
+
+    Sp3Segments = OrderedDict({})
+    Sp3Segments["T0"] = Time[0]
+    Sp3Segments["Step"] = Step
+    Sp3Segments["NGrid"] = NGrid
+    Sp3Segments["NWin"] = Windows.shape[1]
+    Sp3Segments["Order"] = Order
+    Sp3Segments["Coef"] = Coef.reshape(Order, 3, -1)
+    Sp3Segments["Clk"] = Clk
+
+    return Sp3Segments
+
+# End of buildSp3Segments()
+
+def computeSp3PosClk(Sp3Segments, Prn, Time):
+
+    # Purpose: interpolate the satellite positions, velocities and
+    #          clocks
+
+    # Parameters
+    # ==========
+    # Sp3Segments: dict
+    #         Polynomials, as given by buildSp3Segments()
+    # Prn, Time: numpy arrays
+    #         PRNs and GPS times [s]
+
+    # Returns
+    # =======
+    # SatPos, SatVel: numpy arrays
+    #         (..., 3) ECEF position [m] and velocity [m/s]
+    # SatClk: numpy array
+    #         Clock bias [m]
+    # Found: numpy array
+    #         True inside the SP3 epochs, for satellites with all the
+    #         samples of their window
+
+    Prn = np.asarray(Prn, dtype=int)
+    Time = np.asarray(Time, dtype=float)
+    Order = Sp3Segments["Order"]
+    Half = (Order - 1) / 2
+
+    # Position in the grid
+    Grid = (Time - Sp3Segments["T0"]) / Sp3Segments["Step"]
+    Inside = (Grid >= 0) & (Grid <= Sp3Segments["NGrid"] - 1) & \
+        (Prn >= 1) & (Prn <= Const.MAX_NUM_SATS_CONSTEL)
+    Grid = np.where(Inside, Grid, 0.0)
+    Sat = np.where(Inside, Prn - 1, 0)
+
+    # Window centered on the interval, shifted at the edges
+    Interval = np.minimum(Grid.astype(int), Sp3Segments["NGrid"] - 2)
+    Win = np.clip(Interval - (Order // 2 - 1), 0, Sp3Segments["NWin"] - 1)
+    Segment = Sat * Sp3Segments["NWin"] + Win
+    X = (Grid - Win - Half) / Half
+
+    # Horner evaluation of the polynomial and its derivative, in place
+    # on (Axis, Query) arrays
+    Coef = np.take(Sp3Segments["Coef"], Segment.ravel(), axis=2)
+    X = X.ravel()
+    SatPos = Coef[Order - 1].copy()
+    SatVel = np.zeros(SatPos.shape)
+    for k in range(Order - 2, -1, -1):
+        SatVel *= X
+        SatVel += SatPos
+        SatPos *= X
+        SatPos += Coef[k]
+    SatVel /= Half * Sp3Segments["Step"]
+    SatPos = SatPos.T.reshape(Time.shape + (3,))
+    SatVel = SatVel.T.reshape(Time.shape + (3,))
+
+    # Linear interpolation of the clocks
+    Frac = Grid - Interval
+    SatClk = (1 - Frac) * Sp3Segments["Clk"][Sat, Interval] + \
+        Frac * Sp3Segments["Clk"][Sat, Interval + 1]
+
+    Found = Inside & np.all(np.isfinite(SatPos), axis=-1) & np.isfinite(SatClk)
+
+    return SatPos, SatVel, SatClk, Found
+
+# End of computeSp3PosClk()
+
+def computeSp3SatGeometry(Sp3Segments, Prn, Time, RcvrXyz):
+
+    # Purpose: compute the satellite positions seen from a receiver,
+    #          at the time of transmission and in the ECEF frame at the
+    #          time of reception (Sagnac effect), as computeSatGeometry()
+    #          for the broadcast ephemerides
+
+    # Parameters
+    # ==========
+    # Sp3Segments: dict
+    #         Polynomials, as given by buildSp3Segments()
+    # Prn, Time: numpy arrays
+    #         PRNs and GPS times of reception [s]
+    # RcvrXyz: list
+    #         Receiver ECEF position [m]
+
+    # Returns
+    # =======
+    # SatGeom: dict
+    #         "Pos" (..., 3) [m], "Clk" and "Rel" [m], and "Found",
+    #         False where there is no orbit (NaN values)
+
+    Time = np.asarray(Time, dtype=float)
+    RcvrXyz = np.asarray(RcvrXyz, dtype=float)
+
+    # Signal transit time, from the geometric range
+    Transit = np.full(Time.shape, EPH_TRANSIT_GUESS)
+    for i in range(EPH_TRANSIT_NITER + 1):
+        SatPos, SatVel, SatClk, Found = computeSp3PosClk(Sp3Segments, Prn,
+            Time - Transit)
+        Transit = np.where(Found,
+            np.linalg.norm(SatPos - RcvrXyz, axis=-1) / Const.SPEED_OF_LIGHT,
+            EPH_TRANSIT_GUESS)
+
+    # Relativistic clock correction: -2 r.v / c
+    # Ref.: IS-GPS-200 Section 20.3.3.3.3.1
+    SatRel = -2 * np.sum(SatPos * SatVel, axis=-1) / Const.SPEED_OF_LIGHT
+
+    SatPos = rotateEarthTransit(SatPos, Transit)
+    SatPos[~Found] = np.nan
+    SatGeom = OrderedDict({})
+    SatGeom["Pos"] = SatPos
+    SatGeom["Clk"] = np.where(Found, SatClk, np.nan)
+    SatGeom["Rel"] = np.where(Found, SatRel, np.nan)
+    SatGeom["Found"] = Found
+
+    return SatGeom
+
+# End of computeSp3SatGeometry()
+
+########################################################################
+# END OF SP3 FUNCTIONS MODULE
+########################################################################
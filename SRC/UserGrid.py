@@ -0,0 +1,258 @@
+#!/usr/bin/env python
+
+########################################################################
+# PETRUS/SRC/UserGrid.py:
+# This is the User Grid Simulation Module of PETRUS tool
+#
+#  Project:        PETRUS
+#  File:           UserGrid.py
+#  Date(YY/MM/DD): 01/02/21
+#
+#   Author: GNSS Academy
+#   Copyright 2021 GNSS Academy
+#
+# -----------------------------------------------------------------
+# Date       | Author             | Action
+# -----------------------------------------------------------------
+#
+# Simulates the users of a latitude/longitude grid over a day: their
+# visibility, DOPs, Protection Levels and the availability and
+# continuity of the activated Service Levels.
+#
+# The satellite positions of all the epochs are computed once per day
+# and shared by all the users. The Line-of-Sight vectors of
+# (epoch, user, satellite) are then obtained by batched rotations to
+# the local frame of each user, for chunks of up to MAX_NUM_USRS users
+# and USR_GRID_BATCH user-epochs at once, so that the memory is
+# bounded whatever the grid and sampling rate. Only per-user counters
+# are kept between batches.
+########################################################################
+
+
+# Import External and Internal functions and Libraries
+#----------------------------------------------------------------------
+import sys, os
+from collections import OrderedDict
+import numpy as np
+from COMMON import GnssConstants as Const
+from COMMON.Coordinates import llh2xyzArray
+from COMMON.Coordinates import computeEnuRotation
+from COMMON.Dates import convertYearDoy2JulianDayArray
+from COMMON.Uere import lookupUereVariance
+from Geometry import computeDop
+from Integrity import computeProtectionLevels
+from Integrity import initIntegrityInfo
+
+# Number of user-epochs processed at once
+USR_GRID_BATCH = 16384
+
+def buildUserGrid(Conf):
+
+    # Purpose: build the users of the User Grid
+
+    # Parameters
+    # ==========
+    # Conf: dict
+    #         Configuration dictionary
+
+    # Returns
+    # =======
+    # UserGrid: dict
+    #         Per user: "Lat", "Lon" [deg], ECEF "Xyz" (NUsers, 3) [m]
+    #         and rotation to the local ENU frame "Rot" (NUsers, 3, 3)
+
+    LatMin, LatMax, LonMin, LonMax, LatStep, LonStep = Conf["USR_GRID"]
+
+    # Nodes of the grid, the upper limits included
+    Lat = np.arange(LatMin, LatMax + LatStep / 2, LatStep)
+    Lon = np.arange(LonMin, LonMax + LonStep / 2, LonStep)
+    Lat, Lon = [Axis.ravel() for Axis in np.meshgrid(Lat, Lon, indexing="ij")]
+
+    if len(Lat) == 0:
+        sys.stderr.write("ERROR: empty User Grid %s\n" % str(Conf["USR_GRID"]))
+        sys.exit(-1)
+
+    UserGrid = OrderedDict({})
+    UserGrid["Lat"] = Lat
+    UserGrid["Lon"] = Lon
+    UserGrid["Xyz"] = np.stack(llh2xyzArray(Lon, Lat, np.zeros(len(Lat))), axis=-1)
+    UserGrid["Rot"] = computeEnuRotation(Lon, Lat)
+
+    return UserGrid
+
+# End of buildUserGrid()
+
+def computeGridSatPos(OrbitInfo, Time, computeGeometry):
+
+    # Purpose: compute the positions of all the GPS satellites at all
+    #          the epochs, common to all the users
+
+    # Parameters
+    # ==========
+    # OrbitInfo: dict
+    #         Orbits, as given by readRinexNav(), readYumaAlmanac() or
+    #         buildSp3Segments()
+    # Time: numpy array
+    #         GPS times of the epochs [s]
+    # computeGeometry: function
+    #         Geometry of the orbits, as computeSatGeometry()
+
+    # Returns
+    # =======
+    # SatPos: numpy array
+    #         (NEpochs, MAX_NUM_SATS_CONSTEL, 3) ECEF positions [m], NaN
+    #         without orbit
+
+    Prn = np.arange(1, Const.MAX_NUM_SATS_CONSTEL + 1)
+    Time, Prn = np.broadcast_arrays(Time[:, None], Prn[None, :])
+
+    # Transit time and Earth rotation of a receiver at the center of
+    # the Earth: the difference with any user on the ground is below
+    # 0.02 s, some tens of meters along the orbit
+    SatGeom = computeGeometry(OrbitInfo, Prn, Time, np.zeros(3))
+
+    return SatGeom["Pos"]
+
+# End of computeGridSatPos()
+
+def simulateUserGrid(Conf, UserGrid, OrbitInfo, computeGeometry, Year, Doy,
+    UereLut):
+
+    # Purpose: simulate the users of the User Grid over a day
+
+    # Parameters
+    # ==========
+    # Conf: dict
+    #         Configuration dictionary
+    # UserGrid: dict
+    #         Users, as given by buildUserGrid()
+    # OrbitInfo: dict
+    #         Orbits of the day
+    # computeGeometry: function
+    #         Geometry of the orbits, as computeSatGeometry()
+    # Year, Doy: int
+    #         Day to simulate
+    # UereLut: dict
+    #         UERE look-up table, as given by buildUereLut()
+
+    # Returns
+    # =======
+    # UsrGridInfo: dict
+    #         Per user: position, number of visible satellites, PDOPs,
+    #         availability of the solution (PDOP <= PDOP_MAX) [%], and
+    #         per user and activated service: availability [%],
+    #         continuity risk and compliance
+
+    Rate = Conf["USR_GRID_RATE"]
+    Sod = np.arange(0, Const.S_IN_D, Rate, dtype=float)
+    Day = (convertYearDoy2JulianDayArray(Year, Doy) - Const.JD_0) * Const.S_IN_D
+    SatPos = computeGridSatPos(OrbitInfo, Day + Sod, computeGeometry)
+    NEpochs = len(Sod)
+    NUsers = len(UserGrid["Lat"])
+    SinMask = np.sin(np.radians(Conf["RCVR_MASK"]))
+
+    # Thresholds of the activated services: (1, 1, service) arrays
+    Thresholds = initIntegrityInfo(Conf)
+    Services = Thresholds["Services"]
+    NServices = len(Services)
+    HAL = Thresholds["HAL"][None, None, :]
+    VAL = Thresholds["VAL"][None, None, :]
+
+    # Per user counters
+    MinNSats = np.full(NUsers, Const.MAX_NUM_SATS_CONSTEL, dtype=int)
+    SumNSats = np.zeros(NUsers, dtype=int)
+    SumPdop = np.zeros(NUsers)
+    MaxPdop = np.full(NUsers, -np.inf)
+    NPdop = np.zeros(NUsers, dtype=int)
+    NSol = np.zeros(NUsers, dtype=int)
+    NAvail = np.zeros((NUsers, NServices), dtype=int)
+    NLoss = np.zeros((NUsers, NServices), dtype=int)
+
+    # Chunks of users, and batches of their epochs
+    for UserStart in range(0, NUsers, Const.MAX_NUM_USRS):
+        Users = slice(UserStart, min(UserStart + Const.MAX_NUM_USRS, NUsers))
+        Rot = UserGrid["Rot"][Users]
+        UserEnu = np.einsum('uij,uj->ui', Rot, UserGrid["Xyz"][Users])
+        NChunk = len(UserEnu)
+        EpochBatch = max(USR_GRID_BATCH // NChunk, 1)
+        LastAvail = np.zeros((NChunk, NServices), dtype=bool)
+
+        for EpochStart in range(0, NEpochs, EpochBatch):
+            Epochs = slice(EpochStart, EpochStart + EpochBatch)
+
+            # (epoch, user, sat, ENU) Line-of-Sight vectors: the
+            # satellite positions rotated to all the user frames at
+            # once, as one (epoch * sat, 3) x (3, user * 3) product
+            EpochSatPos = SatPos[Epochs]
+            Enu = (EpochSatPos.reshape(-1, 3) @ Rot.reshape(-1, 3).T).reshape(
+                EpochSatPos.shape[:2] + (NChunk, 3)).transpose(0, 2, 1, 3) - \
+                UserEnu[None, :, None, :]
+            Range = np.sqrt(np.sum(Enu * Enu, axis=-1))
+            SinElev = Enu[..., 2] / Range
+            Visible = SinElev >= SinMask
+            NSats = np.sum(Visible, axis=-1)
+
+            # Geometry matrices, zero rows for the hidden satellites
+            G = np.empty(Enu.shape[:-1] + (4,))
+            G[..., :3] = np.where(Visible[..., None], -Enu / Range[..., None], 0.0)
+            G[..., 3] = Visible
+            G = G.reshape((-1,) + G.shape[2:])
+
+            Pdop = computeDop(G, NSats.ravel())["PDOP"].reshape(NSats.shape)
+
+            # Protection Levels weighted by the UERE
+            Elev = np.degrees(np.arcsin(np.where(Visible, SinElev, 0.0)))
+            W = np.where(Visible, 1.0 / lookupUereVariance(UereLut, Elev), 0.0)
+            Hpl, Vpl = computeProtectionLevels(G, W.reshape(len(G), -1))
+            Hpl = Hpl.reshape(NSats.shape)[..., None]
+            Vpl = Vpl.reshape(NSats.shape)[..., None]
+
+            # Geometry counters
+            MinNSats[Users] = np.minimum(MinNSats[Users], NSats.min(axis=0))
+            SumNSats[Users] += NSats.sum(axis=0)
+            Solved = ~np.isnan(Pdop)
+            SumPdop[Users] += np.where(Solved, Pdop, 0.0).sum(axis=0)
+            NPdop[Users] += Solved.sum(axis=0)
+            MaxPdop[Users] = np.maximum(MaxPdop[Users],
+                np.where(Solved, Pdop, -np.inf).max(axis=0))
+            Sol = Pdop <= Conf["PDOP_MAX"]
+            NSol[Users] += Sol.sum(axis=0)
+
+            # (epoch, user, service) availability, the alarm limits set
+            # to -1 do not apply
+            Avail = Sol[..., None] & \
+                ((HAL < 0) | (Hpl <= HAL)) & \
+                ((VAL < 0) | (Vpl <= VAL))
+            NAvail[Users] += Avail.sum(axis=0)
+
+            # Losses of service, continuing from the previous batch
+            Prev = np.concatenate((LastAvail[None], Avail[:-1]), axis=0)
+            NLoss[Users] += np.sum(Prev & ~Avail, axis=0)
+            LastAvail = Avail[-1]
+
+    UsrGridInfo = OrderedDict({})
+    UsrGridInfo["LAT"] = UserGrid["Lat"]
+    UsrGridInfo["LON"] = UserGrid["Lon"]
+    UsrGridInfo["NEPOCHS"] = NEpochs
+    UsrGridInfo["MINNSATS"] = MinNSats
+    UsrGridInfo["AVGNSATS"] = SumNSats / NEpochs
+    UsrGridInfo["AVGPDOP"] = np.where(NPdop > 0, SumPdop / np.maximum(NPdop, 1), np.nan)
+    UsrGridInfo["MAXPDOP"] = np.where(NPdop > 0, MaxPdop, np.nan)
+    UsrGridInfo["SOLAVAIL"] = 100.0 * NSol / NEpochs
+
+    # Service Levels, as computeServiceLevels() (no Position Errors)
+    UsrGridInfo["SERVICE"] = Services
+    UsrGridInfo["AVAIL"] = 100.0 * NAvail / NEpochs
+    UsrGridInfo["CONTRISK"] = NLoss * Thresholds["CINT"][None, :] / \
+        (np.maximum(NAvail, 1) * Rate)
+    UsrGridInfo["COMPLIANT"] = \
+        (UsrGridInfo["AVAIL"] >= Thresholds["AVAI"][None, :]) & \
+        (UsrGridInfo["CONTRISK"] <= Thresholds["CONT"][None, :])
+
+    return UsrGridInfo
+
+# End of simulateUserGrid()
+
+########################################################################
+# END OF USER GRID FUNCTIONS MODULE
+########################################################################